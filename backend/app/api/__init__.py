@@ -6,7 +6,7 @@ Combines all API route modules.
 
 from fastapi import APIRouter
 
-from app.api.routes import auth, tickets, knowledge, users, reports, m365, audit, sla
+from app.api.routes import auth, tickets, knowledge, users, reports, m365, audit, sla, system
 
 api_router = APIRouter()
 
@@ -19,3 +19,4 @@ api_router.include_router(reports.router, prefix="/reports", tags=["Reports"])
 api_router.include_router(m365.router, prefix="/m365", tags=["M365 Operations"])
 api_router.include_router(audit.router, prefix="/audit", tags=["Audit Logs"])
 api_router.include_router(sla.router, prefix="/sla", tags=["SLA Policies"])
+api_router.include_router(system.router, prefix="/system", tags=["System"])
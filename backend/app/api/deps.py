@@ -6,13 +6,14 @@ Shared dependencies for API routes including authentication and database session
 
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.core.security import verify_token
+from app.core.auth_context import get_auth_context
 from app.models.user import User, UserRole
+from app.services.user_cache import get_user_by_id
 
 
 # Security scheme
@@ -20,36 +21,37 @@ security = HTTPBearer()
 
 
 async def get_current_user(
+    request: Request,
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ) -> User:
     """
     Get the current authenticated user from JWT token.
     
+    The token is verified at most once per request: the result is shared
+    with AuditMiddleware through the request-scoped auth context. The user
+    row is served from a short-lived cache (see app.services.user_cache).
+    
     Raises:
         HTTPException: If token is invalid or user not found.
     """
-    from sqlalchemy import select
-    
-    token = credentials.credentials
-    payload = verify_token(token)
+    context = get_auth_context(request)
     
-    if payload is None:
+    if context is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user_id = payload.get("sub")
+    user_id = context.user_id
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
         )
     
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
+    user = await get_user_by_id(db, user_id)
     
     if user is None:
         raise HTTPException(
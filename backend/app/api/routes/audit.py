@@ -23,6 +23,8 @@ from app.database import get_db
 from app.models.audit_log import AuditLog, AuditAction
 from app.models.user import UserRole
 from app.api.deps import CurrentUser, DbSession, require_roles
+from app.services.audit_partitions import audit_log_source
+from app.services.audit_rollup import get_rollup_statistics
 from utils.masking import mask_pii
 
 
@@ -220,32 +222,35 @@ async def get_audit_logs(
             detail="監査ログへのアクセス権限がありません。Auditor または Manager ロールが必要です。"
         )
 
+    # 期間に該当するパーティションのみを対象にする
+    source = await audit_log_source(db, start_date, end_date)
+
     # クエリ構築
     conditions = []
 
     if action is not None:
-        conditions.append(AuditLog.action == action)
+        conditions.append(source.action == action)
 
     if resource_type is not None:
-        conditions.append(AuditLog.resource_type == resource_type)
+        conditions.append(source.resource_type == resource_type)
 
     if resource_id is not None:
-        conditions.append(AuditLog.resource_id == resource_id)
+        conditions.append(source.resource_id == resource_id)
 
     if actor_id is not None:
-        conditions.append(AuditLog.actor_id == actor_id)
+        conditions.append(source.actor_id == actor_id)
 
     if related_ticket_id is not None:
-        conditions.append(AuditLog.related_ticket_id == related_ticket_id)
+        conditions.append(source.related_ticket_id == related_ticket_id)
 
     if start_date is not None:
-        conditions.append(AuditLog.created_at >= start_date)
+        conditions.append(source.created_at >= start_date)
 
     if end_date is not None:
-        conditions.append(AuditLog.created_at <= end_date)
+        conditions.append(source.created_at <= end_date)
 
     # 総件数取得
-    count_query = select(func.count(AuditLog.id))
+    count_query = select(func.count(source.id))
     if conditions:
         count_query = count_query.where(and_(*conditions))
 
@@ -258,8 +263,8 @@ async def get_audit_logs(
 
     # データ取得（新しい順）
     data_query = (
-        select(AuditLog)
-        .order_by(AuditLog.created_at.desc())
+        select(source)
+        .order_by(source.created_at.desc())
         .offset(offset)
         .limit(page_size)
     )
@@ -312,9 +317,10 @@ async def get_audit_log_detail(
             detail="監査ログへのアクセス権限がありません。Auditor または Manager ロールが必要です。"
         )
 
-    # ログ取得
+    # ログ取得（全パーティション対象）
+    source = await audit_log_source(db)
     result = await db.execute(
-        select(AuditLog).where(AuditLog.id == log_id)
+        select(source).where(source.id == log_id)
     )
     log = result.scalar_one_or_none()
 
@@ -390,26 +396,29 @@ async def export_audit_logs(
     if start_date is None:
         start_date = now - timedelta(days=30)
 
+    # 期間に該当するパーティションのみを対象にする
+    source = await audit_log_source(db, start_date, end_date)
+
     # クエリ構築
     conditions = [
-        AuditLog.created_at >= start_date,
-        AuditLog.created_at <= end_date,
+        source.created_at >= start_date,
+        source.created_at <= end_date,
     ]
 
     if action is not None:
-        conditions.append(AuditLog.action == action)
+        conditions.append(source.action == action)
 
     if resource_type is not None:
-        conditions.append(AuditLog.resource_type == resource_type)
+        conditions.append(source.resource_type == resource_type)
 
     if actor_id is not None:
-        conditions.append(AuditLog.actor_id == actor_id)
+        conditions.append(source.actor_id == actor_id)
 
     # データ取得
     query = (
-        select(AuditLog)
+        select(source)
         .where(and_(*conditions))
-        .order_by(AuditLog.created_at.desc())
+        .order_by(source.created_at.desc())
         .limit(limit)
     )
 
@@ -478,6 +487,8 @@ async def get_audit_statistics(
 
     アクション種別別、リソース種別別の集計を提供します。
     KPIレビューや監査報告書作成に活用できます。
+    集計は時間単位の事前集計テーブルを合計するため、期間に比例した
+    audit_logs の全件走査は発生しません。
 
     Args:
         days: 統計対象期間（デフォルト30日）
@@ -495,27 +506,10 @@ async def get_audit_statistics(
     now = datetime.now(timezone.utc)
     period_start = now - timedelta(days=days)
 
-    # 総件数
-    total_result = await db.execute(
-        select(func.count(AuditLog.id)).where(AuditLog.created_at >= period_start)
-    )
-    total_logs = total_result.scalar() or 0
-
-    # アクション別集計
-    action_result = await db.execute(
-        select(AuditLog.action, func.count(AuditLog.id))
-        .where(AuditLog.created_at >= period_start)
-        .group_by(AuditLog.action)
-    )
-    logs_by_action = {row[0].value: row[1] for row in action_result}
-
-    # リソース種別集計
-    resource_result = await db.execute(
-        select(AuditLog.resource_type, func.count(AuditLog.id))
-        .where(AuditLog.created_at >= period_start)
-        .group_by(AuditLog.resource_type)
+    # 時間単位の事前集計（audit_log_rollup）から集計
+    total_logs, logs_by_action, logs_by_resource = await get_rollup_statistics(
+        db, period_start, now
     )
-    logs_by_resource = {row[0]: row[1] for row in resource_result}
 
     return AuditStatistics(
         total_logs=total_logs,
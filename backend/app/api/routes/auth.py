@@ -6,15 +6,24 @@ Login, logout, and token refresh endpoints.
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models.user import User
-from app.core.security import verify_password, create_access_token, create_refresh_token
+from app.core.auth_context import get_auth_context
+from app.core.rate_limit import client_ip, login_throttle
+from app.core.revocation import revocation_list
+from app.core.security import (
+    verify_password_async,
+    create_access_token,
+    create_refresh_token,
+    new_token_id,
+)
 from app.api.deps import CurrentUser
+from app.services.token_revocation import revoke_family, revoke_session, revoke_token
 
 
 router = APIRouter()
@@ -49,16 +58,28 @@ class UserResponse(BaseModel):
 @router.post("/login", response_model=TokenResponse)
 async def login(
     request: LoginRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
 ):
     """
     Authenticate user and return JWT tokens.
+    
+    Attempts are rate limited per client IP and per email before any
+    password verification is done.
     """
+    retry_after = await login_throttle.check(client_ip(http_request), request.email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please try again later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    
     # Find user by email
     result = await db.execute(select(User).where(User.email == request.email))
     user = result.scalar_one_or_none()
     
-    if user is None or not verify_password(request.password, user.hashed_password):
+    if user is None or not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -74,10 +95,12 @@ async def login(
     # Update last login
     user.last_login_at = datetime.now(timezone.utc)
     await db.commit()
+    await login_throttle.reset_email(request.email)
     
-    # Generate tokens
-    access_token = create_access_token(subject=str(user.id))
-    refresh_token = create_refresh_token(subject=str(user.id))
+    # Generate tokens (one family per login session)
+    family = new_token_id()
+    access_token = create_access_token(subject=str(user.id), family=family)
+    refresh_token = create_refresh_token(subject=str(user.id), family=family)
     
     return TokenResponse(
         access_token=access_token,
@@ -87,16 +110,21 @@ async def login(
 
 
 @router.post("/logout")
-async def logout(current_user: CurrentUser):
+async def logout(
+    request: Request,
+    current_user: CurrentUser,
+    db: AsyncSession = Depends(get_db),
+):
     """
     Logout current user.
     
-    Note: JWT tokens are stateless, so this endpoint is primarily
-    for audit logging purposes. Client should discard the token.
+    Revokes the presented access token and its login session (token family),
+    so the refresh token issued with it can no longer be used either.
     """
-    # In a production system, you might want to:
-    # 1. Add the token to a blacklist
-    # 2. Log the logout action
+    context = get_auth_context(request)
+    if context is not None:
+        await revoke_session(db, context.payload, reason="logout")
+        await db.commit()
     return {"message": "Successfully logged out"}
 
 
@@ -122,17 +150,35 @@ async def refresh_token(
     request: RefreshRequest,
     db: AsyncSession = Depends(get_db),
 ):
-    """Refresh access token using refresh token."""
+    """
+    Refresh access token using refresh token.
+    
+    Refresh tokens are rotated: the presented token is revoked and a new one
+    of the same family is issued. Presenting an already-rotated (revoked)
+    refresh token indicates theft, so the whole family is revoked.
+    """
     from app.core.security import verify_token
     
-    payload = verify_token(request.refresh_token)
-    if payload is None:
+    payload = verify_token(request.refresh_token, check_revocation=False)
+    if payload is None or payload.get("type") != "refresh":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token",
         )
     
     user_id = payload.get("sub")
+    family = payload.get("fam")
+    
+    if revocation_list.is_revoked(payload):
+        if family and payload.get("jti") and not revocation_list.is_revoked({"fam": family}):
+            # Reuse of a rotated refresh token: revoke the whole session
+            await revoke_family(db, family, int(user_id), reason="refresh_reuse")
+            await db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
+    
     result = await db.execute(select(User).where(User.id == int(user_id)))
     user = result.scalar_one_or_none()
     
@@ -142,9 +188,14 @@ async def refresh_token(
             detail="User not found or inactive",
         )
     
+    # Rotate: revoke the presented refresh token, keep the session family
+    await revoke_token(db, payload, reason="refresh_rotation")
+    await db.commit()
+    
     # Generate new tokens
-    access_token = create_access_token(subject=str(user.id))
-    refresh_token = create_refresh_token(subject=str(user.id))
+    family = family or new_token_id()
+    access_token = create_access_token(subject=str(user.id), family=family)
+    refresh_token = create_refresh_token(subject=str(user.id), family=family)
     
     return TokenResponse(
         access_token=access_token,
@@ -4,14 +4,20 @@ Knowledge Routes
 CRUD operations for knowledge base articles.
 """
 
+from typing import Literal
+
 from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel, Field
 from sqlalchemy import func, or_, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import defer, selectinload
 
 from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
 from app.models.user import UserRole
 from app.api.deps import CurrentUser, DbSession
+from app.services.knowledge_counters import feedback_counts, record_vote, view_counts
+from app.services.knowledge_related import get_related_articles
+from app.services.knowledge_search import search_knowledge, visible_visibilities
+from app.services.knowledge_suggest import knowledge_suggester
 
 
 router = APIRouter()
@@ -42,11 +48,10 @@ class KnowledgeUpdate(BaseModel):
     is_featured: bool | None = None
 
 
-class KnowledgeResponse(BaseModel):
-    """Schema for knowledge article response."""
+class KnowledgeSummaryResponse(BaseModel):
+    """Schema for a knowledge article without its content (list views)."""
     id: int
     title: str
-    content: str
     summary: str | None
     category: str
     tags: str | None
@@ -66,17 +71,97 @@ class KnowledgeResponse(BaseModel):
         from_attributes = True
 
 
+class KnowledgeResponse(KnowledgeSummaryResponse):
+    """Schema for knowledge article response."""
+    content: str
+
+
 class KnowledgeListResponse(BaseModel):
     """Schema for paginated knowledge list."""
-    items: list[KnowledgeResponse]
+    items: list[KnowledgeResponse] | list[KnowledgeSummaryResponse]
+    total: int
+    page: int
+    page_size: int
+
+
+class KnowledgeSearchHit(KnowledgeResponse):
+    """Knowledge article with its relevance score."""
+    score: float
+
+
+class KnowledgeSummaryHit(KnowledgeSummaryResponse):
+    """Knowledge article summary with its relevance score."""
+    score: float
+
+
+class KnowledgeRelatedResponse(BaseModel):
+    """Schema for precomputed related articles."""
+    items: list[KnowledgeSummaryHit]
+
+
+class KnowledgeSuggestion(BaseModel):
+    """Schema for a typeahead suggestion."""
+    id: int
+    title: str
+    category: str
+    tag: str | None = None  # set when the prefix matched a tag rather than the title
+
+
+class KnowledgeSuggestResponse(BaseModel):
+    """Schema for typeahead suggestions."""
+    prefix: str
+    items: list[KnowledgeSuggestion]
+
+
+class KnowledgeSearchResponse(BaseModel):
+    """Schema for ranked knowledge search results."""
+    items: list[KnowledgeSearchHit] | list[KnowledgeSummaryHit]
     total: int
     page: int
     page_size: int
+    query: str
+
+
+def _to_response(
+    article: KnowledgeArticle, with_content: bool = True
+) -> KnowledgeResponse | KnowledgeSummaryResponse:
+    """Build the response, including counts not yet flushed to the database."""
+    pending = view_counts.pending(article.id)
+    pending.update(feedback_counts.pending(article.id))  # keeps negative deltas
+    values = dict(
+        id=article.id,
+        title=article.title,
+        summary=article.summary,
+        category=article.category,
+        tags=article.tags,
+        visibility=article.visibility.value,
+        article_type=article.article_type,
+        is_published=article.is_published,
+        is_featured=article.is_featured,
+        view_count=article.view_count + pending["view_count"],
+        helpful_count=article.helpful_count + pending["helpful_count"],
+        not_helpful_count=article.not_helpful_count + pending["not_helpful_count"],
+        author_id=article.author_id,
+        author_name=article.author.display_name if article.author else None,
+        created_at=article.created_at.isoformat(),
+        updated_at=article.updated_at.isoformat(),
+    )
+    if with_content:
+        return KnowledgeResponse(content=article.content, **values)
+    return KnowledgeSummaryResponse(**values)
+
+
+def _article_query(with_content: bool):
+    """Base article query; the summary view never reads ``content``."""
+    query = select(KnowledgeArticle).options(selectinload(KnowledgeArticle.author))
+    if not with_content:
+        query = query.options(defer(KnowledgeArticle.content))
+    return query
 
 
 # ============== Routes ==============
 
-@router.get("", response_model=KnowledgeListResponse)
+@router.get("", response_model=KnowledgeListResponse | KnowledgeSearchResponse)
 async def list_knowledge(
     current_user: CurrentUser,
     db: DbSession,
@@ -86,23 +171,36 @@ async def list_knowledge(
     article_type: str | None = None,
     search: str | None = None,
     published_only: bool = True,
+    mode: Literal["list", "search"] = "list",
+    view: Literal["full", "summary"] = "full",
 ):
     """
     List knowledge articles with filtering and search.
+    
+    With ``mode=search`` the ``search`` term is run against the full-text
+    index and hits are returned ranked by relevance with their scores.
+    With ``view=summary`` items omit ``content`` and it is not loaded.
     """
-    query = select(KnowledgeArticle).options(selectinload(KnowledgeArticle.author))
+    visibilities = visible_visibilities(current_user.role)
+    with_content = view == "full"
     
-    # Visibility filter based on role
-    if current_user.role == UserRole.REQUESTER:
-        query = query.where(KnowledgeArticle.visibility == KnowledgeVisibility.PUBLIC)
-    elif current_user.role not in [UserRole.MANAGER, UserRole.AGENT]:
-        query = query.where(
-            KnowledgeArticle.visibility.in_([
-                KnowledgeVisibility.PUBLIC,
-                KnowledgeVisibility.DEPARTMENT,
-            ])
+    if mode == "search":
+        if not search or not search.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="search is required when mode=search",
+            )
+        return await _search_knowledge(
+            db, search, visibilities, published_only, category, article_type, page, page_size,
+            with_content,
         )
     
+    query = _article_query(with_content)
+    
+    # Visibility filter based on role
+    if visibilities is not None:
+        query = query.where(KnowledgeArticle.visibility.in_(visibilities))
+    
     # Published filter
     if published_only:
         query = query.where(KnowledgeArticle.is_published == True)
@@ -137,34 +235,61 @@ async def list_knowledge(
     result = await db.execute(query)
     articles = result.scalars().all()
     
+    items = [_to_response(a, with_content) for a in articles]
+    
+    return KnowledgeListResponse(
+        items=items,
+        total=total,
+        page=page,
+        page_size=page_size,
+    )
+
+
+async def _search_knowledge(
+    db: DbSession,
+    search: str,
+    visibilities: list[KnowledgeVisibility] | None,
+    published_only: bool,
+    category: str | None,
+    article_type: str | None,
+    page: int,
+    page_size: int,
+    with_content: bool = True,
+) -> KnowledgeSearchResponse:
+    """Ranked search over the knowledge index; only the page is read from the DB."""
+    hits = search_knowledge(
+        search,
+        visibilities=visibilities,
+        published_only=published_only,
+        category=category,
+        article_type=article_type,
+    )
+    offset = (page - 1) * page_size
+    page_hits = hits[offset:offset + page_size]
+    
+    articles: dict[int, KnowledgeArticle] = {}
+    if page_hits:
+        result = await db.execute(
+            _article_query(with_content)
+            .where(KnowledgeArticle.id.in_([article_id for article_id, _ in page_hits]))
+        )
+        articles = {a.id: a for a in result.scalars().all()}
+    
+    hit_model = KnowledgeSearchHit if with_content else KnowledgeSummaryHit
     items = [
-        KnowledgeResponse(
-            id=a.id,
-            title=a.title,
-            content=a.content,
-            summary=a.summary,
-            category=a.category,
-            tags=a.tags,
-            visibility=a.visibility.value,
-            article_type=a.article_type,
-            is_published=a.is_published,
-            is_featured=a.is_featured,
-            view_count=a.view_count,
-            helpful_count=a.helpful_count,
-            not_helpful_count=a.not_helpful_count,
-            author_id=a.author_id,
-            author_name=a.author.display_name if a.author else None,
-            created_at=a.created_at.isoformat(),
-            updated_at=a.updated_at.isoformat(),
+        hit_model(
+            **_to_response(articles[article_id], with_content).model_dump(), score=round(score, 4)
         )
-        for a in articles
+        for article_id, score in page_hits
+        if article_id in articles
     ]
     
-    return KnowledgeListResponse(
+    return KnowledgeSearchResponse(
         items=items,
-        total=total,
+        total=len(hits),
         page=page,
         page_size=page_size,
+        query=search,
     )
 
 
@@ -218,13 +343,39 @@ async def create_knowledge(
     )
 
 
+@router.get("/suggest", response_model=KnowledgeSuggestResponse)
+async def suggest_knowledge(
+    current_user: CurrentUser,
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=20),
+):
+    """
+    Typeahead for the search box: published articles whose title or tags
+    start with ``prefix``, most viewed / most helpful first.
+    
+    Served from the in-memory suggester without touching the database.
+    """
+    suggestions = knowledge_suggester.suggest(
+        prefix,
+        limit=limit,
+        visibilities=visible_visibilities(current_user.role),
+    )
+    return KnowledgeSuggestResponse(
+        prefix=prefix,
+        items=[
+            KnowledgeSuggestion(id=s.article_id, title=s.title, category=s.category, tag=s.tag)
+            for s in suggestions
+        ],
+    )
+
+
 @router.get("/{article_id}", response_model=KnowledgeResponse)
 async def get_knowledge(
     article_id: int,
     current_user: CurrentUser,
     db: DbSession,
 ):
-    """Get a single knowledge article and increment view count."""
+    """Get a single knowledge article and count the view."""
     result = await db.execute(
         select(KnowledgeArticle)
         .options(selectinload(KnowledgeArticle.author))
@@ -245,28 +396,52 @@ async def get_knowledge(
         if not article.is_published:
             raise HTTPException(status_code=404, detail="Article not found")
     
-    # Increment view count
-    article.increment_view()
-    await db.commit()
+    # Count the view; buffered and flushed in batches, so the read stays read-only
+    view_counts.add(article.id, "view_count")
     
-    return KnowledgeResponse(
-        id=article.id,
-        title=article.title,
-        content=article.content,
-        summary=article.summary,
-        category=article.category,
-        tags=article.tags,
-        visibility=article.visibility.value,
-        article_type=article.article_type,
-        is_published=article.is_published,
-        is_featured=article.is_featured,
-        view_count=article.view_count,
-        helpful_count=article.helpful_count,
-        not_helpful_count=article.not_helpful_count,
-        author_id=article.author_id,
-        author_name=article.author.display_name if article.author else None,
-        created_at=article.created_at.isoformat(),
-        updated_at=article.updated_at.isoformat(),
+    return _to_response(article)
+
+
+@router.get("/{article_id}/related", response_model=KnowledgeRelatedResponse)
+async def get_related_knowledge(
+    article_id: int,
+    current_user: CurrentUser,
+    db: DbSession,
+    limit: int = Query(default=5, ge=1, le=20),
+):
+    """
+    Related articles for the article page.
+    
+    Served from the nightly ``knowledge_related_articles`` table and filtered
+    by what the current user may read; no search is run per request.
+    """
+    result = await db.execute(
+        select(KnowledgeArticle.visibility, KnowledgeArticle.is_published)
+        .where(KnowledgeArticle.id == article_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    
+    if current_user.role == UserRole.REQUESTER:
+        if row.visibility != KnowledgeVisibility.PUBLIC:
+            raise HTTPException(status_code=403, detail="Access denied")
+        if not row.is_published:
+            raise HTTPException(status_code=404, detail="Article not found")
+    
+    # Only published articles are suggested, whoever is reading
+    related = await get_related_articles(
+        db,
+        article_id,
+        visibilities=visible_visibilities(current_user.role),
+        published_only=True,
+        limit=limit,
+    )
+    return KnowledgeRelatedResponse(
+        items=[
+            KnowledgeSummaryHit(**_to_response(article, with_content=False).model_dump(), score=score)
+            for article, score in related
+        ]
     )
 
 
@@ -277,20 +452,18 @@ async def submit_feedback(
     current_user: CurrentUser,
     db: DbSession,
 ):
-    """Submit helpfulness feedback for an article."""
+    """
+    Submit helpfulness feedback for an article.
+    
+    Each user has one vote per article; voting again replaces the vote.
+    The counters are updated atomically in batches (see knowledge_counters).
+    """
     result = await db.execute(
-        select(KnowledgeArticle).where(KnowledgeArticle.id == article_id)
+        select(KnowledgeArticle.id).where(KnowledgeArticle.id == article_id)
     )
-    article = result.scalar_one_or_none()
-    
-    if article is None:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Article not found")
     
-    if helpful:
-        article.helpful_count += 1
-    else:
-        article.not_helpful_count += 1
-    
-    await db.commit()
+    changed = await record_vote(db, article_id, current_user.id, helpful)
     
-    return {"message": "Feedback submitted", "helpful": helpful}
+    return {"message": "Feedback submitted", "helpful": helpful, "changed": changed}
@@ -7,27 +7,37 @@ Graph API integration for actual M365 operations.
 
 import json
 import logging
-from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, Header, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from app.config import settings
 from app.models.ticket import Ticket, TicketStatus
 from app.models.approval import Approval, ApprovalStatus
-from app.models.m365_task import M365Task, M365TaskType, M365TaskStatus, M365ExecutionLog
+from app.models.m365_task import (
+    M365Job,
+    M365JobStatus,
+    M365Task,
+    M365TaskStatus,
+    M365TaskTarget,
+    M365TaskType,
+)
 from app.models.user import UserRole
+from app.services.m365_directory import directory_index
+from app.services.m365_bulk import BULK_TASK_TYPES, bulk_progress
+from app.services.m365_jobs import enqueue_execution, m365_job_worker, take_job_secrets
+from app.services.m365_workflow import WORKFLOW_TASK_TYPES, build_workflow_steps, workflow_progress
 from app.api.deps import CurrentUser, DbSession
+from app.m365.graph_client import MAX_PAGE_SIZE
 from app.m365.operations import M365Operations
 from app.m365.exceptions import (
     M365Error,
     M365APIError,
     M365AuthenticationError,
-    M365AuthorizationError,
-    M365ValidationError,
 )
-from utils.masking import mask_pii, preview_pii
 
 logger = logging.getLogger(__name__)
 
@@ -66,15 +76,27 @@ class ApprovalListResponse(BaseModel):
     page: int
     page_size: int
 
+class M365OnboardingOptions(BaseModel):
+    """Schema for the new user of a USER_ONBOARD task."""
+    display_name: str = Field(..., min_length=1, max_length=256)
+    usage_location: str | None = Field(default=None, pattern="^[A-Z]{2}$")
+    license_sku_ids: list[str] = Field(default_factory=list)
+    group_ids: list[str] = Field(default_factory=list)
+
+
 class M365TaskCreate(BaseModel):
     """Schema for creating an M365 task."""
     ticket_id: int
     task_type: M365TaskType
     target_upn: str | None = None
+    # Target users of bulk task types (BULK_LICENSE_ASSIGN / BULK_GROUP_ADD)
+    target_upns: list[str] | None = None
     target_resource_id: str | None = None
     target_description: str = Field(..., min_length=5)
     checklist: str | None = None
     rollback_procedure: str | None = None
+    # New user of USER_ONBOARD tasks
+    onboarding: M365OnboardingOptions | None = None
 
 
 class M365TaskResponse(BaseModel):
@@ -89,6 +111,7 @@ class M365TaskResponse(BaseModel):
     operator_id: int | None
     created_at: str
     completed_at: str | None
+    target_count: int | None = None
 
 
 class ExecutionLogCreate(BaseModel):
@@ -247,6 +270,40 @@ async def create_m365_task(
     
     if ticket is None:
         raise HTTPException(status_code=404, detail="Ticket not found")
+
+    target_upns = []
+    if data.task_type in BULK_TASK_TYPES:
+        # Deduplicate (UPNs are case-insensitive) while keeping the order
+        seen = set()
+        for upn in data.target_upns or []:
+            upn = upn.strip()
+            if upn and upn.lower() not in seen:
+                seen.add(upn.lower())
+                target_upns.append(upn)
+        if not target_upns or not data.target_resource_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Bulk tasks require target_upns and target_resource_id",
+            )
+        if len(target_upns) > settings.M365_BULK_MAX_TARGETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bulk tasks accept at most {settings.M365_BULK_MAX_TARGETS} targets",
+            )
+    elif data.target_upns:
+        raise HTTPException(status_code=400, detail="target_upns is only allowed for bulk tasks")
+
+    workflow_steps = []
+    if data.task_type in WORKFLOW_TASK_TYPES:
+        if not data.target_upn:
+            raise HTTPException(status_code=400, detail="Onboarding and offboarding tasks require target_upn")
+        if data.task_type == M365TaskType.USER_ONBOARD and data.onboarding is None:
+            raise HTTPException(status_code=400, detail="Onboarding tasks require onboarding options")
+        workflow_steps = build_workflow_steps(
+            data.task_type, data.onboarding.model_dump() if data.onboarding else None
+        )
+    if data.onboarding is not None and data.task_type != M365TaskType.USER_ONBOARD:
+        raise HTTPException(status_code=400, detail="onboarding is only allowed for onboarding tasks")
     
     task = M365Task(
         ticket_id=data.ticket_id,
@@ -256,6 +313,8 @@ async def create_m365_task(
         target_description=data.target_description,
         checklist=data.checklist,
         rollback_procedure=data.rollback_procedure,
+        targets=[M365TaskTarget(target_upn=upn) for upn in target_upns],
+        workflow_steps=workflow_steps,
     )
     
     db.add(task)
@@ -273,6 +332,7 @@ async def create_m365_task(
         operator_id=task.operator_id,
         created_at=task.created_at.isoformat(),
         completed_at=task.completed_at.isoformat() if task.completed_at else None,
+        target_count=len(target_upns) if target_upns else None,
     )
 
 
@@ -387,20 +447,24 @@ async def reject_task(
     return {"message": "Rejected", "status": "rejected"}
 
 
-@router.post("/tasks/{task_id}/execute")
+@router.post("/tasks/{task_id}/execute", status_code=status.HTTP_202_ACCEPTED)
 async def execute_m365_task(
     task_id: int,
     data: ExecutionLogCreate,
     current_user: CurrentUser,
     db: DbSession,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", max_length=128),
 ):
-    """Execute M365 task with Graph API integration (M365 Operator only).
+    """Queue M365 task execution via Graph API (M365 Operator only).
 
     This endpoint:
     1. Verifies approval and SOD compliance
-    2. Executes the M365 operation via Graph API
-    3. Records execution log with results
-    4. Updates task status
+    2. Queues the M365 operation as a background job and returns 202 with the job id
+    3. The job worker executes it via Graph API, records the execution log and
+       updates the task status (poll ``GET /jobs/{job_id}``)
+
+    Retrying with the same ``Idempotency-Key`` header, or while the task already
+    has a queued or running job, returns the existing job instead of a new one.
     """
     # Only M365 operators can execute
     if current_user.role not in [UserRole.M365_OPERATOR, UserRole.MANAGER]:
@@ -432,155 +496,74 @@ async def execute_m365_task(
             detail="SOD violation: Approver cannot be the operator",
         )
 
-    # Execute M365 operation via Graph API
-    execution_result = {}
-    result_status = "success"
-    error_message = None
-
     try:
-        async with M365Operations() as m365_ops:
-            # Log with PII masking
-            logger.info(
-                f"Executing M365 task: type={task.task_type}, target={mask_pii(task.target_upn)}, "
-                f"operator={current_user.id}, action={preview_pii(data.action, max_length=80)}"
-            )
-
-            # Execute based on task type
-            if task.task_type == M365TaskType.LICENSE_ASSIGN:
-                execution_result = await m365_ops.assign_license(
-                    user_id=task.target_upn,
-                    sku_id=task.target_resource_id,
-                    operator_comment=data.action
-                )
-
-            elif task.task_type == M365TaskType.LICENSE_REMOVE:
-                execution_result = await m365_ops.remove_license(
-                    user_id=task.target_upn,
-                    sku_id=task.target_resource_id,
-                    operator_comment=data.action
-                )
-
-            elif task.task_type == M365TaskType.PASSWORD_RESET:
-                # Use provided password or generate new one
-                new_password = data.command_or_action if data.command_or_action else None
-                execution_result = await m365_ops.reset_password(
-                    user_id=task.target_upn,
-                    new_password=new_password,
-                    operator_comment=data.action
-                )
-
-            elif task.task_type == M365TaskType.MFA_RESET:
-                execution_result = await m365_ops.reset_mfa(
-                    user_id=task.target_upn,
-                    operator_comment=data.action
-                )
-
-            elif task.task_type == M365TaskType.GROUP_ADD:
-                execution_result = await m365_ops.add_user_to_group(
-                    group_id=task.target_resource_id,
-                    user_id=task.target_upn,
-                    operator_comment=data.action
-                )
-
-            elif task.task_type == M365TaskType.GROUP_REMOVE:
-                execution_result = await m365_ops.remove_user_from_group(
-                    group_id=task.target_resource_id,
-                    user_id=task.target_upn,
-                    operator_comment=data.action
-                )
-
-            else:
-                # For other task types, require manual execution logging
-                logger.warning(f"Task type {task.task_type} requires manual execution")
-                execution_result = {
-                    "status": "manual_execution_required",
-                    "message": f"Task type {task.task_type} is not yet automated"
-                }
-
-    except M365ValidationError as e:
-        result_status = "failure"
-        error_message = f"Validation error: {e.message}"
-        logger.error(f"M365 validation error: {error_message}", exc_info=True)
-        execution_result = {"error": error_message, "details": e.details}
-
-    except M365AuthenticationError as e:
-        result_status = "failure"
-        error_message = f"Authentication error: {e.message}"
-        logger.error(f"M365 authentication error: {error_message}", exc_info=True)
-        execution_result = {"error": error_message, "details": e.details}
-
-    except M365AuthorizationError as e:
-        result_status = "failure"
-        error_message = f"Authorization error: {e.message}"
-        logger.error(f"M365 authorization error: {error_message}", exc_info=True)
-        execution_result = {"error": error_message, "details": e.details}
+        job, created = await enqueue_execution(
+            db,
+            task,
+            operator_id=current_user.id,
+            action=data.action,
+            command_or_action=data.command_or_action,
+            idempotency_key=idempotency_key,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    except M365APIError as e:
-        result_status = "failure"
-        error_message = f"API error: {e.message}"
-        logger.error(f"M365 API error: {error_message}", exc_info=True)
-        execution_result = {"error": error_message, "details": e.details, "status_code": e.status_code}
+    if created:
+        await db.commit()
+        await db.refresh(job)
+        m365_job_worker.wake()
+        logger.info(f"M365 task execution queued: task_id={task_id}, job_id={job.id}, operator={current_user.id}")
 
-    except M365Error as e:
-        result_status = "failure"
-        error_message = f"M365 error: {e.message}"
-        logger.error(f"M365 error: {error_message}", exc_info=True)
-        execution_result = {"error": error_message, "details": e.details}
+    return {
+        "message": "Task execution queued" if created else "Task execution already queued",
+        "job_id": job.id,
+        "job_status": job.status.value,
+        "task_id": task.id,
+        "task_status": task.status.value,
+    }
 
-    except Exception as e:
-        result_status = "failure"
-        error_message = f"Unexpected error: {str(e)}"
-        logger.error(
-            f"Unexpected error during M365 execution: {mask_pii(error_message)}",
-            exc_info=True
-        )
-        execution_result = {"error": error_message}
 
-    # Log execution result with PII masking
-    logger.info(
-        f"M365 task execution completed: task_id={task_id}, result={result_status}, "
-        f"operator={current_user.id}, details={preview_pii(json.dumps(execution_result), max_length=100)}"
-    )
+@router.get("/jobs/{job_id}")
+async def get_m365_job(
+    job_id: int,
+    current_user: CurrentUser,
+    db: DbSession,
+):
+    """Get the status and result of a queued M365 task execution."""
+    if current_user.role not in [UserRole.M365_OPERATOR, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Access denied")
 
-    # Create execution log with Graph API results
-    log = M365ExecutionLog(
-        task_id=task_id,
-        operator_id=current_user.id,
-        action=data.action,
-        method="graph_api",  # Always use graph_api for automated operations
-        command_or_action=data.command_or_action or json.dumps({"task_type": task.task_type.value}),
-        result=result_status,
-        result_details=json.dumps(execution_result, ensure_ascii=False, default=str),
-        error_message=error_message,
-    )
+    job = await db.get(M365Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    # Update task status
-    if task.status == M365TaskStatus.PENDING:
-        task.status = M365TaskStatus.IN_PROGRESS
-        task.started_at = datetime.now(timezone.utc)
-        task.operator_id = current_user.id
-        task.ticket.status = TicketStatus.IN_PROGRESS
-
-    if result_status == "success":
-        task.status = M365TaskStatus.COMPLETED
-        task.completed_at = datetime.now(timezone.utc)
-        # Optionally update ticket to resolved
-        task.ticket.status = TicketStatus.RESOLVED
-        task.ticket.resolved_at = datetime.now(timezone.utc)
-    elif result_status == "failure":
-        task.status = M365TaskStatus.FAILED
-
-    db.add(log)
-    await db.commit()
-    await db.refresh(task)
+    task = await db.get(M365Task, job.task_id)
+    progress = None
+    if task.task_type in BULK_TASK_TYPES:
+        progress = await bulk_progress(db, task.id)
+    elif task.task_type in WORKFLOW_TASK_TYPES:
+        progress = await workflow_progress(db, task.id)
+    # Initial passwords are returned once, to the operator who queued the job
+    secrets = await take_job_secrets(db, job) if job.operator_id == current_user.id else None
 
     return {
-        "message": "Task execution completed",
-        "log_id": log.id,
-        "task_status": task.status.value,
-        "result": result_status,
-        "execution_result": execution_result,
-        "error_message": error_message
+        "job_id": job.id,
+        "task_id": job.task_id,
+        "job_status": job.status.value,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "log_id": job.execution_log_id,
+        "result": "success" if job.status == M365JobStatus.SUCCEEDED else
+                  "failure" if job.status == M365JobStatus.FAILED else None,
+        "execution_result": json.loads(job.result) if job.result else None,
+        "secrets": secrets,
+        "error_message": job.error_message,
+        # Per-target counts of bulk tasks (updated as each batch completes), or
+        # per-step status of onboarding/offboarding workflows (updated as each step completes)
+        "progress": progress,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
     }
 
 
@@ -597,10 +580,20 @@ async def search_m365_users(
     """Search M365 users (Manager/M365 Operator only).
 
     Search for users by displayName, mail, or userPrincipalName.
+    Served from the local directory mirror once it has completed a full
+    sync; falls back to a Graph ``startswith`` query before that.
     """
     if current_user.role not in [UserRole.MANAGER, UserRole.M365_OPERATOR, UserRole.AGENT]:
         raise HTTPException(status_code=403, detail="Access denied")
 
+    if directory_index.ready:
+        users = [entry.to_graph() for entry in directory_index.search(query, top)]
+        return {
+            "query": query,
+            "count": len(users),
+            "users": users
+        }
+
     try:
         async with M365Operations() as m365_ops:
             users = await m365_ops.search_users(query, top)
@@ -633,6 +626,110 @@ async def search_m365_users(
         )
 
 
+def _select_fields(select: str | None) -> list[str] | None:
+    """カンマ区切りの $select をフィールド一覧にする"""
+    if not select:
+        return None
+    return [name.strip() for name in select.split(",") if name.strip()] or None
+
+
+async def _stream_ndjson(open_pages, action: str) -> StreamingResponse:
+    """Graph の一覧を NDJSON（1行1件）でストリーミングする
+
+    最初のページは応答前に取得するため、認証エラーや 404 は通常どおり
+    HTTP ステータスで返ります。以降のページで失敗した場合はステータスを
+    送信済みのため {"error": ...} の行を出力して終了します。
+    """
+    async def pages():
+        async with M365Operations() as m365_ops:
+            async for page in open_pages(m365_ops):
+                yield page
+
+    stream = pages()
+    try:
+        first = await anext(stream, [])
+    except BaseException:
+        await stream.aclose()
+        raise
+
+    def lines(page: list[dict]) -> str:
+        return "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in page)
+
+    async def body():
+        try:
+            yield lines(first)
+            async for page in stream:
+                yield lines(page)
+        except M365Error as e:
+            logger.error(f"API error while streaming {action}: {e.message}")
+            yield json.dumps({"error": f"Failed to {action}: {e.message}"}) + "\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.get("/users")
+async def list_m365_users(
+    current_user: CurrentUser,
+    select: str | None = Query(default=None, description="Comma-separated fields ($select)"),
+    page_size: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE, description="Users per Graph page ($top)"),
+):
+    """Stream all M365 users as NDJSON (Manager/M365 Operator only).
+
+    Pages are fetched from Graph lazily via @odata.nextLink while the
+    response is being written, one JSON object per line.
+    """
+    if current_user.role not in [UserRole.MANAGER, UserRole.M365_OPERATOR, UserRole.AGENT]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    fields = _select_fields(select)
+    try:
+        return await _stream_ndjson(
+            lambda m365_ops: m365_ops.iter_users(select=fields, page_size=page_size),
+            "list users",
+        )
+
+    except M365AuthenticationError:
+        raise HTTPException(status_code=503, detail="M365 authentication failed")
+
+    except M365APIError as e:
+        logger.error(f"API error listing users: {e.message}")
+        raise HTTPException(status_code=502, detail=f"Failed to list users: {e.message}")
+
+
+@router.get("/groups/{group_id}/members")
+async def list_m365_group_members(
+    group_id: str,
+    current_user: CurrentUser,
+    select: str | None = Query(default=None, description="Comma-separated fields ($select)"),
+    page_size: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE, description="Members per Graph page ($top)"),
+):
+    """Stream all members of an M365 group as NDJSON (Manager/M365 Operator only).
+
+    Large groups are not truncated: every @odata.nextLink page is
+    followed, one JSON object per line.
+    """
+    if current_user.role not in [UserRole.MANAGER, UserRole.M365_OPERATOR, UserRole.AGENT]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    fields = _select_fields(select)
+    try:
+        return await _stream_ndjson(
+            lambda m365_ops: m365_ops.iter_group_members(group_id, select=fields, page_size=page_size),
+            "list group members",
+        )
+
+    except M365APIError as e:
+        if e.status_code == 404:
+            raise HTTPException(status_code=404, detail=f"Group {group_id} not found")
+        logger.error(f"API error listing group members: {e.message}")
+        raise HTTPException(status_code=502, detail=f"Failed to list group members: {e.message}")
+
+    except M365AuthenticationError:
+        raise HTTPException(status_code=503, detail="M365 authentication failed")
+
+
 @router.get("/users/{user_id}")
 async def get_m365_user(
     user_id: str,
@@ -0,0 +1,59 @@
+"""
+System Routes
+
+運用監視向けのエンドポイント（プロセス内キャッシュ等のメトリクス）。
+
+アクセス権限: Manager, Auditor のみ
+"""
+
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+
+from app.api.deps import CurrentUser
+from app.core.hashing import password_hasher
+from app.core.rate_limit import login_throttle
+from app.core.revocation import revocation_list
+from app.m365.auth import access_token_cache
+from app.m365.cache import graph_cache
+from app.m365.throttle import graph_throttle
+from app.models.user import UserRole
+from app.services.knowledge_counters import feedback_counts, view_counts
+from app.services.knowledge_suggest import knowledge_suggester
+from app.services.m365_directory import directory_index
+from app.services.m365_jobs import m365_job_worker
+from app.services.user_cache import user_cache
+
+
+router = APIRouter()
+
+
+SYSTEM_ALLOWED_ROLES = [UserRole.MANAGER, UserRole.AUDITOR]
+
+
+# ============== エンドポイント ==============
+
+@router.get(
+    "/metrics",
+    summary="プロセス内メトリクス取得",
+    description="キャッシュのヒット率などプロセス内のメトリクスを返します。Manager/Auditorロールのみアクセス可能。",
+)
+async def get_metrics(current_user: CurrentUser) -> dict[str, Any]:
+    """プロセス内メトリクスを取得する。"""
+    if current_user.role not in SYSTEM_ALLOWED_ROLES:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_revocation": revocation_list.stats(),
+        "login_throttle": login_throttle.stats(),
+        "knowledge_view_counts": view_counts.stats(),
+        "knowledge_feedback_counts": feedback_counts.stats(),
+        "knowledge_suggest": knowledge_suggester.stats(),
+        "m365_access_token": access_token_cache.stats(),
+        "m365_graph_cache": graph_cache.stats(),
+        "m365_graph_throttle": graph_throttle.stats(),
+        "m365_directory": directory_index.stats(),
+        "m365_jobs": m365_job_worker.stats(),
+    }
@@ -27,8 +27,11 @@ from app.models.attachment import Attachment
 from app.models.user import User, UserRole
 from app.models.ticket_history import TicketHistory, HistoryAction
 from app.models.sla_policy import SLAPolicy
+from app.models.knowledge import KnowledgeArticle
 from app.api.deps import CurrentUser, DbSession, require_roles
 from app.config import settings
+from app.services.knowledge_search import visible_visibilities
+from app.services.ticket_suggestions import suggest_for_ticket
 from utils.masking import mask_pii, preview_pii
 
 
@@ -169,6 +172,35 @@ class TicketHistoryListResponse(BaseModel):
     total_pages: int
 
 
+class SimilarTicketResponse(BaseModel):
+    """Schema for a similar resolved ticket."""
+    id: int
+    ticket_number: str
+    subject: str
+    status: str
+    resolution_summary: str | None
+    score: float
+
+
+class SuggestedArticleResponse(BaseModel):
+    """Schema for a suggested knowledge article."""
+    id: int
+    title: str
+    summary: str | None
+    score: float
+
+
+class TicketSuggestionsResponse(BaseModel):
+    """Similar resolved tickets and knowledge articles for a ticket."""
+    similar_tickets: list[SimilarTicketResponse]
+    articles: list[SuggestedArticleResponse]
+
+
+class TicketCreatedResponse(TicketResponse):
+    """Schema for a created ticket with suggestions."""
+    suggestions: TicketSuggestionsResponse
+
+
 # Allowed file extensions for security
 ALLOWED_EXTENSIONS = {
     '.txt', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
@@ -310,6 +342,64 @@ async def record_ticket_changes(
     return history_entries
 
 
+async def build_ticket_suggestions(
+    db: AsyncSession,
+    ticket: Ticket,
+    user: User,
+) -> TicketSuggestionsResponse:
+    """
+    類似した解決済みチケットと関連ナレッジ記事を提案する
+
+    類似度はプロセス内のベクトル索引で求め、DBからは結果の行のみ読み込む。
+    依頼者には他人のチケットを見せないため、記事のみを返す。
+    """
+    ticket_hits, article_hits = await suggest_for_ticket(
+        f"{ticket.subject}\n{ticket.description}",
+        include_tickets=user.role != UserRole.REQUESTER,
+        visibilities=visible_visibilities(user.role),
+        exclude_ticket_id=ticket.id,
+    )
+
+    similar_tickets = []
+    if ticket_hits:
+        result = await db.execute(
+            select(
+                Ticket.id, Ticket.ticket_number, Ticket.subject, Ticket.status,
+                Ticket.resolution_summary,
+            ).where(Ticket.id.in_([ticket_id for ticket_id, _ in ticket_hits]))
+        )
+        rows = {row.id: row for row in result.all()}
+        similar_tickets = [
+            SimilarTicketResponse(
+                id=row.id,
+                ticket_number=row.ticket_number,
+                subject=row.subject,
+                status=row.status.value,
+                resolution_summary=row.resolution_summary,
+                score=round(score, 4),
+            )
+            for ticket_id, score in ticket_hits
+            if (row := rows.get(ticket_id)) is not None
+        ]
+
+    articles = []
+    if article_hits:
+        result = await db.execute(
+            select(KnowledgeArticle.id, KnowledgeArticle.title, KnowledgeArticle.summary)
+            .where(KnowledgeArticle.id.in_([article_id for article_id, _ in article_hits]))
+        )
+        rows = {row.id: row for row in result.all()}
+        articles = [
+            SuggestedArticleResponse(
+                id=row.id, title=row.title, summary=row.summary, score=round(score, 4)
+            )
+            for article_id, score in article_hits
+            if (row := rows.get(article_id)) is not None
+        ]
+
+    return TicketSuggestionsResponse(similar_tickets=similar_tickets, articles=articles)
+
+
 async def calculate_ticket_deadline(
     db: AsyncSession,
     priority: TicketPriority,
@@ -435,7 +525,7 @@ async def list_tickets(
     )
 
 
-@router.post("", response_model=TicketResponse, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=TicketCreatedResponse, status_code=status.HTTP_201_CREATED)
 async def create_ticket(
     ticket_data: TicketCreate,
     current_user: CurrentUser,
@@ -444,7 +534,8 @@ async def create_ticket(
     """
     新しいチケットを作成する
 
-    作成時に自動的に履歴（監査証跡）を記録する。
+    作成時に自動的に履歴（監査証跡）を記録し、類似した解決済みチケットと
+    関連ナレッジ記事の提案をレスポンスに含める。
     """
     # Create ticket
     ticket = Ticket(
@@ -502,7 +593,7 @@ async def create_ticket(
     )
     ticket = result.scalar_one()
     
-    return TicketResponse(
+    return TicketCreatedResponse(
         id=ticket.id,
         ticket_number=ticket.ticket_number,
         subject=ticket.subject,
@@ -522,6 +613,7 @@ async def create_ticket(
         updated_at=ticket.updated_at,
         resolved_at=ticket.resolved_at,
         closed_at=ticket.closed_at,
+        suggestions=await build_ticket_suggestions(db, ticket, current_user),
     )
 
 
@@ -586,6 +678,32 @@ async def get_ticket(
     )
 
 
+@router.get("/{ticket_id}/suggestions", response_model=TicketSuggestionsResponse)
+async def get_ticket_suggestions(
+    ticket_id: int,
+    current_user: CurrentUser,
+    db: DbSession,
+):
+    """チケットに類似した解決済みチケットと関連ナレッジ記事を取得する"""
+    result = await db.execute(select(Ticket).where(Ticket.id == ticket_id))
+    ticket = result.scalar_one_or_none()
+
+    if ticket is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found",
+        )
+
+    # Check access
+    if current_user.role == UserRole.REQUESTER and ticket.requester_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied",
+        )
+
+    return await build_ticket_suggestions(db, ticket, current_user)
+
+
 @router.get("/{ticket_id}/detail", response_model=TicketDetailResponse)
 async def get_ticket_detail(
     ticket_id: int,
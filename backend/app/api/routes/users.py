@@ -9,7 +9,7 @@ from pydantic import BaseModel, EmailStr
 from sqlalchemy import func, select
 
 from app.models.user import User, UserRole
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 from app.api.deps import CurrentUser, DbSession, require_roles
 
 
@@ -133,7 +133,7 @@ async def create_user(
     
     user = User(
         email=data.email,
-        hashed_password=get_password_hash(data.password),
+        hashed_password=await get_password_hash_async(data.password),
         display_name=data.display_name,
         department=data.department,
         role=data.role,
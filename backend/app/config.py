@@ -62,6 +62,17 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # 検証済みJWTのLRUキャッシュ件数（0で無効）
+    USER_CACHE_SIZE: int = 1000  # 認証ユーザーキャッシュ件数（0で無効）
+    USER_CACHE_TTL_SECONDS: int = 30  # 認証ユーザーキャッシュの最大の古さ（秒）
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 30  # 他ワーカーの失効を取り込む間隔（秒、0で無効）
+    LOGIN_RATE_LIMIT_PER_IP: int = 20  # IPごとのログイン試行上限（ウィンドウあたり、0で無効）
+    LOGIN_RATE_LIMIT_PER_EMAIL: int = 5  # メールアドレスごとのログイン試行上限（0で無効）
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = 60  # ログイン試行のスライディングウィンドウ（秒）
+    LOGIN_RATE_LIMIT_STORE: str = ""  # 複数ワーカーで共有するSQLiteファイル（空ならプロセス内）
+    TRUSTED_PROXIES: list[str] = []  # X-Forwarded-For / X-Real-IP を信頼するプロキシのIP・CIDR（空なら接続元IPのみ）
+    PASSWORD_HASH_WORKERS: int = 4  # bcrypt を同時実行するスレッド数
+    PASSWORD_HASH_MAX_PENDING: int = 256  # 待機を含む bcrypt 処理の上限（超過時は503、0で無制限）
     
     # Microsoft Graph API (Non-interactive authentication)
     MS_TENANT_ID: str = ""
@@ -70,12 +81,52 @@ class Settings(BaseSettings):
     MS_AUTHORITY: str = ""
     MS_GRAPH_ENDPOINT: str = "https://graph.microsoft.com/v1.0"
     MS_SCOPES: str = "https://graph.microsoft.com/.default"
+    MS_TOKEN_REFRESH_AHEAD_SECONDS: int = 300  # アクセストークンを期限切れの何秒前から先行更新するか
+    MS_GRAPH_HTTP2: bool = True  # Graph API へ HTTP/2 で接続する（h2 がない場合は HTTP/1.1）
+    MS_GRAPH_MAX_CONNECTIONS: int = 100  # 共有 HTTP クライアントの最大同時接続数
+    MS_GRAPH_MAX_KEEPALIVE_CONNECTIONS: int = 20  # 再利用のために保持するアイドル接続数
+    MS_GRAPH_KEEPALIVE_SECONDS: float = 60.0  # アイドル接続を保持する秒数
+    MS_GRAPH_TIMEOUT_SECONDS: float = 30.0  # Graph API リクエストのタイムアウト（秒）
+    MS_GRAPH_CONNECT_TIMEOUT_SECONDS: float = 10.0  # 接続確立のタイムアウト（秒）
+    MS_GRAPH_MAX_CONCURRENCY: int = 32  # Graph API への同時リクエスト数の上限（プロセス全体）
+    MS_GRAPH_INITIAL_CONCURRENCY: int = 8  # 同時リクエスト数の初期値（成功で増やし、429 で半減）
+    MS_GRAPH_CIRCUIT_FAILURE_THRESHOLD: int = 5  # サーキットを開く連続失敗（5xx・ネットワークエラー）数
+    MS_GRAPH_CIRCUIT_RECOVERY_SECONDS: float = 30.0  # サーキットを開いてから回復を試すまでの秒数
+    MS_GRAPH_CACHE_SIZE: int = 5000  # Graph 読み取りキャッシュの最大件数（0で無効）
+    MS_GRAPH_CACHE_USER_TTL_SECONDS: float = 60.0  # ユーザー情報・割り当て済みライセンスのキャッシュ秒数
+    MS_GRAPH_CACHE_GROUP_TTL_SECONDS: float = 300.0  # グループ情報のキャッシュ秒数
+    MS_GRAPH_CACHE_SKU_TTL_SECONDS: float = 21600.0  # SKU（ライセンス）一覧のキャッシュ秒数
+    MS_GRAPH_CACHE_NEGATIVE_TTL_SECONDS: float = 30.0  # 存在しないユーザー（404）を記録する秒数
+    M365_DIRECTORY_SYNC_SECONDS: int = 300  # ユーザー・グループの差分同期間隔（秒、0で無効）
+    M365_JOB_WORKERS: int = 4  # M365 タスク実行ジョブの同時実行数（プロセスごと、0でワーカーを起動しない）
+    M365_JOB_POLL_SECONDS: float = 2.0  # 実行待ちジョブを確認する間隔（秒）
+    M365_JOB_LEASE_SECONDS: int = 300  # ジョブのリース期間（秒、期限切れは他のワーカーが再実行）
+    M365_JOB_MAX_ATTEMPTS: int = 3  # 一時的なエラー（429・5xx・通信エラー）時の最大実行回数
+    M365_JOB_RETRY_BACKOFF_SECONDS: float = 30.0  # リトライ間隔の初期値（秒、試行ごとに倍）
+    M365_BULK_CONCURRENCY: int = 4  # 一括操作で同時に実行するバッチ（20件ずつ）の数
+    M365_BULK_MAX_TARGETS: int = 1000  # 一括操作タスク1件の対象ユーザー数の上限
     
     # File Upload
     UPLOAD_DIR: Path = Path("./data/uploads")
     MAX_UPLOAD_SIZE_MB: int = 10
     ALLOWED_EXTENSIONS: list[str] = [".pdf", ".png", ".jpg", ".jpeg", ".gif", ".txt", ".csv", ".xlsx", ".docx"]
     
+    # Knowledge Search
+    KNOWLEDGE_INDEX_PATH: Path = Path("./data/search/knowledge.idx")  # 検索インデックスの保存先
+    KNOWLEDGE_INDEX_SAVE_SECONDS: int = 300  # 検索インデックスの差分同期・保存間隔（秒、0で起動・終了時のみ）
+    KNOWLEDGE_COUNTER_FLUSH_SECONDS: int = 10  # 閲覧数などのDB反映間隔（秒、0で終了時のみ）
+    KNOWLEDGE_RELATED_LIMIT: int = 5  # 記事ごとに保存する関連記事数
+    
+    # Similar Tickets / Suggested Articles
+    SIMILARITY_INDEX_DIR: Path = Path("./data/search/similarity")  # ベクトル索引の保存先
+    SIMILARITY_INDEX_SAVE_SECONDS: int = 300  # ベクトル索引の差分同期・保存間隔（秒、0で起動・終了時のみ）
+    SIMILARITY_DIMENSIONS: int = 512  # 特徴ハッシングの次元数（1文書あたり 4バイト×次元数）
+    SIMILARITY_SUGGESTION_LIMIT: int = 5  # 提案する類似チケット・記事の件数
+    SIMILARITY_MIN_SCORE: float = 0.1  # 提案する最小のコサイン類似度
+    SIMILARITY_BACKEND: str = "auto"  # ベクトルの格納先（auto: PostgreSQL なら pgvector、それ以外は ivf）
+    SIMILARITY_IVF_PROBES: int = 0  # IVF 索引で検索時に走査するクラスタ数（0でクラスタ数の平方根の2倍）
+    SIMILARITY_IVF_MIN_TRAIN_SIZE: int = 200000  # IVF 索引でクラスタに分ける最小件数（未満は全件走査）
+    
     # SLA Defaults (in hours)
     SLA_P1_RESPONSE: int = 1
     SLA_P1_RESOLUTION: int = 4
@@ -94,6 +145,7 @@ class Settings(BaseSettings):
     LOG_DIR: str = "logs"
     AUDIT_LOG_ENABLED: bool = True
     AUDIT_LOG_RETENTION_DAYS: int = 90  # 最低2年 (730日) を推奨
+    AUDIT_ARCHIVE_DIR: Path = Path("./data/audit_archive")  # 保持期間超過パーティションの出力先
     
     # Development Options
     INCLUDE_SAMPLE_DATA: bool = True
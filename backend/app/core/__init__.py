@@ -5,15 +5,22 @@ Core Package
 from app.core.security import (
     verify_password,
     get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     create_refresh_token,
     verify_token,
 )
+from app.core.auth_context import AuthContext, get_auth_context
 
 __all__ = [
     "verify_password",
     "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
     "create_access_token",
     "create_refresh_token",
     "verify_token",
+    "AuthContext",
+    "get_auth_context",
 ]
@@ -0,0 +1,77 @@
+"""
+Request-scoped Authentication Context
+
+The bearer token of a request is verified once and the result is stored on
+``request.state.auth_context``. AuditMiddleware and the API dependencies both
+read it from there instead of verifying the JWT independently.
+"""
+
+from dataclasses import dataclass
+from typing import Any
+
+from starlette.requests import Request
+
+from app.core.security import verify_token
+
+
+_UNRESOLVED = object()
+
+
+@dataclass(frozen=True)
+class AuthContext:
+    """Verified bearer token and its decoded claims."""
+
+    token: str
+    payload: dict[str, Any]
+
+    @property
+    def subject(self) -> str:
+        return str(self.payload.get("sub") or "")
+
+    @property
+    def user_id(self) -> int | None:
+        """User ID from the ``sub`` claim ("123" or legacy "123:user@example.com")."""
+        user_id = self.subject.split(":", 1)[0]
+        return int(user_id) if user_id.isdigit() else None
+
+    @property
+    def email(self) -> str:
+        """Email embedded in a legacy "id:email" subject, otherwise empty."""
+        _, _, email = self.subject.partition(":")
+        return email
+
+    @property
+    def token_type(self) -> str | None:
+        return self.payload.get("type")
+
+
+def get_bearer_token(request: Request) -> str | None:
+    """Extract the bearer token from the Authorization header."""
+    auth_header = request.headers.get("authorization", "")
+    scheme, _, token = auth_header.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+
+def get_auth_context(request: Request) -> AuthContext | None:
+    """
+    Return the request's auth context, verifying the token on first use.
+
+    The result (including "not authenticated", stored as None) is memoised on
+    ``request.state`` so later readers in the same request reuse it.
+    """
+    state = request.state
+    context = getattr(state, "auth_context", _UNRESOLVED)
+    if context is None or isinstance(context, AuthContext):
+        return context
+
+    context = None
+    token = get_bearer_token(request)
+    if token:
+        payload = verify_token(token)
+        if payload is not None:
+            context = AuthContext(token=token, payload=payload)
+
+    state.auth_context = context
+    return context
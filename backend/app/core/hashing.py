@@ -0,0 +1,138 @@
+"""
+Password Hashing Executor
+
+bcrypt takes 100-250 ms of CPU per call. Running it inside an ``async def``
+route blocks the event loop, so a burst of logins stalls every other request
+on the worker. PasswordHasher runs those calls on a dedicated, bounded thread
+pool instead (bcrypt releases the GIL while hashing):
+
+- At most ``max_workers`` hashes run at once.
+- At most ``max_pending`` calls may be queued or running; further calls are
+  rejected with PasswordHasherBusyError instead of growing the queue forever.
+- Queue depth, wait time and run time are tracked for monitoring.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from app.config import settings
+
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Bounded thread pool for password hashing with queue metrics."""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.active = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hasher",
+                )
+            return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run ``func(*args)`` on the hashing pool.
+
+        Raises:
+            PasswordHasherBusyError: If ``max_pending`` calls are already queued.
+        """
+        with self._lock:
+            if self.max_pending and self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusyError("Password hashing queue is full")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        submitted_at = time.perf_counter()
+
+        def task() -> T:
+            started_at = time.perf_counter()
+            wait = started_at - submitted_at
+            with self._lock:
+                self.active += 1
+                self.total_wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.total_run_seconds += time.perf_counter() - started_at
+
+        def release(_future: Future | None) -> None:
+            # Counted until the thread is done, even if the awaiting coroutine
+            # was cancelled (the hash keeps the worker busy regardless).
+            with self._lock:
+                self.pending -= 1
+
+        try:
+            future = self._get_executor().submit(task)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue and throughput metrics."""
+        with self._lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": self.active,
+                "queued": self.pending - self.active,
+                "peak_pending": self.peak_pending,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_seconds / completed * 1000, 2) if completed else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_run_ms": round(self.total_run_seconds / completed * 1000, 2) if completed else 0.0,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.peak_pending = self.pending
+            self.completed = self.rejected = 0
+            self.total_wait_seconds = self.total_run_seconds = self.max_wait_seconds = 0.0
+
+    def shutdown(self) -> None:
+        """Stop the worker threads (the pool is recreated on next use)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
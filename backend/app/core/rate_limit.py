@@ -0,0 +1,308 @@
+"""
+Login Rate Limiting
+
+Every login attempt costs a full bcrypt verification, so a credential-stuffing
+burst can saturate the hashing pool. LoginThrottle rejects attempts per client
+IP and per email *before* any password is checked.
+
+Limits use sliding-window counters: each key keeps only the attempt counts of
+the current and the previous fixed window, and the number of attempts in the
+last ``window`` seconds is estimated as
+
+    previous * (1 - elapsed / window) + current
+
+Keys that have been idle for two windows carry no weight and are expired.
+
+Counters live in memory by default (per worker process). Setting
+``LOGIN_RATE_LIMIT_STORE`` to a file path stores them in a shared SQLite
+database so that all workers on a host enforce one limit.
+"""
+
+import asyncio
+import ipaddress
+import math
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network
+from pathlib import Path
+from typing import Any, Protocol
+
+from starlette.requests import Request
+
+from app.config import settings
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(proxies: tuple[str, ...]) -> tuple[IPv4Network | IPv6Network, ...]:
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in proxies if proxy.strip())
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host.strip())
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks(tuple(settings.TRUSTED_PROXIES)))
+
+
+def client_ip(request: Request) -> str:
+    """Client IP used as the per-IP throttle key.
+
+    Proxy headers are client-controlled, so they are honoured only when the
+    socket peer is listed in ``TRUSTED_PROXIES``. ``X-Forwarded-For`` is then
+    read from the right, skipping trusted proxies, so a spoofed leftmost
+    value cannot pick the key.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(peer):
+        return peer
+
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted_proxy(hop):
+                return hop
+        if hops:
+            return hops[0]
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+    return peer
+
+
+def _window_state(
+    window_start: float, previous: int, current: int, now: float, window: float
+) -> tuple[float, int, int]:
+    """Roll a counter forward to the window containing ``now``."""
+    start = math.floor(now / window) * window
+    if start == window_start:
+        return window_start, previous, current
+    if start - window_start == window:
+        return start, current, 0
+    return start, 0, 0
+
+
+def _estimate(previous: int, current: int, elapsed: float, window: float) -> float:
+    return previous * (1 - elapsed / window) + current
+
+
+def _retry_after(previous: int, current: int, elapsed: float, window: float, limit: int) -> float:
+    """Seconds until one more attempt fits under ``limit``."""
+    allowed = limit - 1
+    if current > allowed:
+        # Wait for the next window, where ``current`` becomes the decaying part
+        return (window - elapsed) + window * (1 - allowed / current)
+    if previous == 0:
+        return 0.0
+    return max(0.0, window * (1 - (allowed - current) / previous) - elapsed)
+
+
+class CounterStore(Protocol):
+    """Storage for sliding-window counters."""
+
+    blocking: bool
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """Count an attempt if it fits. Returns 0, or the seconds to wait."""
+        ...
+
+    def reset(self, key: str) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+
+class MemoryCounterStore:
+    """Per-process counters: ``key -> [window_start, previous, current]``."""
+
+    blocking = False
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._counters: dict[str, list[Any]] = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+    def _sweep(self, now: float, window: float) -> None:
+        cutoff = now - 2 * window
+        for key in [k for k, v in self._counters.items() if v[0] < cutoff]:
+            del self._counters[key]
+        self._next_sweep = now + self._sweep_interval
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now, window)
+            start, previous, current = _window_state(
+                *self._counters.get(key, (0.0, 0, 0)), now, window
+            )
+            elapsed = now - start
+            if _estimate(previous, current, elapsed, window) + 1 > limit:
+                self._counters[key] = [start, previous, current]
+                return max(1.0, _retry_after(previous, current, elapsed, window, limit))
+            self._counters[key] = [start, previous, current + 1]
+            return 0.0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._counters.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteCounterStore:
+    """Counters shared between worker processes through a SQLite file."""
+
+    blocking = True
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS login_rate_counters ("
+                " key TEXT PRIMARY KEY,"
+                " window_start REAL NOT NULL,"
+                " previous INTEGER NOT NULL,"
+                " current INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_login_rate_counters_window_start"
+                " ON login_rate_counters (window_start)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, previous, current FROM login_rate_counters WHERE key = ?",
+                (key,),
+            ).fetchone()
+            start, previous, current = _window_state(*(row or (0.0, 0, 0)), now, window)
+            elapsed = now - start
+            allowed = _estimate(previous, current, elapsed, window) + 1 <= limit
+            if allowed:
+                current += 1
+            conn.execute(
+                "INSERT INTO login_rate_counters (key, window_start, previous, current)"
+                " VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET window_start = excluded.window_start,"
+                " previous = excluded.previous, current = excluded.current",
+                (key, start, previous, current),
+            )
+            # Expire idle keys (cheap: indexed range delete)
+            conn.execute(
+                "DELETE FROM login_rate_counters WHERE window_start < ?",
+                (now - 2 * window,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if allowed:
+            return 0.0
+        return max(1.0, _retry_after(previous, current, elapsed, window, limit))
+
+    def reset(self, key: str) -> None:
+        self._connect().execute("DELETE FROM login_rate_counters WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM login_rate_counters")
+
+
+class LoginThrottle:
+    """Per-IP and per-email login attempt limits."""
+
+    def __init__(self, store: CounterStore, ip_limit: int, email_limit: int, window_seconds: float):
+        self.store = store
+        self.ip_limit = ip_limit
+        self.email_limit = email_limit
+        self.window_seconds = window_seconds
+        self.allowed = 0
+        self.blocked_ip = 0
+        self.blocked_email = 0
+
+    def _check(self, ip: str, email: str) -> float:
+        now = time.time()
+        if self.ip_limit > 0:
+            wait = self.store.hit(f"ip:{ip}", self.ip_limit, self.window_seconds, now)
+            if wait:
+                self.blocked_ip += 1
+                return wait
+        if self.email_limit > 0:
+            wait = self.store.hit(f"email:{email.lower()}", self.email_limit, self.window_seconds, now)
+            if wait:
+                self.blocked_email += 1
+                return wait
+        self.allowed += 1
+        return 0.0
+
+    async def check(self, ip: str, email: str) -> int:
+        """
+        Count a login attempt.
+
+        Returns:
+            0 if the attempt may proceed, otherwise the Retry-After seconds.
+        """
+        if self.store.blocking:
+            wait = await asyncio.to_thread(self._check, ip, email)
+        else:
+            wait = self._check(ip, email)
+        return math.ceil(wait)
+
+    async def reset_email(self, email: str) -> None:
+        """Forget an email's attempts after a successful login."""
+        key = f"email:{email.lower()}"
+        if self.store.blocking:
+            await asyncio.to_thread(self.store.reset, key)
+        else:
+            self.store.reset(key)
+
+    def clear(self) -> None:
+        self.store.clear()
+        self.allowed = self.blocked_ip = self.blocked_email = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "store": type(self.store).__name__,
+            "ip_limit": self.ip_limit,
+            "email_limit": self.email_limit,
+            "window_seconds": self.window_seconds,
+            "allowed": self.allowed,
+            "blocked_ip": self.blocked_ip,
+            "blocked_email": self.blocked_email,
+        }
+
+
+def _create_store() -> CounterStore:
+    if settings.LOGIN_RATE_LIMIT_STORE:
+        return SQLiteCounterStore(settings.LOGIN_RATE_LIMIT_STORE)
+    return MemoryCounterStore()
+
+
+login_throttle = LoginThrottle(
+    store=_create_store(),
+    ip_limit=settings.LOGIN_RATE_LIMIT_PER_IP,
+    email_limit=settings.LOGIN_RATE_LIMIT_PER_EMAIL,
+    window_seconds=settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS,
+)
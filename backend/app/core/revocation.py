@@ -0,0 +1,87 @@
+"""
+In-memory Token Revocation List
+
+Holds the revoked ``jti`` and ``fam`` (token family) claims so verify_token
+can reject revoked tokens with two dict lookups and no database access.
+Each entry is kept only until the covered tokens would have expired anyway;
+expired entries are pruned lazily from a min-heap ordered by expiry.
+
+The list is the in-process view of the ``revoked_tokens`` table and is filled
+by app.services.token_revocation (on startup and on every revocation).
+"""
+
+import heapq
+import threading
+import time
+from typing import Any
+
+
+class RevocationList:
+    """Revoked token IDs and token families with expiry-based pruning."""
+
+    def __init__(self) -> None:
+        self._tokens: dict[str, float] = {}
+        self._families: dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, bool, str]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, entries: dict[str, float], is_family: bool, value: str, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            if entries.get(value, 0.0) >= expires_at:
+                return
+            entries[value] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, is_family, value))
+
+    def revoke_token(self, jti: str, expires_at: float) -> None:
+        """Revoke a single token until ``expires_at`` (epoch seconds)."""
+        self._add(self._tokens, False, jti, expires_at)
+
+    def revoke_family(self, family: str, expires_at: float) -> None:
+        """Revoke every token of a family until ``expires_at`` (epoch seconds)."""
+        self._add(self._families, True, family, expires_at)
+
+    def prune(self, now: float | None = None) -> int:
+        """Drop entries whose tokens have expired. Returns the number removed."""
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, is_family, value = heapq.heappop(heap)
+                entries = self._families if is_family else self._tokens
+                # Skip heap entries superseded by a later expiry for the same value
+                if entries.get(value) == expires_at:
+                    del entries[value]
+                    removed += 1
+        return removed
+
+    def is_revoked(self, payload: dict[str, Any]) -> bool:
+        """Check the ``jti`` and ``fam`` claims of a decoded token."""
+        if self._expiry_heap and self._expiry_heap[0][0] <= time.time():
+            self.prune()
+        jti = payload.get("jti")
+        if jti is not None and jti in self._tokens:
+            return True
+        family = payload.get("fam")
+        return family is not None and family in self._families
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+            self._families.clear()
+            self._expiry_heap.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "revoked_tokens": len(self._tokens),
+                "revoked_families": len(self._families),
+            }
+
+    def __len__(self) -> int:
+        return len(self._tokens) + len(self._families)
+
+
+revocation_list = RevocationList()
@@ -4,6 +4,11 @@ Security Module
 JWT token handling and password hashing.
 """
 
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
@@ -11,6 +16,8 @@ import bcrypt
 from jose import JWTError, jwt
 
 from app.config import settings
+from app.core.hashing import password_hasher
+from app.core.revocation import revocation_list
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -28,23 +35,49 @@ def get_password_hash(password: str) -> str:
     return hashed.decode("utf-8")
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without blocking the event loop."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool without blocking the event loop."""
+    return await password_hasher.run(get_password_hash, password)
+
+
+def new_token_id() -> str:
+    """Generate a random identifier for the ``jti`` / ``fam`` claims."""
+    return uuid.uuid4().hex
+
+
 def create_access_token(
     subject: str,
     expires_delta: timedelta | None = None,
+    family: str | None = None,
 ) -> str:
-    """Create a JWT access token."""
+    """
+    Create a JWT access token.
+    
+    ``family`` ties the token to a login session so that revoking the
+    session (logout, refresh-token reuse) also revokes the access token.
+    """
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
+        expire = now + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
     to_encode = {
         "sub": subject,
         "exp": expire,
+        "iat": now,
+        "jti": new_token_id(),
         "type": "access",
     }
+    if family:
+        to_encode["fam"] = family
     
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
@@ -52,32 +85,101 @@ def create_access_token(
 def create_refresh_token(
     subject: str,
     expires_delta: timedelta | None = None,
+    family: str | None = None,
 ) -> str:
-    """Create a JWT refresh token."""
+    """Create a JWT refresh token (a new family is started if none is given)."""
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
+        expire = now + timedelta(
             days=settings.REFRESH_TOKEN_EXPIRE_DAYS
         )
     
     to_encode = {
         "sub": subject,
         "exp": expire,
+        "iat": now,
+        "jti": new_token_id(),
+        "fam": family or new_token_id(),
         "type": "refresh",
     }
     
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
-def verify_token(token: str) -> dict[str, Any] | None:
-    """Verify and decode a JWT token."""
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM],
-        )
-        return payload
-    except JWTError:
+class VerifiedTokenCache:
+    """
+    LRU cache of already-verified JWTs.
+
+    Keyed by the SHA-256 of the token so raw tokens are never kept in memory.
+    Entries are only served until the token's own ``exp`` claim, so a cache
+    hit never extends a token's lifetime.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(payload)
+
+    def put(self, token: str, payload: dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)) or self.max_size <= 0:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def verify_token(token: str, check_revocation: bool = True) -> dict[str, Any] | None:
+    """Verify and decode a JWT token.
+
+    Successfully verified tokens are remembered until they expire, so repeated
+    requests with the same bearer token skip the signature check. Revoked
+    tokens are rejected via the in-memory revocation list (no DB access).
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.ALGORITHM],
+            )
+        except JWTError:
+            return None
+        token_cache.put(token, payload)
+
+    if check_revocation and revocation_list.is_revoked(payload):
         return None
+    return payload
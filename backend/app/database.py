@@ -75,8 +75,19 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 async def init_db() -> None:
     """Initialize database tables."""
+    from app.services.audit_partitions import (
+        create_partitioned_audit_logs,
+        ensure_audit_partitions,
+    )
+    from app.services.ticket_suggestions import create_similarity_tables
+
     async with engine.begin() as conn:
+        # audit_logs is partitioned by month (must exist before create_all on PostgreSQL)
+        await conn.run_sync(create_partitioned_audit_logs)
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(ensure_audit_partitions)
+        # pgvector tables for similar ticket / article suggestions (PostgreSQL only)
+        await conn.run_sync(create_similarity_tables)
 
 
 async def close_db() -> None:
@@ -0,0 +1,5 @@
+"""
+Batch jobs for Mirai HelpDesk Management System.
+
+Each module can be run directly, e.g. ``python -m app.jobs.audit_rollup``.
+"""
@@ -0,0 +1,51 @@
+"""
+監査ログアーカイブジョブ
+
+AUDIT_LOG_RETENTION_DAYS を過ぎた月の audit_logs パーティションを
+AUDIT_ARCHIVE_DIR に gzip 圧縮 JSON Lines としてエクスポートし、
+パーティションごと削除します。あわせて将来月のパーティション作成
+（PostgreSQL）と締め済み月の移動（SQLite）も行います。
+
+月初の日次バッチ（cron 等）での実行を想定しています。
+
+使用例:
+    python -m app.jobs.audit_archive
+    python -m app.jobs.audit_archive --retention-days 730
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.config import settings
+from app.database import engine, init_db
+from app.services.audit_partitions import archive_expired_partitions
+
+
+async def run_audit_archival(
+    retention_days: int | None = None,
+    archive_dir: Path | None = None,
+) -> list[Path]:
+    """保持期間超過パーティションをアーカイブし、作成したファイル一覧を返す"""
+    retention_days = retention_days or settings.AUDIT_LOG_RETENTION_DAYS
+    archive_dir = archive_dir or settings.AUDIT_ARCHIVE_DIR
+
+    async with engine.begin() as conn:
+        return await conn.run_sync(
+            lambda sync_conn: archive_expired_partitions(sync_conn, archive_dir, retention_days)
+        )
+
+
+async def main(retention_days: int | None) -> None:
+    await init_db()
+    archived = await run_audit_archival(retention_days=retention_days)
+    for path in archived:
+        print(f"[OK] archived {path}")
+    print(f"[OK] audit log archival complete: {len(archived)} partitions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and drop expired audit_logs partitions")
+    parser.add_argument("--retention-days", type=int, default=None, help="保持日数（省略時は AUDIT_LOG_RETENTION_DAYS）")
+    args = parser.parse_args()
+    asyncio.run(main(args.retention_days))
@@ -0,0 +1,42 @@
+"""
+監査ログ集計バックフィルジョブ
+
+audit_logs から audit_log_rollup を再構築します。
+ロールアップ導入前のログの取り込みや、集計の不整合修復に使用します。
+
+使用例:
+    python -m app.jobs.audit_rollup              # 全期間
+    python -m app.jobs.audit_rollup --days 365   # 過去365日
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.database import async_session_factory, init_db
+from app.services.audit_rollup import rebuild_audit_rollup
+
+
+async def backfill_audit_rollup(
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> int:
+    """指定期間のロールアップを再構築し、書き込んだバケット数を返す"""
+    async with async_session_factory() as session:
+        buckets = await rebuild_audit_rollup(session, start=start, end=end)
+        await session.commit()
+    return buckets
+
+
+async def main(days: int | None) -> None:
+    await init_db()
+    start = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    buckets = await backfill_audit_rollup(start=start)
+    print(f"[OK] audit_log_rollup rebuilt: {buckets} buckets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild audit_log_rollup from audit_logs")
+    parser.add_argument("--days", type=int, default=None, help="対象期間（日数、省略時は全期間）")
+    args = parser.parse_args()
+    asyncio.run(main(args.days))
@@ -0,0 +1,38 @@
+"""
+関連ナレッジ記事の再計算ジョブ
+
+タグと本文の語の重なりから各記事の関連記事を計算し、
+knowledge_related_articles を作り直します。記事ページの関連記事は
+この表から表示されるため、夜間の日次バッチ（cron 等）での実行を想定しています。
+
+使用例:
+    python -m app.jobs.knowledge_related
+    python -m app.jobs.knowledge_related --limit 10
+"""
+
+import argparse
+import asyncio
+
+from app.database import async_session_factory, init_db
+from app.services.knowledge_related import rebuild_related_articles
+
+
+async def run_related_rebuild(limit: int | None = None) -> tuple[int, int]:
+    """関連記事表を作り直し、(記事数, 行数) を返す"""
+    async with async_session_factory() as session:
+        articles, rows = await rebuild_related_articles(session, limit=limit)
+        await session.commit()
+    return articles, rows
+
+
+async def main(limit: int | None) -> None:
+    await init_db()
+    articles, rows = await run_related_rebuild(limit=limit)
+    print(f"[OK] knowledge_related_articles rebuilt: {articles} articles, {rows} links")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild knowledge_related_articles")
+    parser.add_argument("--limit", type=int, default=None, help="記事あたりの関連記事数（省略時は KNOWLEDGE_RELATED_LIMIT）")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit))
@@ -5,7 +5,7 @@ Microsoft 365 連携モジュール
 すべてのM365操作は承認フロー、SOD原則、監査証跡の記録が必須です。
 """
 
-from .graph_client import GraphClient
+from .graph_client import BatchRequest, BatchResponse, GraphClient
 from .operations import M365Operations
 from .auth import M365AuthConfig
 from .exceptions import (
@@ -17,6 +17,8 @@ from .exceptions import (
 )
 
 __all__ = [
+    "BatchRequest",
+    "BatchResponse",
     "GraphClient",
     "M365Operations",
     "M365AuthConfig",
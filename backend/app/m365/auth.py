@@ -2,13 +2,31 @@
 Microsoft 365 認証設定
 
 Microsoft Graph APIへの認証に必要な設定とトークン取得機能を提供します。
+
+取得したアクセストークンはプロセス全体で共有するキャッシュ（access_token_cache）に
+有効期限（expires_in）とともに保持し、GraphClient やリクエストごとに
+トークンエンドポイントへ問い合わせないようにしています。
 """
 
+import asyncio
+import logging
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any
 import httpx
 from app.config import settings
 
+from .http import get_http_client
+
+
+logger = logging.getLogger(__name__)
+
+# expires_in が返されなかった場合のトークン有効期間（秒）
+DEFAULT_TOKEN_LIFETIME = 3600
+
+# 有効期限の直前に送ったリクエストが期限切れにならないよう早めに失効扱いする秒数
+EXPIRY_SKEW_SECONDS = 60
+
 
 @dataclass
 class M365AuthConfig:
@@ -46,14 +64,32 @@ class M365AuthConfig:
         """認証設定が有効かチェック"""
         return bool(self.tenant_id and self.client_id and self.client_secret)
 
+    def cache_key(self) -> tuple[str, str, str]:
+        """トークンキャッシュのキー（同じアプリ・スコープのトークンを共有する）"""
+        return (self.authority, self.client_id, " ".join(self.scopes))
+
     async def get_access_token(self) -> str:
         """アクセストークン取得
 
-        Client Credentials Flowを使用してアクセストークンを取得します。
+        共有キャッシュのトークンを返します。期限切れ・未取得の場合のみ
+        トークンエンドポイントへ問い合わせます。
 
         Returns:
             アクセストークン
 
+        Raises:
+            M365AuthenticationError: トークン取得失敗時
+        """
+        return await access_token_cache.get(self)
+
+    async def fetch_access_token(self) -> tuple[str, int]:
+        """アクセストークンをトークンエンドポイントから取得
+
+        Client Credentials Flowを使用してアクセストークンを取得します。
+
+        Returns:
+            (アクセストークン, 有効期間（秒）)
+
         Raises:
             M365AuthenticationError: トークン取得失敗時
         """
@@ -74,12 +110,16 @@ class M365AuthConfig:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(token_url, data=data, timeout=30.0)
-                response.raise_for_status()
+            shared_client = get_http_client()
+            if shared_client is not None:
+                response = await shared_client.post(token_url, data=data)
+            else:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(token_url, data=data, timeout=30.0)
+            response.raise_for_status()
 
-                token_data = response.json()
-                return token_data["access_token"]
+            token_data = response.json()
+            return token_data["access_token"], int(token_data.get("expires_in", DEFAULT_TOKEN_LIFETIME))
 
         except httpx.HTTPStatusError as e:
             error_detail = {}
@@ -104,3 +144,113 @@ class M365AuthConfig:
                 "Invalid token response format",
                 details={"missing_key": str(e)}
             ) from e
+
+
+@dataclass
+class _CachedToken:
+    token: str
+    expires_at: float  # time.monotonic() 基準
+    refresh_at: float
+
+
+class AccessTokenCache:
+    """プロセス全体で共有するアクセストークンのキャッシュ
+
+    - 有効期限（expires_in から EXPIRY_SKEW_SECONDS を引いた時刻）までトークンを再利用します。
+    - 期限の refresh_ahead_seconds 秒前（有効期間の半分を上限）を過ぎたら、
+      手元のトークンを返しつつバックグラウンドで先行更新します。
+    - 同じキーの取得は同時に1つだけ行い（single-flight）、並行する呼び出しは
+      その結果を待ち合わせます。
+    """
+
+    def __init__(self, refresh_ahead_seconds: float):
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self._entries: dict[tuple[str, str, str], _CachedToken] = {}
+        self._inflight: dict[tuple[str, str, str], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.refreshes_ahead = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    async def get(self, config: M365AuthConfig) -> str:
+        """有効なトークンを返す（必要なら取得を待つ）"""
+        key = config.cache_key()
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            if now >= entry.refresh_at and key not in self._inflight:
+                self.refreshes_ahead += 1
+                self._fetch(key, config)
+            return entry.token
+
+        self.misses += 1
+        # 待っている呼び出しがキャンセルされても共有の取得は続ける
+        return await asyncio.shield(self._fetch(key, config))
+
+    def invalidate(self, config: M365AuthConfig, token: str) -> None:
+        """Graph に拒否されたトークンを破棄する（既に更新済みなら何もしない）"""
+        key = config.cache_key()
+        entry = self._entries.get(key)
+        if entry is not None and entry.token == token:
+            del self._entries[key]
+            self.invalidations += 1
+
+    def _fetch(self, key: tuple[str, str, str], config: M365AuthConfig) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task
+
+        task = asyncio.ensure_future(self._refresh(key, config))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    async def _refresh(self, key: tuple[str, str, str], config: M365AuthConfig) -> str:
+        self.fetches += 1
+        started = time.monotonic()
+        token, expires_in = await config.fetch_access_token()
+
+        lifetime = max(expires_in - EXPIRY_SKEW_SECONDS, 0)
+        expires_at = started + lifetime
+        self._entries[key] = _CachedToken(
+            token=token,
+            expires_at=expires_at,
+            refresh_at=expires_at - min(self.refresh_ahead_seconds, lifetime / 2),
+        )
+        return token
+
+    def _finished(self, key: tuple[str, str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            # 先行更新の失敗は待っている呼び出しがいないためここで記録する
+            self.failures += 1
+            logger.warning("M365 アクセストークンの取得に失敗しました: %s", error)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """キャッシュ統計"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "refresh_ahead_seconds": self.refresh_ahead_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "fetches": self.fetches,
+            "refreshes_ahead": self.refreshes_ahead,
+            "failures": self.failures,
+            "invalidations": self.invalidations,
+        }
+
+
+access_token_cache = AccessTokenCache(settings.MS_TOKEN_REFRESH_AHEAD_SECONDS)
@@ -0,0 +1,214 @@
+"""
+Microsoft Graph 読み取りのレスポンスキャッシュ
+
+同じチケットのタスク作成・サマリー・実行の間に繰り返される同一の読み取り
+（ユーザー情報、割り当て済みライセンス、SKU 一覧）を、エンドポイントの種類ごとの
+TTL でプロセス内にキャッシュします。
+
+- 対象は GET /users/{id}、GET /groups/{id}、GET /subscribedSkus のみです
+  （検索・一覧・差分クエリなど結果が変わりやすいものはキャッシュしません）。
+- 存在しないユーザー（404）も短い TTL でキャッシュします（negative caching）。
+- 書き込み（POST / PATCH / DELETE、$batch 内の書き込みを含む）の後は、
+  対象のユーザー・グループのエントリを破棄します。ユーザーは UPN と
+  オブジェクトID のどちらで参照されても破棄されるよう両方で登録します。
+  ライセンスの付与・剥奪は SKU の消費数も変えるため SKU 一覧も破棄します。
+"""
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.config import settings
+
+
+# エンドポイントの種類（パスは小文字化して照合）
+_CACHEABLE = (
+    ("users", re.compile(r"/users/([^/]+)")),
+    ("groups", re.compile(r"/groups/([^/]+)")),
+    ("skus", re.compile(r"/subscribedskus")),
+)
+
+# 書き込みで破棄する対象（/users/{id}/assignLicense などを含む）
+_SUBJECT = re.compile(r"/(users|groups)/([^/]+)")
+
+# SKU の消費数が変わる書き込み
+_LICENSE_WRITE = re.compile(r"/users/[^/]+/assignlicense")
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    category: str
+    subjects: tuple[tuple[str, str], ...]
+    # 404 を記録したエントリ（value は (メッセージ, エラー詳細)）
+    negative: bool = False
+
+
+class GraphResponseCache:
+    """エンドポイントの種類ごとの TTL を持つ LRU キャッシュ"""
+
+    def __init__(self, max_size: int, ttl_seconds: dict[str, float], negative_ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        # (種類, ID または UPN) → キャッシュキー
+        self._subjects: dict[tuple[str, str], set[tuple]] = {}
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.counters = {
+            category: {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+            for category in self.ttl_seconds
+        }
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def _path(base_url: str, endpoint: str) -> str:
+        if endpoint.startswith(base_url):
+            endpoint = endpoint[len(base_url):]
+        return endpoint.split("?", 1)[0].rstrip("/").lower()
+
+    def key(self, base_url: str, endpoint: str, params: Optional[dict[str, Any]]) -> Optional[tuple]:
+        """キャッシュ対象の GET ならキーを返す（対象外は None）"""
+        if not self.enabled:
+            return None
+        path = self._path(base_url, endpoint)
+        for category, pattern in _CACHEABLE:
+            if pattern.fullmatch(path) and self.ttl_seconds.get(category, 0) > 0:
+                query = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+                return (category, base_url, path, query)
+        return None
+
+    def get(self, key: tuple) -> tuple[bool, Any, bool]:
+        """(見つかったか, 値, 404 の記録か) を返す"""
+        category = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.counters[category]["misses"] += 1
+                return False, None, False
+            self._entries.move_to_end(key)
+            self.counters[category]["negative_hits" if entry.negative else "hits"] += 1
+            return True, copy.deepcopy(entry.value), entry.negative
+
+    def put(self, key: tuple, value: Any) -> None:
+        category, _, path, _ = key
+        subjects = {self._subject(path)} - {None}
+        if category == "users" and isinstance(value, dict):
+            # UPN とオブジェクトIDのどちらで書き込まれても破棄できるようにする
+            for alias in (value.get("id"), value.get("userPrincipalName")):
+                if alias:
+                    subjects.add(("users", str(alias).lower()))
+        self._store(key, copy.deepcopy(value), self.ttl_seconds[category], subjects, negative=False)
+
+    def put_not_found(self, key: tuple, message: str, details: dict[str, Any]) -> None:
+        """404 を記録する（negative caching、ユーザー・グループのみ）"""
+        category, _, path, _ = key
+        if category == "skus" or self.negative_ttl_seconds <= 0:
+            return
+        self._store(
+            key, (message, copy.deepcopy(details)), self.negative_ttl_seconds,
+            {self._subject(path)} - {None}, negative=True,
+        )
+
+    def _store(self, key: tuple, value: Any, ttl: float, subjects: set, negative: bool) -> None:
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(value, time.monotonic() + ttl, key[0], tuple(subjects), negative)
+            for subject in subjects:
+                self._subjects.setdefault(subject, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: tuple) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for subject in entry.subjects:
+                keys = self._subjects.get(subject)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._subjects[subject]
+        return entry
+
+    @staticmethod
+    def _subject(path: str) -> Optional[tuple[str, str]]:
+        match = _SUBJECT.match(path)
+        return (match.group(1), match.group(2)) if match else None
+
+    def invalidate_write(self, base_url: str, endpoint: str) -> None:
+        """書き込みの対象（ユーザー・グループ）のエントリを破棄する"""
+        path = self._path(base_url, endpoint)
+        with self._lock:
+            subject = self._subject(path)
+            if subject is not None:
+                for key in list(self._subjects.get(subject, ())):
+                    if self._drop(key) is not None:
+                        self.counters[key[0]]["invalidations"] += 1
+            if path in ("/users", "/groups"):
+                # 作成: 同じ UPN の 404 の記録を破棄する
+                category = path[1:]
+                for key, entry in list(self._entries.items()):
+                    if entry.category == category and entry.negative:
+                        self._drop(key)
+                        self.counters[category]["invalidations"] += 1
+            if _LICENSE_WRITE.fullmatch(path):
+                for key, entry in list(self._entries.items()):
+                    if entry.category == "skus":
+                        self._drop(key)
+                        self.counters["skus"]["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._subjects.clear()
+            self._reset_stats()
+
+    def stats(self) -> dict[str, Any]:
+        """種類ごとのヒット率などの統計"""
+        with self._lock:
+            categories = {}
+            for category, counter in self.counters.items():
+                lookups = counter["hits"] + counter["negative_hits"] + counter["misses"]
+                categories[category] = {
+                    **counter,
+                    "ttl_seconds": self.ttl_seconds[category],
+                    "size": sum(1 for entry in self._entries.values() if entry.category == category),
+                    "hit_ratio": (
+                        round((counter["hits"] + counter["negative_hits"]) / lookups, 4) if lookups else 0.0
+                    ),
+                }
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "negative_ttl_seconds": self.negative_ttl_seconds,
+                "evictions": self.evictions,
+                "endpoints": categories,
+            }
+
+
+graph_cache = GraphResponseCache(
+    settings.MS_GRAPH_CACHE_SIZE,
+    {
+        "users": settings.MS_GRAPH_CACHE_USER_TTL_SECONDS,
+        "groups": settings.MS_GRAPH_CACHE_GROUP_TTL_SECONDS,
+        "skus": settings.MS_GRAPH_CACHE_SKU_TTL_SECONDS,
+    },
+    settings.MS_GRAPH_CACHE_NEGATIVE_TTL_SECONDS,
+)
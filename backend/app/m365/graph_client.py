@@ -3,22 +3,110 @@ Microsoft Graph API クライアント
 
 Microsoft Graph APIへのHTTPリクエストを抽象化したクライアントクラス。
 トークン管理、リトライ、エラーハンドリングを提供します。
+
+複数のリクエストは JSON バッチ（/$batch）で最大20件ずつまとめて送信できます。
+一覧取得は @odata.nextLink をたどる非同期イテレータでページ単位に読み進めます。
+すべてのリクエストはプロセス共有のリミッター（app.m365.throttle）を通ります。
+ユーザー・グループ・SKU 一覧の GET は短い TTL でキャッシュし（app.m365.cache）、
+書き込みの後に対象のエントリを破棄します。
 """
 
 import asyncio
 import logging
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
 from typing import Any, Optional
 import httpx
 
-from .auth import M365AuthConfig
+from .auth import M365AuthConfig, access_token_cache
+from .cache import graph_cache
+from .throttle import graph_throttle, retry_after_seconds
+from .http import get_http_client
 from .exceptions import (
     M365APIError,
     M365AuthenticationError,
     M365AuthorizationError,
+    M365Error,
+    M365ValidationError,
 )
 
 logger = logging.getLogger(__name__)
 
+# 1回の /$batch に含められるリクエスト数（Graph の上限）
+MAX_BATCH_SIZE = 20
+
+# バッチ内の個別リクエストを再試行するステータス
+_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# 依存先が失敗したため実行されなかったリクエストのステータス
+_FAILED_DEPENDENCY = 424
+
+# 一覧取得の1ページあたりの件数（$top、Graph の上限は 999）
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 999
+
+
+@dataclass
+class DeltaPage:
+    """差分クエリ（/delta）の1ページ
+
+    Attributes:
+        items: 追加・変更されたオブジェクト（削除は "@removed" を含む）
+        delta_link: 最終ページでのみ設定される次回の差分取得用リンク
+    """
+
+    items: list[dict[str, Any]]
+    delta_link: Optional[str] = None
+
+
+@dataclass
+class BatchRequest:
+    """JSON バッチに含める個別リクエスト
+
+    Attributes:
+        method: HTTPメソッド
+        url: APIエンドポイント（/users/... のようにバージョンを含まない相対パス）
+        body: リクエストボディ（JSON）
+        depends_on: 先に成功している必要があるリクエストのID
+        id: バッチ内のID（省略時は順番から採番）
+    """
+
+    method: str
+    url: str
+    body: Optional[dict[str, Any]] = None
+    depends_on: list[str] = field(default_factory=list)
+    id: Optional[str] = None
+
+
+@dataclass
+class BatchResponse:
+    """JSON バッチの個別レスポンス"""
+
+    id: str
+    status: int
+    body: Any = None
+    headers: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def error(self) -> Optional[M365Error]:
+        """失敗した場合は対応する例外を返す（成功時は None）"""
+        if self.ok:
+            return None
+        details = {"status_code": self.status, "error": self.body}
+        if self.status == 401:
+            return M365AuthenticationError("Authentication failed", details=details)
+        if self.status == 403:
+            return M365AuthorizationError("Insufficient permissions for this operation", details=details)
+        return M365APIError(f"Graph API error: {self.status}", status_code=self.status, details={"error": self.body})
+
+    def raise_for_status(self) -> None:
+        error = self.error()
+        if error is not None:
+            raise error
+
 
 class GraphClient:
     """Microsoft Graph API クライアント
@@ -30,15 +118,23 @@ class GraphClient:
     - 標準的なCRUD操作
     """
 
-    def __init__(self, auth_config: Optional[M365AuthConfig] = None):
+    def __init__(
+        self,
+        auth_config: Optional[M365AuthConfig] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         """GraphClientの初期化
 
         Args:
             auth_config: 認証設定（省略時は設定ファイルから取得）
+            http_client: 使用するHTTPクライアント（省略時は起動時に作成した共有クライアント、
+                共有クライアントがなければこのインスタンス専用に作成してcloseで閉じる）
         """
         self.auth_config = auth_config or M365AuthConfig.from_settings()
         self._access_token: Optional[str] = None
-        self._client = httpx.AsyncClient(timeout=30.0)
+        http_client = http_client or get_http_client()
+        self._owns_client = http_client is None
+        self._client = http_client or httpx.AsyncClient(timeout=30.0)
 
     async def __aenter__(self):
         """非同期コンテキストマネージャー入口"""
@@ -49,16 +145,16 @@ class GraphClient:
         await self.close()
 
     async def close(self):
-        """クライアントのクローズ"""
-        await self._client.aclose()
+        """クライアントのクローズ（共有・外部から渡されたHTTPクライアントは閉じない）"""
+        if self._owns_client:
+            await self._client.aclose()
 
     async def _ensure_token(self):
         """アクセストークンの確保
 
-        トークンがない場合は取得します。
+        プロセス共有のキャッシュから取得します（期限切れ・期限間近なら更新）。
         """
-        if not self._access_token:
-            self._access_token = await self.auth_config.get_access_token()
+        self._access_token = await self.auth_config.get_access_token()
 
     async def _request(
         self,
@@ -104,19 +200,23 @@ class GraphClient:
         try:
             logger.info(f"Graph API Request: {method} {url}")
 
-            response = await self._client.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=json_data,
-                params=params,
-            )
+            # プロセス全体の同時実行数制限・429 による一時停止・サーキットブレーカー
+            async with graph_throttle.slot() as slot:
+                response = await self._client.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    json=json_data,
+                    params=params,
+                )
+                slot.record(response)
 
             # ステータスコードによる処理
             if response.status_code == 401:
                 # トークン期限切れの可能性 → リトライ
                 if retry_count < max_retries:
                     logger.warning("Token expired, refreshing and retrying...")
+                    access_token_cache.invalidate(self.auth_config, self._access_token)
                     self._access_token = None
                     await asyncio.sleep(1)
                     return await self._request(
@@ -140,11 +240,10 @@ class GraphClient:
                 )
 
             elif response.status_code == 429:
-                # レート制限 → リトライ
+                # レート制限 → 全体の送信が Retry-After まで止まるので、再開後にリトライ
                 if retry_count < max_retries:
-                    retry_after = int(response.headers.get("Retry-After", 5))
+                    retry_after = response.headers.get("Retry-After", 5)
                     logger.warning(f"Rate limited, retrying after {retry_after} seconds...")
-                    await asyncio.sleep(retry_after)
                     return await self._request(
                         method, endpoint,
                         json_data=json_data,
@@ -203,6 +302,262 @@ class GraphClient:
                 details={"error": str(e)}
             ) from e
 
+    # ============== ページング ==============
+
+    async def iter_pages(
+        self,
+        endpoint: str,
+        params: Optional[dict[str, Any]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """一覧をページ単位で返す
+
+        @odata.nextLink を次のページが要求されたときに初めて取得するため、
+        全件をメモリに保持せずに読み進められます。
+
+        Args:
+            endpoint: APIエンドポイント
+            params: クエリパラメータ（$select, $filter など）
+            page_size: 1ページの件数（$top、省略時は DEFAULT_PAGE_SIZE）
+
+        Yields:
+            各ページの要素（value）
+        """
+        params = dict(params or {})
+        params["$top"] = str(min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+        url: Optional[str] = endpoint
+        while url:
+            response = await self._request("GET", url, params=params)
+            yield response.get("value", [])
+            # nextLink にはクエリパラメータ（$skiptoken など）が含まれる
+            url = response.get("@odata.nextLink")
+            params = None
+
+    async def iter_items(
+        self,
+        endpoint: str,
+        params: Optional[dict[str, Any]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """一覧を1件ずつ返す（ページは必要になった時点で取得）"""
+        async for page in self.iter_pages(endpoint, params, page_size):
+            for item in page:
+                yield item
+
+    async def iter_delta(
+        self,
+        resource: str,
+        delta_link: Optional[str] = None,
+        select: Optional[list[str]] = None,
+    ) -> AsyncIterator[DeltaPage]:
+        """差分クエリ（/users/delta など）をページ単位で返す
+
+        delta_link を省略すると全件の初回同期になります。最終ページの
+        delta_link を保存しておき、次回に渡すと前回以降の変更だけを取得できます。
+        変更されたオブジェクトには変更されたプロパティだけが含まれることがあります。
+
+        Args:
+            resource: リソース（"users" / "groups"）
+            delta_link: 前回の最終ページで受け取った delta_link
+            select: 取得するフィールド一覧（初回のみ有効、以降は delta_link に含まれる）
+
+        Yields:
+            DeltaPage
+
+        Raises:
+            M365APIError: delta_link が失効している場合は status_code=410
+        """
+        url: Optional[str] = delta_link or f"/{resource}/delta"
+        params = {"$select": ",".join(select)} if select and not delta_link else None
+
+        while url:
+            response = await self._request("GET", url, params=params)
+            params = None
+            url = response.get("@odata.nextLink")
+            yield DeltaPage(
+                items=response.get("value", []),
+                delta_link=None if url else response.get("@odata.deltaLink"),
+            )
+
+    # ============== JSON バッチ ==============
+
+    async def batch(self, requests: list[BatchRequest], max_retries: int = 3) -> list[BatchResponse]:
+        """複数のリクエストを /$batch でまとめて実行
+
+        最大20件ずつ POST します。依存関係（depends_on）でつながったリクエストは
+        同じバッチに入れます。429 / 5xx で失敗した個別リクエストは、それに依存して
+        実行されなかったリクエストとともに再送します（429 は Retry-After に従う）。
+
+        Args:
+            requests: 個別リクエスト
+            max_retries: 個別リクエストの最大リトライ回数
+
+        Returns:
+            requests と同じ順のレスポンス（失敗も例外にせず status で返す）
+
+        Raises:
+            M365ValidationError: ID の重複、存在しない依存先、20件を超える依存関係
+        """
+        ids = [request.id or str(i + 1) for i, request in enumerate(requests)]
+        if len(set(ids)) != len(ids):
+            raise M365ValidationError("Batch request ids must be unique")
+        by_id = dict(zip(ids, requests))
+        for request in requests:
+            missing = [dep for dep in request.depends_on if dep not in by_id]
+            if missing:
+                raise M365ValidationError("Unknown batch dependency", details={"depends_on": missing})
+
+        responses: dict[str, BatchResponse] = {}
+        pending = ids
+        for attempt in range(max_retries + 1):
+            try:
+                for chunk in self._batch_chunks(pending, by_id):
+                    responses.update(await self._send_batch(chunk, by_id, responses))
+            finally:
+                for request_id in pending:
+                    if by_id[request_id].method.upper() != "GET":
+                        graph_cache.invalidate_write(self.auth_config.graph_endpoint, by_id[request_id].url)
+
+            retry = [
+                request_id for request_id in pending
+                if responses[request_id].status in _RETRYABLE_STATUSES
+            ]
+            if not retry or attempt == max_retries:
+                break
+            # 再送するリクエストに依存して実行されなかったものも再送する
+            retrying = set(retry)
+            for request_id in pending:
+                if (
+                    responses[request_id].status == _FAILED_DEPENDENCY
+                    and self._depends_on_any(request_id, by_id, retrying)
+                ):
+                    retry.append(request_id)
+                    retrying.add(request_id)
+            pending = [request_id for request_id in ids if request_id in retrying]
+
+            throttled = [responses[request_id] for request_id in pending if responses[request_id].status == 429]
+            if throttled:
+                # 個別リクエストの 429 も全体の送信を止める
+                graph_throttle.throttled(self._batch_retry_delay(throttled, attempt))
+            delay = self._batch_retry_delay([responses[request_id] for request_id in pending], attempt)
+            logger.warning(f"Retrying {len(pending)} batch requests after {delay} seconds...")
+            await asyncio.sleep(delay)
+
+        return [responses[request_id] for request_id in ids]
+
+    def _batch_chunks(self, ids: list[str], by_id: dict[str, BatchRequest]) -> list[list[str]]:
+        """依存関係でつながったリクエストを分割しないよう MAX_BATCH_SIZE 件ずつに分ける"""
+        included = set(ids)
+        group_of = {request_id: request_id for request_id in ids}
+
+        def find(request_id: str) -> str:
+            while group_of[request_id] != request_id:
+                group_of[request_id] = group_of[group_of[request_id]]
+                request_id = group_of[request_id]
+            return request_id
+
+        for request_id in ids:
+            for dep in by_id[request_id].depends_on:
+                if dep in included:
+                    group_of[find(request_id)] = find(dep)
+
+        groups: dict[str, list[str]] = {}
+        for request_id in ids:
+            groups.setdefault(find(request_id), []).append(request_id)
+
+        chunks: list[list[str]] = []
+        for group in groups.values():
+            if len(group) > MAX_BATCH_SIZE:
+                raise M365ValidationError(
+                    f"Dependent batch requests cannot exceed {MAX_BATCH_SIZE}",
+                    details={"ids": group},
+                )
+            if chunks and len(chunks[-1]) + len(group) <= MAX_BATCH_SIZE:
+                chunks[-1].extend(group)
+            else:
+                chunks.append(list(group))
+        return chunks
+
+    async def _send_batch(
+        self,
+        chunk: list[str],
+        by_id: dict[str, BatchRequest],
+        done: dict[str, BatchResponse],
+    ) -> dict[str, BatchResponse]:
+        included = set(chunk)
+        payload = []
+        for request_id in chunk:
+            request = by_id[request_id]
+            item: dict[str, Any] = {
+                "id": request_id,
+                "method": request.method,
+                "url": self._batch_url(request.url),
+            }
+            if request.body is not None:
+                item["body"] = request.body
+                item["headers"] = {"Content-Type": "application/json"}
+            # 前回までに成功した依存先は外す（同じバッチにないものは参照できない）
+            depends_on = [dep for dep in request.depends_on if dep in included]
+            if depends_on:
+                item["dependsOn"] = depends_on
+            payload.append(item)
+
+        # 依存先が前回までに失敗している場合は送らない
+        results: dict[str, BatchResponse] = {}
+        for item in list(payload):
+            failed = [
+                dep for dep in by_id[item["id"]].depends_on
+                if dep not in included and dep in done and not done[dep].ok
+            ]
+            if failed:
+                payload.remove(item)
+                results[item["id"]] = BatchResponse(item["id"], _FAILED_DEPENDENCY, {"failed_dependencies": failed})
+        if not payload:
+            return results
+
+        logger.info(f"Graph API Batch: {len(payload)} requests")
+        response = await self.post("/$batch", {"requests": payload})
+        for item in response.get("responses", []):
+            results[str(item["id"])] = BatchResponse(
+                id=str(item["id"]),
+                status=int(item["status"]),
+                body=item.get("body"),
+                headers=item.get("headers") or {},
+            )
+        # 応答に含まれなかったリクエストは失敗として扱う
+        for item in payload:
+            results.setdefault(item["id"], BatchResponse(item["id"], 500, {"error": "missing batch response"}))
+        return results
+
+    def _batch_url(self, url: str) -> str:
+        if url.startswith(self.auth_config.graph_endpoint):
+            url = url[len(self.auth_config.graph_endpoint):]
+        return url if url.startswith("/") else f"/{url}"
+
+    @staticmethod
+    def _depends_on_any(request_id: str, by_id: dict[str, BatchRequest], targets: set[str]) -> bool:
+        stack = list(by_id[request_id].depends_on)
+        seen = set()
+        while stack:
+            dep = stack.pop()
+            if dep in targets:
+                return True
+            if dep not in seen:
+                seen.add(dep)
+                stack.extend(by_id[dep].depends_on)
+        return False
+
+    @staticmethod
+    def _batch_retry_delay(responses: list[BatchResponse], attempt: int) -> float:
+        retry_after = [
+            seconds for response in responses
+            if (seconds := retry_after_seconds(response.headers)) is not None
+        ]
+        if retry_after:
+            return max(retry_after)
+        return 2 ** attempt
+
     def _parse_error_response(self, response: httpx.Response) -> dict[str, Any]:
         """エラーレスポンスのパース"""
         try:
@@ -213,52 +568,102 @@ class GraphClient:
     # ============== 基本的なCRUD操作 ==============
 
     async def get(self, endpoint: str, params: Optional[dict[str, Any]] = None) -> dict[str, Any]:
-        """GETリクエスト"""
-        return await self._request("GET", endpoint, params=params)
+        """GETリクエスト（キャッシュ対象のエンドポイントはキャッシュから返す）"""
+        key = graph_cache.key(self.auth_config.graph_endpoint, endpoint, params)
+        if key is None:
+            return await self._request("GET", endpoint, params=params)
+
+        found, value, not_found = graph_cache.get(key)
+        if found:
+            if not_found:
+                message, details = value
+                raise M365APIError(message, status_code=404, details=details)
+            return value
+
+        try:
+            value = await self._request("GET", endpoint, params=params)
+        except M365APIError as e:
+            if e.status_code == 404:
+                graph_cache.put_not_found(key, e.message, e.details)
+            raise
+        graph_cache.put(key, value)
+        return value
 
     async def post(self, endpoint: str, data: dict[str, Any]) -> dict[str, Any]:
         """POSTリクエスト"""
-        return await self._request("POST", endpoint, json_data=data)
+        try:
+            return await self._request("POST", endpoint, json_data=data)
+        finally:
+            # 失敗しても反映されている可能性があるため常に破棄する
+            graph_cache.invalidate_write(self.auth_config.graph_endpoint, endpoint)
 
     async def patch(self, endpoint: str, data: dict[str, Any]) -> dict[str, Any]:
         """PATCHリクエスト"""
-        return await self._request("PATCH", endpoint, json_data=data)
+        try:
+            return await self._request("PATCH", endpoint, json_data=data)
+        finally:
+            graph_cache.invalidate_write(self.auth_config.graph_endpoint, endpoint)
 
     async def delete(self, endpoint: str) -> dict[str, Any]:
         """DELETEリクエスト"""
-        return await self._request("DELETE", endpoint)
+        try:
+            return await self._request("DELETE", endpoint)
+        finally:
+            graph_cache.invalidate_write(self.auth_config.graph_endpoint, endpoint)
 
     # ============== ユーザー操作 ==============
 
-    async def get_user(self, user_id: str) -> dict[str, Any]:
+    async def get_user(self, user_id: str, select: Optional[list[str]] = None) -> dict[str, Any]:
         """ユーザー情報取得
 
         Args:
             user_id: ユーザーID (UPN or Object ID)
+            select: 取得するフィールド一覧（省略時は既定のフィールド）
 
         Returns:
             ユーザー情報
         """
+        if select:
+            return await self.get(f"/users/{user_id}", params={"$select": ",".join(select)})
         return await self.get(f"/users/{user_id}")
 
-    async def list_users(self, select: Optional[list[str]] = None, filter_query: Optional[str] = None) -> list[dict[str, Any]]:
-        """ユーザー一覧取得
+    def iter_user_pages(
+        self,
+        select: Optional[list[str]] = None,
+        filter_query: Optional[str] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """ユーザー一覧をページ単位で取得
 
         Args:
             select: 取得するフィールド一覧
             filter_query: ODataフィルタ
+            page_size: 1ページの件数
 
-        Returns:
-            ユーザー一覧
+        Yields:
+            ユーザー一覧（1ページ分）
         """
         params = {}
         if select:
             params["$select"] = ",".join(select)
         if filter_query:
             params["$filter"] = filter_query
+        return self.iter_pages("/users", params, page_size)
 
-        response = await self.get("/users", params=params)
-        return response.get("value", [])
+    async def list_users(self, select: Optional[list[str]] = None, filter_query: Optional[str] = None) -> list[dict[str, Any]]:
+        """ユーザー一覧取得（全ページ）
+
+        Args:
+            select: 取得するフィールド一覧
+            filter_query: ODataフィルタ
+
+        Returns:
+            ユーザー一覧
+        """
+        users = []
+        async for page in self.iter_user_pages(select, filter_query, MAX_PAGE_SIZE):
+            users.extend(page)
+        return users
 
     async def search_users(self, query: str, top: int = 10) -> list[dict[str, Any]]:
         """ユーザー検索
@@ -298,6 +703,29 @@ class GraphClient:
         await self.patch(f"/users/{user_id}", data)
         return await self.get_user(user_id)
 
+    async def create_user(self, data: dict[str, Any]) -> dict[str, Any]:
+        """ユーザー作成
+
+        Args:
+            data: ユーザー情報（userPrincipalName, displayName, passwordProfile など）
+
+        Returns:
+            作成したユーザー情報
+        """
+        return await self.post("/users", data)
+
+    async def revoke_sign_in_sessions(self, user_id: str) -> dict[str, Any]:
+        """サインインセッションの無効化（発行済みのリフレッシュトークンを失効）"""
+        return await self.post(f"/users/{user_id}/revokeSignInSessions", {})
+
+    async def list_user_groups(self, user_id: str) -> list[dict[str, Any]]:
+        """ユーザーが直接所属するグループ一覧取得（全ページ）"""
+        groups = []
+        params = {"$select": "id,displayName,groupTypes,onPremisesSyncEnabled,mailEnabled,securityEnabled"}
+        async for page in self.iter_pages(f"/users/{user_id}/memberOf/microsoft.graph.group", params, MAX_PAGE_SIZE):
+            groups.extend(page)
+        return groups
+
     # ============== ライセンス操作 ==============
 
     async def get_user_licenses(self, user_id: str) -> list[dict[str, Any]]:
@@ -344,6 +772,44 @@ class GraphClient:
         }
         return await self.post(f"/users/{user_id}/assignLicense", data)
 
+    async def assign_licenses(self, user_ids: list[str], sku_id: str) -> dict[str, BatchResponse]:
+        """複数ユーザーにライセンス付与（JSON バッチ）
+
+        Returns:
+            {ユーザーID: 個別レスポンス}
+        """
+        requests = [
+            BatchRequest(
+                "POST",
+                f"/users/{user_id}/assignLicense",
+                body={"addLicenses": [{"skuId": sku_id}], "removeLicenses": []},
+            )
+            for user_id in user_ids
+        ]
+        return dict(zip(user_ids, await self.batch(requests)))
+
+    async def get_license_assignment_states(self, user_id: str) -> list[dict[str, Any]]:
+        """ユーザーのライセンス割り当て状態取得（グループ経由の割り当ては assignedByGroup を持つ）"""
+        user = await self.get(f"/users/{user_id}", params={"$select": "licenseAssignmentStates"})
+        return user.get("licenseAssignmentStates", [])
+
+    async def update_licenses(
+        self,
+        user_id: str,
+        add_sku_ids: Optional[list[str]] = None,
+        remove_sku_ids: Optional[list[str]] = None,
+    ) -> dict[str, Any]:
+        """複数のライセンスを1回の assignLicense で付与・剥奪
+
+        Returns:
+            更新後のユーザー情報
+        """
+        data = {
+            "addLicenses": [{"skuId": sku_id} for sku_id in add_sku_ids or []],
+            "removeLicenses": list(remove_sku_ids or []),
+        }
+        return await self.post(f"/users/{user_id}/assignLicense", data)
+
     async def list_available_licenses(self) -> list[dict[str, Any]]:
         """利用可能なライセンス一覧取得
 
@@ -359,10 +825,22 @@ class GraphClient:
         """グループ情報取得"""
         return await self.get(f"/groups/{group_id}")
 
+    def iter_group_member_pages(
+        self,
+        group_id: str,
+        select: Optional[list[str]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """グループメンバー一覧をページ単位で取得"""
+        params = {"$select": ",".join(select)} if select else None
+        return self.iter_pages(f"/groups/{group_id}/members", params, page_size)
+
     async def list_group_members(self, group_id: str) -> list[dict[str, Any]]:
-        """グループメンバー一覧取得"""
-        response = await self.get(f"/groups/{group_id}/members")
-        return response.get("value", [])
+        """グループメンバー一覧取得（全ページ）"""
+        members = []
+        async for page in self.iter_group_member_pages(group_id, page_size=MAX_PAGE_SIZE):
+            members.extend(page)
+        return members
 
     async def add_group_member(self, group_id: str, user_id: str) -> dict[str, Any]:
         """グループにメンバー追加"""
@@ -371,10 +849,54 @@ class GraphClient:
         }
         return await self.post(f"/groups/{group_id}/members/$ref", data)
 
+    async def add_group_members(self, group_id: str, user_ids: list[str]) -> dict[str, BatchResponse]:
+        """グループに複数メンバーを追加（JSON バッチ）
+
+        Returns:
+            {ユーザーID: 個別レスポンス}
+        """
+        requests = [
+            BatchRequest(
+                "POST",
+                f"/groups/{group_id}/members/$ref",
+                body={"@odata.id": f"{self.auth_config.graph_endpoint}/users/{user_id}"},
+            )
+            for user_id in user_ids
+        ]
+        return dict(zip(user_ids, await self.batch(requests)))
+
     async def remove_group_member(self, group_id: str, user_id: str) -> dict[str, Any]:
         """グループからメンバー削除"""
         return await self.delete(f"/groups/{group_id}/members/{user_id}/$ref")
 
+    async def add_member_to_groups(self, user_id: str, group_ids: list[str]) -> dict[str, BatchResponse]:
+        """ユーザーを複数のグループに追加（JSON バッチ）
+
+        Returns:
+            {グループID: 個別レスポンス}
+        """
+        requests = [
+            BatchRequest(
+                "POST",
+                f"/groups/{group_id}/members/$ref",
+                body={"@odata.id": f"{self.auth_config.graph_endpoint}/users/{user_id}"},
+            )
+            for group_id in group_ids
+        ]
+        return dict(zip(group_ids, await self.batch(requests)))
+
+    async def remove_group_memberships(self, user_id: str, group_ids: list[str]) -> dict[str, BatchResponse]:
+        """ユーザーを複数のグループから削除（JSON バッチ）
+
+        Returns:
+            {グループID: 個別レスポンス}
+        """
+        requests = [
+            BatchRequest("DELETE", f"/groups/{group_id}/members/{user_id}/$ref")
+            for group_id in group_ids
+        ]
+        return dict(zip(group_ids, await self.batch(requests)))
+
     # ============== パスワード操作 ==============
 
     async def reset_password(self, user_id: str, new_password: str, force_change: bool = True) -> dict[str, Any]:
@@ -406,3 +928,54 @@ class GraphClient:
     async def delete_authentication_method(self, user_id: str, method_id: str) -> dict[str, Any]:
         """認証方法削除（MFAリセット）"""
         return await self.delete(f"/users/{user_id}/authentication/methods/{method_id}")
+
+    async def delete_authentication_methods(self, user_id: str, method_ids: list[str]) -> dict[str, BatchResponse]:
+        """複数の認証方法を削除（JSON バッチ）
+
+        Returns:
+            {認証方法ID: 個別レスポンス}
+        """
+        requests = [
+            BatchRequest("DELETE", f"/users/{user_id}/authentication/methods/{method_id}")
+            for method_id in method_ids
+        ]
+        return dict(zip(method_ids, await self.batch(requests)))
+
+    # ============== OneDrive 共有操作 ==============
+
+    async def list_shared_drive_items(self, user_id: str) -> list[dict[str, Any]]:
+        """ユーザーの OneDrive で共有されているアイテム一覧取得（全ページ）"""
+        items = []
+        params = {"$select": "id,name,shared"}
+        async for page in self.iter_pages(f"/users/{user_id}/drive/root/search(q='')", params, MAX_PAGE_SIZE):
+            items.extend(item for item in page if item.get("shared"))
+        return items
+
+    async def list_drive_item_permissions(self, user_id: str, item_ids: list[str]) -> dict[str, BatchResponse]:
+        """複数の OneDrive アイテムの権限一覧取得（JSON バッチ）
+
+        Returns:
+            {アイテムID: 個別レスポンス（body の value が権限一覧）}
+        """
+        requests = [
+            BatchRequest("GET", f"/users/{user_id}/drive/items/{item_id}/permissions")
+            for item_id in item_ids
+        ]
+        return dict(zip(item_ids, await self.batch(requests)))
+
+    async def delete_drive_item_permissions(
+        self, user_id: str, permissions: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], BatchResponse]:
+        """OneDrive アイテムの権限（共有リンク・招待）を削除（JSON バッチ）
+
+        Args:
+            permissions: (アイテムID, 権限ID) の一覧
+
+        Returns:
+            {(アイテムID, 権限ID): 個別レスポンス}
+        """
+        requests = [
+            BatchRequest("DELETE", f"/users/{user_id}/drive/items/{item_id}/permissions/{permission_id}")
+            for item_id, permission_id in permissions
+        ]
+        return dict(zip(permissions, await self.batch(requests)))
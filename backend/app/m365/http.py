@@ -0,0 +1,67 @@
+"""
+Microsoft Graph 用の共有 HTTP クライアント
+
+アプリケーションの起動時（lifespan）に1つだけ作成し、GraphClient と
+トークン取得で共有します。接続を使い回すことで、リクエストごとの
+TCP / TLS ハンドシェイクを省きます。
+
+- 接続数・keep-alive の上限とタイムアウトは設定（MS_GRAPH_*）で調整します。
+- HTTP/2 は h2 パッケージ（httpx[http2]）がある場合のみ有効にします。
+  ない場合は HTTP/1.1 の keep-alive 接続プールで動作します。
+"""
+
+import importlib.util
+import logging
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def http2_available() -> bool:
+    """HTTP/2 を使えるか（h2 がインストールされているか）"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """設定に従って Graph 用の HTTP クライアントを作成"""
+    http2 = settings.MS_GRAPH_HTTP2 and http2_available()
+    if settings.MS_GRAPH_HTTP2 and not http2:
+        logger.warning("h2 がインストールされていないため Graph API へは HTTP/1.1 で接続します")
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.MS_GRAPH_TIMEOUT_SECONDS, connect=settings.MS_GRAPH_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.MS_GRAPH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MS_GRAPH_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.MS_GRAPH_KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def get_http_client() -> Optional[httpx.AsyncClient]:
+    """共有クライアントを返す（起動前・終了後は None）"""
+    return _shared_client
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """共有クライアントを作成する（起動時、既にあればそれを返す）"""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = create_http_client()
+    return _shared_client
+
+
+async def close_http_client() -> None:
+    """共有クライアントを閉じる（終了時）"""
+    global _shared_client
+    client, _shared_client = _shared_client, None
+    if client is not None:
+        await client.aclose()
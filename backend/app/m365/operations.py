@@ -8,14 +8,56 @@ GraphClientをラップし、ビジネスロジックを実装します。
 import logging
 import secrets
 import string
+from collections.abc import AsyncIterator
 from typing import Any, Optional
 
-from .graph_client import GraphClient
+import httpx
+
+from .graph_client import BatchResponse, GraphClient
 from .auth import M365AuthConfig
 from .exceptions import M365ValidationError, M365APIError
 
 logger = logging.getLogger(__name__)
 
+# 操作サマリーで取得するユーザーのフィールド
+_SUMMARY_FIELDS = (
+    "id",
+    "userPrincipalName",
+    "displayName",
+    "mail",
+    "jobTitle",
+    "department",
+    "accountEnabled",
+)
+
+
+
+def _batch_error_message(response: BatchResponse) -> str:
+    """バッチの個別レスポンスのエラーメッセージ（Graph のメッセージがあれば含める）"""
+    body = response.body if isinstance(response.body, dict) else {}
+    message = (body.get("error") or {}).get("message") if isinstance(body.get("error"), dict) else None
+    return f"Graph API error: {response.status}" + (f" ({message})" if message else "")
+
+
+def _already_member(response: BatchResponse) -> bool:
+    """すでにメンバーであることによる 400 か（再実行時は成功として扱う）"""
+    return response.status == 400 and "already exist" in _batch_error_message(response)
+
+
+def _already_exists(error: M365APIError) -> bool:
+    """同じ値のオブジェクトがすでに存在することによる 400 か"""
+    return error.status_code == 400 and "already exist" in str(error.details)
+
+
+def _exchange_managed(group: dict[str, Any]) -> bool:
+    """Exchange で管理するグループか（配布リスト・メールが有効なセキュリティグループ）"""
+    return bool(group.get("mailEnabled")) and "Unified" not in (group.get("groupTypes") or [])
+
+
+def _revocable_permission(permission: dict[str, Any]) -> bool:
+    """共有を解除する権限か（所有者の権限と親フォルダから継承した権限は残す）"""
+    return not permission.get("inheritedFrom") and "owner" not in (permission.get("roles") or [])
+
 
 class M365Operations:
     """Microsoft 365 操作クラス
@@ -24,18 +66,24 @@ class M365Operations:
     すべての操作は承認とログ記録が前提です。
     """
 
-    def __init__(self, auth_config: Optional[M365AuthConfig] = None):
+    def __init__(
+        self,
+        auth_config: Optional[M365AuthConfig] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         """M365Operationsの初期化
 
         Args:
             auth_config: 認証設定（省略時は設定ファイルから取得）
+            http_client: GraphClientに渡すHTTPクライアント（省略時は共有クライアント）
         """
         self.auth_config = auth_config or M365AuthConfig.from_settings()
+        self.http_client = http_client
         self._client: Optional[GraphClient] = None
 
     async def __aenter__(self):
         """非同期コンテキストマネージャー入口"""
-        self._client = GraphClient(self.auth_config)
+        self._client = GraphClient(self.auth_config, self.http_client)
         await self._client.__aenter__()
         return self
 
@@ -47,7 +95,7 @@ class M365Operations:
     def _get_client(self) -> GraphClient:
         """GraphClientインスタンス取得"""
         if not self._client:
-            self._client = GraphClient(self.auth_config)
+            self._client = GraphClient(self.auth_config, self.http_client)
         return self._client
 
     # ============== ユーザー検索 ==============
@@ -77,6 +125,157 @@ class M365Operations:
         client = self._get_client()
         return await client.get_user(user_id)
 
+    def iter_users(
+        self,
+        select: Optional[list[str]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """ユーザー一覧をページ単位で取得
+
+        Args:
+            select: 取得するフィールド一覧
+            page_size: 1ページの件数
+
+        Returns:
+            ユーザー一覧（1ページ分）を返す非同期イテレータ
+        """
+        client = self._get_client()
+        return client.iter_user_pages(select=select, page_size=page_size)
+
+    # ============== アカウント操作 ==============
+
+    async def create_user(
+        self,
+        user_principal_name: str,
+        display_name: str,
+        usage_location: Optional[str] = None,
+        password: Optional[str] = None,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザー作成
+
+        Args:
+            user_principal_name: ユーザープリンシパル名
+            display_name: 表示名
+            usage_location: 利用場所（ISO 3166 の国コード、ライセンス付与に必要）
+            password: 初期パスワード（省略時は自動生成）
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（初期パスワード含む）
+
+        再実行時など、同じ UPN・表示名のユーザーがすでに存在する場合は作成済みとして
+        扱い、初期パスワードを設定し直して返します（前回の作成要求は Graph に反映
+        されたが応答を受け取れなかった場合）。
+        """
+        if not user_principal_name or "@" not in user_principal_name or not display_name:
+            raise M365ValidationError("user_principal_name and display_name are required")
+
+        if not password:
+            password = self.generate_temporary_password()
+
+        data = {
+            "accountEnabled": True,
+            "displayName": display_name,
+            "mailNickname": user_principal_name.split("@", 1)[0],
+            "userPrincipalName": user_principal_name,
+            "passwordProfile": {
+                "forceChangePasswordNextSignIn": True,
+                "password": password,
+            },
+        }
+        if usage_location:
+            data["usageLocation"] = usage_location
+
+        client = self._get_client()
+        already_existed = False
+        try:
+            user = await client.create_user(data)
+        except M365APIError as e:
+            if not _already_exists(e):
+                raise
+            user = await client.get_user(user_principal_name, select=["id", "userPrincipalName", "displayName"])
+            if user.get("displayName") != display_name:
+                raise M365ValidationError(
+                    f"Another user already exists with userPrincipalName {user_principal_name}"
+                ) from e
+            await client.reset_password(user["id"], password, True)
+            already_existed = True
+
+        logger.info(
+            f"User created: user={user_principal_name}, already_existed={already_existed}, "
+            f"comment={operator_comment}"
+        )
+
+        return {
+            "status": "success",
+            "message": "User already existed" if already_existed else "User created successfully",
+            "user_id": user.get("id"),
+            "user_principal_name": user_principal_name,
+            "temporary_password": password,
+            "force_change_on_next_login": True,
+            "already_existed": already_existed,
+        }
+
+    async def block_sign_in(
+        self,
+        user_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """サインインのブロック（アカウントの無効化）
+
+        Args:
+            user_id: ユーザーID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+        await client.update_user(user_id, {"accountEnabled": False})
+
+        logger.info(f"Sign-in blocked: user={user_id}, comment={operator_comment}")
+
+        return {
+            "status": "success",
+            "message": "Sign-in blocked successfully",
+            "user_id": user_id,
+        }
+
+    async def revoke_sign_in_sessions(
+        self,
+        user_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """サインインセッションの無効化
+
+        発行済みのリフレッシュトークンとブラウザのセッションを失効させます。
+
+        Args:
+            user_id: ユーザーID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+        result = await client.revoke_sign_in_sessions(user_id)
+
+        logger.info(f"Sign-in sessions revoked: user={user_id}, comment={operator_comment}")
+
+        return {
+            "status": "success",
+            "message": "Sign-in sessions revoked successfully",
+            "user_id": user_id,
+            "graph_response": result,
+        }
+
     # ============== ライセンス操作 ==============
 
     async def list_available_licenses(self) -> list[dict[str, Any]]:
@@ -162,6 +361,54 @@ class M365Operations:
             "graph_response": result,
         }
 
+    async def assign_license_to_users(
+        self,
+        user_ids: list[str],
+        sku_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """複数ユーザーにライセンス付与
+
+        付与は JSON バッチで最大20件ずつまとめて実行します。すでに付与済みの
+        ユーザーへの付与も成功として扱われます。
+
+        Args:
+            user_ids: ユーザーID一覧
+            sku_id: ライセンスSKU ID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（ユーザーごとの成否）
+        """
+        if not sku_id or not user_ids or not all(user_ids):
+            raise M365ValidationError("user_ids and sku_id are required")
+
+        client = self._get_client()
+        results = await client.assign_licenses(user_ids, sku_id)
+
+        assigned = []
+        failed = {}
+        for user_id, response in results.items():
+            error = response.error()
+            if error is None:
+                assigned.append(user_id)
+            else:
+                failed[user_id] = _batch_error_message(response)
+                logger.warning(f"Failed to assign license: user={user_id}, sku={sku_id}, error={error}")
+
+        logger.info(
+            f"License assigned to users: sku={sku_id}, assigned={len(assigned)}, failed={len(failed)}, "
+            f"comment={operator_comment}"
+        )
+
+        return {
+            "status": "success" if not failed else "partial" if assigned else "failed",
+            "message": f"License assigned to {len(assigned)} of {len(user_ids)} users",
+            "sku_id": sku_id,
+            "assigned_user_ids": assigned,
+            "failed": failed,
+        }
+
     async def remove_license(
         self,
         user_id: str,
@@ -196,6 +443,93 @@ class M365Operations:
             "graph_response": result,
         }
 
+    async def assign_licenses(
+        self,
+        user_id: str,
+        sku_ids: list[str],
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザーに複数のライセンスを付与
+
+        付与済みのものを除き、1回の assignLicense でまとめて付与します。
+
+        Args:
+            user_id: ユーザーID
+            sku_ids: ライセンスSKU ID一覧
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+
+        current_licenses = await client.get_user_licenses(user_id)
+        assigned = {lic.get("skuId") for lic in current_licenses}
+        to_add = [sku_id for sku_id in dict.fromkeys(sku_ids) if sku_id not in assigned]
+
+        if to_add:
+            await client.update_licenses(user_id, add_sku_ids=to_add)
+
+        logger.info(f"Licenses assigned: user={user_id}, skus={to_add}, comment={operator_comment}")
+
+        return {
+            "status": "success",
+            "message": f"{len(to_add)} licenses assigned",
+            "user_id": user_id,
+            "assigned_sku_ids": to_add,
+            "already_assigned_sku_ids": [sku_id for sku_id in sku_ids if sku_id in assigned],
+        }
+
+    async def remove_direct_licenses(
+        self,
+        user_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザーに直接割り当てられたライセンスをすべて剥奪
+
+        グループ経由で割り当てられたライセンスは剥奪できないため残します
+        （グループから削除すると外れます）。
+
+        Args:
+            user_id: ユーザーID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+
+        states = await client.get_license_assignment_states(user_id)
+        direct = list(dict.fromkeys(
+            state["skuId"] for state in states if state.get("skuId") and not state.get("assignedByGroup")
+        ))
+        inherited = list(dict.fromkeys(
+            state["skuId"] for state in states
+            if state.get("skuId") and state.get("assignedByGroup") and state["skuId"] not in direct
+        ))
+
+        if direct:
+            await client.update_licenses(user_id, remove_sku_ids=direct)
+
+        logger.info(
+            f"Direct licenses removed: user={user_id}, skus={direct}, inherited={len(inherited)}, "
+            f"comment={operator_comment}"
+        )
+
+        return {
+            "status": "success",
+            "message": f"{len(direct)} licenses removed",
+            "user_id": user_id,
+            "removed_sku_ids": direct,
+            "inherited_sku_ids": inherited,
+        }
+
     # ============== パスワード操作 ==============
 
     def generate_temporary_password(self, length: int = 16) -> str:
@@ -275,21 +609,24 @@ class M365Operations:
         # 現在の認証方法を取得
         methods = await client.list_authentication_methods(user_id)
 
-        deleted_methods = []
-        for method in methods:
-            method_id = method.get("id")
-            method_type = method.get("@odata.type", "unknown")
+        # パスワードは削除しない
+        method_types = {
+            method.get("id"): method.get("@odata.type", "unknown")
+            for method in methods
+            if "password" not in method.get("@odata.type", "unknown").lower()
+        }
 
-            # パスワードは削除しない
-            if "password" in method_type.lower():
-                continue
+        # 削除は JSON バッチでまとめて実行
+        results = await client.delete_authentication_methods(user_id, list(method_types))
 
-            try:
-                await client.delete_authentication_method(user_id, method_id)
+        deleted_methods = []
+        for method_id, method_type in method_types.items():
+            error = results[method_id].error()
+            if error is None:
                 deleted_methods.append(method_type)
                 logger.info(f"Deleted authentication method: {method_type} for user {user_id}")
-            except M365APIError as e:
-                logger.warning(f"Failed to delete method {method_type}: {e}")
+            else:
+                logger.warning(f"Failed to delete method {method_type}: {error}")
 
         logger.info(f"MFA reset: user={user_id}, methods_deleted={len(deleted_methods)}, comment={operator_comment}")
 
@@ -339,6 +676,58 @@ class M365Operations:
             "graph_response": result,
         }
 
+    async def add_users_to_group(
+        self,
+        group_id: str,
+        user_ids: list[str],
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """グループに複数ユーザーを追加
+
+        追加は JSON バッチで最大20件ずつまとめて実行します。
+
+        Args:
+            group_id: グループID
+            user_ids: ユーザーID一覧
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（ユーザーごとの成否）
+        """
+        if not group_id or not user_ids or not all(user_ids):
+            raise M365ValidationError("group_id and user_ids are required")
+
+        client = self._get_client()
+
+        # グループ存在確認
+        await client.get_group(group_id)
+
+        # メンバー追加
+        results = await client.add_group_members(group_id, user_ids)
+
+        added = []
+        failed = {}
+        for user_id, response in results.items():
+            error = response.error()
+            if error is None or _already_member(response):
+                added.append(user_id)
+            else:
+                failed[user_id] = _batch_error_message(response)
+                logger.warning(f"Failed to add user to group: group={group_id}, user={user_id}, error={error}")
+
+        logger.info(
+            f"Users added to group: group={group_id}, added={len(added)}, failed={len(failed)}, "
+            f"comment={operator_comment}"
+        )
+
+        return {
+            "status": "success" if not failed else "partial" if added else "failed",
+            "message": f"{len(added)} of {len(user_ids)} users added to group",
+            "group_id": group_id,
+            "added_user_ids": added,
+            "failed": failed,
+        }
+
     async def remove_user_from_group(
         self,
         group_id: str,
@@ -385,6 +774,205 @@ class M365Operations:
         client = self._get_client()
         return await client.list_group_members(group_id)
 
+    def iter_group_members(
+        self,
+        group_id: str,
+        select: Optional[list[str]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """グループメンバー一覧をページ単位で取得
+
+        Args:
+            group_id: グループID
+            select: 取得するフィールド一覧
+            page_size: 1ページの件数
+
+        Returns:
+            メンバー一覧（1ページ分）を返す非同期イテレータ
+        """
+        if not group_id:
+            raise M365ValidationError("group_id is required")
+
+        client = self._get_client()
+        return client.iter_group_member_pages(group_id, select=select, page_size=page_size)
+
+    async def add_user_to_groups(
+        self,
+        user_id: str,
+        group_ids: list[str],
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザーを複数のグループに追加
+
+        追加は JSON バッチでまとめて実行します。すでにメンバーのグループは
+        成功として扱います。
+
+        Args:
+            user_id: ユーザーID
+            group_ids: グループID一覧
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（グループごとの成否）
+        """
+        if not user_id or not all(group_ids):
+            raise M365ValidationError("user_id and group_ids are required")
+
+        added = []
+        failed = {}
+        if group_ids:
+            client = self._get_client()
+            results = await client.add_member_to_groups(user_id, list(dict.fromkeys(group_ids)))
+            for group_id, response in results.items():
+                error = response.error()
+                if error is None or _already_member(response):
+                    added.append(group_id)
+                else:
+                    failed[group_id] = _batch_error_message(response)
+                    logger.warning(f"Failed to add user to group: group={group_id}, user={user_id}, error={error}")
+
+        logger.info(
+            f"User added to groups: user={user_id}, added={len(added)}, failed={len(failed)}, "
+            f"comment={operator_comment}"
+        )
+
+        return {
+            "status": "success" if not failed else "partial" if added else "failed",
+            "message": f"User added to {len(added)} of {len(added) + len(failed)} groups",
+            "user_id": user_id,
+            "added_group_ids": added,
+            "failed": failed,
+        }
+
+    async def remove_user_from_all_groups(
+        self,
+        user_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザーを直接所属するすべてのグループから削除
+
+        削除は JSON バッチでまとめて実行します。動的メンバーシップのグループ、
+        オンプレミスから同期されたグループ、Exchange で管理するグループ（配布リスト・
+        メールが有効なセキュリティグループ）は Graph から削除できないため残します。
+
+        Args:
+            user_id: ユーザーID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（グループごとの成否）
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+        groups = await client.list_user_groups(user_id)
+
+        skipped = [
+            group["id"] for group in groups
+            if "DynamicMembership" in (group.get("groupTypes") or [])
+            or group.get("onPremisesSyncEnabled")
+            or _exchange_managed(group)
+        ]
+        removable = [group["id"] for group in groups if group["id"] not in skipped]
+
+        removed = []
+        failed = {}
+        if removable:
+            results = await client.remove_group_memberships(user_id, removable)
+            for group_id, response in results.items():
+                # 404 はすでにメンバーでない
+                if response.ok or response.status == 404:
+                    removed.append(group_id)
+                else:
+                    failed[group_id] = _batch_error_message(response)
+                    logger.warning(f"Failed to remove user from group: group={group_id}, user={user_id}")
+
+        logger.info(
+            f"User removed from groups: user={user_id}, removed={len(removed)}, skipped={len(skipped)}, "
+            f"failed={len(failed)}, comment={operator_comment}"
+        )
+
+        return {
+            "status": "success" if not failed else "partial" if removed else "failed",
+            "message": f"User removed from {len(removed)} of {len(removable)} groups",
+            "user_id": user_id,
+            "removed_group_ids": removed,
+            "skipped_group_ids": skipped,
+            "failed": failed,
+        }
+
+    # ============== OneDrive 共有操作 ==============
+
+    async def revoke_onedrive_shares(
+        self,
+        user_id: str,
+        operator_comment: Optional[str] = None
+    ) -> dict[str, Any]:
+        """ユーザーの OneDrive の共有をすべて解除
+
+        共有されているアイテムの権限（共有リンク・ユーザーの招待）を削除します。
+        所有者の権限と親フォルダから継承した権限は残します。権限の取得・削除は
+        JSON バッチでまとめて実行します。
+
+        Args:
+            user_id: ユーザーID
+            operator_comment: オペレータコメント（監査用）
+
+        Returns:
+            実行結果（失敗したアイテム・権限を含む）
+        """
+        if not user_id:
+            raise M365ValidationError("user_id is required")
+
+        client = self._get_client()
+        try:
+            items = await client.list_shared_drive_items(user_id)
+        except M365APIError as e:
+            if e.status_code != 404:
+                raise
+            # OneDrive が作成されていない
+            items = []
+
+        failed = {}
+        permissions = []
+        if items:
+            responses = await client.list_drive_item_permissions(user_id, [item["id"] for item in items])
+            for item_id, response in responses.items():
+                if not response.ok:
+                    failed[item_id] = _batch_error_message(response)
+                    continue
+                body = response.body if isinstance(response.body, dict) else {}
+                permissions.extend(
+                    (item_id, permission["id"])
+                    for permission in body.get("value", [])
+                    if _revocable_permission(permission)
+                )
+
+        revoked = 0
+        if permissions:
+            results = await client.delete_drive_item_permissions(user_id, permissions)
+            for (item_id, permission_id), response in results.items():
+                # 404 はすでに削除済み
+                if response.ok or response.status == 404:
+                    revoked += 1
+                else:
+                    failed[f"{item_id}/{permission_id}"] = _batch_error_message(response)
+
+        logger.info(
+            f"OneDrive shares revoked: user={user_id}, items={len(items)}, revoked={revoked}, "
+            f"failed={len(failed)}, comment={operator_comment}"
+        )
+
+        return {
+            "status": "success" if not failed else "partial" if revoked else "failed",
+            "message": f"{revoked} sharing permissions revoked on {len(items)} items",
+            "user_id": user_id,
+            "shared_items": len(items),
+            "revoked_permissions": revoked,
+            "failed": failed,
+        }
+
     # ============== その他のユーティリティ ==============
 
     async def validate_upn(self, upn: str) -> bool:
@@ -417,8 +1005,14 @@ class M365Operations:
         """
         client = self._get_client()
 
+        # ライセンス情報もユーザー情報と同じリクエストで取得する
+        include_licenses = "license" in task_type.lower()
+        select = list(_SUMMARY_FIELDS)
+        if include_licenses:
+            select.append("assignedLicenses")
+
         try:
-            user = await client.get_user(target_upn)
+            user = await client.get_user(target_upn, select=select)
 
             summary = {
                 "user_id": user.get("id"),
@@ -431,9 +1025,8 @@ class M365Operations:
             }
 
             # タスクタイプに応じた追加情報
-            if "license" in task_type.lower():
-                licenses = await client.get_user_licenses(target_upn)
-                summary["current_licenses"] = licenses
+            if include_licenses:
+                summary["current_licenses"] = user.get("assignedLicenses", [])
 
             return summary
 
@@ -0,0 +1,278 @@
+"""
+Microsoft Graph 呼び出しのテナント単位のスロットリングとサーキットブレーカー
+
+プロセス内のすべての Graph リクエストが1つのリミッターを共有します。
+
+- 同時実行数は AIMD で調整します（成功ごとに少しずつ増やし、429 で半分にする）。
+  上限に達したリクエストは到着順に待ちます。
+- 429 を受けたら Retry-After の間、全員の送信を止めます（個別に再送して
+  他のリクエストが Graph を叩き続けることを防ぐ）。
+- 5xx・ネットワークエラーが続いたらサーキットを開き、回復待ちの間は Graph に
+  送らず即座に失敗させます。待ち時間の後に1件だけ試し、成功したら閉じます。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Optional
+
+import httpx
+
+from app.config import settings
+
+from .exceptions import M365APIError
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _Slot:
+    """GraphThrottle.slot() で確保した送信枠"""
+
+    def __init__(self, throttle: "GraphThrottle"):
+        self._throttle = throttle
+        self._status: Optional[int] = None
+        self._retry_after: Optional[float] = None
+
+    def record(self, response: httpx.Response) -> None:
+        """レスポンスの結果をリミッターに反映する"""
+        self._status = response.status_code
+        self._retry_after = retry_after_seconds(response.headers)
+
+    async def __aenter__(self) -> "_Slot":
+        await self._throttle.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._status is not None:
+            self._throttle.release(self._status, self._retry_after)
+        elif exc_type is not None and issubclass(exc_type, httpx.RequestError):
+            self._throttle.release(None)
+        else:
+            # キャンセルなど Graph の状態と無関係な中断
+            self._throttle.release(0)
+
+
+def retry_after_seconds(headers: Any, default: Optional[float] = None) -> Optional[float]:
+    """Retry-After ヘッダ（秒数）を読む"""
+    for key, value in headers.items():
+        if key.lower() == "retry-after" and str(value).strip().isdigit():
+            return float(value)
+    return default
+
+
+class GraphThrottle:
+    """AIMD の同時実行数制限・全体の一時停止・サーキットブレーカー"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        initial_concurrency: int,
+        failure_threshold: int,
+        recovery_seconds: float,
+        default_retry_after: float = 5.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial_concurrency = min(max(1, initial_concurrency), self.max_concurrency)
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.default_retry_after = default_retry_after
+        self._reset()
+
+    def _reset(self) -> None:
+        self._limit = float(self.initial_concurrency)
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._pausing = 0
+        self._resume_handle: Optional[asyncio.TimerHandle] = None
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self.throttle_events = 0
+        self.circuit_opened = 0
+        self.rejected = 0
+
+    # ============== 送信枠 ==============
+
+    def slot(self) -> _Slot:
+        """送信枠を確保する非同期コンテキストマネージャー
+
+        ブロック内で record(response) を呼ぶと、その結果で同時実行数と
+        サーキットの状態を更新します。
+        """
+        return _Slot(self)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _capacity(self) -> int:
+        return 1 if self._state == CircuitState.HALF_OPEN else self.limit
+
+    def _check_circuit(self) -> None:
+        if self._state == CircuitState.CLOSED:
+            return
+        if self._state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at >= self.recovery_seconds:
+                self._state = CircuitState.HALF_OPEN
+                return
+        elif self._in_flight == 0:
+            # 回復確認の1件を送れる
+            return
+        self.rejected += 1
+        raise self._circuit_error()
+
+    def _circuit_error(self) -> M365APIError:
+        retry_after = max(0.0, self.recovery_seconds - (time.monotonic() - self._opened_at))
+        return M365APIError(
+            "Microsoft Graph is unavailable (circuit open)",
+            status_code=503,
+            details={"retry_after": round(retry_after, 1)},
+        )
+
+    async def acquire(self) -> None:
+        """送信枠を確保する（一時停止中・上限到達時は待つ）
+
+        Raises:
+            M365APIError: サーキットが開いている（status_code=503）
+        """
+        while True:
+            self._check_circuit()
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                self._pausing += 1
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._pausing -= 1
+                continue
+            if self._in_flight < self._capacity() and not self._waiters:
+                self._in_flight += 1
+                return
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # 枠が空くと release から枠ごと渡される
+                await waiter
+                return
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                    self._in_flight -= 1
+                    self._dispatch()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+
+    def release(self, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """送信枠を返却し、結果を反映する
+
+        Args:
+            status: HTTPステータス（None はネットワークエラー、0 は結果なし）
+            retry_after: 429 の Retry-After（秒）
+        """
+        self._in_flight -= 1
+        if status == 429:
+            self.throttled(retry_after)
+        elif status is None or status >= 500:
+            self._failure()
+        elif status > 0:
+            self._success()
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """空いた枠を待っているリクエストに到着順に渡す"""
+        if self._paused_until > time.monotonic():
+            return
+        while self._waiters and self._in_flight < self._capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    # ============== 結果の反映 ==============
+
+    def _success(self) -> None:
+        self._consecutive_failures = 0
+        if self._state == CircuitState.HALF_OPEN:
+            self._state = CircuitState.CLOSED
+        # 加算増加: 現在の上限ぶん成功すると1増える
+        self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+    def throttled(self, retry_after: Optional[float]) -> None:
+        """429 を反映する（全体を Retry-After の間止め、同時実行数を半分にする）"""
+        now = time.monotonic()
+        self.throttle_events += 1
+        # Graph は応答しているので障害としては数えない
+        self._consecutive_failures = 0
+        if self._state == CircuitState.HALF_OPEN:
+            self._state = CircuitState.CLOSED
+        # 同じ停止期間中に続いた 429 では1回だけ減らす
+        if self._paused_until <= now:
+            self._limit = max(1.0, self._limit / 2)
+        delay = self.default_retry_after if retry_after is None else retry_after
+        if now + delay > self._paused_until:
+            self._paused_until = now + delay
+            self._schedule_resume(delay)
+
+    def _schedule_resume(self, delay: float) -> None:
+        if self._resume_handle is not None:
+            self._resume_handle.cancel()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._resume_handle = loop.call_later(delay, self._dispatch)
+
+    def _failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._state == CircuitState.HALF_OPEN or (
+            self._state == CircuitState.CLOSED and self._consecutive_failures >= self.failure_threshold
+        ):
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self.circuit_opened += 1
+            # 待っているリクエストも即座に失敗させる
+            error = self._circuit_error()
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    self.rejected += 1
+                    waiter.set_exception(error)
+
+    # ============== 管理 ==============
+
+    def clear(self) -> None:
+        if self._resume_handle is not None:
+            self._resume_handle.cancel()
+        self._reset()
+
+    def stats(self) -> dict[str, Any]:
+        """現在の同時実行数・待ち行列・スロットリングの統計"""
+        return {
+            "in_flight": self._in_flight,
+            "concurrency_limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self._waiters) + self._pausing,
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "throttle_events": self.throttle_events,
+            "circuit": {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "opened": self.circuit_opened,
+                "rejected": self.rejected,
+            },
+        }
+
+
+graph_throttle = GraphThrottle(
+    max_concurrency=settings.MS_GRAPH_MAX_CONCURRENCY,
+    initial_concurrency=settings.MS_GRAPH_INITIAL_CONCURRENCY,
+    failure_threshold=settings.MS_GRAPH_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_seconds=settings.MS_GRAPH_CIRCUIT_RECOVERY_SECONDS,
+)
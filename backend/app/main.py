@@ -4,17 +4,41 @@ Mirai HelpDesk Management System - FastAPI Application
 Main application entry point with API routes, middleware, and lifecycle events.
 """
 
+import asyncio
 import sys
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
-from app.database import init_db, close_db
+from app.database import async_session_factory, init_db, close_db
 from app.api import api_router
+from app.core.hashing import PasswordHasherBusyError, password_hasher
+from app.m365.auth import M365AuthConfig
+from app.m365.http import close_http_client, http2_available, start_http_client
+from app.services.knowledge_counters import (
+    flush_knowledge_counters,
+    run_knowledge_counter_flusher,
+)
+from app.services.knowledge_search import (
+    load_knowledge_index,
+    run_knowledge_index_saver,
+    save_knowledge_index,
+)
+from app.services.knowledge_suggest import load_knowledge_suggestions
+from app.services.m365_directory import load_directory_index, run_directory_sync
+from app.services.m365_jobs import m365_job_worker
+from app.services.ticket_suggestions import (
+    flush_similarity_indexes,
+    load_similarity_indexes,
+    run_similarity_index_saver,
+    save_similarity_indexes,
+)
+from app.services.token_revocation import load_revocations, run_revocation_sync
 from app.middleware.audit import AuditMiddleware
 
 # Windows環境でのUnicodeエンコーディング問題を解決
@@ -43,9 +67,79 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("[OK] Database initialized")
 
+    # Load revoked tokens into the in-memory revocation list
+    async with async_session_factory() as db:
+        revoked = await load_revocations(db)
+    print(f"[OK] Token revocation list loaded ({revoked} entries)")
+
+    # Load the knowledge search index and catch up with the database
+    async with async_session_factory() as db:
+        reindexed, removed = await load_knowledge_index(db)
+    print(f"[OK] Knowledge search index loaded ({reindexed} reindexed, {removed} removed)")
+
+    # Build the title / tag typeahead from the database
+    async with async_session_factory() as db:
+        suggestions = await load_knowledge_suggestions(db)
+    print(f"[OK] Knowledge typeahead built ({suggestions} articles)")
+
+    # Load the ticket / article similarity indexes and catch up with the database
+    async with async_session_factory() as db:
+        synced = await load_similarity_indexes(db)
+    for name, (reindexed, removed) in synced.items():
+        print(f"[OK] Similarity index '{name}' loaded ({reindexed} reindexed, {removed} removed)")
+
+    # Shared HTTP connection pool for Microsoft Graph
+    await start_http_client()
+    http2 = settings.MS_GRAPH_HTTP2 and http2_available()
+    print(f"[OK] Graph HTTP client ready (HTTP/2 {'enabled' if http2 else 'disabled'})")
+
+    # Load the local M365 directory mirror (kept up to date by the delta sync task)
+    async with async_session_factory() as db:
+        directory_objects = await load_directory_index(db)
+    print(f"[OK] M365 directory mirror loaded ({directory_objects} objects)")
+
+    background_tasks = []
+    if settings.TOKEN_REVOCATION_SYNC_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_revocation_sync(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+        ))
+    if settings.KNOWLEDGE_INDEX_SAVE_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_knowledge_index_saver(settings.KNOWLEDGE_INDEX_SAVE_SECONDS)
+        ))
+    if settings.SIMILARITY_INDEX_SAVE_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_similarity_index_saver(settings.SIMILARITY_INDEX_SAVE_SECONDS)
+        ))
+    if settings.M365_DIRECTORY_SYNC_SECONDS > 0 and M365AuthConfig.from_settings().is_configured():
+        background_tasks.append(asyncio.create_task(
+            run_directory_sync(settings.M365_DIRECTORY_SYNC_SECONDS)
+        ))
+    if settings.KNOWLEDGE_COUNTER_FLUSH_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_knowledge_counter_flusher(settings.KNOWLEDGE_COUNTER_FLUSH_SECONDS)
+        ))
+
+    # Background workers for queued M365 task executions
+    if settings.M365_JOB_WORKERS > 0:
+        m365_job_worker.start()
+        print(f"[OK] M365 job worker started ({settings.M365_JOB_WORKERS} concurrent jobs)")
+
     yield
 
     # Shutdown
+    await m365_job_worker.stop()
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    save_knowledge_index()
+    await flush_similarity_indexes()
+    save_similarity_indexes()
+    async with async_session_factory() as db:
+        await flush_knowledge_counters(db)
+    await close_http_client()
+    password_hasher.shutdown()
     await close_db()
     print("[STOP] Application shutdown complete")
 
@@ -77,6 +171,16 @@ if settings.AUDIT_LOG_ENABLED:
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
 
+@app.exception_handler(PasswordHasherBusyError)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError):
+    """Shed load when too many password hashes are queued."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Health check endpoint
 @app.get("/health", tags=["Health"])
 async def health_check():
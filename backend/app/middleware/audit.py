@@ -12,7 +12,7 @@ from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
-from app.core.security import verify_token
+from app.core.auth_context import get_auth_context
 from utils.audit_log import log_api_operation
 
 
@@ -102,27 +102,17 @@ class AuditMiddleware(BaseHTTPMiddleware):
         return False
 
     async def _get_user_info(self, request: Request) -> tuple[int | None, str]:
-        """リクエストから認証ユーザー情報を取得"""
-        try:
-            # Authorization ヘッダーからトークンを取得
-            auth_header = request.headers.get("authorization", "")
-            if not auth_header.startswith("Bearer "):
-                return None, ""
-
-            token = auth_header.split(" ")[1]
-            payload = verify_token(token)
+        """リクエストから認証ユーザー情報を取得
 
-            if not payload:
+        トークン検証結果は request.state に保持され、後続の認証依存関係
+        (get_current_user) でも再利用されます。
+        """
+        try:
+            context = get_auth_context(request)
+            if context is None:
                 return None, ""
 
-            # トークンペイロードからユーザー情報を取得
-            # subject には "user_id:email" の形式を想定
-            subject = payload.get("sub", "")
-            if ":" in subject:
-                user_id_str, email = subject.split(":", 1)
-                return int(user_id_str), email
-
-            return None, subject
+            return context.user_id, context.email
 
         except Exception:
             # トークン検証失敗時はNoneを返す
@@ -9,11 +9,29 @@ from app.models.ticket import Ticket, TicketStatus, TicketType, TicketPriority,
 from app.models.comment import Comment, CommentVisibility
 from app.models.attachment import Attachment
 from app.models.approval import Approval, ApprovalStatus
-from app.models.m365_task import M365Task, M365TaskType, M365TaskStatus, M365ExecutionLog
-from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
-from app.models.audit_log import AuditLog, AuditAction
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365JobStatus,
+    M365StepStatus,
+    M365TargetStatus,
+    M365Task,
+    M365TaskStatus,
+    M365TaskTarget,
+    M365TaskType,
+    M365WorkflowStep,
+)
+from app.models.m365_directory import DirectoryObjectKind, M365DeltaLink, M365DirectoryObject
+from app.models.knowledge import (
+    KnowledgeArticle,
+    KnowledgeRelatedArticle,
+    KnowledgeVisibility,
+    KnowledgeVote,
+)
+from app.models.audit_log import AuditLog, AuditAction, AuditLogRollup
 from app.models.ticket_history import TicketHistory, HistoryAction
 from app.models.sla_policy import SLAPolicy
+from app.models.revoked_token import RevokedToken, RevocationKind
 
 __all__ = [
     # User
@@ -38,15 +56,30 @@ __all__ = [
     "M365TaskType",
     "M365TaskStatus",
     "M365ExecutionLog",
+    "M365Job",
+    "M365JobStatus",
+    "M365TaskTarget",
+    "M365TargetStatus",
+    "M365WorkflowStep",
+    "M365StepStatus",
+    "M365DirectoryObject",
+    "M365DeltaLink",
+    "DirectoryObjectKind",
     # Knowledge
     "KnowledgeArticle",
     "KnowledgeVisibility",
+    "KnowledgeVote",
+    "KnowledgeRelatedArticle",
     # Audit
     "AuditLog",
     "AuditAction",
+    "AuditLogRollup",
     # Ticket History
     "TicketHistory",
     "HistoryAction",
     # SLA Policy
     "SLAPolicy",
+    # Token Revocation
+    "RevokedToken",
+    "RevocationKind",
 ]
@@ -6,10 +6,23 @@ Required for compliance and security auditing.
 """
 
 import enum
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Enum, Integer, String, Text, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import (
+    Connection,
+    DateTime,
+    Enum,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+    func,
+    inspect,
+    update,
+)
+from sqlalchemy.orm import Mapped, Session, mapped_column
 
 from app.database import Base
 
@@ -73,9 +86,14 @@ class AuditLog(Base):
     
     This table is append-only. Records should never be updated or deleted.
     All operations are logged with: who, when, what, and why.
+
+    On SQLite, closed months are moved out to audit_logs_YYYY_MM tables, so ids
+    use AUTOINCREMENT to never be reused once the hot table has been emptied
+    (tables created before that are rebuilt by migrate_sqlite_autoincrement).
     """
     
     __tablename__ = "audit_logs"
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -138,3 +156,101 @@ class AuditLog(Base):
             reason=reason,
             related_ticket_id=related_ticket_id,
         )
+
+
+class AuditLogRollup(Base):
+    """
+    Hourly pre-aggregated audit log counts.
+
+    One row per (hour, action, resource_type). Maintained incrementally on every
+    AuditLog insert and rebuildable from audit_logs by the backfill job
+    (app.jobs.audit_rollup), so statistics never have to scan audit_logs.
+    """
+
+    __tablename__ = "audit_log_rollup"
+    __table_args__ = (
+        UniqueConstraint("hour", "action", "resource_type", name="uq_audit_log_rollup_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    # Start of the hour bucket (UTC)
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    action: Mapped[AuditAction] = mapped_column(Enum(AuditAction), nullable=False)
+    resource_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<AuditLogRollup(hour={self.hour}, action={self.action}, resource={self.resource_type}, count={self.count})>"
+
+
+def hour_bucket(value: datetime) -> datetime:
+    """Truncate a timestamp to the start of its UTC hour."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def increment_rollup(
+    connection: Connection,
+    counts: Counter[tuple[datetime, AuditAction, str]],
+) -> None:
+    """
+    Add counts to audit_log_rollup, creating missing buckets.
+
+    Uses INSERT ... ON CONFLICT DO UPDATE on SQLite/PostgreSQL so concurrent
+    writers never lose increments; other dialects fall back to UPDATE then INSERT.
+    """
+    table = AuditLogRollup.__table__
+    dialect = connection.dialect.name
+
+    for (hour, action, resource_type), n in counts.items():
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+
+            stmt = insert(table).values(
+                hour=hour, action=action, resource_type=resource_type, count=n
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.hour, table.c.action, table.c.resource_type],
+                set_={"count": table.c.count + stmt.excluded.count},
+            )
+            connection.execute(stmt)
+            continue
+
+        result = connection.execute(
+            update(table)
+            .where(
+                table.c.hour == hour,
+                table.c.action == action,
+                table.c.resource_type == resource_type,
+            )
+            .values(count=table.c.count + n)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                table.insert().values(
+                    hour=hour, action=action, resource_type=resource_type, count=n
+                )
+            )
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_new_audit_logs(session: Session, flush_context) -> None:
+    """Fold newly inserted audit logs into their hourly rollup buckets."""
+    new_logs = [obj for obj in session.new if isinstance(obj, AuditLog)]
+    if not new_logs:
+        return
+
+    now = datetime.now(timezone.utc)
+    counts: Counter[tuple[datetime, AuditAction, str]] = Counter()
+    for log in new_logs:
+        # created_at is usually a server default; read the loaded value only
+        # (never trigger a refresh mid-flush) and fall back to "now".
+        created_at = inspect(log).dict.get("created_at") or now
+        counts[(hour_bucket(created_at), log.action, log.resource_type)] += 1
+
+    increment_rollup(session.connection(), counts)
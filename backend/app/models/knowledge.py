@@ -8,7 +8,7 @@ import enum
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Boolean, DateTime, Enum, Float, ForeignKey, Integer, SmallInteger, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -99,3 +99,53 @@ class KnowledgeArticle(Base):
         if total == 0:
             return 0.0
         return self.helpful_count / total
+
+
+class KnowledgeVote(Base):
+    """Helpfulness vote: at most one per user and article.
+
+    The composite primary key doubles as the unique index that enforces the
+    one-vote rule, so a row is just two integers, a flag and a timestamp.
+    The article's helpful_count / not_helpful_count hold the running totals.
+    """
+
+    __tablename__ = "knowledge_votes"
+
+    article_id: Mapped[int] = mapped_column(
+        ForeignKey("knowledge_articles.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    helpful: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    voted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<KnowledgeVote(article_id={self.article_id}, user_id={self.user_id}, helpful={self.helpful})>"
+
+
+class KnowledgeRelatedArticle(Base):
+    """Precomputed "related articles" list, rebuilt nightly.
+
+    Rows are keyed by (article_id, rank) so an article's list is one
+    primary-key range scan in display order.
+    """
+
+    __tablename__ = "knowledge_related_articles"
+
+    article_id: Mapped[int] = mapped_column(
+        ForeignKey("knowledge_articles.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    related_id: Mapped[int] = mapped_column(
+        ForeignKey("knowledge_articles.id", ondelete="CASCADE"), nullable=False
+    )
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<KnowledgeRelatedArticle(article_id={self.article_id}, rank={self.rank}, "
+            f"related_id={self.related_id})>"
+        )
@@ -0,0 +1,74 @@
+"""
+M365 Directory Mirror Models
+
+Local copy of Entra ID (Azure AD) users and groups, kept up to date with
+Graph delta queries (``/users/delta``, ``/groups/delta``). The typeahead
+user search is served from this mirror instead of calling Graph on every
+keystroke.
+
+Deleted directory objects are kept as tombstones (``is_deleted``) so that
+other workers can drop them from their in-memory index; ``synced_at`` is
+the local time of the last change and drives that incremental refresh.
+"""
+
+import enum
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Enum, Index, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class DirectoryObjectKind(str, enum.Enum):
+    """Kind of mirrored directory object."""
+    USER = "user"
+    GROUP = "group"
+
+
+class M365DirectoryObject(Base):
+    """Mirrored Entra ID user or group."""
+
+    __tablename__ = "m365_directory_objects"
+    __table_args__ = (
+        Index("ix_m365_directory_objects_kind_display_name", "kind", "display_name"),
+    )
+
+    # Graph object ID
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[DirectoryObjectKind] = mapped_column(Enum(DirectoryObjectKind), nullable=False)
+    display_name: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    user_principal_name: Mapped[str | None] = mapped_column(String(256), nullable=True, index=True)
+    mail: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    job_title: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    department: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    account_enabled: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
+    is_deleted: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    synced_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+
+    def __repr__(self) -> str:
+        return f"<M365DirectoryObject(id={self.id}, kind={self.kind}, display_name={self.display_name})>"
+
+
+class M365DeltaLink(Base):
+    """Graph delta link of the last completed sync round per resource."""
+
+    __tablename__ = "m365_delta_links"
+
+    # "users" / "groups"
+    resource: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # None until the first full sync round has completed
+    delta_link: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # Worker currently allowed to sync this resource (one worker per interval)
+    lease_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<M365DeltaLink(resource={self.resource}, updated_at={self.updated_at})>"
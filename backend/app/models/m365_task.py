@@ -8,7 +8,7 @@ import enum
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import DateTime, Enum, ForeignKey, String, Text, func
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer, String, Text, UniqueConstraint, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -34,6 +34,8 @@ class M365TaskType(str, enum.Enum):
     USER_OFFBOARD = "user_offboard"          # 退職者処理
     USER_ONBOARD = "user_onboard"            # 新規ユーザー作成
     SECURITY_GROUP = "security_group"        # セキュリティグループ操作
+    BULK_LICENSE_ASSIGN = "bulk_license_assign"  # ライセンス一括付与
+    BULK_GROUP_ADD = "bulk_group_add"        # グループ一括追加
     OTHER = "other"                          # その他
 
 
@@ -46,6 +48,28 @@ class M365TaskStatus(str, enum.Enum):
     ROLLED_BACK = "rolled_back"  # ロールバック済み
 
 
+class M365JobStatus(str, enum.Enum):
+    """Background execution job status."""
+    QUEUED = "queued"          # 実行待ち（リトライ待ちを含む）
+    RUNNING = "running"        # 実行中（リース保持）
+    SUCCEEDED = "succeeded"    # 成功
+    FAILED = "failed"          # 失敗
+
+
+class M365TargetStatus(str, enum.Enum):
+    """Per-target status of a bulk M365 task."""
+    PENDING = "pending"        # 未実施
+    SUCCEEDED = "succeeded"    # 成功
+    FAILED = "failed"          # 失敗
+
+
+class M365StepStatus(str, enum.Enum):
+    """Per-step status of an onboarding/offboarding workflow."""
+    PENDING = "pending"        # 未実施（前のステップの完了待ちを含む）
+    SUCCEEDED = "succeeded"    # 成功
+    FAILED = "failed"          # 失敗
+
+
 class M365Task(Base):
     """M365 operation task model."""
     
@@ -86,11 +110,80 @@ class M365Task(Base):
     execution_logs: Mapped[list["M365ExecutionLog"]] = relationship(
         "M365ExecutionLog", back_populates="task", cascade="all, delete-orphan"
     )
+    targets: Mapped[list["M365TaskTarget"]] = relationship(
+        "M365TaskTarget", back_populates="task", cascade="all, delete-orphan"
+    )
+    workflow_steps: Mapped[list["M365WorkflowStep"]] = relationship(
+        "M365WorkflowStep", back_populates="task", cascade="all, delete-orphan"
+    )
     
     def __repr__(self) -> str:
         return f"<M365Task(id={self.id}, type={self.task_type}, status={self.status})>"
 
 
+class M365TaskTarget(Base):
+    """Target user of a bulk M365 task (one row per UPN).
+
+    The status is checkpointed as each batch of targets completes, so a
+    retried or re-executed job only processes the targets still pending.
+    """
+
+    __tablename__ = "m365_task_targets"
+    __table_args__ = (
+        Index("ix_m365_task_targets_task_id_status", "task_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("m365_tasks.id", ondelete="CASCADE"), nullable=False)
+    target_upn: Mapped[str] = mapped_column(String(255), nullable=False)
+    status: Mapped[M365TargetStatus] = mapped_column(
+        Enum(M365TargetStatus), default=M365TargetStatus.PENDING, nullable=False
+    )
+    error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    task: Mapped["M365Task"] = relationship("M365Task", back_populates="targets")
+
+    def __repr__(self) -> str:
+        return f"<M365TaskTarget(id={self.id}, task_id={self.task_id}, status={self.status})>"
+
+
+class M365WorkflowStep(Base):
+    """Step of an onboarding/offboarding workflow task (one row per step).
+
+    The status and result are checkpointed as each step completes, so a
+    retried or re-executed job only runs the steps that have not succeeded.
+    """
+
+    __tablename__ = "m365_workflow_steps"
+    __table_args__ = (
+        UniqueConstraint("task_id", "step_key", name="uq_m365_workflow_steps_task_id_step_key"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("m365_tasks.id", ondelete="CASCADE"), nullable=False)
+    step_key: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[M365StepStatus] = mapped_column(
+        Enum(M365StepStatus), default=M365StepStatus.PENDING, nullable=False
+    )
+    # Step parameters (JSON, e.g. license SKUs of onboarding)
+    params: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # Result of the last run
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    task: Mapped["M365Task"] = relationship("M365Task", back_populates="workflow_steps")
+
+    def __repr__(self) -> str:
+        return f"<M365WorkflowStep(id={self.id}, task_id={self.task_id}, step={self.step_key}, status={self.status})>"
+
+
 class M365ExecutionLog(Base):
     """Execution log for M365 operations (audit trail)."""
     
@@ -125,3 +218,66 @@ class M365ExecutionLog(Base):
     
     def __repr__(self) -> str:
         return f"<M365ExecutionLog(id={self.id}, task_id={self.task_id}, result={self.result})>"
+
+
+class M365Job(Base):
+    """Queued Graph API execution of an M365 task.
+
+    Workers claim a job by taking a lease (``lease_owner`` / ``lease_expires_at``);
+    a job whose lease expired without completion is claimed again by another
+    worker. The execution log is written when the job completes. A task has
+    at most one queued or running job (enforced by a partial unique index).
+    """
+
+    __tablename__ = "m365_jobs"
+    __table_args__ = (
+        Index("ix_m365_jobs_status_available_at", "status", "available_at"),
+        Index(
+            "uq_m365_jobs_active_task_id",
+            "task_id",
+            unique=True,
+            sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("m365_tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    operator_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+
+    # Client supplied Idempotency-Key (same key returns the same job)
+    idempotency_key: Mapped[str | None] = mapped_column(String(128), nullable=True, unique=True)
+
+    status: Mapped[M365JobStatus] = mapped_column(
+        Enum(M365JobStatus), default=M365JobStatus.QUEUED, nullable=False
+    )
+    # Execution request (JSON: action, command_or_action)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+
+    # Retries
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    # Lease
+    lease_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # Result
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    # 結果から取り除いた初期パスワードなど（JSON。ジョブの取得で1回だけ返し、返した時点で消す）
+    secrets: Mapped[str | None] = mapped_column(Text, nullable=True)
+    error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    execution_log_id: Mapped[int | None] = mapped_column(
+        ForeignKey("m365_execution_logs.id"), nullable=True
+    )
+
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<M365Job(id={self.id}, task_id={self.task_id}, status={self.status})>"
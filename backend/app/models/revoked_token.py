@@ -0,0 +1,53 @@
+"""
+Revoked Token Model
+
+Persisted JWT revocations. Each row revokes either a single token (by its
+``jti`` claim) or a whole refresh-token family (``fam`` claim: every access
+and refresh token issued from one login). Rows are only needed until the
+tokens they cover would have expired anyway.
+"""
+
+import enum
+from datetime import datetime
+
+from sqlalchemy import DateTime, Enum, Integer, String, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class RevocationKind(str, enum.Enum):
+    """What a revocation row refers to."""
+    TOKEN = "token"    # 単一トークン (jti)
+    FAMILY = "family"  # ログインセッション単位 (fam)
+
+
+class RevokedToken(Base):
+    """Revoked token or token family."""
+
+    __tablename__ = "revoked_tokens"
+    __table_args__ = (
+        UniqueConstraint("kind", "value", name="uq_revoked_tokens_kind_value"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[RevocationKind] = mapped_column(Enum(RevocationKind), nullable=False)
+    value: Mapped[str] = mapped_column(String(64), nullable=False)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    reason: Mapped[str | None] = mapped_column(String(50), nullable=True)
+
+    # Latest expiry of any token covered by this row; pruned afterwards
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    revoked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    # Set by the database on insert and on every upsert; workers sync on it
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(),
+        nullable=False, index=True,
+    )
+
+    def __repr__(self) -> str:
+        return f"<RevokedToken(kind={self.kind}, value={self.value}, expires_at={self.expires_at})>"
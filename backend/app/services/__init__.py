@@ -0,0 +1,3 @@
+"""
+Service modules for Mirai HelpDesk Management System.
+"""
@@ -0,0 +1,375 @@
+"""
+監査ログのパーティション管理
+
+audit_logs を created_at の月単位で分割し、範囲クエリが対象月だけを読むように
+します。保持期間（AUDIT_LOG_RETENTION_DAYS）を過ぎた月は圧縮ファイルへ
+エクスポートしたうえでテーブルごと削除（DROP）します。
+
+- PostgreSQL: audit_logs を RANGE (created_at) のネイティブパーティション親表
+  として作成し、月ごとの子表 audit_logs_YYYY_MM を事前作成します。
+  範囲指定のクエリはプランナーのパーティションプルーニングで絞り込まれます。
+- SQLite: audit_logs は当月分の書き込み先として残し、締め済みの月は
+  audit_logs_YYYY_MM テーブルへ移します。全期間は audit_logs_all ビューで
+  参照でき、範囲指定のクエリは audit_log_source() が対象月のテーブルのみを
+  UNION ALL した選択元に振り分けます。ID は AUTOINCREMENT で採番し、締めで
+  audit_logs が空になっても再利用しません（AUTOINCREMENT なしで作成済みの
+  テーブルは起動時・締めの前に作り直します）。
+"""
+
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    MetaData,
+    PrimaryKeyConstraint,
+    Table,
+    delete,
+    inspect,
+    select,
+    text,
+    union_all,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.audit_log import AuditLog, AuditLogRollup
+
+
+PARENT_TABLE = "audit_logs"
+ALL_VIEW = "audit_logs_all"
+DEFAULT_PARTITION = "audit_logs_default"
+
+# PostgreSQL で事前作成する将来月数（当月を含まない）
+PRECREATE_MONTHS = 2
+
+_PARTITION_PATTERN = re.compile(r"^audit_logs_(\d{4})_(\d{2})$")
+_SQLITE_TIMESTAMP = "%Y-%m-%d %H:%M:%S"
+
+
+# ============== 月の計算 ==============
+
+def month_start(value: datetime) -> datetime:
+    """value を含む月の初日 00:00 (UTC) を返す"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """月初日時に months か月を加算する"""
+    index = month.year * 12 + (month.month - 1) + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    """月のパーティション名（audit_logs_YYYY_MM）"""
+    return f"{PARENT_TABLE}_{month.year:04d}_{month.month:02d}"
+
+
+def parse_partition_name(name: str) -> datetime | None:
+    """パーティション名から月初日時を取得（対象外の名前は None）"""
+    match = _PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+
+def list_partitions(connection: Connection) -> list[datetime]:
+    """存在する月次パーティションの月初日時を昇順で返す"""
+    months = [
+        parse_partition_name(name)
+        for name in inspect(connection).get_table_names()
+    ]
+    return sorted(m for m in months if m is not None)
+
+
+# ============== スキーマ準備 ==============
+
+def _partitioned_parent_table() -> Table:
+    """PostgreSQL 用のパーティション親表定義
+
+    パーティションキーは主キーに含める必要があるため (id, created_at) を
+    主キーとします。ORM 側の同一性は従来どおり id のみで扱います。
+    """
+    table = AuditLog.__table__.to_metadata(MetaData())
+    table.c.id.autoincrement = True
+    table.c.created_at.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.created_at))
+    table.dialect_kwargs["postgresql_partition_by"] = "RANGE (created_at)"
+    return table
+
+
+def create_partitioned_audit_logs(connection: Connection) -> None:
+    """audit_logs をパーティション親表として作成する（PostgreSQL のみ）
+
+    Base.metadata.create_all より前に呼び出します。既に audit_logs が存在する
+    場合は何もしません（既存の非パーティション表の移行は対象外）。
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    if inspect(connection).has_table(PARENT_TABLE):
+        return
+    _partitioned_parent_table().create(connection)
+
+
+def ensure_postgres_partition(connection: Connection, month: datetime) -> None:
+    """指定月のパーティションを作成する（既存なら何もしない）"""
+    start = month_start(month)
+    end = add_months(start, 1)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} "
+        f"PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def rebuild_sqlite_view(connection: Connection) -> None:
+    """audit_logs と全月次テーブルを UNION ALL した audit_logs_all ビューを再作成"""
+    sources = [PARENT_TABLE] + [partition_name(m) for m in list_partitions(connection)]
+    connection.execute(text(f"DROP VIEW IF EXISTS {ALL_VIEW}"))
+    connection.execute(text(
+        f"CREATE VIEW {ALL_VIEW} AS "
+        + " UNION ALL ".join(f"SELECT * FROM {name}" for name in sources)
+    ))
+
+
+def migrate_sqlite_autoincrement(connection: Connection) -> bool:
+    """AUTOINCREMENT なしで作成された audit_logs を作り直す（SQLite のみ）
+
+    AUTOINCREMENT のない INTEGER PRIMARY KEY は max(rowid) + 1 を採番するため、
+    締めで audit_logs が空になると月次テーブルに移したログと同じIDを再利用し、
+    audit_logs_all ビューでIDが重複します。既存の行を AUTOINCREMENT つきの
+    テーブルへ移し、採番の起点を月次テーブルを含めた最大IDに合わせます。
+
+    Returns:
+        作り直した場合 True
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    ddl = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": PARENT_TABLE},
+    ).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return False
+
+    legacy = f"{PARENT_TABLE}_without_autoincrement"
+    columns = ", ".join(column.name for column in AuditLog.__table__.columns)
+    # ビューは名前の変更に追従させず、最後に作り直す
+    connection.execute(text(f"DROP VIEW IF EXISTS {ALL_VIEW}"))
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}"))
+    for index in inspect(connection).get_indexes(legacy):
+        connection.execute(text(f"DROP INDEX {index['name']}"))
+    AuditLog.__table__.create(connection)
+    connection.execute(text(f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {legacy}"))
+    connection.execute(text(f"DROP TABLE {legacy}"))
+
+    last_id = max(
+        [connection.execute(text(f"SELECT coalesce(max(id), 0) FROM {PARENT_TABLE}")).scalar()]
+        + [
+            connection.execute(text(f"SELECT coalesce(max(id), 0) FROM {partition_name(month)}")).scalar()
+            for month in list_partitions(connection)
+        ]
+    )
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": PARENT_TABLE})
+    connection.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+        {"name": PARENT_TABLE, "seq": last_id},
+    )
+    rebuild_sqlite_view(connection)
+    return True
+
+
+def ensure_audit_partitions(connection: Connection, now: datetime | None = None) -> None:
+    """起動時・ジョブ実行時のパーティション整備
+
+    PostgreSQL では当月から PRECREATE_MONTHS か月先までのパーティションと
+    DEFAULT パーティションを、SQLite では audit_logs_all ビューを用意します
+    （SQLite の audit_logs が AUTOINCREMENT なしの場合は先に作り直します）。
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        current = month_start(now or datetime.now(timezone.utc))
+        for offset in range(PRECREATE_MONTHS + 1):
+            ensure_postgres_partition(connection, add_months(current, offset))
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+        ))
+    elif dialect == "sqlite":
+        migrate_sqlite_autoincrement(connection)
+        rebuild_sqlite_view(connection)
+
+
+def seal_sqlite_partitions(connection: Connection, now: datetime | None = None) -> list[str]:
+    """当月より前のログを audit_logs から月次テーブルへ移す（SQLite のみ）
+
+    Returns:
+        行を移した月次テーブル名の一覧
+    """
+    if connection.dialect.name != "sqlite":
+        return []
+    migrate_sqlite_autoincrement(connection)
+
+    cutoff = month_start(now or datetime.now(timezone.utc))
+    months = connection.execute(
+        text(
+            f"SELECT DISTINCT substr(created_at, 1, 7) FROM {PARENT_TABLE} "
+            "WHERE created_at < :cutoff"
+        ),
+        {"cutoff": cutoff.strftime(_SQLITE_TIMESTAMP)},
+    ).scalars().all()
+
+    sealed = []
+    for value in sorted(months):
+        start = datetime.strptime(value, "%Y-%m").replace(tzinfo=timezone.utc)
+        name = partition_name(start)
+        bounds = {
+            "start": start.strftime(_SQLITE_TIMESTAMP),
+            "end": add_months(start, 1).strftime(_SQLITE_TIMESTAMP),
+        }
+        where = "WHERE created_at >= :start AND created_at < :end"
+
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM {PARENT_TABLE} WHERE 0"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{name}_created_at ON {name} (created_at)"
+        ))
+        connection.execute(text(f"INSERT INTO {name} SELECT * FROM {PARENT_TABLE} {where}"), bounds)
+        connection.execute(text(f"DELETE FROM {PARENT_TABLE} {where}"), bounds)
+        sealed.append(name)
+
+    if sealed:
+        rebuild_sqlite_view(connection)
+    return sealed
+
+
+# ============== クエリの振り分け ==============
+
+def _partition_table(name: str) -> Table:
+    """月次テーブルを audit_logs と同じ列構成の Table として参照する"""
+    return Table(
+        name,
+        MetaData(),
+        *(Column(column.name, column.type) for column in AuditLog.__table__.columns),
+    )
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """タイムゾーンなしの日時を UTC として扱う"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _route(connection: Connection, start: datetime | None, end: datetime | None):
+    if connection.dialect.name != "sqlite":
+        return AuditLog
+
+    names = [
+        partition_name(month)
+        for month in list_partitions(connection)
+        if (start is None or add_months(month, 1) > start)
+        and (end is None or month <= end)
+    ]
+    if not names:
+        return AuditLog
+
+    routed = union_all(
+        select(AuditLog.__table__),
+        *(select(_partition_table(name)) for name in names),
+    ).subquery("audit_logs_routed")
+    return aliased(AuditLog, routed)
+
+
+async def audit_log_source(
+    db: AsyncSession,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """期間 [start, end] のログを含むパーティションだけを対象にした AuditLog エンティティ
+
+    PostgreSQL ではネイティブのパーティションプルーニングに任せて AuditLog を
+    そのまま返します。SQLite では月次テーブルがなければ audit_logs のみ、
+    あれば範囲に重なる月次テーブルと audit_logs の UNION ALL を AuditLog として
+    エイリアスしたものを返します（select(source).where(source.created_at ...)
+    のように AuditLog と同じ書き方で使えます）。
+    """
+    start = _as_utc(start)
+    end = _as_utc(end)
+    connection = await db.connection()
+    return await connection.run_sync(lambda sync_conn: _route(sync_conn, start, end))
+
+
+# ============== アーカイブ ==============
+
+def export_partition(connection: Connection, name: str, archive_dir: Path) -> Path:
+    """パーティションの全行を gzip 圧縮した JSON Lines にエクスポートする"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.jsonl.gz"
+    tmp_path = path.with_suffix(".gz.tmp")
+
+    rows = connection.execute(text(f"SELECT * FROM {name} ORDER BY id")).mappings()
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as handle:
+        for row in rows:
+            handle.write(json.dumps(dict(row), ensure_ascii=False, default=str))
+            handle.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def drop_partition(connection: Connection, name: str) -> None:
+    """パーティションを切り離して削除する（行数に依存しない DROP）
+
+    統計がアーカイブ済みの月を数え続けないよう、同じ月の audit_log_rollup の
+    バケットも同じトランザクションで削除します。
+    """
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+    month = parse_partition_name(name)
+    if month is not None:
+        connection.execute(
+            delete(AuditLogRollup.__table__).where(
+                AuditLogRollup.hour >= month,
+                AuditLogRollup.hour < add_months(month, 1),
+            )
+        )
+    if connection.dialect.name == "sqlite":
+        rebuild_sqlite_view(connection)
+
+
+def archive_expired_partitions(
+    connection: Connection,
+    archive_dir: Path,
+    retention_days: int,
+    now: datetime | None = None,
+) -> list[Path]:
+    """保持期間を過ぎた月のパーティションをエクスポートして削除する
+
+    月の末日が保持期間の境界より前の月のみ対象とし、境界をまたぐ月は
+    次回以降に持ち越します。
+
+    Returns:
+        作成したアーカイブファイルの一覧
+    """
+    now = now or datetime.now(timezone.utc)
+    ensure_audit_partitions(connection, now)
+    seal_sqlite_partitions(connection, now)
+
+    boundary = now - timedelta(days=retention_days)
+    archived = []
+    for month in list_partitions(connection):
+        if add_months(month, 1) > boundary:
+            continue
+        name = partition_name(month)
+        archived.append(export_partition(connection, name, archive_dir))
+        drop_partition(connection, name)
+    return archived
@@ -0,0 +1,154 @@
+"""
+監査ログ集計サービス
+
+audit_log_rollup（時間単位の事前集計テーブル）を使った統計取得と、
+audit_logs からの再集計（バックフィル）を提供します。
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.audit_log import (
+    AuditAction,
+    AuditLogRollup,
+    hour_bucket,
+    increment_rollup,
+)
+from app.services.audit_partitions import audit_log_source
+
+
+def _next_hour(value: datetime) -> datetime:
+    """value 以上で最初の正時を返す"""
+    floor = hour_bucket(value)
+    return floor if floor == value.astimezone(timezone.utc) else floor + timedelta(hours=1)
+
+
+def _bucket_expression(dialect: str, created_at):
+    """created_at を時間単位に切り捨てるSQL式"""
+    if dialect == "postgresql":
+        return func.date_trunc("hour", created_at)
+    return func.strftime("%Y-%m-%d %H:00:00", created_at)
+
+
+def _parse_bucket(value: datetime | str) -> datetime:
+    """集計SQLの戻り値（SQLiteでは文字列）を UTC datetime に変換"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return hour_bucket(value)
+
+
+async def get_rollup_statistics(
+    db: AsyncSession,
+    period_start: datetime,
+    period_end: datetime,
+) -> tuple[int, dict[str, int], dict[str, int]]:
+    """
+    指定期間の監査ログ件数を集計する。
+
+    正時から始まる時間帯は audit_log_rollup の合計、期間先頭の端数（1時間未満）
+    のみ該当パーティションの audit_logs を直接数えるため、期間が1年でも
+    読み取る行数は「時間数 × 種別数」程度に収まります。
+
+    Returns:
+        (総件数, アクション別件数, リソース種別別件数)
+    """
+    by_action: Counter[str] = Counter()
+    by_resource: Counter[str] = Counter()
+
+    rollup_start = _next_hour(period_start)
+
+    # 事前集計済みの時間帯
+    rollup_result = await db.execute(
+        select(
+            AuditLogRollup.action,
+            AuditLogRollup.resource_type,
+            func.sum(AuditLogRollup.count),
+        )
+        .where(
+            AuditLogRollup.hour >= rollup_start,
+            AuditLogRollup.hour <= period_end,
+        )
+        .group_by(AuditLogRollup.action, AuditLogRollup.resource_type)
+    )
+    rows = list(rollup_result)
+
+    # 期間先頭の端数
+    if rollup_start > period_start:
+        edge_end = min(rollup_start, period_end)
+        source = await audit_log_source(db, period_start, edge_end)
+        edge_result = await db.execute(
+            select(source.action, source.resource_type, func.count(source.id))
+            .where(
+                source.created_at >= period_start,
+                source.created_at < edge_end,
+            )
+            .group_by(source.action, source.resource_type)
+        )
+        rows.extend(edge_result)
+
+    for action, resource_type, count in rows:
+        action_key = action.value if isinstance(action, AuditAction) else str(action)
+        by_action[action_key] += int(count or 0)
+        by_resource[resource_type] += int(count or 0)
+
+    return sum(by_action.values()), dict(by_action), dict(by_resource)
+
+
+async def rebuild_audit_rollup(
+    db: AsyncSession,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> int:
+    """
+    audit_logs から audit_log_rollup を再構築する（バックフィル）。
+
+    対象範囲は正時単位に広げられ、範囲内の既存バケットは削除してから
+    GROUP BY の結果で置き換えます。コミットは呼び出し側で行います。
+
+    Args:
+        db: データベースセッション
+        start: 再集計の開始日時（省略時は全期間）
+        end: 再集計の終了日時（省略時は全期間）
+
+    Returns:
+        書き込んだバケット数
+    """
+    if start is not None:
+        start = hour_bucket(start)
+    if end is not None:
+        end = _next_hour(end)
+    source = await audit_log_source(db, start, end)
+
+    conditions = []
+    rollup_conditions = []
+    if start is not None:
+        conditions.append(source.created_at >= start)
+        rollup_conditions.append(AuditLogRollup.hour >= start)
+    if end is not None:
+        conditions.append(source.created_at < end)
+        rollup_conditions.append(AuditLogRollup.hour < end)
+
+    connection = await db.connection()
+    bucket = _bucket_expression(connection.dialect.name, source.created_at).label("bucket")
+
+    query = select(
+        bucket, source.action, source.resource_type, func.count(source.id)
+    ).group_by(bucket, source.action, source.resource_type)
+    if conditions:
+        query = query.where(and_(*conditions))
+
+    counts: Counter = Counter()
+    for hour, action, resource_type, count in await db.execute(query):
+        counts[(_parse_bucket(hour), action, resource_type)] += count
+
+    delete_stmt = delete(AuditLogRollup)
+    if rollup_conditions:
+        delete_stmt = delete_stmt.where(and_(*rollup_conditions))
+    await db.execute(delete_stmt)
+
+    await connection.run_sync(lambda sync_conn: increment_rollup(sync_conn, counts))
+
+    return len(counts)
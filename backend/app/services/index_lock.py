@@ -0,0 +1,70 @@
+"""
+索引ファイルの保存担当ロック
+
+検索インデックス・ベクトル索引はワーカー（プロセス）ごとにメモリ上に持ち、
+同じファイルへ保存します。全ワーカーがそれぞれの内容で上書きしないよう、
+保存先ごとのロックファイルを OS のファイルロックで取得できた1プロセスだけが
+保存を担当します。
+
+- ロックはプロセスの終了まで保持します（担当のプロセスが終了するとロックは
+  OS が解放し、次に取得を試みたプロセスが担当を引き継ぎます）。
+- 担当でないプロセスは保存されたファイルを読み込み直し、DB と差分同期して
+  他のワーカーでの変更を取り込みます（索引の内容の正は DB）。
+"""
+
+import sys
+import threading
+from pathlib import Path
+from typing import IO
+
+
+_held: dict[Path, IO[bytes]] = {}
+_held_lock = threading.Lock()
+
+
+def lock_path(path: Path) -> Path:
+    """保存先に対応するロックファイルのパス"""
+    return path.with_name(path.name + ".lock")
+
+
+def _try_lock(file: IO[bytes]) -> bool:
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def acquire_saver_lock(path: Path) -> bool:
+    """保存先の保存担当ロックを取得する
+
+    Returns:
+        このプロセスが保存担当の場合 True（取得済みの場合も True）
+    """
+    path = lock_path(path)
+    with _held_lock:
+        if path in _held:
+            return True
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(path, "a+b")
+        if not _try_lock(file):
+            file.close()
+            return False
+        _held[path] = file
+        return True
+
+
+def release_saver_locks() -> None:
+    """保持しているロックをすべて解放する（テスト用）"""
+    with _held_lock:
+        for file in _held.values():
+            file.close()
+        _held.clear()
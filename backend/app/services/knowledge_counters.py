@@ -0,0 +1,225 @@
+"""
+ナレッジ記事カウンターのバッファリング
+
+記事の閲覧や評価のたびに記事の行を更新してコミットすると、人気記事の行が
+書き込みのホットスポットになり行ロックの競合を招きます。閲覧数・評価数は
+プロセス内で記事ごとに加算しておき、一定間隔でまとめて
+
+    UPDATE knowledge_articles SET view_count = view_count + :n WHERE id = :id
+
+を記事ごとに1回ずつ（executemany で1往復）実行します。
+
+評価（役に立った／立たなかった）は1ユーザー1記事1票で、票そのものは
+knowledge_votes に即時に記録します。集計値への反映は票が新規または
+変更された場合のみで、同じ評価の再送信では集計は変わりません。
+
+- 加算は SQL 側で行うため、複数ワーカーが同時に書き込んでも更新は失われません。
+- フラッシュに失敗した分はバッファへ戻し、次回に再送します。
+- アプリケーション終了時にも残りをフラッシュします（プロセスが異常終了した
+  場合、未フラッシュ分は失われます）。
+"""
+
+import asyncio
+import logging
+import threading
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.knowledge import KnowledgeArticle, KnowledgeVote
+
+
+logger = logging.getLogger(__name__)
+
+_articles = KnowledgeArticle.__table__
+
+
+class ArticleCounterBuffer:
+    """記事ごとのカウンター加算をまとめて反映するバッファ
+
+    Args:
+        columns: 加算対象の列名
+    """
+
+    def __init__(self, columns: tuple[str, ...]):
+        self.columns = columns
+        self._pending: dict[int, Counter[str]] = {}
+        self._lock = threading.Lock()
+        self._statement = (
+            update(_articles)
+            .where(_articles.c.id == bindparam("b_id"))
+            .values(
+                {column: _articles.c[column] + bindparam(f"b_{column}") for column in columns}
+            )
+            # 閲覧・評価は記事の編集ではないため更新日時は変えない
+            # （onupdate の適用を抑止。検索インデックスの差分同期にも影響させない）
+            .values(updated_at=_articles.c.updated_at)
+        )
+        self._subscribers: list[Callable[[dict[int, Counter[str]]], None]] = []
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+
+    def subscribe(self, callback: Callable[[dict[int, Counter[str]]], None]) -> None:
+        """DB への反映が成功するたびに反映分（記事ID → 加算量）を受け取る関数を登録する"""
+        self._subscribers.append(callback)
+
+    def add(self, article_id: int, column: str, amount: int = 1) -> None:
+        """記事のカウンターに加算する（DB への反映は次回のフラッシュ時）"""
+        with self._lock:
+            counts = self._pending.get(article_id)
+            if counts is None:
+                counts = self._pending[article_id] = Counter()
+            counts[column] += amount
+
+    def pending(self, article_id: int) -> Counter[str]:
+        """未反映の加算量（レスポンスで DB の値に足して返すため）"""
+        with self._lock:
+            return Counter(self._pending.get(article_id, ()))
+
+    def _restore(self, snapshot: dict[int, Counter[str]]) -> None:
+        with self._lock:
+            for article_id, counts in snapshot.items():
+                self._pending.setdefault(article_id, Counter()).update(counts)
+
+    async def flush(self, db: AsyncSession) -> int:
+        """未反映の加算を DB に反映してコミットする
+
+        Returns:
+            更新した記事数
+        """
+        with self._lock:
+            snapshot, self._pending = self._pending, {}
+        if not snapshot:
+            return 0
+
+        params = [
+            {"b_id": article_id, **{f"b_{column}": counts[column] for column in self.columns}}
+            for article_id, counts in sorted(snapshot.items())
+        ]
+        try:
+            await db.execute(self._statement, params)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._restore(snapshot)
+            self.failures += 1
+            raise
+
+        self.flushes += 1
+        self.flushed_rows += len(params)
+        for callback in self._subscribers:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("カウンター反映の通知に失敗しました")
+        return len(params)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        self.flushes = self.flushed_rows = self.failures = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            pending_articles = len(self._pending)
+            pending_counts = {
+                column: sum(counts[column] for counts in self._pending.values())
+                for column in self.columns
+            }
+        return {
+            "pending_articles": pending_articles,
+            "pending": pending_counts,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failures": self.failures,
+        }
+
+
+view_counts = ArticleCounterBuffer(("view_count",))
+feedback_counts = ArticleCounterBuffer(("helpful_count", "not_helpful_count"))
+
+
+def _feedback_column(helpful: bool) -> str:
+    return "helpful_count" if helpful else "not_helpful_count"
+
+
+async def record_vote(db: AsyncSession, article_id: int, user_id: int, helpful: bool) -> bool:
+    """記事への評価を記録する（1ユーザー1記事1票、再投票は票の変更）
+
+    票の行を挿入または更新してコミットし、集計の増減はバッファに積みます。
+
+    Returns:
+        集計が変わった場合 True（同じ評価の再送信では False）
+    """
+    previous: bool | None = None
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        result = await db.execute(
+            insert(KnowledgeVote)
+            .values(article_id=article_id, user_id=user_id, helpful=helpful)
+            .on_conflict_do_nothing(index_elements=["article_id", "user_id"])
+        )
+        if result.rowcount == 0:
+            # 投票済み: 評価が異なる場合のみ票を変更する（条件付き UPDATE で競合しても1回だけ成功）
+            result = await db.execute(
+                update(KnowledgeVote)
+                .where(
+                    KnowledgeVote.article_id == article_id,
+                    KnowledgeVote.user_id == user_id,
+                    KnowledgeVote.helpful != helpful,
+                )
+                .values(helpful=helpful, voted_at=func.now())
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                return False
+            previous = not helpful
+    else:
+        result = await db.execute(
+            select(KnowledgeVote).where(
+                KnowledgeVote.article_id == article_id, KnowledgeVote.user_id == user_id
+            )
+        )
+        vote = result.scalar_one_or_none()
+        if vote is None:
+            db.add(KnowledgeVote(article_id=article_id, user_id=user_id, helpful=helpful))
+        elif vote.helpful == helpful:
+            return False
+        else:
+            previous = vote.helpful
+            vote.helpful = helpful
+            vote.voted_at = func.now()
+    await db.commit()
+
+    if previous is not None:
+        feedback_counts.add(article_id, _feedback_column(previous), -1)
+    feedback_counts.add(article_id, _feedback_column(helpful))
+    return True
+
+
+async def flush_knowledge_counters(db: AsyncSession) -> int:
+    """バッファ済みのカウンターを DB に反映する
+
+    Returns:
+        更新した記事数（閲覧数・評価数の更新の合計）
+    """
+    return await view_counts.flush(db) + await feedback_counts.flush(db)
+
+
+async def run_knowledge_counter_flusher(interval_seconds: float) -> None:
+    """flush_knowledge_counters を一定間隔で実行するバックグラウンドタスク"""
+    from app.database import async_session_factory
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with async_session_factory() as db:
+                await flush_knowledge_counters(db)
+        except Exception:
+            logger.exception("ナレッジ記事カウンターの反映に失敗しました")
@@ -0,0 +1,200 @@
+"""
+関連ナレッジ記事の事前計算
+
+記事ページに表示する「関連記事」を夜間バッチ（app.jobs.knowledge_related）で
+計算し、knowledge_related_articles に保存します。記事ページはこの表を
+主キー範囲で読むだけで、閲覧のたびに検索を実行しません。
+
+関連度はタグの一致とテキストの語の重なりを組み合わせます。
+
+    score = TAG_WEIGHT * Jaccard(タグ) + (1 - TAG_WEIGHT) * cos(TF-IDF)
+
+- 語は検索と同じ解析器（app.services.text_analysis）で分割します。
+- 各記事は TF-IDF 上位 MAX_TERMS_PER_ARTICLE 語のみで表し、記事数の
+  MAX_DF_RATIO を超える記事に現れる語（ありふれた語）は使いません。
+  共通の語・タグを持つ記事の組だけを転置リストから辿るため、全記事の
+  総当たりにはなりません。
+- 可視性・公開状態は表示時に閲覧者に応じて絞り込むため、計算時は
+  全記事を対象にします。
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, selectinload
+
+from app.config import settings
+from app.models.knowledge import KnowledgeArticle, KnowledgeRelatedArticle, KnowledgeVisibility
+from app.services.text_analysis import default_analyzer
+
+
+# タグ一致の重み（残りがテキストの類似度）
+TAG_WEIGHT = 0.4
+# 記事を表す語の数
+MAX_TERMS_PER_ARTICLE = 64
+# この割合を超える記事に現れる語は関連度に使わない
+MAX_DF_RATIO = 0.2
+# これ未満の関連度は関連記事としない
+MIN_SCORE = 0.05
+
+# 一度に挿入する行数
+_INSERT_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class RelatedSource:
+    """関連度の計算に使う記事の内容"""
+    id: int
+    text: str
+    tags: str | None
+
+
+def _tag_set(tags: str | None) -> frozenset[str]:
+    if not tags:
+        return frozenset()
+    return frozenset(
+        tag for tag in (default_analyzer.normalize(t).strip() for t in tags.split(",")) if tag
+    )
+
+
+def _term_vectors(sources: list[RelatedSource]) -> dict[int, dict[str, float]]:
+    """記事ごとの TF-IDF 上位語の単位ベクトル"""
+    counts = {source.id: Counter(default_analyzer(source.text)) for source in sources}
+    df: Counter[str] = Counter()
+    for terms in counts.values():
+        df.update(terms.keys())
+
+    n_docs = len(sources)
+    max_df = max(2, int(n_docs * MAX_DF_RATIO))
+    vectors: dict[int, dict[str, float]] = {}
+    for article_id, terms in counts.items():
+        weights = {
+            term: (1 + math.log(tf)) * math.log(n_docs / df[term])
+            for term, tf in terms.items()
+            # 1記事にしかない語は重なりを生まない
+            if 2 <= df[term] <= max_df
+        }
+        top = heapq.nlargest(MAX_TERMS_PER_ARTICLE, weights.items(), key=lambda item: item[1])
+        norm = math.sqrt(sum(weight * weight for _, weight in top))
+        if norm > 0:
+            vectors[article_id] = {term: weight / norm for term, weight in top}
+    return vectors
+
+
+def compute_related(
+    sources: Iterable[RelatedSource],
+    limit: int,
+) -> dict[int, list[tuple[int, float]]]:
+    """記事ごとの関連記事を関連度の高い順に返す
+
+    Returns:
+        記事ID → [(関連記事ID, 関連度), ...]（最大 limit 件）
+    """
+    sources = list(sources)
+    vectors = _term_vectors(sources)
+    tags = {source.id: _tag_set(source.tags) for source in sources}
+
+    term_postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+    for article_id, vector in vectors.items():
+        for term, weight in vector.items():
+            term_postings[term].append((article_id, weight))
+    tag_postings: dict[str, list[int]] = defaultdict(list)
+    for article_id, article_tags in tags.items():
+        for tag in article_tags:
+            tag_postings[tag].append(article_id)
+
+    related: dict[int, list[tuple[int, float]]] = {}
+    for source in sources:
+        article_id = source.id
+
+        cosine: Counter[int] = Counter()
+        for term, weight in vectors.get(article_id, {}).items():
+            for other_id, other_weight in term_postings[term]:
+                cosine[other_id] += weight * other_weight
+
+        shared_tags: Counter[int] = Counter()
+        for tag in tags[article_id]:
+            shared_tags.update(tag_postings[tag])
+
+        scores = []
+        for other_id in cosine.keys() | shared_tags.keys():
+            if other_id == article_id:
+                continue
+            jaccard = 0.0
+            if shared_tags[other_id]:
+                union = len(tags[article_id]) + len(tags[other_id]) - shared_tags[other_id]
+                jaccard = shared_tags[other_id] / union
+            score = TAG_WEIGHT * jaccard + (1 - TAG_WEIGHT) * cosine[other_id]
+            if score >= MIN_SCORE:
+                scores.append((other_id, score))
+
+        if scores:
+            related[article_id] = heapq.nlargest(limit, scores, key=lambda item: (item[1], -item[0]))
+    return related
+
+
+async def rebuild_related_articles(db: AsyncSession, limit: int | None = None) -> tuple[int, int]:
+    """knowledge_related_articles を全件作り直す（コミットは呼び出し側）
+
+    Returns:
+        (関連記事を持つ記事数, 書き込んだ行数)
+    """
+    limit = limit or settings.KNOWLEDGE_RELATED_LIMIT
+    result = await db.execute(
+        select(
+            KnowledgeArticle.id,
+            KnowledgeArticle.title,
+            KnowledgeArticle.summary,
+            KnowledgeArticle.content,
+            KnowledgeArticle.tags,
+        )
+    )
+    sources = [
+        RelatedSource(
+            id=article_id,
+            text="\n".join(part for part in (title, summary, content) if part),
+            tags=tags,
+        )
+        for article_id, title, summary, content, tags in result.all()
+    ]
+    related = compute_related(sources, limit)
+
+    rows = [
+        {"article_id": article_id, "rank": rank, "related_id": related_id, "score": round(score, 6)}
+        for article_id, items in related.items()
+        for rank, (related_id, score) in enumerate(items, start=1)
+    ]
+    await db.execute(delete(KnowledgeRelatedArticle))
+    for start in range(0, len(rows), _INSERT_BATCH_SIZE):
+        await db.execute(insert(KnowledgeRelatedArticle), rows[start:start + _INSERT_BATCH_SIZE])
+    return len(related), len(rows)
+
+
+async def get_related_articles(
+    db: AsyncSession,
+    article_id: int,
+    visibilities: Iterable[KnowledgeVisibility] | None = None,
+    published_only: bool = True,
+    limit: int | None = None,
+) -> list[tuple[KnowledgeArticle, float]]:
+    """事前計算済みの関連記事を閲覧者の権限で絞り込んで返す（本文は読み込まない）"""
+    query = (
+        select(KnowledgeArticle, KnowledgeRelatedArticle.score)
+        .join(KnowledgeRelatedArticle, KnowledgeRelatedArticle.related_id == KnowledgeArticle.id)
+        .options(selectinload(KnowledgeArticle.author), defer(KnowledgeArticle.content))
+        .where(KnowledgeRelatedArticle.article_id == article_id)
+        .order_by(KnowledgeRelatedArticle.rank)
+    )
+    if visibilities is not None:
+        query = query.where(KnowledgeArticle.visibility.in_(list(visibilities)))
+    if published_only:
+        query = query.where(KnowledgeArticle.is_published == True)
+    if limit:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return [(article, score) for article, score in result.all()]
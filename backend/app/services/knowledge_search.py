@@ -0,0 +1,274 @@
+"""
+ナレッジ記事の全文検索
+
+KnowledgeArticle を BM25F の転置インデックス（app.services.text_index）で
+検索します。フィールドの重みは タイトル > タグ > 概要 > 本文 です。
+テキストは app.services.text_analysis の解析器で正規化・分割するため、
+半角・全角やひらがな・カタカナの表記ゆれ、同義語（"PW" と "パスワード" など）
+の違いがあっても一致します。
+
+- 記事の作成・更新・公開・削除はマッパーイベントで検知し、コミット後に
+  該当記事だけを索引し直します（閲覧数など索引対象外の列の更新では
+  索引を書き換えません）。
+- 索引は KNOWLEDGE_INDEX_PATH に保存され、起動時に読み込んだうえで
+  DB と差分同期します（更新日時が異なる記事のみ再索引）。
+- コミット後の反映は変更したワーカーの索引にのみ行われます。他のワーカーの
+  変更は KNOWLEDGE_INDEX_SAVE_SECONDS ごとの差分同期で取り込みます（索引の
+  内容の正は DB）。保存は保存担当の1プロセスのみが行い、他のプロセスは
+  保存された索引を読み込み直してから差分同期します（app.services.index_lock）。
+- 可視性・公開状態・カテゴリ・種別は索引内のメタデータで絞り込むため、
+  検索時に DB へアクセスするのは表示するページ分の記事の取得のみです。
+"""
+
+import asyncio
+import logging
+from collections.abc import Iterable
+from dataclasses import astuple, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
+from app.models.user import UserRole
+from app.services.index_lock import acquire_saver_lock
+from app.services.pending_changes import PendingChanges, apply_index_change
+from app.services.text_analysis import default_analyzer
+from app.services.text_index import InvertedIndex
+
+
+logger = logging.getLogger(__name__)
+
+# 検索対象フィールドと重み
+KNOWLEDGE_FIELDS = {
+    "title": 4.0,
+    "tags": 3.0,
+    "summary": 2.0,
+    "content": 1.0,
+}
+
+# 絞り込みに使う列（変更時はメタデータのみ更新）
+_META_COLUMNS = ("visibility", "is_published", "category", "article_type")
+
+# 差分同期で一度に読み込む記事数
+_SYNC_BATCH_SIZE = 200
+
+
+@dataclass(frozen=True)
+class ArticleMeta:
+    """索引に保持する絞り込み用メタデータ"""
+    visibility: str
+    is_published: bool
+    category: str
+    article_type: str
+
+    def to_json(self) -> list:
+        """保存用に JSON で表せる値にする"""
+        return list(astuple(self))
+
+    @classmethod
+    def from_json(cls, value: list) -> "ArticleMeta":
+        return cls(*value)
+
+
+knowledge_index = InvertedIndex(
+    KNOWLEDGE_FIELDS,
+    tokenizer=default_analyzer,
+    tokenizer_id=default_analyzer.analyzer_id,
+    encode_meta=ArticleMeta.to_json,
+    decode_meta=ArticleMeta.from_json,
+)
+
+
+def index_version(value: datetime | None) -> str | None:
+    """更新日時を差分同期の比較用文字列にする"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def article_meta(article: KnowledgeArticle) -> ArticleMeta:
+    """記事の絞り込み用メタデータ"""
+    visibility = article.visibility
+    return ArticleMeta(
+        visibility=visibility.value if isinstance(visibility, KnowledgeVisibility) else str(visibility),
+        is_published=bool(article.is_published),
+        category=article.category,
+        article_type=article.article_type,
+    )
+
+
+def _fields(article: KnowledgeArticle) -> dict[str, str | None]:
+    return {name: getattr(article, name) for name in KNOWLEDGE_FIELDS}
+
+
+def index_article(article: KnowledgeArticle, version: str | None = None) -> None:
+    """記事を索引に追加・置換する"""
+    knowledge_index.add(article.id, _fields(article), article_meta(article), version)
+
+
+# ============== 検索 ==============
+
+def visible_visibilities(role: UserRole) -> list[KnowledgeVisibility] | None:
+    """ロールが閲覧できる公開範囲（None なら制限なし）"""
+    if role == UserRole.REQUESTER:
+        return [KnowledgeVisibility.PUBLIC]
+    if role not in [UserRole.MANAGER, UserRole.AGENT]:
+        return [KnowledgeVisibility.PUBLIC, KnowledgeVisibility.DEPARTMENT]
+    return None
+
+
+def search_knowledge(
+    query: str,
+    visibilities: Iterable[KnowledgeVisibility] | None = None,
+    published_only: bool = True,
+    category: str | None = None,
+    article_type: str | None = None,
+) -> list[tuple[int, float]]:
+    """記事を検索し (記事ID, スコア) をスコア降順で返す
+
+    Args:
+        query: 検索文字列
+        visibilities: 閲覧可能な公開範囲（None なら制限なし）
+        published_only: 公開済みの記事のみ対象にする
+        category: カテゴリで絞り込み
+        article_type: 記事種別で絞り込み
+    """
+    allowed = {v.value for v in visibilities} if visibilities is not None else None
+
+    def predicate(meta: ArticleMeta | None) -> bool:
+        if meta is None:
+            return False
+        if allowed is not None and meta.visibility not in allowed:
+            return False
+        if published_only and not meta.is_published:
+            return False
+        if category and meta.category != category:
+            return False
+        if article_type and meta.article_type != article_type:
+            return False
+        return True
+
+    return knowledge_index.search(query, predicate=predicate)
+
+
+# ============== DB との同期・保存 ==============
+
+async def sync_knowledge_index(db: AsyncSession) -> tuple[int, int]:
+    """索引を DB と差分同期する
+
+    更新日時が索引時点と異なる（または不明な）記事のみ読み込んで再索引し、
+    DB にない記事を索引から削除します。
+
+    Returns:
+        (再索引した件数, 削除した件数)
+    """
+    result = await db.execute(select(KnowledgeArticle.id, KnowledgeArticle.updated_at))
+    current = {article_id: index_version(updated_at) for article_id, updated_at in result.all()}
+
+    stale = [
+        article_id
+        for article_id, version in current.items()
+        if version is None
+        or article_id not in knowledge_index
+        or knowledge_index.doc_versions.get(article_id) != version
+    ]
+    removed = [doc_id for doc_id in knowledge_index.doc_ids() if doc_id not in current]
+    for doc_id in removed:
+        knowledge_index.remove(doc_id)
+
+    for start in range(0, len(stale), _SYNC_BATCH_SIZE):
+        batch = stale[start:start + _SYNC_BATCH_SIZE]
+        result = await db.execute(select(KnowledgeArticle).where(KnowledgeArticle.id.in_(batch)))
+        for article in result.scalars().all():
+            index_article(article, index_version(article.updated_at))
+
+    return len(stale), len(removed)
+
+
+async def load_knowledge_index(db: AsyncSession, path: Path | None = None) -> tuple[int, int]:
+    """保存済みの索引を読み込み、DB と差分同期する（起動時）"""
+    path = path or settings.KNOWLEDGE_INDEX_PATH
+    if not knowledge_index.load(path):
+        knowledge_index.clear()
+    return await sync_knowledge_index(db)
+
+
+def save_knowledge_index(path: Path | None = None) -> bool:
+    """変更があれば索引を保存する（保存担当のプロセスのみ）
+
+    Returns:
+        保存した場合 True
+    """
+    path = path or settings.KNOWLEDGE_INDEX_PATH
+    if not knowledge_index.dirty or not acquire_saver_lock(path):
+        return False
+    knowledge_index.save(path)
+    return True
+
+
+async def refresh_knowledge_index(db: AsyncSession, path: Path | None = None) -> tuple[int, int]:
+    """索引を DB と差分同期し、保存担当なら保存する
+
+    保存担当でないプロセスは、先に保存担当が保存した索引を読み込み直します
+    （自プロセスで受け付けていない変更も含めて差分同期の対象を小さくするため）。
+
+    Returns:
+        (再索引した記事数, 削除した記事数)
+    """
+    path = path or settings.KNOWLEDGE_INDEX_PATH
+    if acquire_saver_lock(path):
+        synced = await sync_knowledge_index(db)
+        save_knowledge_index(path)
+        return synced
+    knowledge_index.load(path)
+    return await sync_knowledge_index(db)
+
+
+async def run_knowledge_index_saver(interval_seconds: float) -> None:
+    """索引を一定間隔で DB と差分同期・保存するバックグラウンドタスク"""
+    from app.database import async_session_factory
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with async_session_factory() as db:
+                await refresh_knowledge_index(db)
+        except Exception:
+            logger.exception("ナレッジ検索インデックスの保存に失敗しました")
+
+
+# ============== 増分更新 ==============
+
+_pending = PendingChanges(
+    "knowledge_index_pending",
+    lambda article_id, change: apply_index_change(knowledge_index, article_id, change),
+)
+
+
+@event.listens_for(KnowledgeArticle, "after_insert")
+def _article_inserted(mapper, connection, target: KnowledgeArticle) -> None:
+    _pending.queue(target, ("index", (_fields(target), article_meta(target))))
+
+
+@event.listens_for(KnowledgeArticle, "after_update")
+def _article_updated(mapper, connection, target: KnowledgeArticle) -> None:
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in KNOWLEDGE_FIELDS):
+        _pending.queue(target, ("index", (_fields(target), article_meta(target))))
+    elif any(state.attrs[name].history.has_changes() for name in _META_COLUMNS):
+        queued = _pending.queued(target)
+        if queued is not None and queued[0] == "index":
+            # 同一トランザクションで索引済みの変更がある場合は本文ごと反映する
+            _pending.queue(target, ("index", (_fields(target), article_meta(target))))
+        else:
+            _pending.queue(target, ("meta", article_meta(target)))
+
+
+@event.listens_for(KnowledgeArticle, "after_delete")
+def _article_deleted(mapper, connection, target: KnowledgeArticle) -> None:
+    _pending.queue(target, ("remove", None))
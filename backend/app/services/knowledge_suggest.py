@@ -0,0 +1,356 @@
+"""
+ナレッジ記事タイトル・タグの入力補完（前方一致サジェスト）
+
+検索欄の入力ごとに DB へ ILIKE を投げる代わりに、記事のタイトル・タグを
+正規化したキーの昇順配列をプロセス内に持ち、二分探索で前方一致する範囲を
+求めます。
+
+- キーはタイトル全体、タイトル中の各語（空白・記号の直後）から始まる部分、
+  各タグです。半角・全角、大文字・小文字、ひらがな・カタカナの違いは
+  正規化で吸収します（入力途中の語が置き換わらないよう同義語置換はしません）。
+- 候補は閲覧数と役立ち度で並べます（popularity）。一致するキーが多い短い
+  接頭辞では、人気順に並べた記事を先頭から見て一致したものを返します
+  （人気順の並びは閲覧数などの反映時に該当記事だけ挿入し直します）。
+- 起動時に DB から全件を構築し、以降は記事の作成・更新・削除をマッパー
+  イベントで、閲覧数・評価数はカウンターの DB 反映時に差分更新します。
+  本文を持たないため保存はせず、起動のたびに作り直します。
+"""
+
+import heapq
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
+from app.services.knowledge_counters import feedback_counts, view_counts
+from app.services.knowledge_search import ArticleMeta, article_meta
+from app.services.pending_changes import PendingChanges
+from app.services.text_analysis import TextAnalyzer
+
+
+logger = logging.getLogger(__name__)
+
+# 役立ち度の重み（閲覧数は log(1 + 閲覧数) で効かせる）
+HELPFULNESS_WEIGHT = 2.0
+# 前方一致するキーがこれより多い場合は人気順に記事を見る（索引が大きい場合は
+# 両方の走査量が釣り合う √(limit × キー数) まで引き上げる）
+MAX_RANGE_SCAN = 512
+# タイトル中の語の先頭から作るキーの上限（1記事あたり）
+MAX_WORD_KEYS = 8
+
+# キーの変更を伴う列（変更時は記事のキーを作り直す）
+_KEY_COLUMNS = ("title", "tags", "visibility", "is_published", "category", "article_type")
+_COUNT_COLUMNS = ("view_count", "helpful_count", "not_helpful_count")
+
+# 前方一致する範囲の上端を求めるための最大の文字
+_MAX_CHAR = "\U0010ffff"
+# タイトルを語に分ける区切り
+_WORD_SEPARATORS = re.compile(r"[\s/・()（）「」【】\[\]:：、。,.!?！？-]+")
+
+# 入力途中の語が別の表記に置き換わらないよう、同義語置換はしない
+_analyzer = TextAnalyzer(synonyms=())
+
+
+def normalize_prefix(text: str) -> str:
+    """入力補完用の正規化（連続する空白は1つにまとめる）"""
+    return " ".join(_analyzer.normalize(text).split())
+
+
+def popularity(view_count: int, helpful_count: int, not_helpful_count: int) -> float:
+    """候補の並び順に使う人気度
+
+    役立ち度は票の少ない記事で極端な値にならないよう、賛否1票ずつを
+    加えて平滑化します（票がなければ 0.5）。
+    """
+    helpfulness = (helpful_count + 1) / (helpful_count + not_helpful_count + 2)
+    return math.log1p(max(view_count, 0)) + HELPFULNESS_WEIGHT * helpfulness
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    """入力補完の候補"""
+    article_id: int
+    title: str
+    category: str
+    # 一致したタグ（タイトルで一致した場合は None）
+    tag: str | None
+    score: float
+
+
+@dataclass(frozen=True)
+class _Article:
+    title: str
+    meta: ArticleMeta
+    # (正規化したキー, 一致時に返すタグ（タイトルなら ""）)
+    keys: tuple[tuple[str, str], ...]
+
+
+def _keys(title: str, tags: str | None) -> tuple[tuple[str, str], ...]:
+    keys: dict[str, str] = {}
+    normalized = normalize_prefix(title)
+    if normalized:
+        keys[normalized] = ""
+        for match in list(_WORD_SEPARATORS.finditer(normalized))[:MAX_WORD_KEYS]:
+            rest = normalized[match.end():]
+            if rest:
+                keys.setdefault(rest, "")
+    for tag in (tags or "").split(","):
+        key = normalize_prefix(tag)
+        if key:
+            keys.setdefault(key, tag.strip())
+    return tuple(keys.items())
+
+
+class PrefixSuggester:
+    """正規化したキーの昇順配列と二分探索による前方一致サジェスト"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            # (キー, 記事ID, タグ) の昇順
+            self._entries: list[tuple[str, int, str]] = []
+            self._articles: dict[int, _Article] = {}
+            # 記事ID → [閲覧数, 役立った, 役立たなかった]
+            self._counts: dict[int, list[int]] = {}
+            self._scores: dict[int, float] = {}
+            # (-人気度, 記事ID) の昇順（= 人気順）
+            self._ranking: list[tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def __contains__(self, article_id: int) -> bool:
+        return article_id in self._articles
+
+    # ============== 更新 ==============
+
+    def rebuild(self, rows: Iterable[tuple[int, str, str | None, ArticleMeta, tuple[int, int, int]]]) -> None:
+        """全件を構築し直す（rows: (記事ID, タイトル, タグ, メタデータ, (閲覧数, 役立った, 役立たなかった))）"""
+        with self._lock:
+            self.clear()
+            for article_id, title, tags, meta, counts in rows:
+                article = _Article(title, meta, _keys(title, tags))
+                self._articles[article_id] = article
+                self._entries.extend((key, article_id, tag) for key, tag in article.keys)
+                self._counts[article_id] = list(counts)
+                self._scores[article_id] = popularity(*counts)
+            self._entries.sort()
+            self._ranking = sorted((-score, article_id) for article_id, score in self._scores.items())
+
+    def add(
+        self,
+        article_id: int,
+        title: str,
+        tags: str | None,
+        meta: ArticleMeta,
+        counts: tuple[int, int, int] | None = None,
+    ) -> None:
+        """記事を追加・置換する（counts が None なら既存の閲覧数・評価数を引き継ぐ）"""
+        article = _Article(title, meta, _keys(title, tags))
+        with self._lock:
+            self._remove_keys(article_id)
+            self._articles[article_id] = article
+            for key, tag in article.keys:
+                insort(self._entries, (key, article_id, tag))
+            if counts is not None or article_id not in self._counts:
+                self._set_counts(article_id, list(counts or (0, 0, 0)))
+
+    def remove(self, article_id: int) -> None:
+        with self._lock:
+            self._remove_keys(article_id)
+            self._counts.pop(article_id, None)
+            self._unrank(article_id)
+
+    def _remove_keys(self, article_id: int) -> None:
+        article = self._articles.pop(article_id, None)
+        if article is None:
+            return
+        for key, tag in article.keys:
+            entry = (key, article_id, tag)
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def _set_counts(self, article_id: int, counts: list[int]) -> None:
+        self._counts[article_id] = counts
+        self._unrank(article_id)
+        score = self._scores[article_id] = popularity(*counts)
+        insort(self._ranking, (-score, article_id))
+
+    def _unrank(self, article_id: int) -> None:
+        score = self._scores.pop(article_id, None)
+        if score is None:
+            return
+        i = bisect_left(self._ranking, (-score, article_id))
+        if i < len(self._ranking) and self._ranking[i][1] == article_id:
+            del self._ranking[i]
+
+    def apply_counts(self, deltas: dict[int, Counter[str]]) -> None:
+        """カウンターの DB 反映分を閲覧数・評価数に加える"""
+        with self._lock:
+            for article_id, delta in deltas.items():
+                counts = self._counts.get(article_id)
+                if counts is None:
+                    continue
+                for i, column in enumerate(_COUNT_COLUMNS):
+                    counts[i] += delta.get(column, 0)
+                self._set_counts(article_id, counts)
+
+    # ============== 検索 ==============
+
+    def suggest(
+        self,
+        prefix: str,
+        limit: int = 10,
+        visibilities: Iterable[KnowledgeVisibility] | None = None,
+        published_only: bool = True,
+    ) -> list[Suggestion]:
+        """前方一致する記事を人気順に返す
+
+        Args:
+            prefix: 入力中の文字列
+            limit: 返す件数の上限
+            visibilities: 閲覧可能な公開範囲（None なら制限なし）
+            published_only: 公開済みの記事のみ対象にする
+        """
+        key = normalize_prefix(prefix)
+        if not key or limit <= 0:
+            return []
+        allowed = {v.value for v in visibilities} if visibilities is not None else None
+
+        def visible(meta: ArticleMeta) -> bool:
+            return (not published_only or meta.is_published) and (
+                allowed is None or meta.visibility in allowed
+            )
+
+        with self._lock:
+            lo = bisect_left(self._entries, (key,))
+            hi = bisect_left(self._entries, (key + _MAX_CHAR,), lo)
+
+            matched: dict[int, str] = {}
+            if hi - lo <= max(MAX_RANGE_SCAN, math.isqrt(limit * len(self._entries))):
+                for _, article_id, tag in self._entries[lo:hi]:
+                    if article_id in matched:
+                        if not tag:
+                            # タイトルでの一致を優先する
+                            matched[article_id] = tag
+                    elif visible(self._articles[article_id].meta):
+                        matched[article_id] = tag
+                ranked = heapq.nlargest(limit, matched, key=lambda i: (self._scores[i], -i))
+            else:
+                ranked = []
+                for _, article_id in self._ranking:
+                    article = self._articles[article_id]
+                    if not visible(article.meta):
+                        continue
+                    tags = [tag for k, tag in article.keys if k.startswith(key)]
+                    if tags:
+                        # タイトル（""）での一致を優先する
+                        matched[article_id] = min(tags, key=bool)
+                        ranked.append(article_id)
+                        if len(ranked) == limit:
+                            break
+
+            return [
+                Suggestion(
+                    article_id=article_id,
+                    title=self._articles[article_id].title,
+                    category=self._articles[article_id].meta.category,
+                    tag=matched[article_id] or None,
+                    score=self._scores[article_id],
+                )
+                for article_id in ranked
+            ]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"articles": len(self._articles), "keys": len(self._entries)}
+
+
+knowledge_suggester = PrefixSuggester()
+
+# 閲覧数・評価数は DB に反映された分だけ人気度に加える
+view_counts.subscribe(knowledge_suggester.apply_counts)
+feedback_counts.subscribe(knowledge_suggester.apply_counts)
+
+
+async def load_knowledge_suggestions(db: AsyncSession) -> int:
+    """DB から入力補完の候補を構築する（起動時、本文は読み込まない）
+
+    Returns:
+        構築した記事数
+    """
+    result = await db.execute(
+        select(
+            KnowledgeArticle.id,
+            KnowledgeArticle.title,
+            KnowledgeArticle.tags,
+            KnowledgeArticle.visibility,
+            KnowledgeArticle.is_published,
+            KnowledgeArticle.category,
+            KnowledgeArticle.article_type,
+            KnowledgeArticle.view_count,
+            KnowledgeArticle.helpful_count,
+            KnowledgeArticle.not_helpful_count,
+        )
+    )
+    knowledge_suggester.rebuild(
+        (
+            row.id,
+            row.title,
+            row.tags,
+            article_meta(row),
+            (row.view_count, row.helpful_count, row.not_helpful_count),
+        )
+        for row in result.all()
+    )
+    return len(knowledge_suggester)
+
+
+# ============== 増分更新 ==============
+
+def _apply(article_id: int, change: tuple[str, Any]) -> None:
+    action, payload = change
+    if action == "add":
+        knowledge_suggester.add(article_id, *payload)
+    else:
+        knowledge_suggester.remove(article_id)
+
+
+_pending = PendingChanges("knowledge_suggest_pending", _apply)
+
+
+def _counts(target: KnowledgeArticle) -> tuple[int, int, int]:
+    return tuple(getattr(target, name) or 0 for name in _COUNT_COLUMNS)
+
+
+@event.listens_for(KnowledgeArticle, "after_insert")
+def _article_inserted(mapper, connection, target: KnowledgeArticle) -> None:
+    _pending.queue(target, ("add", (target.title, target.tags, article_meta(target), _counts(target))))
+
+
+@event.listens_for(KnowledgeArticle, "after_update")
+def _article_updated(mapper, connection, target: KnowledgeArticle) -> None:
+    state = inspect(target)
+    counts_changed = any(state.attrs[name].history.has_changes() for name in _COUNT_COLUMNS)
+    if counts_changed or any(state.attrs[name].history.has_changes() for name in _KEY_COLUMNS):
+        # カウンターは通常バッファ経由で更新されるため、ORM で変更された場合のみ上書きする
+        counts = _counts(target) if counts_changed else None
+        _pending.queue(target, ("add", (target.title, target.tags, article_meta(target), counts)))
+
+
+@event.listens_for(KnowledgeArticle, "after_delete")
+def _article_deleted(mapper, connection, target: KnowledgeArticle) -> None:
+    _pending.queue(target, ("remove", None))
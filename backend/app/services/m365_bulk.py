@@ -0,0 +1,210 @@
+"""
+M365 一括操作（ライセンス一括付与・グループ一括追加）
+
+入社時期にまとめて発生する数百人分のライセンス付与・グループ追加を、1つの
+タスク（BULK_LICENSE_ASSIGN / BULK_GROUP_ADD）として実行します。対象ユーザーは
+m365_task_targets に1人1行で登録します。
+
+- 対象を JSON バッチ1回分（20人）ずつに分け、M365_BULK_CONCURRENCY 個のバッチを
+  同時に実行します（Graph へのリクエスト数は人数の 1/20 になります）。
+- バッチが終わるごとに、対象ごとの実行ログ（M365ExecutionLog）をまとめて INSERT し、
+  対象の状態を更新します（チェックポイント）。同時にジョブのリースを延長し、
+  リースを失っていたら中断します。
+- ジョブが再実行された場合は未実施の対象だけを処理します。失敗したタスクを
+  もう一度実行すると、失敗した対象だけをやり直します。
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.m365.graph_client import MAX_BATCH_SIZE
+from app.m365.operations import M365Operations
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365TargetStatus,
+    M365Task,
+    M365TaskTarget,
+    M365TaskType,
+)
+
+
+logger = logging.getLogger(__name__)
+
+BULK_TASK_TYPES = frozenset({M365TaskType.BULK_LICENSE_ASSIGN, M365TaskType.BULK_GROUP_ADD})
+
+
+class LeaseLostError(Exception):
+    """チェックポイントの時点でジョブのリースを失っていた（他のワーカーが実行している）"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def renew_job_lease(db: AsyncSession, job_id: int, worker_id: str) -> None:
+    """チェックポイントでジョブのリースを延長する（コミットは呼び出し側）
+
+    Raises:
+        LeaseLostError: リースを失っていた
+    """
+    renewed = await db.execute(
+        update(M365Job)
+        .where(M365Job.id == job_id, M365Job.lease_owner == worker_id)
+        .values(lease_expires_at=_now() + timedelta(seconds=settings.M365_JOB_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    if not renewed.rowcount:
+        raise LeaseLostError(f"Lease of job {job_id} was lost")
+
+
+async def reset_failed_targets(db: AsyncSession, task_id: int) -> int:
+    """失敗した対象を未実施に戻す（再実行時、コミットは呼び出し側）"""
+    result = await db.execute(
+        update(M365TaskTarget)
+        .where(M365TaskTarget.task_id == task_id, M365TaskTarget.status == M365TargetStatus.FAILED)
+        .values(status=M365TargetStatus.PENDING, error_message=None, completed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def bulk_progress(db: AsyncSession, task_id: int) -> dict[str, int]:
+    """対象の状態ごとの件数"""
+    rows = await db.execute(
+        select(M365TaskTarget.status, func.count())
+        .where(M365TaskTarget.task_id == task_id)
+        .group_by(M365TaskTarget.status)
+    )
+    counts = {status.value: 0 for status in M365TargetStatus}
+    for status, count in rows.all():
+        counts[M365TargetStatus(status).value] = count
+    return {"total": sum(counts.values()), **counts}
+
+
+async def execute_bulk_task(
+    session_factory: async_sessionmaker,
+    job: M365Job,
+    task: M365Task,
+    m365_ops: M365Operations,
+    worker_id: str,
+    action: str,
+) -> dict[str, Any]:
+    """一括操作タスクの未実施の対象を実行する
+
+    Returns:
+        実行結果（全対象の成功・失敗件数と失敗した対象のエラー）
+
+    Raises:
+        LeaseLostError: ジョブのリースを失った
+        M365Error: バッチ全体が失敗した（完了したバッチは記録済み）
+    """
+    async with session_factory() as db:
+        targets = (await db.execute(
+            select(M365TaskTarget.id, M365TaskTarget.target_upn)
+            .where(M365TaskTarget.task_id == task.id, M365TaskTarget.status == M365TargetStatus.PENDING)
+            .order_by(M365TaskTarget.id)
+        )).all()
+
+    chunks = [targets[i:i + MAX_BATCH_SIZE] for i in range(0, len(targets), MAX_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(max(1, settings.M365_BULK_CONCURRENCY))
+    checkpoint_lock = asyncio.Lock()
+
+    stopped = False
+
+    async def run_chunk(chunk: list) -> None:
+        nonlocal stopped
+        upns = [upn for _, upn in chunk]
+        try:
+            async with semaphore:
+                # 他のバッチが失敗したら、まだ始めていないバッチは次の実行に回す
+                if stopped:
+                    return
+                if task.task_type == M365TaskType.BULK_LICENSE_ASSIGN:
+                    result = await m365_ops.assign_license_to_users(upns, task.target_resource_id, action)
+                else:
+                    result = await m365_ops.add_users_to_group(task.target_resource_id, upns, action)
+            # チェックポイントは1つずつ書き込む
+            async with checkpoint_lock:
+                await _checkpoint(session_factory, job, task, worker_id, action, chunk, result["failed"])
+        except Exception:
+            stopped = True
+            raise
+
+    # 実行中のバッチは中断せず、Graph に反映した結果を記録してから失敗を伝える
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+    async with session_factory() as db:
+        progress = await bulk_progress(db, task.id)
+        failed = dict((await db.execute(
+            select(M365TaskTarget.target_upn, M365TaskTarget.error_message)
+            .where(M365TaskTarget.task_id == task.id, M365TaskTarget.status == M365TargetStatus.FAILED)
+            .order_by(M365TaskTarget.id)
+        )).all())
+
+    logger.info(
+        f"M365 bulk task processed: task_id={task.id}, type={task.task_type}, "
+        f"succeeded={progress['succeeded']}, failed={progress['failed']}, total={progress['total']}"
+    )
+    return {
+        "status": "success" if not failed else "partial" if progress["succeeded"] else "failed",
+        "message": f"{progress['succeeded']} of {progress['total']} targets succeeded",
+        "target_resource_id": task.target_resource_id,
+        "processed": len(targets),
+        **progress,
+        "failed_targets": failed,
+    }
+
+
+async def _checkpoint(
+    session_factory: async_sessionmaker,
+    job: M365Job,
+    task: M365Task,
+    worker_id: str,
+    action: str,
+    chunk: list,
+    failed: dict[str, str],
+) -> None:
+    """バッチの結果（対象ごとの実行ログと状態）を記録し、リースを延長する"""
+    now = _now()
+    async with session_factory() as db:
+        await renew_job_lease(db, job.id, worker_id)
+
+        logs = []
+        states = []
+        for target_id, upn in chunk:
+            error_message = failed.get(upn)
+            logs.append({
+                "task_id": task.id,
+                "operator_id": job.operator_id,
+                "action": action,
+                "method": "graph_api",
+                "command_or_action": json.dumps({
+                    "task_type": task.task_type.value,
+                    "target_upn": upn,
+                    "target_resource_id": task.target_resource_id,
+                }),
+                "result": "failure" if error_message else "success",
+                "result_details": json.dumps({"job_id": job.id, "target_upn": upn}),
+                "error_message": error_message,
+                "executed_at": now,
+            })
+            states.append({
+                "id": target_id,
+                "status": M365TargetStatus.FAILED if error_message else M365TargetStatus.SUCCEEDED,
+                "error_message": error_message,
+                "completed_at": now,
+            })
+        await db.execute(insert(M365ExecutionLog), logs)
+        await db.execute(update(M365TaskTarget), states)
+        await db.commit()
@@ -0,0 +1,483 @@
+"""
+M365 ディレクトリのローカルミラー
+
+Entra ID のユーザー・グループを Graph の差分クエリ（/users/delta, /groups/delta）で
+m365_directory_objects テーブルへ複製し、ユーザー検索（入力補完）をプロセス内の
+索引から返します。キー入力ごとに Graph の startswith $filter を呼ばないため、
+レート制限を消費しません。
+
+- 差分クエリの delta_link は m365_delta_links に保存し、次回はその後の変更だけを
+  取得します。delta_link が失効した場合（410 Gone）は全件を取り直し、見つからな
+  かったオブジェクトを削除扱いにします。
+- Graph との同期は m365_delta_links の行のリース（lease_owner / lease_expires_at）を
+  条件付き UPDATE で取得した1ワーカーだけが行います。リースは同期間隔の間保持し、
+  ページごとに延長します（担当のワーカーが停止すると期限切れ後に他のワーカーが
+  引き継ぎます）。他のワーカーは DB から索引へ差分を取り込むだけです。
+- 削除されたオブジェクトは削除済みの行（is_deleted）として残し、synced_at を
+  手がかりに各ワーカーが索引へ差分を取り込みます（同期を実行したワーカー以外にも
+  反映されます。複数ワーカーが同時に同期しても反映内容は同じです）。
+- 索引は表示名・表示名の単語の先頭・UPN・メールアドレスを正規化したキーの
+  ソート済み配列で、前方一致の範囲を二分探索で求めます。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import unicodedata
+import uuid
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.m365.exceptions import M365APIError
+from app.m365.graph_client import GraphClient
+from app.models.m365_directory import DirectoryObjectKind, M365DeltaLink, M365DirectoryObject
+
+
+logger = logging.getLogger(__name__)
+
+# 差分クエリのリソースと複製するオブジェクトの種類
+RESOURCES = {
+    "users": DirectoryObjectKind.USER,
+    "groups": DirectoryObjectKind.GROUP,
+}
+
+# Graph のプロパティとテーブルの列の対応
+_COLUMNS = {
+    "displayName": "display_name",
+    "userPrincipalName": "user_principal_name",
+    "mail": "mail",
+    "jobTitle": "job_title",
+    "department": "department",
+    "accountEnabled": "account_enabled",
+}
+
+# 差分クエリで取得するプロパティ
+_SELECT = {
+    "users": ["id", "displayName", "userPrincipalName", "mail", "jobTitle", "department", "accountEnabled"],
+    "groups": ["id", "displayName", "mail"],
+}
+
+# 同期のリースの所有者としてのこのプロセスの識別子
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# 索引の差分取り込みで遡る秒数（コミット順と synced_at の前後に対する余裕）
+_REFRESH_OVERLAP = timedelta(seconds=60)
+
+# 全件同期で削除扱いにする行を一度に更新する件数
+_SWEEP_BATCH_SIZE = 500
+
+# これより多い変更は1件ずつ挿入せずキーの配列を作り直す
+_BULK_THRESHOLD = 1000
+
+
+def normalize(text: str) -> str:
+    """検索キーの正規化（全角・半角と大文字・小文字を区別しない）"""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+@dataclass
+class DirectoryEntry:
+    """索引に保持するディレクトリオブジェクト"""
+
+    id: str
+    kind: DirectoryObjectKind
+    display_name: Optional[str]
+    user_principal_name: Optional[str]
+    mail: Optional[str]
+    job_title: Optional[str]
+    department: Optional[str]
+    account_enabled: Optional[bool]
+
+    @classmethod
+    def from_row(cls, row: M365DirectoryObject) -> "DirectoryEntry":
+        return cls(
+            id=row.id,
+            kind=row.kind,
+            display_name=row.display_name,
+            user_principal_name=row.user_principal_name,
+            mail=row.mail,
+            job_title=row.job_title,
+            department=row.department,
+            account_enabled=row.account_enabled,
+        )
+
+    def keys(self) -> set[str]:
+        keys = set()
+        if self.display_name:
+            name = normalize(self.display_name)
+            keys.add(name)
+            keys.update(word for word in name.split()[1:])
+        for value in (self.user_principal_name, self.mail):
+            if value:
+                keys.add(normalize(value))
+        keys.discard("")
+        return keys
+
+    def to_graph(self) -> dict[str, Any]:
+        """Graph API と同じ形式（search_users の $select と同じフィールド）"""
+        return {
+            "id": self.id,
+            "userPrincipalName": self.user_principal_name,
+            "displayName": self.display_name,
+            "mail": self.mail,
+            "jobTitle": self.job_title,
+            "department": self.department,
+        }
+
+
+# ============== 索引 ==============
+
+class DirectoryIndex:
+    """ディレクトリオブジェクトの前方一致索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            # (正規化したキー, 種類, ID) の昇順
+            self._entries: list[tuple[str, str, str]] = []
+            self._objects: dict[str, DirectoryEntry] = {}
+            self._keys: dict[str, set[str]] = {}
+            # ユーザーの全件同期が一度でも完了していれば検索に使える
+            self.ready = False
+            self.synced_through: Optional[datetime] = None
+            self.searches = 0
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def upsert(self, entry: DirectoryEntry) -> None:
+        self.apply([entry], [])
+
+    def remove(self, object_id: str) -> None:
+        self.apply([], [object_id])
+
+    def apply(self, upserts: list[DirectoryEntry], removals: list[str]) -> None:
+        """追加・更新と削除をまとめて反映する
+
+        変更が多い場合（初回読み込み・全件同期の後）は1件ずつ挿入せず、
+        キーの配列を作り直して並べ替えます。
+        """
+        with self._lock:
+            if len(upserts) + len(removals) > max(_BULK_THRESHOLD, len(self._objects) // 10):
+                for object_id in removals:
+                    self._objects.pop(object_id, None)
+                for entry in upserts:
+                    self._objects[entry.id] = entry
+                self._keys = {object_id: entry.keys() for object_id, entry in self._objects.items()}
+                self._entries = sorted(
+                    (key, self._objects[object_id].kind.value, object_id)
+                    for object_id, keys in self._keys.items()
+                    for key in keys
+                )
+                return
+
+            for object_id in removals:
+                self._remove_keys(object_id)
+                self._objects.pop(object_id, None)
+            for entry in upserts:
+                self._remove_keys(entry.id)
+                keys = entry.keys()
+                for key in keys:
+                    insort(self._entries, (key, entry.kind.value, entry.id))
+                self._objects[entry.id] = entry
+                self._keys[entry.id] = keys
+
+    def _remove_keys(self, object_id: str) -> None:
+        entry = self._objects.get(object_id)
+        for key in self._keys.pop(object_id, ()):
+            item = (key, entry.kind.value, object_id)
+            i = bisect_left(self._entries, item)
+            if i < len(self._entries) and self._entries[i] == item:
+                del self._entries[i]
+
+    def search(
+        self,
+        query: str,
+        top: int = 10,
+        kind: DirectoryObjectKind = DirectoryObjectKind.USER,
+    ) -> list[DirectoryEntry]:
+        """表示名（単語の先頭を含む）・UPN・メールアドレスの前方一致
+
+        結果は一致したキーの辞書順（同じオブジェクトは1件）です。
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        results: list[DirectoryEntry] = []
+        seen: set[str] = set()
+        with self._lock:
+            self.searches += 1
+            i = bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < top:
+                key, entry_kind, object_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                if entry_kind != kind.value or object_id in seen:
+                    continue
+                seen.add(object_id)
+                results.append(self._objects[object_id])
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            kinds = [entry.kind for entry in self._objects.values()]
+            return {
+                "ready": self.ready,
+                "users": kinds.count(DirectoryObjectKind.USER),
+                "groups": kinds.count(DirectoryObjectKind.GROUP),
+                "keys": len(self._entries),
+                "searches": self.searches,
+                "synced_through": self.synced_through.isoformat() if self.synced_through else None,
+            }
+
+
+directory_index = DirectoryIndex()
+
+
+# ============== DB からの読み込み ==============
+
+async def refresh_directory_index(db: AsyncSession) -> int:
+    """前回以降に変更された行を索引へ取り込む（起動時は全件）
+
+    Returns:
+        取り込んだ行数
+    """
+    query = select(M365DirectoryObject).order_by(M365DirectoryObject.synced_at)
+    if directory_index.synced_through is not None:
+        query = query.where(M365DirectoryObject.synced_at > directory_index.synced_through - _REFRESH_OVERLAP)
+
+    rows = (await db.execute(query)).scalars().all()
+    directory_index.apply(
+        [DirectoryEntry.from_row(row) for row in rows if not row.is_deleted],
+        [row.id for row in rows if row.is_deleted],
+    )
+    if rows:
+        synced_at = rows[-1].synced_at
+        synced_at = synced_at if synced_at.tzinfo else synced_at.replace(tzinfo=timezone.utc)
+        if directory_index.synced_through is None or synced_at > directory_index.synced_through:
+            directory_index.synced_through = synced_at
+
+    if not directory_index.ready:
+        state = await db.get(M365DeltaLink, "users")
+        directory_index.ready = state is not None and state.delta_link is not None
+    return len(rows)
+
+
+async def load_directory_index(db: AsyncSession) -> int:
+    """索引を DB から作り直す（起動時）
+
+    Returns:
+        索引に含まれるオブジェクト数
+    """
+    directory_index.clear()
+    await refresh_directory_index(db)
+    return len(directory_index)
+
+
+# ============== Graph との差分同期 ==============
+
+def _apply_item(row: Optional[M365DirectoryObject], item: dict[str, Any], kind: DirectoryObjectKind, now: datetime):
+    """差分の1件を行へ反映する（含まれるプロパティだけを更新）"""
+    if "@removed" in item:
+        if row is not None and not row.is_deleted:
+            row.is_deleted = True
+            row.synced_at = now
+        return row
+
+    if row is None:
+        row = M365DirectoryObject(id=item["id"], kind=kind)
+    row.is_deleted = False
+    for name, column in _COLUMNS.items():
+        if name in item:
+            setattr(row, column, item[name])
+    row.synced_at = now
+    return row
+
+
+def _lease_until() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=settings.M365_DIRECTORY_SYNC_SECONDS)
+
+
+async def _acquire_sync_lease(db: AsyncSession, resource: str, worker_id: str) -> bool:
+    """リソースの同期のリースを取得する（期限内の他のワーカーのリースがあれば False）"""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        await db.execute(
+            insert(M365DeltaLink).values(resource=resource).on_conflict_do_nothing(index_elements=["resource"])
+        )
+    elif await db.get(M365DeltaLink, resource) is None:
+        db.add(M365DeltaLink(resource=resource))
+        await db.flush()
+
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        update(M365DeltaLink)
+        .where(
+            M365DeltaLink.resource == resource,
+            or_(
+                M365DeltaLink.lease_owner.is_(None),
+                M365DeltaLink.lease_owner == worker_id,
+                M365DeltaLink.lease_expires_at < now,
+            ),
+        )
+        .values(lease_owner=worker_id, lease_expires_at=_lease_until())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return bool(result.rowcount)
+
+
+async def sync_directory_resource(
+    db: AsyncSession,
+    client: GraphClient,
+    resource: str,
+    worker_id: str = _WORKER_ID,
+) -> tuple[int, int]:
+    """1つのリソースを差分同期する（他のワーカーがリースを保持していれば何もしない）
+
+    Returns:
+        (追加・更新件数, 削除件数)
+    """
+    kind = RESOURCES[resource]
+    if not await _acquire_sync_lease(db, resource, worker_id):
+        return 0, 0
+    state = await db.get(M365DeltaLink, resource)
+    await db.refresh(state)
+    delta_link = state.delta_link
+
+    try:
+        return await _sync_rounds(db, client, resource, kind, delta_link, worker_id)
+    except M365APIError as e:
+        if delta_link is None or e.status_code != 410:
+            raise
+        # delta_link の失効（410 Gone）: 全件を取り直す
+        logger.warning(f"Delta link for {resource} expired, starting a full sync")
+        await db.rollback()
+        return await _sync_rounds(db, client, resource, kind, None, worker_id)
+
+
+async def _sync_rounds(
+    db: AsyncSession,
+    client: GraphClient,
+    resource: str,
+    kind: DirectoryObjectKind,
+    delta_link: Optional[str],
+    worker_id: str,
+) -> tuple[int, int]:
+    full_sync = delta_link is None
+    seen: set[str] = set()
+    changed = removed = 0
+
+    async for page in client.iter_delta(resource, delta_link, select=_SELECT[resource]):
+        now = datetime.now(timezone.utc)
+        ids = [item["id"] for item in page.items]
+        result = await db.execute(select(M365DirectoryObject).where(M365DirectoryObject.id.in_(ids)))
+        rows = {row.id: row for row in result.scalars().all()}
+
+        for item in page.items:
+            row = _apply_item(rows.get(item["id"]), item, kind, now)
+            if "@removed" in item:
+                removed += 1
+                continue
+            seen.add(item["id"])
+            changed += 1
+            if item["id"] not in rows:
+                rows[item["id"]] = row
+                db.add(row)
+
+        values: dict[str, Any] = {"lease_expires_at": _lease_until()}
+        if page.delta_link is not None:
+            if full_sync:
+                removed += await _sweep_unseen(db, kind, seen, now)
+            values["delta_link"] = page.delta_link
+        # リースを延長し、リースを失っていればこのページは書き込まない
+        renewed = await db.execute(
+            update(M365DeltaLink)
+            .where(M365DeltaLink.resource == resource, M365DeltaLink.lease_owner == worker_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if not renewed.rowcount:
+            await db.rollback()
+            logger.warning(f"M365 directory sync lease for {resource} was lost")
+            break
+        # ページごとにコミットする（途中で失敗しても次回は同じ delta_link から再開）
+        await db.commit()
+
+    return changed, removed
+
+
+async def _sweep_unseen(db: AsyncSession, kind: DirectoryObjectKind, seen: set[str], now: datetime) -> int:
+    """全件同期で見つからなかったオブジェクトを削除扱いにする"""
+    result = await db.execute(
+        select(M365DirectoryObject.id).where(
+            M365DirectoryObject.kind == kind,
+            M365DirectoryObject.is_deleted.is_(False),
+        )
+    )
+    unseen = [object_id for object_id in result.scalars().all() if object_id not in seen]
+    for start in range(0, len(unseen), _SWEEP_BATCH_SIZE):
+        await db.execute(
+            update(M365DirectoryObject)
+            .where(M365DirectoryObject.id.in_(unseen[start:start + _SWEEP_BATCH_SIZE]))
+            .values(is_deleted=True, synced_at=now)
+        )
+    return len(unseen)
+
+
+async def sync_directory(
+    db: AsyncSession, client: GraphClient, worker_id: str = _WORKER_ID
+) -> dict[str, tuple[int, int]]:
+    """ユーザー・グループを差分同期し、索引へ取り込む
+
+    Returns:
+        {"users": (追加・更新件数, 削除件数), "groups": (...)}（リースを取得できなかった
+        リソースは (0, 0)）
+    """
+    results = {}
+    for resource in RESOURCES:
+        results[resource] = await sync_directory_resource(db, client, resource, worker_id)
+    await refresh_directory_index(db)
+    return results
+
+
+async def run_directory_sync(interval_seconds: float) -> None:
+    """ディレクトリの差分同期を一定間隔で実行するバックグラウンドタスク
+
+    起動直後に1回同期し、以降は interval_seconds ごとに同期します。
+    Graph との同期はリースを取得したワーカーだけが行い、他のワーカーと同期に
+    失敗した場合も、同期された内容は索引へ取り込みます。
+    """
+    from app.database import async_session_factory
+
+    while True:
+        try:
+            async with async_session_factory() as db:
+                async with GraphClient() as client:
+                    results = await sync_directory(db, client)
+            for resource, (changed, removed) in results.items():
+                if changed or removed:
+                    logger.info(f"M365 directory {resource} synced ({changed} changed, {removed} removed)")
+        except Exception:
+            logger.exception("M365 ディレクトリの同期に失敗しました")
+            try:
+                async with async_session_factory() as db:
+                    await refresh_directory_index(db)
+            except Exception:
+                logger.exception("M365 ディレクトリ索引の更新に失敗しました")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,673 @@
+"""
+M365 タスク実行のジョブキュー
+
+M365 タスクの実行（Graph API の呼び出し）を HTTP リクエストの中で行わず、
+m365_jobs テーブルに登録してバックグラウンドのワーカーが実行します。
+Graph の応答が遅くてもリクエストはすぐに 202 で返り、同時実行数はワーカーごとの
+上限（M365_JOB_WORKERS）に収まります。
+
+- ワーカーはジョブのリース（lease_owner / lease_expires_at）を条件付き UPDATE で
+  取得します。複数のワーカー・プロセスが同じジョブを同時に実行することはなく、
+  実行中のワーカーが停止してリースが切れたジョブは他のワーカーが再実行します。
+  実行中はリースを定期的に延長します。
+- 一時的なエラー（429・5xx・通信エラー・サーキットオープン）は、間隔を倍に
+  しながら M365_JOB_MAX_ATTEMPTS 回まで再実行します。
+- 同じ Idempotency-Key での登録、実行待ち・実行中のジョブがあるタスクへの登録は
+  既存のジョブを返します（二重実行の防止）。
+- 完了時に実行ログ（M365ExecutionLog）の作成、タスク・チケットの状態更新、
+  ジョブの完了を1つのトランザクションで記録します。リースを失っていた場合は
+  何も書き込みません。一括操作（app.services.m365_bulk）は対象ごとの実行ログを
+  バッチごとに、退職者処理・新規ユーザー作成（app.services.m365_workflow）は
+  ステップごとの実行ログをステップごとに記録します。
+- 新規ユーザー作成・パスワードリセットの初期パスワードは結果・実行ログに残さず、
+  ジョブの secrets に記録して、ジョブを実行したオペレーターによる最初の取得時に
+  だけ返します。オペレーターが指定したパスワード（command_or_action）は実行ログに
+  記録せず、ジョブが完了・失敗した時点で payload から消します。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.m365.exceptions import (
+    M365APIError,
+    M365AuthenticationError,
+    M365AuthorizationError,
+    M365Error,
+    M365ValidationError,
+)
+from app.m365.operations import M365Operations
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365JobStatus,
+    M365Task,
+    M365TaskStatus,
+    M365TaskType,
+)
+from app.models.ticket import TicketStatus
+from app.services.m365_bulk import BULK_TASK_TYPES, LeaseLostError, execute_bulk_task, reset_failed_targets
+from app.services.m365_workflow import (
+    SECRET_KEYS,
+    WORKFLOW_TASK_TYPES,
+    execute_workflow_task,
+    reset_failed_steps,
+)
+from utils.masking import mask_pii, preview_pii
+
+
+logger = logging.getLogger(__name__)
+
+# 再実行する Graph のステータス（None は通信エラー）
+_TRANSIENT_STATUSES = {None, 429, 500, 502, 503, 504}
+
+# 対象・ステップごとの実行ログを実行中に記録するタスクの種類
+_ITEM_LOGGED_TASK_TYPES = BULK_TASK_TYPES | WORKFLOW_TASK_TYPES
+
+# command_or_action が資格情報（指定したパスワード）になるタスクの種類
+_CREDENTIAL_TASK_TYPES = {M365TaskType.PASSWORD_RESET}
+
+# 停止時に実行中のジョブの完了を待つ秒数（超えたらリース切れ後に他のワーカーが再実行）
+_SHUTDOWN_GRACE_SECONDS = 10.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ============== 登録 ==============
+
+async def enqueue_execution(
+    db: AsyncSession,
+    task: M365Task,
+    operator_id: int,
+    action: str,
+    command_or_action: Optional[str],
+    idempotency_key: Optional[str] = None,
+) -> tuple[M365Job, bool]:
+    """タスクの実行をジョブとして登録する
+
+    タスクを実施中にし、ワーカーが実行するジョブを作成します（コミットは呼び出し側）。
+
+    Returns:
+        (ジョブ, 新規に登録したか)。同じ Idempotency-Key のジョブ、またはタスクの
+        実行待ち・実行中のジョブがあればそれを返します。同時に登録された場合も
+        一意制約（Idempotency-Key、タスクごとに1つの実行待ち・実行中ジョブ）で
+        1つだけが登録され、もう一方は登録されたジョブを返します。
+
+    Raises:
+        ValueError: Idempotency-Key が別のタスクのジョブで使われている
+    """
+    existing = await _existing_job(db, task, idempotency_key)
+    if existing is not None:
+        return existing, False
+
+    if task.task_type in BULK_TASK_TYPES:
+        # 再実行では失敗した対象だけをやり直す
+        await reset_failed_targets(db, task.id)
+    elif task.task_type in WORKFLOW_TASK_TYPES:
+        # 再実行では成功していないステップだけを実行する
+        await reset_failed_steps(db, task.id)
+
+    job = M365Job(
+        task_id=task.id,
+        operator_id=operator_id,
+        idempotency_key=idempotency_key or None,
+        status=M365JobStatus.QUEUED,
+        payload=json.dumps({"action": action, "command_or_action": command_or_action}, ensure_ascii=False),
+        attempts=0,
+        max_attempts=max(1, settings.M365_JOB_MAX_ATTEMPTS),
+        available_at=_now(),
+    )
+    try:
+        async with db.begin_nested():
+            db.add(job)
+            await db.flush()
+    except IntegrityError:
+        # 確認と登録の間に他のリクエストが登録した
+        existing = await _existing_job(db, task, idempotency_key)
+        if existing is None:
+            raise
+        return existing, False
+
+    if task.status == M365TaskStatus.PENDING:
+        task.status = M365TaskStatus.IN_PROGRESS
+        task.started_at = _now()
+        task.operator_id = operator_id
+        task.ticket.status = TicketStatus.IN_PROGRESS
+    return job, True
+
+
+async def _existing_job(
+    db: AsyncSession,
+    task: M365Task,
+    idempotency_key: Optional[str],
+) -> Optional[M365Job]:
+    """同じ Idempotency-Key のジョブ、またはタスクの実行待ち・実行中のジョブ"""
+    if idempotency_key:
+        existing = (await db.execute(
+            select(M365Job).where(M365Job.idempotency_key == idempotency_key)
+        )).scalar_one_or_none()
+        if existing is not None:
+            if existing.task_id != task.id:
+                raise ValueError("Idempotency-Key is already used for another task")
+            return existing
+
+    return (await db.execute(
+        select(M365Job)
+        .where(
+            M365Job.task_id == task.id,
+            M365Job.status.in_([M365JobStatus.QUEUED, M365JobStatus.RUNNING]),
+        )
+        .order_by(M365Job.id)
+        .limit(1)
+    )).scalar_one_or_none()
+
+
+async def take_job_secrets(db: AsyncSession, job: M365Job) -> Optional[dict[str, Any]]:
+    """ジョブの secrets（初期パスワードなど）を取り出して消す
+
+    条件付き UPDATE で消せた場合だけ返すため、同時に取得されても返すのは1回だけです。
+    """
+    if not job.secrets:
+        return None
+    result = await db.execute(
+        update(M365Job)
+        .where(M365Job.id == job.id, M365Job.secrets == job.secrets)
+        .values(secrets=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return json.loads(job.secrets) if result.rowcount else None
+
+
+# ============== 実行 ==============
+
+async def execute_task_operation(
+    m365_ops: M365Operations,
+    task: M365Task,
+    action: str,
+    command_or_action: Optional[str],
+) -> dict[str, Any]:
+    """タスクの種類に応じた M365 操作を実行する"""
+    if task.task_type == M365TaskType.LICENSE_ASSIGN:
+        return await m365_ops.assign_license(
+            user_id=task.target_upn,
+            sku_id=task.target_resource_id,
+            operator_comment=action
+        )
+
+    if task.task_type == M365TaskType.LICENSE_REMOVE:
+        return await m365_ops.remove_license(
+            user_id=task.target_upn,
+            sku_id=task.target_resource_id,
+            operator_comment=action
+        )
+
+    if task.task_type == M365TaskType.PASSWORD_RESET:
+        # Use provided password or generate new one
+        return await m365_ops.reset_password(
+            user_id=task.target_upn,
+            new_password=command_or_action or None,
+            operator_comment=action
+        )
+
+    if task.task_type == M365TaskType.MFA_RESET:
+        return await m365_ops.reset_mfa(
+            user_id=task.target_upn,
+            operator_comment=action
+        )
+
+    if task.task_type == M365TaskType.GROUP_ADD:
+        return await m365_ops.add_user_to_group(
+            group_id=task.target_resource_id,
+            user_id=task.target_upn,
+            operator_comment=action
+        )
+
+    if task.task_type == M365TaskType.GROUP_REMOVE:
+        return await m365_ops.remove_user_from_group(
+            group_id=task.target_resource_id,
+            user_id=task.target_upn,
+            operator_comment=action
+        )
+
+    # For other task types, require manual execution logging
+    logger.warning(f"Task type {task.task_type} requires manual execution")
+    return {
+        "status": "manual_execution_required",
+        "message": f"Task type {task.task_type} is not yet automated"
+    }
+
+
+def describe_failure(error: Exception) -> tuple[str, dict[str, Any]]:
+    """例外から (エラーメッセージ, 実行結果) を作る"""
+    if isinstance(error, M365ValidationError):
+        message = f"Validation error: {error.message}"
+    elif isinstance(error, M365AuthenticationError):
+        message = f"Authentication error: {error.message}"
+    elif isinstance(error, M365AuthorizationError):
+        message = f"Authorization error: {error.message}"
+    elif isinstance(error, M365APIError):
+        message = f"API error: {error.message}"
+        return message, {"error": message, "details": error.details, "status_code": error.status_code}
+    elif isinstance(error, M365Error):
+        message = f"M365 error: {error.message}"
+    else:
+        message = f"Unexpected error: {str(error)}"
+        return message, {"error": message}
+    return message, {"error": message, "details": error.details}
+
+
+def is_transient(error: Exception) -> bool:
+    """時間をおけば成功する可能性のあるエラーか"""
+    return type(error) is M365APIError and error.status_code in _TRANSIENT_STATUSES
+
+
+def retry_delay(job: M365Job, error: Exception) -> float:
+    """次の実行までの秒数（Retry-After があれば優先）"""
+    delay = settings.M365_JOB_RETRY_BACKOFF_SECONDS * 2 ** max(0, job.attempts - 1)
+    if isinstance(error, M365Error):
+        retry_after = str(error.details.get("retry_after") or "")
+        try:
+            return max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(M365Job.status == M365JobStatus.QUEUED, M365Job.available_at <= now),
+        and_(M365Job.status == M365JobStatus.RUNNING, M365Job.lease_expires_at < now),
+    )
+
+
+async def claim_jobs(db: AsyncSession, worker_id: str, limit: int) -> list[int]:
+    """実行できるジョブのリースを取得する
+
+    実行待ちで実行時刻を過ぎたもの、またはリースが切れたものを古い順に取得します。
+    取得は条件付き UPDATE で行うため、他のワーカーが先に取得したジョブは飛ばします。
+    """
+    if limit <= 0:
+        return []
+    now = _now()
+    candidates = (await db.execute(
+        select(M365Job.id).where(_claimable(now)).order_by(M365Job.available_at, M365Job.id).limit(limit)
+    )).scalars().all()
+
+    claimed = []
+    for job_id in candidates:
+        result = await db.execute(
+            update(M365Job)
+            .where(M365Job.id == job_id, _claimable(now))
+            .values(
+                status=M365JobStatus.RUNNING,
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=settings.M365_JOB_LEASE_SECONDS),
+                attempts=M365Job.attempts + 1,
+                started_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+    await db.commit()
+    return claimed
+
+
+async def _renew_lease(session_factory: async_sessionmaker, job_id: int, worker_id: str) -> None:
+    """実行中のジョブのリースを定期的に延長する"""
+    interval = max(1.0, settings.M365_JOB_LEASE_SECONDS / 3)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await db.execute(
+                    update(M365Job)
+                    .where(M365Job.id == job_id, M365Job.lease_owner == worker_id)
+                    .values(lease_expires_at=_now() + timedelta(seconds=settings.M365_JOB_LEASE_SECONDS))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            logger.exception(f"M365 ジョブのリース延長に失敗しました: job_id={job_id}")
+
+
+async def run_job(session_factory: async_sessionmaker, job_id: int, worker_id: str) -> Optional[M365JobStatus]:
+    """リースを取得したジョブを実行する
+
+    Returns:
+        記録したジョブの状態（リースを失っていた場合は None）
+    """
+    async with session_factory() as db:
+        job = await db.get(M365Job, job_id)
+        if job is None or job.lease_owner != worker_id:
+            return None
+        task = (await db.execute(
+            select(M365Task).options(selectinload(M365Task.ticket)).where(M365Task.id == job.task_id)
+        )).scalar_one()
+        payload = json.loads(job.payload)
+        action = payload["action"]
+        command_or_action = payload.get("command_or_action")
+        # Graph の呼び出し中に DB のトランザクションを保持しない
+        await db.commit()
+
+        error: Optional[Exception] = None
+        execution_result: dict[str, Any] = {}
+        secrets: dict[str, Any] = {}
+        if job.attempts > job.max_attempts:
+            # 実行中のワーカーが停止してリース切れを繰り返した
+            error = M365Error("Job lease expired before completion", {"attempts": job.attempts - 1})
+        else:
+            renewer = asyncio.create_task(_renew_lease(session_factory, job_id, worker_id))
+            try:
+                async with M365Operations() as m365_ops:
+                    # Log with PII masking
+                    logger.info(
+                        f"Executing M365 task: job_id={job_id}, type={task.task_type}, "
+                        f"target={mask_pii(task.target_upn)}, operator={job.operator_id}, "
+                        f"action={preview_pii(action, max_length=80)}"
+                    )
+                    if task.task_type in BULK_TASK_TYPES:
+                        execution_result = await execute_bulk_task(
+                            session_factory, job, task, m365_ops, worker_id, action
+                        )
+                    elif task.task_type in WORKFLOW_TASK_TYPES:
+                        execution_result = await execute_workflow_task(
+                            session_factory, job, task, m365_ops, worker_id, action
+                        )
+                    else:
+                        execution_result = await execute_task_operation(
+                            m365_ops, task, action, command_or_action
+                        )
+                        # 初期パスワードは結果に残さず secrets に移す
+                        secrets = {key: execution_result.pop(key) for key in SECRET_KEYS if key in execution_result}
+            except LeaseLostError:
+                logger.warning(f"M365 job lease was lost during execution: job_id={job_id}")
+                return None
+            except Exception as e:
+                error = e
+            finally:
+                renewer.cancel()
+
+        if error is not None:
+            error_message, execution_result = describe_failure(error)
+            if is_transient(error) and job.attempts < job.max_attempts:
+                delay = retry_delay(job, error)
+                logger.warning(
+                    f"M365 job will be retried: job_id={job_id}, attempt={job.attempts}, "
+                    f"delay={delay}s, error={mask_pii(error_message)}"
+                )
+                result = await db.execute(
+                    update(M365Job)
+                    .where(M365Job.id == job_id, M365Job.lease_owner == worker_id)
+                    .values(
+                        status=M365JobStatus.QUEUED,
+                        available_at=_now() + timedelta(seconds=delay),
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        error_message=error_message,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                return M365JobStatus.QUEUED if result.rowcount else None
+            logger.error(f"M365 job failed: job_id={job_id}, error={mask_pii(error_message)}", exc_info=error)
+            result_status = "failure"
+        elif task.task_type in BULK_TASK_TYPES and execution_result["failed"]:
+            # 一部の対象の失敗（対象ごとの実行ログは記録済み）
+            error_message = f"{execution_result['failed']} of {execution_result['total']} targets failed"
+            result_status = "failure"
+        elif task.task_type in WORKFLOW_TASK_TYPES and execution_result["failed"]:
+            # 一部のステップの失敗（ステップごとの実行ログは記録済み）
+            error_message = f"{execution_result['failed']} of {execution_result['total']} steps failed"
+            result_status = "failure"
+        else:
+            error_message = None
+            result_status = "success"
+
+        # Log execution result with PII masking
+        logger.info(
+            f"M365 task execution completed: task_id={task.id}, job_id={job_id}, result={result_status}, "
+            f"operator={job.operator_id}, "
+            f"details={preview_pii(json.dumps(execution_result, default=str), max_length=100)}"
+        )
+        return await _complete(db, job, task, worker_id, action, command_or_action,
+                               result_status, execution_result, error_message, secrets,
+                               write_log=task.task_type not in _ITEM_LOGGED_TASK_TYPES or error is not None)
+
+
+async def _complete(
+    db: AsyncSession,
+    job: M365Job,
+    task: M365Task,
+    worker_id: str,
+    action: str,
+    command_or_action: Optional[str],
+    result_status: str,
+    execution_result: dict[str, Any],
+    error_message: Optional[str],
+    secrets: Optional[dict[str, Any]] = None,
+    write_log: bool = True,
+) -> Optional[M365JobStatus]:
+    """実行ログ・タスクの状態・ジョブの完了を1つのトランザクションで記録する
+
+    write_log が False のとき（一括操作・ワークフローで対象・ステップごとの
+    実行ログを記録済み）は実行ログを作成しません。secrets はジョブの secrets に
+    記録します（ワークフローはステップごとに記録済み）。
+    """
+    job_status = M365JobStatus.SUCCEEDED if result_status == "success" else M365JobStatus.FAILED
+    completed_at = _now()
+    result_details = json.dumps(execution_result, ensure_ascii=False, default=str)
+    completion = {
+        "status": job_status,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "result": result_details,
+        "error_message": error_message,
+        "completed_at": completed_at,
+        # 再実行しないため、指定されたパスワードなどを残さない
+        "payload": json.dumps({"action": action, "command_or_action": None}, ensure_ascii=False),
+    }
+    if secrets:
+        completion["secrets"] = json.dumps(secrets, ensure_ascii=False)
+    if task.task_type in _CREDENTIAL_TASK_TYPES:
+        command_or_action = None
+
+    # リースを保持している場合だけ完了にする（失っていれば他のワーカーが実行している）
+    claimed = await db.execute(
+        update(M365Job)
+        .where(M365Job.id == job.id, M365Job.lease_owner == worker_id)
+        .values(completion)
+        .execution_options(synchronize_session=False)
+    )
+    if not claimed.rowcount:
+        logger.warning(f"M365 job lease was lost before completion: job_id={job.id}")
+        await db.rollback()
+        return None
+
+    log = None
+    if write_log:
+        # Create execution log with Graph API results
+        log = M365ExecutionLog(
+            task_id=task.id,
+            operator_id=job.operator_id,
+            action=action,
+            method="graph_api",  # Always use graph_api for automated operations
+            command_or_action=command_or_action or json.dumps({"task_type": task.task_type.value}),
+            result=result_status,
+            result_details=result_details,
+            error_message=error_message,
+        )
+        db.add(log)
+
+    if result_status == "success":
+        task.status = M365TaskStatus.COMPLETED
+        task.completed_at = completed_at
+        task.ticket.status = TicketStatus.RESOLVED
+        task.ticket.resolved_at = completed_at
+    else:
+        task.status = M365TaskStatus.FAILED
+
+    await db.flush()
+    if log is not None:
+        await db.execute(
+            update(M365Job)
+            .where(M365Job.id == job.id)
+            .values(execution_log_id=log.id)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return job_status
+
+
+# ============== ワーカー ==============
+
+class M365JobWorker:
+    """ジョブを上限つきの同時実行数で実行するワーカー
+
+    起動中は M365_JOB_POLL_SECONDS ごと、または wake() で起こされたときに
+    空いている枠の数だけジョブのリースを取得して実行します。
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        poll_seconds: float,
+        session_factory: Optional[async_sessionmaker] = None,
+    ):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.claimed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.lost = 0
+
+    def _factory(self) -> async_sessionmaker:
+        if self.session_factory is None:
+            from app.database import async_session_factory
+            return async_session_factory
+        return self.session_factory
+
+    def start(self) -> None:
+        """ワーカーを起動する（lifespan から呼ぶ）"""
+        if self._loop_task is None:
+            self._wake = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        """ジョブが登録されたことを知らせる（起動していなければ何もしない）"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        """新しいジョブの取得をやめ、実行中のジョブの完了を少し待って停止する"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+            self._wake = None
+        if self._running:
+            _, pending = await asyncio.wait(set(self._running), timeout=_SHUTDOWN_GRACE_SECONDS)
+            for job_task in pending:
+                job_task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.dispatch()
+            except Exception:
+                logger.exception("M365 ジョブの取得に失敗しました")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def dispatch(self) -> int:
+        """空いている枠の数だけジョブを取得して実行を開始する"""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        async with self._factory()() as db:
+            job_ids = await claim_jobs(db, self.worker_id, free)
+        for job_id in job_ids:
+            job_task = asyncio.create_task(self._run_job(job_id))
+            self._running.add(job_task)
+            job_task.add_done_callback(self._job_done)
+        self.claimed += len(job_ids)
+        return len(job_ids)
+
+    def _job_done(self, job_task: asyncio.Task) -> None:
+        self._running.discard(job_task)
+        # 空いた枠ですぐに次のジョブを取得する
+        self.wake()
+
+    async def _run_job(self, job_id: int) -> None:
+        try:
+            status = await run_job(self._factory(), job_id, self.worker_id)
+        except Exception:
+            # リースが切れた後に他のワーカー（または次の取得）が再実行する
+            logger.exception(f"M365 ジョブの実行に失敗しました: job_id={job_id}")
+            return
+        if status == M365JobStatus.SUCCEEDED:
+            self.succeeded += 1
+        elif status == M365JobStatus.FAILED:
+            self.failed += 1
+        elif status == M365JobStatus.QUEUED:
+            self.retried += 1
+        else:
+            self.lost += 1
+
+    async def run_until_idle(self) -> None:
+        """実行できるジョブがなくなるまで実行する（テスト・管理コマンド用）"""
+        while True:
+            started = await self.dispatch()
+            if not started and not self._running:
+                return
+            if self._running:
+                await asyncio.wait(set(self._running), return_when=asyncio.FIRST_COMPLETED)
+
+    def clear(self) -> None:
+        self._reset_stats()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "lost": self.lost,
+        }
+
+
+m365_job_worker = M365JobWorker(settings.M365_JOB_WORKERS, settings.M365_JOB_POLL_SECONDS)
@@ -0,0 +1,425 @@
+"""
+M365 退職者処理・新規ユーザー作成のワークフロー
+
+USER_OFFBOARD / USER_ONBOARD タスクを、依存関係のあるステップの DAG として実行します。
+依存先がすべて成功したステップから開始し、互いに依存しないステップは同時に
+実行します（Graph への同時リクエスト数は共有のスロットルが制限します）。
+
+退職者処理（USER_OFFBOARD）::
+
+    block_sign_in ─┬─ revoke_sessions
+                   ├─ reset_mfa
+                   ├─ remove_groups ──────────┬─ remove_licenses
+                   └─ revoke_onedrive_shares ─┘
+
+- セッションの無効化はサインインのブロックの後に行います（先に無効化しても
+  再サインインできるため）。
+- ライセンスの剥奪は、グループからの削除（グループ経由のライセンスが外れる）と
+  OneDrive の共有解除（ライセンスを外すと OneDrive を操作できなくなる）の後に行います。
+
+新規ユーザー作成（USER_ONBOARD）::
+
+    create_user ─┬─ assign_licenses
+                 └─ add_groups
+
+- ステップの状態は m365_workflow_steps に1ステップ1行で記録します。ステップが
+  終わるごとに状態とステップごとの実行ログ（M365ExecutionLog）を記録し、
+  ジョブのリースを延長します（チェックポイント）。
+- ジョブが再実行された場合は成功していないステップだけを実行します。失敗した
+  ステップに依存するステップは実行せず、未実施のまま残します。
+- ステップが例外で失敗した場合も、実行中の他のステップの完了と記録を待ってから
+  その例外をジョブに返します（一時的なエラーならジョブごとリトライされます）。
+- 初期パスワードはステップの結果・実行ログ・ジョブの結果には残さず、ジョブの
+  secrets に記録します（ジョブの取得で1回だけ返し、返した時点で消します）。
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.m365.exceptions import M365Error
+from app.m365.operations import M365Operations
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365StepStatus,
+    M365Task,
+    M365TaskType,
+    M365WorkflowStep,
+)
+from app.services.m365_bulk import LeaseLostError, renew_job_lease
+from utils.masking import mask_pii
+
+
+logger = logging.getLogger(__name__)
+
+# ステップの結果から取り除いてジョブの secrets に移す項目
+SECRET_KEYS = ("temporary_password",)
+
+# (M365Operations, 対象UPN, パラメータ, 操作内容) → 実行結果
+StepRunner = Callable[[M365Operations, str, dict[str, Any], str], Awaitable[dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class WorkflowStep:
+    """ワークフローの1ステップ
+
+    Attributes:
+        key: ステップ名（m365_workflow_steps.step_key）
+        run: 実行する操作（結果の failed が空でなければ失敗として扱う）
+        depends_on: 先に成功している必要があるステップ
+        params: タスク作成時に受け取るパラメータ名
+    """
+
+    key: str
+    run: StepRunner
+    depends_on: tuple[str, ...] = ()
+    params: tuple[str, ...] = ()
+
+
+OFFBOARDING_STEPS = (
+    WorkflowStep(
+        "block_sign_in",
+        lambda ops, upn, params, action: ops.block_sign_in(upn, operator_comment=action),
+    ),
+    WorkflowStep(
+        "revoke_sessions",
+        lambda ops, upn, params, action: ops.revoke_sign_in_sessions(upn, operator_comment=action),
+        depends_on=("block_sign_in",),
+    ),
+    WorkflowStep(
+        "reset_mfa",
+        lambda ops, upn, params, action: ops.reset_mfa(upn, operator_comment=action),
+        depends_on=("block_sign_in",),
+    ),
+    WorkflowStep(
+        "remove_groups",
+        lambda ops, upn, params, action: ops.remove_user_from_all_groups(upn, operator_comment=action),
+        depends_on=("block_sign_in",),
+    ),
+    WorkflowStep(
+        "revoke_onedrive_shares",
+        lambda ops, upn, params, action: ops.revoke_onedrive_shares(upn, operator_comment=action),
+        depends_on=("block_sign_in",),
+    ),
+    WorkflowStep(
+        "remove_licenses",
+        lambda ops, upn, params, action: ops.remove_direct_licenses(upn, operator_comment=action),
+        depends_on=("remove_groups", "revoke_onedrive_shares"),
+    ),
+)
+
+ONBOARDING_STEPS = (
+    WorkflowStep(
+        "create_user",
+        lambda ops, upn, params, action: ops.create_user(
+            upn, params.get("display_name"), params.get("usage_location"), operator_comment=action
+        ),
+        params=("display_name", "usage_location"),
+    ),
+    WorkflowStep(
+        "assign_licenses",
+        lambda ops, upn, params, action: ops.assign_licenses(
+            upn, params.get("license_sku_ids", []), operator_comment=action
+        ),
+        depends_on=("create_user",),
+        params=("license_sku_ids",),
+    ),
+    WorkflowStep(
+        "add_groups",
+        lambda ops, upn, params, action: ops.add_user_to_groups(
+            upn, params.get("group_ids", []), operator_comment=action
+        ),
+        depends_on=("create_user",),
+        params=("group_ids",),
+    ),
+)
+
+WORKFLOWS: dict[M365TaskType, tuple[WorkflowStep, ...]] = {
+    M365TaskType.USER_OFFBOARD: OFFBOARDING_STEPS,
+    M365TaskType.USER_ONBOARD: ONBOARDING_STEPS,
+}
+
+WORKFLOW_TASK_TYPES = frozenset(WORKFLOWS)
+
+
+def _check_order(steps: tuple[WorkflowStep, ...]) -> None:
+    """依存先がそのステップより前に定義されていることを確認する（循環しない）"""
+    defined: set[str] = set()
+    for step in steps:
+        unknown = set(step.depends_on) - defined
+        if unknown:
+            raise ValueError(f"Workflow step {step.key} depends on undefined steps: {sorted(unknown)}")
+        defined.add(step.key)
+
+
+for _steps in WORKFLOWS.values():
+    _check_order(_steps)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ============== 登録・進捗 ==============
+
+def build_workflow_steps(task_type: M365TaskType, options: Optional[dict[str, Any]] = None) -> list[M365WorkflowStep]:
+    """タスク作成時に登録するステップ（各ステップが受け取るパラメータを含む）"""
+    options = options or {}
+    steps = []
+    for step in WORKFLOWS[task_type]:
+        params = {name: options[name] for name in step.params if options.get(name) is not None}
+        steps.append(M365WorkflowStep(
+            step_key=step.key,
+            status=M365StepStatus.PENDING,
+            params=json.dumps(params, ensure_ascii=False) if params else None,
+        ))
+    return steps
+
+
+async def reset_failed_steps(db: AsyncSession, task_id: int) -> int:
+    """失敗したステップを未実施に戻す（再実行時、コミットは呼び出し側）"""
+    result = await db.execute(
+        update(M365WorkflowStep)
+        .where(M365WorkflowStep.task_id == task_id, M365WorkflowStep.status == M365StepStatus.FAILED)
+        .values(status=M365StepStatus.PENDING)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def workflow_progress(db: AsyncSession, task_id: int) -> dict[str, Any]:
+    """ステップの状態ごとの件数とステップ一覧"""
+    rows = (await db.execute(
+        select(M365WorkflowStep).where(M365WorkflowStep.task_id == task_id).order_by(M365WorkflowStep.id)
+    )).scalars().all()
+    counts = {status.value: 0 for status in M365StepStatus}
+    steps = []
+    for row in rows:
+        counts[row.status.value] += 1
+        steps.append({
+            "step": row.step_key,
+            "status": row.status.value,
+            "attempts": row.attempts,
+            "error_message": row.error_message,
+            "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+        })
+    return {"total": len(rows), **counts, "steps": steps}
+
+
+# ============== 実行 ==============
+
+async def _load_steps(
+    session_factory: async_sessionmaker, task: M365Task
+) -> dict[str, tuple[int, M365StepStatus, dict[str, Any]]]:
+    """ステップの (ID, 状態, パラメータ) を読み込む（未登録のステップは登録する）"""
+    async with session_factory() as db:
+        rows = (await db.execute(
+            select(M365WorkflowStep).where(M365WorkflowStep.task_id == task.id)
+        )).scalars().all()
+        states = {
+            row.step_key: (row.id, row.status, json.loads(row.params) if row.params else {})
+            for row in rows
+        }
+        missing = [
+            M365WorkflowStep(task_id=task.id, step_key=step.key, status=M365StepStatus.PENDING)
+            for step in WORKFLOWS[task.task_type]
+            if step.key not in states
+        ]
+        if missing:
+            # ステップを登録せずに作成されたタスク
+            db.add_all(missing)
+            await db.flush()
+            states.update({row.step_key: (row.id, M365StepStatus.PENDING, {}) for row in missing})
+            await db.commit()
+    return states
+
+
+def _step_error(error: Optional[Exception], result: dict[str, Any]) -> Optional[str]:
+    """ステップのエラーメッセージ（成功した場合は None）"""
+    if error is not None:
+        return error.message if isinstance(error, M365Error) else str(error)
+    failed = result.get("failed")
+    if failed:
+        return f"{len(failed)} items failed"
+    return None
+
+
+async def execute_workflow_task(
+    session_factory: async_sessionmaker,
+    job: M365Job,
+    task: M365Task,
+    m365_ops: M365Operations,
+    worker_id: str,
+    action: str,
+) -> dict[str, Any]:
+    """ワークフロータスクの成功していないステップを DAG の順に実行する
+
+    Returns:
+        実行結果（ステップの成功・失敗件数、失敗・未実施のステップ、今回の各ステップの結果）
+
+    Raises:
+        LeaseLostError: ジョブのリースを失った
+        M365Error: ステップが例外で失敗した（他のステップの結果は記録済み）
+    """
+    steps = WORKFLOWS[task.task_type]
+    states = await _load_steps(session_factory, task)
+    succeeded = {key for key, (_, status, _) in states.items() if status == M365StepStatus.SUCCEEDED}
+    failed: dict[str, str] = {}
+    results: dict[str, dict[str, Any]] = {}
+    errors: list[Exception] = []
+    running: dict[asyncio.Task, WorkflowStep] = {}
+    checkpoint_lock = asyncio.Lock()
+
+    async def run_step(step: WorkflowStep) -> Optional[str]:
+        step_id, _, params = states[step.key]
+        started_at = _now()
+        result: dict[str, Any] = {}
+        error: Optional[Exception] = None
+        try:
+            result = await step.run(m365_ops, task.target_upn, params, action)
+        except Exception as e:
+            error = e
+        error_message = _step_error(error, result)
+        secrets = {key: result.pop(key) for key in SECRET_KEYS if key in result}
+        results[step.key] = result if error is None else {"error": error_message}
+        logger.info(
+            f"M365 workflow step finished: task_id={task.id}, step={step.key}, "
+            f"target={mask_pii(task.target_upn)}, result={'failure' if error_message else 'success'}"
+        )
+        # チェックポイントは1つずつ書き込む
+        async with checkpoint_lock:
+            await _checkpoint(
+                session_factory, job, task, worker_id, action, step_id, step.key,
+                results[step.key], secrets, error_message, started_at,
+            )
+        if error is not None:
+            raise error
+        return error_message
+
+    def ready() -> list[WorkflowStep]:
+        started = set(failed) | succeeded | {step.key for step in running.values()}
+        return [
+            step for step in steps
+            if step.key not in started and all(dep in succeeded for dep in step.depends_on)
+        ]
+
+    lease_lost: Optional[LeaseLostError] = None
+    while True:
+        # リースを失ったら新しいステップは始めない
+        if lease_lost is None:
+            for step in ready():
+                running[asyncio.create_task(run_step(step))] = step
+        if not running:
+            break
+        # 実行中のステップは中断せず、Graph に反映した結果を記録してから終える
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for step_task in finished:
+            step = running.pop(step_task)
+            try:
+                error_message = step_task.result()
+            except LeaseLostError as e:
+                lease_lost = e
+                failed[step.key] = str(e)
+                continue
+            except Exception as e:
+                errors.append(e)
+                failed[step.key] = _step_error(e, {})
+                continue
+            if error_message:
+                failed[step.key] = error_message
+            else:
+                succeeded.add(step.key)
+
+    if lease_lost is not None:
+        raise lease_lost
+    if errors:
+        raise errors[0]
+
+    blocked = [step.key for step in steps if step.key not in succeeded and step.key not in failed]
+    logger.info(
+        f"M365 workflow processed: task_id={task.id}, type={task.task_type}, "
+        f"succeeded={len(succeeded)}, failed={len(failed)}, blocked={len(blocked)}"
+    )
+    return {
+        "status": "success" if not failed else "partial" if succeeded else "failed",
+        "message": f"{len(succeeded)} of {len(steps)} steps succeeded",
+        "target_upn": task.target_upn,
+        "total": len(steps),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "failed_steps": failed,
+        # 失敗したステップに依存するため実行しなかったステップ
+        "blocked_steps": blocked,
+        "step_results": results,
+    }
+
+
+async def _checkpoint(
+    session_factory: async_sessionmaker,
+    job: M365Job,
+    task: M365Task,
+    worker_id: str,
+    action: str,
+    step_id: int,
+    step_key: str,
+    result: dict[str, Any],
+    secrets: dict[str, Any],
+    error_message: Optional[str],
+    started_at: datetime,
+) -> None:
+    """ステップの結果（実行ログと状態）を記録し、リースを延長する"""
+    now = _now()
+    result_details = json.dumps(result, ensure_ascii=False, default=str)
+    async with session_factory() as db:
+        await renew_job_lease(db, job.id, worker_id)
+
+        if secrets:
+            stored = await db.scalar(select(M365Job.secrets).where(M365Job.id == job.id))
+            await db.execute(
+                update(M365Job)
+                .where(M365Job.id == job.id)
+                .values(secrets=json.dumps(
+                    {**(json.loads(stored) if stored else {}), step_key: secrets}, ensure_ascii=False
+                ))
+                .execution_options(synchronize_session=False)
+            )
+
+        db.add(M365ExecutionLog(
+            task_id=task.id,
+            operator_id=job.operator_id,
+            action=action,
+            method="graph_api",
+            command_or_action=json.dumps({
+                "task_type": task.task_type.value,
+                "step": step_key,
+                "target_upn": task.target_upn,
+            }),
+            result="failure" if error_message else "success",
+            result_details=json.dumps(
+                {"job_id": job.id, "step": step_key, **result}, ensure_ascii=False, default=str
+            ),
+            error_message=error_message,
+            executed_at=now,
+        ))
+        await db.execute(
+            update(M365WorkflowStep)
+            .where(M365WorkflowStep.id == step_id)
+            .values(
+                status=M365StepStatus.FAILED if error_message else M365StepStatus.SUCCEEDED,
+                attempts=M365WorkflowStep.attempts + 1,
+                result=result_details,
+                error_message=error_message,
+                started_at=started_at,
+                completed_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
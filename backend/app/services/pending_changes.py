@@ -0,0 +1,85 @@
+"""
+コミット後に反映するプロセス内索引の変更
+
+検索インデックスやベクトル索引などプロセス内の索引は、マッパーイベント
+（after_insert / after_update / after_delete）で記事・チケットの変更を検知し、
+トランザクションがコミットされた後にだけ反映します（ロールバックされた変更を
+索引に残さないため）。PendingChanges は変更を Session.info に対象ごとに溜め、
+after_commit で反映関数に渡し、after_soft_rollback で破棄します。
+
+- 同じトランザクションで同じ対象を複数回変更した場合は最後の変更だけを反映します。
+- 反映は変更したワーカーの索引にのみ行われます（他のワーカーは各索引の
+  差分同期で取り込みます）。
+"""
+
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+
+# (操作, 内容) の組
+Change = tuple[str, Any]
+
+
+def _row_id(target: Any) -> Hashable:
+    return target.id
+
+
+class PendingChanges:
+    """Session ごとに対象の変更を溜め、コミット後に反映する
+
+    Args:
+        name: Session.info のキー（索引ごとに一意）
+        apply: コミット後に (キー, 変更) を受け取って索引に反映する関数
+        key: 対象からキーを求める関数（省略時は主キーの id）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        apply: Callable[[Hashable, Change], None],
+        key: Callable[[Any], Hashable] = _row_id,
+    ):
+        self.name = name
+        self._apply = apply
+        self._key = key
+        event.listen(Session, "after_commit", self._apply_changes)
+        event.listen(Session, "after_soft_rollback", self._discard_changes)
+
+    def queue(self, target: Any, change: Change) -> None:
+        """対象の変更をコミット後の反映待ちに加える（同じ対象の前の変更は置き換え）"""
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(self.name, {})[self._key(target)] = change
+
+    def queued(self, target: Any) -> Change | None:
+        """同じトランザクションで反映待ちになっている対象の変更"""
+        session = object_session(target)
+        if session is None:
+            return None
+        return (session.info.get(self.name) or {}).get(self._key(target))
+
+    def _apply_changes(self, session: Session) -> None:
+        for key, change in session.info.pop(self.name, {}).items():
+            self._apply(key, change)
+
+    def _discard_changes(self, session: Session, previous_transaction) -> None:
+        session.info.pop(self.name, None)
+
+
+def apply_index_change(index: Any, doc_id: int, change: Change) -> None:
+    """("index", (内容, メタデータ)) / ("meta", メタデータ) / ("remove", None) を索引に反映する
+
+    index は add(doc_id, 内容, メタデータ, 版) / update_meta / remove を持つ索引です。
+    """
+    action, payload = change
+    if action == "index":
+        content, meta = payload
+        # 更新日時はサーバー側で採番されるため不明（次回の差分同期で確定）
+        index.add(doc_id, content, meta, None)
+    elif action == "meta":
+        index.update_meta(doc_id, payload)
+    else:
+        index.remove(doc_id)
@@ -0,0 +1,338 @@
+"""
+ベクトル類似度検索（特徴ハッシング + コサイン類似度）
+
+外部の埋め込み API を使わずに「似たチケット」「関連するナレッジ記事」を
+求めるための、プロセス内のベクトル索引です。
+
+- テキストは検索と同じ解析器（app.services.text_analysis）で語に分割し、
+  語をハッシュで固定次元に写像します（特徴ハッシング）。語彙表を持たないため、
+  文書の追加・削除で他の文書のベクトルが変わることはありません。
+- 文書ベクトルは語の出現数（1 + log tf）を L2 正規化したもので、格納と
+  上位 k 件の検索はベクトル格納（app.services.vector_index の IVF-flat
+  または pgvector）に任せます。
+- IDF（語の希少さ）は次元ごとの文書頻度から検索時にクエリ側にだけ掛けます。
+  文書側に掛けると文書の追加のたびに全行の再計算が必要になるためです。
+- 絞り込み条件（解決済み・閲覧可能など）は文書ごとのメタデータで判定し、
+  ベクトル格納からは多めに候補を受け取ります。
+- 索引はディレクトリに保存でき（ID・メタデータは JSON、文書頻度は .npz、
+  ベクトルは格納の実装ごと）、起動時に読み込めます。
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import zlib
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.services.text_analysis import TextAnalyzer, default_analyzer
+from app.services.vector_index import IVFFlatIndex, VectorIndex
+
+
+# 保存形式のバージョン（互換性のない変更時に更新）
+FORMAT_VERSION = 3
+
+_STATE_FILE = "state.json"
+_ARRAYS_FILE = "state.npz"
+
+
+class HashedVectorizer:
+    """テキストを固定次元の疎な語ベクトルに変換する
+
+    Args:
+        dimensions: ベクトルの次元数
+        analyzer: テキストを語に分割する解析器
+    """
+
+    def __init__(self, dimensions: int = 1024, analyzer: TextAnalyzer = default_analyzer):
+        self.dimensions = dimensions
+        self.analyzer = analyzer
+        self.vectorizer_id = f"hash-{dimensions}-{analyzer.analyzer_id}"
+
+        @lru_cache(maxsize=1 << 18)
+        def feature(term: str) -> tuple[int, float]:
+            # プロセスごとに値が変わる hash() ではなく CRC32 を使う（保存した索引と整合させるため）
+            code = zlib.crc32(term.encode("utf-8"))
+            # 最上位ビットで符号を決め、衝突した語の寄与が打ち消し合うようにする
+            return code % dimensions, (1.0 if code & 0x80000000 else -1.0)
+
+        self._feature = feature
+
+    def features(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """(次元の配列, 値の配列) を返す（値は 0 でない次元のみ）"""
+        counts: dict[int, float] = {}
+        for term in self.analyzer(text):
+            index, sign = self._feature(term)
+            counts[index] = counts.get(index, 0.0) + sign
+        indices = np.fromiter((i for i, c in counts.items() if c), dtype=np.int64)
+        values = np.fromiter(
+            (math.copysign(1 + math.log(abs(c)), c) for c in counts.values() if c),
+            dtype=np.float32,
+        )
+        return indices, values
+
+    def transform(self, text: str) -> np.ndarray:
+        """L2 正規化した密ベクトルを返す（語がなければ零ベクトル）"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        indices, values = self.features(text)
+        if len(indices):
+            vector[indices] = values
+            vector /= np.linalg.norm(vector)
+        return vector
+
+
+class SimilarityIndex:
+    """コサイン類似度で上位 k 件を返す増分更新可能なベクトル索引
+
+    Args:
+        vectorizer: テキストのベクトル化に使う HashedVectorizer
+        store: ベクトルの格納先（省略時は IVFFlatIndex）
+        encode_meta: メタデータを JSON で表せる値に変換する関数（保存用）
+        decode_meta: encode_meta の逆変換（復元用）
+    """
+
+    def __init__(
+        self,
+        vectorizer: HashedVectorizer,
+        store: VectorIndex | None = None,
+        encode_meta: Callable[[Any], Any] | None = None,
+        decode_meta: Callable[[Any], Any] | None = None,
+    ):
+        self.vectorizer = vectorizer
+        self.dimensions = vectorizer.dimensions
+        self.store = store if store is not None else IVFFlatIndex(vectorizer.dimensions)
+        self.encode_meta = encode_meta
+        self.decode_meta = decode_meta
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # 文書ID → (メタデータ, バージョン, 0 でない次元のビット列)
+        # ビット列は削除時に文書頻度を戻すため（ベクトル本体は格納先にのみ持つ）
+        self._docs: dict[int, tuple[Any, Any, bytes]] = {}
+        # 次元ごとの文書頻度（IDF 用）
+        self._df = np.zeros(self.dimensions, dtype=np.int64)
+        self.dirty = False
+
+    @property
+    def signature(self) -> tuple:
+        """保存ファイルが現在の設定で再利用できるかを判定するための識別子"""
+        return (FORMAT_VERSION, self.vectorizer.vectorizer_id, self.store.kind)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._docs
+
+    def doc_ids(self) -> list[int]:
+        with self._lock:
+            return list(self._docs)
+
+    def version(self, doc_id: int) -> Any:
+        entry = self._docs.get(doc_id)
+        return None if entry is None else entry[1]
+
+    def meta(self, doc_id: int) -> Any:
+        entry = self._docs.get(doc_id)
+        return None if entry is None else entry[0]
+
+    # ============== 更新 ==============
+
+    def add(self, doc_id: int, text: str, meta: Any = None, version: Any = None) -> None:
+        """文書を索引に追加する（既存の文書は置き換え）"""
+        vector = self.vectorizer.transform(text)
+        nonzero = vector != 0
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = (meta, version, np.packbits(nonzero).tobytes())
+            self._df += nonzero
+            self.store.add(doc_id, vector)
+            self.dirty = True
+
+    def update_meta(self, doc_id: int, meta: Any) -> None:
+        """ベクトルを作り直さずにメタデータのみ更新する"""
+        with self._lock:
+            entry = self._docs.get(doc_id)
+            if entry is not None:
+                self._docs[doc_id] = (meta, *entry[1:])
+                self.dirty = True
+
+    def remove(self, doc_id: int) -> None:
+        """文書を索引から削除する"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int, from_store: bool = True) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        self._df -= np.unpackbits(np.frombuffer(entry[2], dtype=np.uint8), count=self.dimensions)
+        if from_store:
+            self.store.remove(doc_id)
+        self.dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self.store.clear()
+
+    async def flush(self) -> None:
+        """追加・削除をベクトルの格納先へ反映する（pgvector のみ意味を持つ）"""
+        await self.store.flush()
+
+    # ============== 検索 ==============
+
+    def query_vector(self, text: str) -> np.ndarray:
+        """クエリのベクトル（IDF で重み付けして L2 正規化）"""
+        vector = self.vectorizer.transform(text)
+        with self._lock:
+            n_docs = len(self._docs)
+            idf = np.log((1 + n_docs) / (1 + self._df)).astype(np.float32) + 1
+        vector *= idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def search(
+        self,
+        text: str,
+        k: int = 5,
+        predicate: Callable[[int, Any], bool] | None = None,
+        min_score: float = 0.0,
+    ) -> list[tuple[int, float]]:
+        """テキストに類似した文書を (文書ID, コサイン類似度) の降順で返す
+
+        Args:
+            text: クエリのテキスト
+            k: 返す件数の上限
+            predicate: (文書ID, メタデータ) を受け取り、対象とする文書なら True を返す関数
+            min_score: これ以下の類似度の文書は返さない
+        """
+        query = self.query_vector(text)
+        n_docs = len(self._docs)
+        if not query.any() or n_docs == 0:
+            return []
+
+        # 絞り込みで落ちる分を見込んで多めに候補を取り、足りなければ全件から取り直す
+        n_candidates = min(n_docs, max(k * 8, 32))
+        hits, complete = self._collect(await self.store.search(query, n_candidates), k, predicate, min_score)
+        if not complete and n_candidates < n_docs:
+            # 全件の絞り込みも数十ミリ秒かかるため、イベントループの外で行う
+            candidates = await self.store.search(query, n_docs, exact=True)
+            hits, _ = await asyncio.to_thread(self._collect, candidates, k, predicate, min_score)
+        return hits
+
+    def _collect(
+        self,
+        candidates: Iterable[tuple[int, float]],
+        k: int,
+        predicate: Callable[[int, Any], bool] | None,
+        min_score: float,
+    ) -> tuple[list[tuple[int, float]], bool]:
+        """候補を絞り込む（k 件揃うか min_score に達した場合は完了として True を返す）"""
+        hits = []
+        with self._lock:
+            for doc_id, score in candidates:
+                if score <= min_score:
+                    return hits, True
+                entry = self._docs.get(doc_id)
+                if entry is None:
+                    # 格納先に残った削除済みの文書
+                    continue
+                if predicate is None or predicate(doc_id, entry[0]):
+                    hits.append((doc_id, score))
+                    if len(hits) == k:
+                        return hits, True
+        return hits, False
+
+    # ============== 保存・復元 ==============
+
+    def save(self, directory: Path) -> None:
+        """索引をディレクトリへ保存する（一時ファイルに書いてから置き換え）"""
+        encode = self.encode_meta
+        with self._lock:
+            ids = np.fromiter(self._docs, dtype=np.int64, count=len(self._docs))
+            metas, versions, bits = [], [], []
+            for meta, version, nonzero in self._docs.values():
+                metas.append(meta if encode is None or meta is None else encode(meta))
+                versions.append(version)
+                bits.append(np.frombuffer(nonzero, dtype=np.uint8))
+            state = {
+                "signature": self.signature,
+                "ids": ids.tolist(),
+                "metas": metas,
+                "versions": versions,
+            }
+            df = self._df.copy()
+            self.dirty = False
+
+        nonzero = np.stack(bits) if bits else np.zeros((0, (self.dimensions + 7) // 8), dtype=np.uint8)
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.store.save(directory)
+            # 配列 → JSON の順に置き換える（読み込み時に ID の一致で組を確認する）
+            tmp_arrays = directory / (_ARRAYS_FILE + ".tmp")
+            with open(tmp_arrays, "wb") as f:
+                np.savez(f, ids=ids, df=df, nonzero=nonzero)
+            os.replace(tmp_arrays, directory / _ARRAYS_FILE)
+            tmp_state = directory / (_STATE_FILE + ".tmp")
+            tmp_state.write_text(json.dumps(state, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_state, directory / _STATE_FILE)
+        except BaseException:
+            self.dirty = True
+            raise
+
+    def load(self, directory: Path) -> bool:
+        """保存ディレクトリから索引を復元する
+
+        Returns:
+            復元できた場合 True（ファイルがない・設定が異なる場合は False）
+        """
+        decode = self.decode_meta
+        try:
+            state = json.loads((directory / _STATE_FILE).read_text(encoding="utf-8"))
+            if state.get("signature") != json.loads(json.dumps(self.signature)):
+                return False
+            with np.load(directory / _ARRAYS_FILE, allow_pickle=False) as arrays:
+                ids, df, nonzero = arrays["ids"], arrays["df"], arrays["nonzero"]
+            n_docs = len(state["ids"])
+            if (
+                ids.tolist() != state["ids"]
+                or len(state["metas"]) != n_docs
+                or len(state["versions"]) != n_docs
+                or df.shape != (self.dimensions,)
+                or nonzero.shape != (n_docs, (self.dimensions + 7) // 8)
+            ):
+                return False
+            docs = {
+                doc_id: (
+                    meta if decode is None or meta is None else decode(meta),
+                    version,
+                    bits.tobytes(),
+                )
+                for doc_id, meta, version, bits in zip(state["ids"], state["metas"], state["versions"], nonzero)
+            }
+        except Exception:
+            # ファイルなし・破損時は呼び出し側で作り直す
+            return False
+        if not self.store.load(directory):
+            return False
+
+        with self._lock:
+            self._docs = docs
+            self._df = df.astype(np.int64)
+            self.dirty = False
+            stored = self.store.doc_ids()
+            if stored is not None:
+                # 保存のタイミングのずれで片方にしかない文書を除く（差分同期で索引し直される）
+                for doc_id in self._docs.keys() - stored:
+                    self._remove(doc_id, from_store=False)
+                for doc_id in stored - self._docs.keys():
+                    self.store.remove(doc_id)
+        return True
@@ -0,0 +1,183 @@
+"""
+日本語向けテキスト解析（正規化・トークン化・同義語）
+
+検索索引（app.services.text_index）に渡すトークナイザです。
+記事やチケットは日本語が中心のため、形態素解析器に頼らず次の処理を
+純 Python で行います。
+
+1. NFKC 正規化（半角カナ・全角英数・互換文字の統一: "ﾊﾟｽﾜｰﾄﾞ" → "パスワード"）
+2. 大文字小文字の畳み込み（casefold）とひらがな → カタカナの統一
+3. 同義語の代表語への置換（"pw", "password" → "パスワード" など）
+4. かな漢字の連続は文字 bi-gram、それ以外の英数字は単語として分割
+
+変換表・正規表現はモジュール読み込み時に一度だけ構築し、ASCII のみの
+テキストは NFKC・かな変換を省略します。処理性能は
+``python -m benchmarks.text_analysis`` で計測できます。
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections.abc import Iterable
+
+
+# 解析結果に影響する変更時に更新（保存済みの索引を作り直させるため）
+ANALYZER_VERSION = 1
+
+# かな漢字とみなす文字（長音符・踊り字を含む）
+_CJK_CHARS = (
+    "\u3005\u3006\u3007"    # 々〆〇
+    "\u3041-\u3096"         # ひらがな
+    "\u30a1-\u30fa\u30fc"   # カタカナ・長音符
+    "\u3400-\u4dbf"         # CJK 統合漢字拡張A
+    "\u4e00-\u9fff"         # CJK 統合漢字
+    "\uf900-\ufaff"         # CJK 互換漢字
+)
+
+# かな漢字の連続、またはそれ以外の英数字の連続
+_TOKEN_PATTERN = re.compile(rf"([{_CJK_CHARS}]+)|([^\W_{_CJK_CHARS}]+)")
+
+# ひらがな → カタカナ
+_KANA_FOLD = {code: code + 0x60 for code in range(0x3041, 0x3097)}
+
+# 同義語グループ（先頭が代表語）。表記は正規化前でよい
+DEFAULT_SYNONYMS: tuple[tuple[str, ...], ...] = (
+    ("パスワード", "password", "passwd", "pw", "pwd"),
+    ("ログイン", "サインイン", "ログオン", "login", "signin", "sign-in", "logon"),
+    ("ログアウト", "サインアウト", "ログオフ", "logout", "signout", "sign-out", "logoff"),
+    ("メール", "電子メール", "eメール", "email", "e-mail", "mail"),
+    ("多要素認証", "二要素認証", "2段階認証", "mfa", "2fa"),
+    ("パソコン", "コンピューター", "コンピュータ", "pc"),
+    ("プリンター", "プリンタ", "printer"),
+    ("サーバー", "サーバ", "server"),
+    ("ユーザー", "ユーザ", "user"),
+    ("アカウント", "account"),
+    ("ライセンス", "license", "licence"),
+    ("チームズ", "teams"),
+    ("アウトルック", "outlook"),
+    ("ワンドライブ", "onedrive"),
+    ("シェアポイント", "sharepoint"),
+)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """語の集合を接頭辞を共有する正規表現にする（長い語を優先して一致）"""
+    root: dict[str, dict] = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        terminal = "" in node
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if terminal else group
+
+    return build(root)
+
+
+class TextAnalyzer:
+    """正規化・同義語置換・トークン化を行う解析器
+
+    インスタンスは呼び出し可能で、InvertedIndex の tokenizer として使えます。
+
+    Args:
+        synonyms: 同義語グループ（各グループの先頭が代表語）
+        fold_kana: ひらがなをカタカナに統一する
+    """
+
+    def __init__(
+        self,
+        synonyms: Iterable[Iterable[str]] = DEFAULT_SYNONYMS,
+        fold_kana: bool = True,
+    ):
+        self.fold_kana = fold_kana
+        self.synonyms = self._build_synonyms(synonyms)
+        self._synonym_pattern = self._compile_synonyms(self.synonyms)
+
+        config = repr((ANALYZER_VERSION, fold_kana, sorted(self.synonyms.items())))
+        digest = hashlib.sha1(config.encode("utf-8")).hexdigest()[:8]
+        # 索引の保存ファイルとの整合性確認用（設定が変われば別の値になる）
+        self.analyzer_id = f"ja-{ANALYZER_VERSION}-{digest}"
+
+    def _fold(self, text: str) -> str:
+        if not unicodedata.is_normalized("NFKC", text):
+            text = unicodedata.normalize("NFKC", text)
+        text = text.casefold()
+        if self.fold_kana:
+            text = text.translate(_KANA_FOLD)
+        return text
+
+    def _build_synonyms(self, groups: Iterable[Iterable[str]]) -> dict[str, str]:
+        """表記 → 代表語 の表（表記・代表語とも正規化済み）
+
+        代表語自身も含めます。"プリンタ" が "プリンター" の先頭に
+        一致しないよう、置換時は長い表記を優先するためです。
+        """
+        table: dict[str, str] = {}
+        for group in groups:
+            forms = [self._fold(form) for form in group]
+            for form in forms:
+                if form:
+                    table[form] = forms[0]
+        return table
+
+    @staticmethod
+    def _compile_synonyms(table: dict[str, str]) -> re.Pattern[str] | None:
+        """同義語を一度に置換する正規表現
+
+        表記を文字単位のトライにまとめた正規表現にすることで、各位置での
+        照合が先頭文字の分岐1回で済むようにしています（表記を単純に
+        "|" で並べると全表記を順に試すため数倍遅くなります）。
+        """
+        ascii_forms = [form for form in table if form.isascii()]
+        other_forms = [form for form in table if not form.isascii()]
+        alternatives = []
+        if ascii_forms:
+            # 英数字の表記は単語境界でのみ一致させる（"mail" と "gmail" など）
+            alternatives.append(rf"(?<![0-9a-z])(?:{_trie_pattern(ascii_forms)})(?![0-9a-z])")
+        if other_forms:
+            alternatives.append(_trie_pattern(other_forms))
+        return re.compile("|".join(alternatives)) if alternatives else None
+
+    def normalize(self, text: str) -> str:
+        """NFKC・casefold・かな統一・同義語置換を適用した文字列を返す"""
+        if text.isascii():
+            # ASCII は NFKC で変化せず、かなも含まない
+            text = text.lower()
+        else:
+            text = self._fold(text)
+        if self._synonym_pattern is not None:
+            synonyms = self.synonyms
+            text = self._synonym_pattern.sub(lambda m: synonyms[m.group()], text)
+        return text
+
+    def tokenize(self, text: str) -> list[str]:
+        """正規化済みの文字列を語に分割する
+
+        かな漢字の連続は重なりのある文字 bi-gram（1文字のみなら unigram）、
+        英数字の連続はそのまま1語とします。
+        """
+        tokens: list[str] = []
+        append = tokens.append
+        for cjk, word in _TOKEN_PATTERN.findall(text):
+            if word:
+                append(word)
+            elif len(cjk) == 1:
+                append(cjk)
+            else:
+                tokens.extend([cjk[i:i + 2] for i in range(len(cjk) - 1)])
+        return tokens
+
+    def __call__(self, text: str) -> list[str]:
+        return self.tokenize(self.normalize(text))
+
+
+# 検索索引で共有する既定の解析器
+default_analyzer = TextAnalyzer()
@@ -0,0 +1,288 @@
+"""
+転置インデックス（BM25F）
+
+フィールドごとの重み（ブースト）を持つ全文検索用の転置インデックスです。
+文書の追加・更新・削除はその文書のポスティングだけを書き換える増分更新で、
+インデックス全体はファイル（JSON）に保存・復元できます。
+
+スコアは BM25F で計算します。各フィールドの語出現数をフィールド長で正規化し、
+ブーストを掛けて合算した値に BM25 の飽和関数と IDF を適用します。
+
+    tf~(t, d) = Σ_f boost_f * tf_f / (1 - b + b * len_f / avglen_f)
+    score(d)  = Σ_t idf(t) * tf~ / (k1 + tf~)
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from collections.abc import Callable, Hashable, Iterable
+from pathlib import Path
+from typing import Any
+
+
+# 保存形式のバージョン（互換性のない変更時に更新）
+FORMAT_VERSION = 2
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+Tokenizer = Callable[[str], list[str]]
+
+
+def simple_tokenize(text: str) -> list[str]:
+    """英数字・かな漢字の連続を1語とする簡易トークナイザ"""
+    return _WORD_PATTERN.findall(text.lower())
+
+
+class InvertedIndex:
+    """フィールドブースト付き BM25F 転置インデックス
+
+    Args:
+        fields: フィールド名 → ブースト（定義順がポスティング内の並び順）
+        tokenizer: テキストを語のリストに分割する関数
+        tokenizer_id: トークナイザの識別子（保存ファイルとの整合性確認用）
+        k1, b: BM25 パラメータ
+        encode_meta: メタデータを JSON で表せる値に変換する関数（保存用）
+        decode_meta: encode_meta の逆変換（復元用）
+
+    文書ID とバージョンは JSON で表せる値（数値・文字列など）である必要があります。
+    """
+
+    def __init__(
+        self,
+        fields: dict[str, float],
+        tokenizer: Tokenizer = simple_tokenize,
+        tokenizer_id: str = "simple-1",
+        k1: float = 1.2,
+        b: float = 0.75,
+        encode_meta: Callable[[Any], Any] | None = None,
+        decode_meta: Callable[[Any], Any] | None = None,
+    ):
+        self.fields = list(fields)
+        self.boosts = [fields[name] for name in self.fields]
+        self.tokenizer = tokenizer
+        self.tokenizer_id = tokenizer_id
+        self.k1 = k1
+        self.b = b
+        self.encode_meta = encode_meta
+        self.decode_meta = decode_meta
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # term -> {doc_id: (tf_field0, tf_field1, ...)}
+        self.postings: dict[str, dict[Hashable, tuple[int, ...]]] = {}
+        # doc_id -> (len_field0, len_field1, ...)
+        self.doc_lengths: dict[Hashable, tuple[int, ...]] = {}
+        # doc_id -> 文書の語（削除時にポスティングを辿るため）
+        self.doc_terms: dict[Hashable, tuple[str, ...]] = {}
+        # doc_id -> 絞り込み用のメタデータ
+        self.doc_meta: dict[Hashable, Any] = {}
+        # doc_id -> 索引時点のバージョン（更新日時など。不明なら None）
+        self.doc_versions: dict[Hashable, Any] = {}
+        self.total_lengths = [0] * len(self.fields)
+        self.dirty = False
+
+    @property
+    def signature(self) -> tuple:
+        """保存ファイルが現在の設定で再利用できるかを判定するための識別子"""
+        return (FORMAT_VERSION, self.tokenizer_id, tuple(zip(self.fields, self.boosts)))
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.doc_lengths
+
+    # ============== 更新 ==============
+
+    def add(
+        self,
+        doc_id: Hashable,
+        fields: dict[str, str | None],
+        meta: Any = None,
+        version: Any = None,
+    ) -> None:
+        """文書を索引に追加する（既存の文書は置き換え）"""
+        counts = [Counter(self.tokenizer(fields.get(name) or "")) for name in self.fields]
+        terms = set().union(*counts)
+
+        with self._lock:
+            self._remove(doc_id)
+            for term in terms:
+                self.postings.setdefault(term, {})[doc_id] = tuple(c[term] for c in counts)
+            lengths = tuple(sum(c.values()) for c in counts)
+            self.doc_lengths[doc_id] = lengths
+            self.doc_terms[doc_id] = tuple(terms)
+            self.doc_meta[doc_id] = meta
+            self.doc_versions[doc_id] = version
+            for i, length in enumerate(lengths):
+                self.total_lengths[i] += length
+            self.dirty = True
+
+    def update_meta(self, doc_id: Hashable, meta: Any) -> None:
+        """本文を索引し直さずにメタデータのみ更新する"""
+        with self._lock:
+            if doc_id in self.doc_meta:
+                self.doc_meta[doc_id] = meta
+                self.dirty = True
+
+    def remove(self, doc_id: Hashable) -> None:
+        """文書を索引から削除する"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: Hashable) -> None:
+        lengths = self.doc_lengths.pop(doc_id, None)
+        if lengths is None:
+            return
+        for term in self.doc_terms.pop(doc_id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.doc_meta.pop(doc_id, None)
+        self.doc_versions.pop(doc_id, None)
+        for i, length in enumerate(lengths):
+            self.total_lengths[i] -= length
+        self.dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    # ============== 検索 ==============
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        predicate: Callable[[Any], bool] | None = None,
+    ) -> list[tuple[Hashable, float]]:
+        """クエリに一致する文書をスコア降順で返す
+
+        Args:
+            query: 検索文字列（索引と同じトークナイザで分割）
+            limit: 返す件数の上限（None なら全件）
+            predicate: メタデータを受け取り、対象とする文書なら True を返す関数
+
+        Returns:
+            (doc_id, score) のリスト
+        """
+        terms = set(self.tokenizer(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_lengths = [max(total / n_docs, 1e-9) for total in self.total_lengths]
+            k1, b = self.k1, self.b
+            field_weights = list(zip(self.boosts, avg_lengths))
+
+            allowed: dict[Hashable, bool] = {}
+            scores: dict[Hashable, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tfs in postings.items():
+                    if predicate is not None:
+                        ok = allowed.get(doc_id)
+                        if ok is None:
+                            ok = allowed[doc_id] = predicate(self.doc_meta.get(doc_id))
+                        if not ok:
+                            continue
+                    lengths = self.doc_lengths[doc_id]
+                    tf = 0.0
+                    for i, count in enumerate(tfs):
+                        if count:
+                            boost, avg = field_weights[i]
+                            tf += boost * count / (1 - b + b * lengths[i] / avg)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (k1 + tf)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        return ranked if limit is None else ranked[:limit]
+
+    # ============== 保存・復元 ==============
+
+    def save(self, path: Path) -> None:
+        """索引をファイルへ保存する（一時ファイルに書いてから置き換え）"""
+        encode = self.encode_meta
+        with self._lock:
+            # [doc_id, フィールド長, メタデータ, バージョン]
+            docs = []
+            for doc_id, lengths in self.doc_lengths.items():
+                meta = self.doc_meta.get(doc_id)
+                if encode is not None and meta is not None:
+                    meta = encode(meta)
+                docs.append([doc_id, lengths, meta, self.doc_versions.get(doc_id)])
+            state = {
+                "signature": self.signature,
+                "docs": docs,
+                # term -> [[doc_id, tf_field0, tf_field1, ...], ...]
+                "postings": {
+                    term: [[doc_id, *tfs] for doc_id, tfs in postings.items()]
+                    for term, postings in self.postings.items()
+                },
+            }
+            data = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.dirty = False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Path) -> bool:
+        """保存ファイルから索引を復元する
+
+        Returns:
+            復元できた場合 True（ファイルがない・設定が異なる場合は False）
+        """
+        decode = self.decode_meta
+        try:
+            state = json.loads(path.read_bytes())
+            if state.get("signature") != json.loads(json.dumps(self.signature)):
+                return False
+
+            doc_lengths: dict[Hashable, tuple[int, ...]] = {}
+            doc_meta: dict[Hashable, Any] = {}
+            doc_versions: dict[Hashable, Any] = {}
+            doc_terms: dict[Hashable, list[str]] = {}
+            for doc_id, lengths, meta, version in state["docs"]:
+                doc_lengths[doc_id] = tuple(lengths)
+                doc_meta[doc_id] = meta if decode is None or meta is None else decode(meta)
+                doc_versions[doc_id] = version
+                doc_terms[doc_id] = []
+
+            postings: dict[str, dict[Hashable, tuple[int, ...]]] = {}
+            for term, entries in state["postings"].items():
+                postings[term] = {entry[0]: tuple(entry[1:]) for entry in entries}
+                for entry in entries:
+                    doc_terms[entry[0]].append(term)
+            total_lengths = [
+                sum(lengths[i] for lengths in doc_lengths.values()) for i in range(len(self.fields))
+            ]
+        except Exception:
+            # ファイルなし・破損時は呼び出し側で作り直す
+            return False
+
+        with self._lock:
+            self.postings = postings
+            self.doc_lengths = doc_lengths
+            self.doc_terms = {doc_id: tuple(terms) for doc_id, terms in doc_terms.items()}
+            self.doc_meta = doc_meta
+            self.doc_versions = doc_versions
+            self.total_lengths = total_lengths
+            self.dirty = False
+        return True
+
+    def doc_ids(self) -> Iterable[Hashable]:
+        return list(self.doc_lengths)
@@ -0,0 +1,291 @@
+"""
+チケット作成時の類似チケット・ナレッジ記事の提案
+
+チケットとナレッジ記事をそれぞれベクトル索引（app.services.similarity）に
+保持し、新しいチケットの件名・詳細に近い
+
+- 解決済み（resolved / closed）の過去チケット
+- 閲覧可能な公開済みナレッジ記事
+
+をコサイン類似度の高い順に返します。
+
+- チケット・記事の作成・更新・削除はマッパーイベントで検知し、コミット後に
+  該当文書だけを索引し直します（状態・公開範囲の変更ではメタデータのみ更新）。
+- 索引は SIMILARITY_INDEX_DIR に保存され、起動時に読み込んだうえで
+  DB と差分同期します（更新日時が異なる文書のみ再索引）。
+- コミット後の反映は変更したワーカーの索引にのみ行われます。他のワーカーの
+  変更は SIMILARITY_INDEX_SAVE_SECONDS ごとの差分同期で取り込みます。保存は
+  保存担当の1プロセスのみが行います（app.services.index_lock）。
+- ベクトルの格納先は SIMILARITY_BACKEND で選びます（PostgreSQL 構成では
+  pgvector、SQLite 構成では NumPy の IVF-flat 索引）。
+"""
+
+import asyncio
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
+from app.models.ticket import Ticket, TicketStatus
+from app.services.index_lock import acquire_saver_lock
+from app.services.knowledge_search import ArticleMeta, article_meta, index_version
+from app.services.pending_changes import PendingChanges, apply_index_change
+from app.services.similarity import HashedVectorizer, SimilarityIndex
+from app.services.vector_index import PgVectorIndex, create_vector_index
+
+
+logger = logging.getLogger(__name__)
+
+# 類似チケットとして提案する状態
+RESOLVED_STATUSES = frozenset({TicketStatus.RESOLVED.value, TicketStatus.CLOSED.value})
+
+# ベクトル化するフィールド
+_TICKET_FIELDS = ("subject", "description", "resolution_summary")
+_ARTICLE_FIELDS = ("title", "tags", "summary", "content")
+_ARTICLE_META_COLUMNS = ("visibility", "is_published", "category", "article_type")
+
+# 差分同期で一度に読み込む件数
+_SYNC_BATCH_SIZE = 200
+
+_vectorizer = HashedVectorizer(settings.SIMILARITY_DIMENSIONS)
+ticket_vectors = SimilarityIndex(_vectorizer, create_vector_index("ticket", settings.SIMILARITY_DIMENSIONS))
+article_vectors = SimilarityIndex(
+    _vectorizer,
+    create_vector_index("article", settings.SIMILARITY_DIMENSIONS),
+    encode_meta=ArticleMeta.to_json,
+    decode_meta=ArticleMeta.from_json,
+)
+
+
+def _text(obj: Ticket | KnowledgeArticle, fields: Iterable[str]) -> str:
+    return "\n".join(value for value in (getattr(obj, name) for name in fields) if value)
+
+
+def _ticket_meta(ticket: Ticket) -> str:
+    status = ticket.status
+    return status.value if isinstance(status, TicketStatus) else str(status)
+
+
+# ============== 提案 ==============
+
+async def suggest_for_ticket(
+    text: str,
+    include_tickets: bool = True,
+    visibilities: Iterable[KnowledgeVisibility] | None = None,
+    exclude_ticket_id: int | None = None,
+    limit: int | None = None,
+) -> tuple[list[tuple[int, float]], list[tuple[int, float]]]:
+    """チケットの本文に類似した解決済みチケットと公開済み記事を返す
+
+    Args:
+        text: チケットの件名・詳細
+        include_tickets: 類似チケットも求める（依頼者には他人のチケットを見せない）
+        visibilities: 閲覧可能な記事の公開範囲（None なら制限なし）
+        exclude_ticket_id: 結果から除くチケット（作成したチケット自身）
+        limit: 種類ごとの件数（省略時は SIMILARITY_SUGGESTION_LIMIT）
+
+    Returns:
+        ([(チケットID, 類似度)], [(記事ID, 類似度)])
+    """
+    limit = limit or settings.SIMILARITY_SUGGESTION_LIMIT
+    min_score = settings.SIMILARITY_MIN_SCORE
+
+    tickets: list[tuple[int, float]] = []
+    if include_tickets:
+        tickets = await ticket_vectors.search(
+            text,
+            k=limit,
+            predicate=lambda doc_id, status: doc_id != exclude_ticket_id and status in RESOLVED_STATUSES,
+            min_score=min_score,
+        )
+
+    allowed = {v.value for v in visibilities} if visibilities is not None else None
+
+    def visible(doc_id: int, meta: ArticleMeta | None) -> bool:
+        return (
+            meta is not None
+            and meta.is_published
+            and (allowed is None or meta.visibility in allowed)
+        )
+
+    articles = await article_vectors.search(text, k=limit, predicate=visible, min_score=min_score)
+    return tickets, articles
+
+
+# ============== DB との同期・保存 ==============
+
+async def _sync(db: AsyncSession, index: SimilarityIndex, model, fields, meta) -> tuple[int, int]:
+    result = await db.execute(select(model.id, model.updated_at))
+    current = {doc_id: index_version(updated_at) for doc_id, updated_at in result.all()}
+
+    stale = [
+        doc_id
+        for doc_id, version in current.items()
+        if version is None or doc_id not in index or index.version(doc_id) != version
+    ]
+    removed = [doc_id for doc_id in index.doc_ids() if doc_id not in current]
+    for doc_id in removed:
+        index.remove(doc_id)
+
+    for start in range(0, len(stale), _SYNC_BATCH_SIZE):
+        batch = stale[start:start + _SYNC_BATCH_SIZE]
+        result = await db.execute(select(model).where(model.id.in_(batch)))
+        for obj in result.scalars().all():
+            index.add(obj.id, _text(obj, fields), meta(obj), index_version(obj.updated_at))
+
+    return len(stale), len(removed)
+
+
+async def sync_similarity_indexes(db: AsyncSession) -> dict[str, tuple[int, int]]:
+    """索引を DB と差分同期する
+
+    Returns:
+        {"tickets": (再索引件数, 削除件数), "articles": (...)}
+    """
+    return {
+        "tickets": await _sync(db, ticket_vectors, Ticket, _TICKET_FIELDS, _ticket_meta),
+        "articles": await _sync(db, article_vectors, KnowledgeArticle, _ARTICLE_FIELDS, article_meta),
+    }
+
+
+def create_similarity_tables(connection: Connection) -> None:
+    """pgvector のテーブルを作成する（格納先が pgvector の場合のみ、init_db から呼ぶ）"""
+    for index in (ticket_vectors, article_vectors):
+        if isinstance(index.store, PgVectorIndex):
+            index.store.create_table(connection)
+
+
+def _paths(directory: Path | None) -> tuple[Path, Path]:
+    directory = directory or settings.SIMILARITY_INDEX_DIR
+    return directory / "tickets", directory / "articles"
+
+
+async def load_similarity_indexes(
+    db: AsyncSession, directory: Path | None = None
+) -> dict[str, tuple[int, int]]:
+    """保存済みの索引を読み込み、DB と差分同期する（起動時）"""
+    for index, path in zip((ticket_vectors, article_vectors), _paths(directory)):
+        if not index.load(path):
+            index.clear()
+    return await sync_similarity_indexes(db)
+
+
+def save_similarity_indexes(directory: Path | None = None) -> int:
+    """変更のあった索引を保存する（保存担当のプロセスのみ）
+
+    Returns:
+        保存した索引の数
+    """
+    if not acquire_saver_lock(directory or settings.SIMILARITY_INDEX_DIR):
+        return 0
+    saved = 0
+    for index, path in zip((ticket_vectors, article_vectors), _paths(directory)):
+        if index.dirty:
+            index.save(path)
+            saved += 1
+    return saved
+
+
+async def flush_similarity_indexes() -> None:
+    """受け付けた追加・削除をベクトルの格納先へ反映する"""
+    for index in (ticket_vectors, article_vectors):
+        await index.flush()
+
+
+async def refresh_similarity_indexes(
+    db: AsyncSession, directory: Path | None = None
+) -> dict[str, tuple[int, int]]:
+    """索引を DB と差分同期して格納先へ反映し、保存担当なら保存する
+
+    IVF 索引の保存（セグメントの書き出し・クラスタの再学習）は件数に比例して
+    時間がかかるため、イベントループを止めないよう別スレッドで行います。
+    保存担当でないプロセスは、先に保存担当が保存した索引を読み込み直します。
+    """
+    if acquire_saver_lock(directory or settings.SIMILARITY_INDEX_DIR):
+        synced = await sync_similarity_indexes(db)
+        await flush_similarity_indexes()
+        await asyncio.to_thread(save_similarity_indexes, directory)
+        return synced
+    await flush_similarity_indexes()
+    for index, path in zip((ticket_vectors, article_vectors), _paths(directory)):
+        await asyncio.to_thread(index.load, path)
+    synced = await sync_similarity_indexes(db)
+    await flush_similarity_indexes()
+    return synced
+
+
+async def run_similarity_index_saver(interval_seconds: float) -> None:
+    """索引を一定間隔で DB と差分同期・保存するバックグラウンドタスク"""
+    from app.database import async_session_factory
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with async_session_factory() as db:
+                await refresh_similarity_indexes(db)
+        except Exception:
+            logger.exception("類似度検索インデックスの保存に失敗しました")
+
+
+# ============== 増分更新 ==============
+
+def _apply(key: tuple[str, int], change: tuple[str, Any]) -> None:
+    kind, doc_id = key
+    index = ticket_vectors if kind == "Ticket" else article_vectors
+    apply_index_change(index, doc_id, change)
+
+
+_pending = PendingChanges(
+    "similarity_index_pending", _apply, key=lambda target: (type(target).__name__, target.id)
+)
+
+
+def _changed(target, names: Iterable[str]) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(Ticket, "after_insert")
+def _ticket_inserted(mapper, connection, target: Ticket) -> None:
+    _pending.queue(target, ("index", (_text(target, _TICKET_FIELDS), _ticket_meta(target))))
+
+
+@event.listens_for(Ticket, "after_update")
+def _ticket_updated(mapper, connection, target: Ticket) -> None:
+    if _changed(target, _TICKET_FIELDS):
+        _pending.queue(target, ("index", (_text(target, _TICKET_FIELDS), _ticket_meta(target))))
+    elif _changed(target, ("status",)):
+        queued = _pending.queued(target)
+        if queued is not None and queued[0] == "index":
+            _pending.queue(target, ("index", (_text(target, _TICKET_FIELDS), _ticket_meta(target))))
+        else:
+            _pending.queue(target, ("meta", _ticket_meta(target)))
+
+
+@event.listens_for(KnowledgeArticle, "after_insert")
+def _article_inserted(mapper, connection, target: KnowledgeArticle) -> None:
+    _pending.queue(target, ("index", (_text(target, _ARTICLE_FIELDS), article_meta(target))))
+
+
+@event.listens_for(KnowledgeArticle, "after_update")
+def _article_updated(mapper, connection, target: KnowledgeArticle) -> None:
+    if _changed(target, _ARTICLE_FIELDS):
+        _pending.queue(target, ("index", (_text(target, _ARTICLE_FIELDS), article_meta(target))))
+    elif _changed(target, _ARTICLE_META_COLUMNS):
+        queued = _pending.queued(target)
+        if queued is not None and queued[0] == "index":
+            _pending.queue(target, ("index", (_text(target, _ARTICLE_FIELDS), article_meta(target))))
+        else:
+            _pending.queue(target, ("meta", article_meta(target)))
+
+
+@event.listens_for(Ticket, "after_delete")
+@event.listens_for(KnowledgeArticle, "after_delete")
+def _deleted(mapper, connection, target) -> None:
+    _pending.queue(target, ("remove", None))
@@ -0,0 +1,222 @@
+"""
+トークン失効管理
+
+ログアウトやリフレッシュトークンの再利用検知で失効させたトークン (jti) と
+トークンファミリー (fam: 1回のログインから発行された一連のトークン) を
+revoked_tokens テーブルに保存し、プロセス内の失効リスト
+(app.core.revocation.revocation_list) に反映します。
+
+- verify_token は失効リストのみを参照し、DB にはアクセスしません。
+- 起動時に load_revocations() で未失効分を読み込み（期限切れ行は削除）、
+  以降は sync_revocations() が他ワーカーで追加・更新された行を差分で取り込みます。
+- 差分はサーバー側で採番する updated_at で判定し、前回の取り込み位置から
+  _SYNC_OVERLAP だけ遡って読み直します。ID 順と異なる順でコミットされた行や、
+  有効期限の延長（同じ値の再失効）も取り込むためです。
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.revocation import revocation_list
+from app.models.revoked_token import RevocationKind, RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+# 差分同期で遡る秒数（コミット順と updated_at の前後に対する余裕）
+_SYNC_OVERLAP = timedelta(seconds=60)
+
+# 取り込み済みの updated_at の最大値
+_synced_through: datetime | None = None
+# 遡る範囲内で取り込み済みの行（ID → (updated_at, expires_at)。読み直した行の再適用を省く）
+_recent: dict[int, tuple[datetime, datetime]] = {}
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _mark_synced(rows: list[RevokedToken]) -> None:
+    """取り込んだ行を記録し、取り込み位置を進める"""
+    global _synced_through
+
+    for row in rows:
+        updated_at = _aware(row.updated_at)
+        _recent[row.id] = (updated_at, _aware(row.expires_at))
+        if _synced_through is None or updated_at > _synced_through:
+            _synced_through = updated_at
+    if _synced_through is not None:
+        horizon = _synced_through - _SYNC_OVERLAP
+        for row_id in [row_id for row_id, (updated_at, _) in _recent.items() if updated_at <= horizon]:
+            del _recent[row_id]
+
+
+def _apply(row: RevokedToken) -> None:
+    """失効行をプロセス内の失効リストへ反映する"""
+    expires_at = row.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if row.kind == RevocationKind.FAMILY:
+        revocation_list.revoke_family(row.value, expires_at.timestamp())
+    else:
+        revocation_list.revoke_token(row.value, expires_at.timestamp())
+
+
+async def _persist(
+    db: AsyncSession,
+    kind: RevocationKind,
+    value: str,
+    expires_at: datetime,
+    user_id: int | None,
+    reason: str,
+) -> None:
+    """失効行を保存し、失効リストへ即時反映する（同じ値は有効期限を更新）"""
+    values = {
+        "kind": kind,
+        "value": value,
+        "expires_at": expires_at,
+        "user_id": user_id,
+        "reason": reason,
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(RevokedToken).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["kind", "value"],
+            set_={
+                "expires_at": stmt.excluded.expires_at,
+                "reason": stmt.excluded.reason,
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+    else:
+        result = await db.execute(
+            select(RevokedToken).where(RevokedToken.kind == kind, RevokedToken.value == value)
+        )
+        row = result.scalar_one_or_none()
+        if row is None:
+            db.add(RevokedToken(**values))
+        else:
+            row.expires_at = expires_at
+            row.reason = reason
+
+    if kind == RevocationKind.FAMILY:
+        revocation_list.revoke_family(value, expires_at.timestamp())
+    else:
+        revocation_list.revoke_token(value, expires_at.timestamp())
+
+
+def _user_id(payload: dict[str, Any]) -> int | None:
+    user_id = str(payload.get("sub") or "").split(":", 1)[0]
+    return int(user_id) if user_id.isdigit() else None
+
+
+async def revoke_token(db: AsyncSession, payload: dict[str, Any], reason: str) -> bool:
+    """トークン単体を失効させる（jti を持たない旧形式のトークンは対象外）
+
+    Returns:
+        失効させた場合 True
+    """
+    jti = payload.get("jti")
+    exp = payload.get("exp")
+    if not jti or not isinstance(exp, (int, float)):
+        return False
+    await _persist(
+        db,
+        RevocationKind.TOKEN,
+        jti,
+        datetime.fromtimestamp(exp, tz=timezone.utc),
+        _user_id(payload),
+        reason,
+    )
+    return True
+
+
+async def revoke_family(
+    db: AsyncSession,
+    family: str,
+    user_id: int | None,
+    reason: str,
+) -> None:
+    """トークンファミリー（ログインセッション）全体を失効させる
+
+    ファミリーに属するトークンの最長の有効期限はリフレッシュトークンの
+    有効期間で決まるため、それまでの間失効を保持します。
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    await _persist(db, RevocationKind.FAMILY, family, expires_at, user_id, reason)
+
+
+async def revoke_session(db: AsyncSession, payload: dict[str, Any], reason: str) -> None:
+    """トークンとその属するファミリーを失効させる（ログアウト用）"""
+    await revoke_token(db, payload, reason)
+    family = payload.get("fam")
+    if family:
+        await revoke_family(db, family, _user_id(payload), reason)
+
+
+async def load_revocations(db: AsyncSession) -> int:
+    """期限切れの失効行を削除し、残りを失効リストへ読み込む（起動時）
+
+    Returns:
+        読み込んだ件数
+    """
+    global _synced_through
+
+    now = datetime.now(timezone.utc)
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    await db.commit()
+
+    revocation_list.clear()
+    result = await db.execute(select(RevokedToken).where(RevokedToken.expires_at > now))
+    rows = result.scalars().all()
+    for row in rows:
+        _apply(row)
+
+    _synced_through = None
+    _recent.clear()
+    _mark_synced(rows)
+    return len(rows)
+
+
+async def sync_revocations(db: AsyncSession) -> int:
+    """前回以降に追加・更新された失効行を取り込む（他ワーカーでの失効の反映）
+
+    Returns:
+        取り込んだ件数（遡って読み直した取り込み済みの行は含まない）
+    """
+    query = select(RevokedToken).order_by(RevokedToken.updated_at)
+    if _synced_through is not None:
+        query = query.where(RevokedToken.updated_at > _synced_through - _SYNC_OVERLAP)
+
+    rows = [
+        row
+        for row in (await db.execute(query)).scalars().all()
+        if _recent.get(row.id) != (_aware(row.updated_at), _aware(row.expires_at))
+    ]
+    for row in rows:
+        _apply(row)
+    _mark_synced(rows)
+    return len(rows)
+
+
+async def run_revocation_sync(interval_seconds: float) -> None:
+    """sync_revocations を一定間隔で実行するバックグラウンドタスク"""
+    from app.database import async_session_factory
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with async_session_factory() as db:
+                await sync_revocations(db)
+        except Exception:
+            logger.exception("トークン失効リストの同期に失敗しました")
@@ -0,0 +1,150 @@
+"""
+認証ユーザーキャッシュ
+
+get_current_user が API 呼び出しごとに users テーブルを参照しないよう、
+ユーザーの列値をユーザーID単位で LRU キャッシュします。
+
+- エントリは USER_CACHE_TTL_SECONDS 秒で失効します（最大の古さ）。
+  更新イベントを経由しない変更（別プロセスや一括 UPDATE）もこの時間内に反映されます。
+- User の UPDATE / DELETE（ロール変更・無効化・users.update_user など）は
+  マッパーイベントで検知し、フラッシュ時とコミット後にエントリを破棄します。
+- ヒット・ミス数などの統計は stats() で取得できます。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from app.config import settings
+from app.models.user import User
+
+
+# コミット後に破棄するユーザーIDを保持する Session.info のキー
+_PENDING_INVALIDATIONS = "user_cache_pending_invalidations"
+
+
+class UserCache:
+    """ユーザーID → 列値のスナップショットを保持する TTL 付き LRU キャッシュ"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, tuple[dict[str, Any], float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, user_id: int) -> dict[str, Any] | None:
+        """有効期限内のスナップショットを返す（なければ None）"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user: User) -> None:
+        """ロード済みの User の列値をキャッシュする"""
+        if not self.enabled:
+            return
+        values = {
+            attr.key: getattr(user, attr.key)
+            for attr in inspect(User).column_attrs
+        }
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[user.id] = (values, expires_at)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        """ユーザーのエントリを破棄する"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """全エントリと統計をリセットする"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> dict[str, Any]:
+        """キャッシュ統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
+    """ユーザーを取得する（キャッシュヒット時は SELECT を発行しない）
+
+    ヒット時はスナップショットから組み立てた User を merge(load=False) で
+    セッションに関連付けるため、呼び出し側は通常どおり永続化済みの
+    インスタンスとして扱えます（リレーションは参照時に遅延ロードされます）。
+    """
+    if user_cache.enabled:
+        values = user_cache.get(user_id)
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return await db.merge(user, load=False)
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is not None:
+        user_cache.put(user)
+    return user
+
+
+# ============== 無効化 ==============
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User) -> None:
+    """User の更新・削除をキャッシュから破棄する
+
+    コミット前に別リクエストが旧値を再キャッシュする可能性があるため、
+    コミット後にも同じIDを破棄します。
+    """
+    user_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _invalidate_pending_users(session: Session, *args) -> None:
+    for user_id in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        user_cache.invalidate(user_id)
@@ -0,0 +1,577 @@
+"""
+近傍検索用のベクトル格納（共通インターフェースと実装）
+
+類似チケット・提案記事の索引（app.services.similarity）が使うベクトルの
+格納と上位 k 件の検索を VectorIndex の背後に置き、構成に応じて実装を
+切り替えます（create_vector_index）。
+
+- PgVectorIndex: PostgreSQL 構成では pgvector の HNSW 索引に格納します。
+- IVFFlatIndex: pgvector のない SQLite 構成（拠点）向けの NumPy 実装です。
+  ベクトルを球面 k-means でクラスタ（リスト）に分け、検索時はクエリに近い
+  n_probe 個のリストだけを走査します（IVF-flat。既定はリスト数の平方根の
+  2倍）。保存したベクトルはリストごとに連続して並べた .npy をメモリマップで
+  読むため、常駐するのは前回の保存以降に追加した分だけです。件数が
+  min_train_size 未満の間はクラスタに分けず全件を走査します（疎な語ベクトルは
+  クラスタの境界付近に近傍が散らばり再現率が落ちやすいため、全件走査で
+  間に合う規模では厳密な検索を優先）。走査はイベントループを止めないよう
+  スレッドで行います。
+
+ベクトルは L2 正規化済みとし、スコアは内積（= コサイン類似度）です。
+"""
+
+import asyncio
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.config import settings
+
+
+_IVF_VECTORS_FILE = "ivf_vectors.npy"
+_IVF_LISTS_FILE = "ivf_lists.npz"
+
+# k-means の学習に使う1リストあたりのサンプル数と反復回数
+_TRAIN_SAMPLES_PER_LIST = 48
+_TRAIN_ITERATIONS = 8
+# 割り当て・書き出しを一度に処理する行数
+_CHUNK_ROWS = 65536
+
+
+class VectorIndex(ABC):
+    """文書ID（整数）→ 単位ベクトルの近傍検索の共通インターフェース
+
+    追加・削除はコミット後のイベントから呼ばれるため同期的に受け付け、
+    検索と外部の格納先への反映は非同期に行います。
+    """
+
+    kind: str
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @abstractmethod
+    def add(self, doc_id: int, vector: np.ndarray) -> None:
+        """ベクトルを追加する（既存の文書は置き換え）"""
+
+    @abstractmethod
+    def remove(self, doc_id: int) -> None:
+        """ベクトルを削除する（なければ何もしない）"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """全件を削除する"""
+
+    @abstractmethod
+    async def search(self, query: np.ndarray, k: int, exact: bool = False) -> list[tuple[int, float]]:
+        """内積の大きい順に最大 k 件の (文書ID, スコア) を返す
+
+        Args:
+            query: L2 正規化したクエリベクトル
+            k: 返す件数の上限
+            exact: 近似せずに全件を走査する
+        """
+
+    def doc_ids(self) -> set[int] | None:
+        """格納している文書ID（外部に格納する実装では None）"""
+        return None
+
+    async def flush(self) -> None:
+        """受け付けた追加・削除を外部の格納先へ反映する"""
+
+    def save(self, directory: Path) -> None:
+        """ディレクトリへ保存する（外部に格納する実装では何もしない）"""
+
+    def load(self, directory: Path) -> bool:
+        """保存ディレクトリから復元する（復元できない場合 False）"""
+        return True
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(ids[i]), float(scores[i])) for i in order if scores[i] > -np.inf]
+
+
+# ============== IVF-flat（NumPy） ==============
+
+def _list_count(n_vectors: int) -> int:
+    # 目安は √n 個（1リストが小さすぎるとリストごとの走査の固定費が勝つ）
+    return int(min(4096, max(16, math.sqrt(n_vectors))))
+
+
+def _probe_count(n_lists: int) -> int:
+    # リスト数に比例して近傍が散らばるため、走査数も √(リスト数) に応じて増やす
+    return 2 * math.ceil(math.sqrt(n_lists))
+
+
+class _Rows:
+    """保存済みの生存行と追加分を、コピーせずに連結した行の並びとして扱う"""
+
+    def __init__(self, base: np.ndarray, base_rows: np.ndarray, delta: np.ndarray):
+        self.base = base
+        self.base_rows = base_rows
+        self.delta = delta
+        self.n_base = len(base_rows)
+
+    def __len__(self) -> int:
+        return self.n_base + len(self.delta)
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        out = np.empty((len(indices), self.base.shape[1]), dtype=np.float32)
+        in_base = indices < self.n_base
+        out[in_base] = self.base[self.base_rows[indices[in_base]]]
+        out[~in_base] = self.delta[indices[~in_base] - self.n_base]
+        return out
+
+    def chunks(self):
+        for start in range(0, len(self), _CHUNK_ROWS):
+            yield self.take(np.arange(start, min(start + _CHUNK_ROWS, len(self))))
+
+
+def _assign(rows: _Rows, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [np.argmax(chunk @ centroids.T, axis=1) for chunk in rows.chunks()]
+    ).astype(np.int32)
+
+
+def train_centroids(rows: _Rows, n_lists: int, seed: int = 0) -> np.ndarray:
+    """球面 k-means でリストの代表ベクトル（L2 正規化済み）を求める"""
+    rng = np.random.default_rng(seed)
+    n_rows = len(rows)
+    sample = rows.take(np.sort(rng.choice(n_rows, min(n_rows, n_lists * _TRAIN_SAMPLES_PER_LIST), replace=False)))
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(_TRAIN_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        # 空になったリストはサンプルから選び直す
+        empty = np.bincount(labels, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1)
+    return centroids.astype(np.float32)
+
+
+class IVFFlatIndex(VectorIndex):
+    """NumPy による IVF-flat 近似最近傍索引
+
+    Args:
+        dimensions: ベクトルの次元数
+        n_probe: 検索時に走査するリスト数（None ならリスト数から決める）
+        min_train_size: クラスタに分ける最小件数（未満なら全件走査）
+        initial_capacity: 追加分の行列の初期行数（不足時は倍に拡張）
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        dimensions: int,
+        n_probe: int | None = None,
+        min_train_size: int = 200000,
+        initial_capacity: int = 1024,
+    ):
+        super().__init__(dimensions)
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self._initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        # 保存中に受け付けた追加・削除（保存後に新しいセグメントへ再適用。ID が None は全削除）
+        self._journal: list[tuple[int | None, np.ndarray | None]] | None = None
+        self._set_base(*self._empty_base())
+        self._reset_delta()
+
+    def _empty_base(self) -> tuple:
+        return np.zeros((0, self.dimensions), dtype=np.float32), np.zeros(0, dtype=np.int64), None, None, 0
+
+    def _set_base(
+        self,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        offsets: np.ndarray | None,
+        centroids: np.ndarray | None,
+        trained_size: int,
+        rows: dict[int, int] | None = None,
+    ) -> None:
+        # 保存済みセグメント（読み取り専用。削除は生存フラグで表す）
+        self._base = vectors
+        self._base_ids = ids
+        self._base_live = np.ones(len(ids), dtype=bool)
+        self._base_rows = rows if rows is not None else dict(zip(ids.tolist(), range(len(ids))))
+        self._offsets = offsets
+        self._centroids = centroids
+        self._trained_size = trained_size
+
+    def _reset_delta(self) -> None:
+        # 前回の保存以降の追加分（メモリ上、全件走査）
+        self._delta = np.zeros((self._initial_capacity, self.dimensions), dtype=np.float32)
+        self._delta_ids = np.zeros(self._initial_capacity, dtype=np.int64)
+        self._delta_rows: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._base_rows) + len(self._delta_rows)
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def doc_ids(self) -> set[int]:
+        with self._lock:
+            return self._base_rows.keys() | self._delta_rows.keys()
+
+    # ============== 更新 ==============
+
+    def add(self, doc_id: int, vector: np.ndarray) -> None:
+        with self._lock:
+            self._add(doc_id, vector)
+            if self._journal is not None:
+                self._journal.append((doc_id, vector))
+
+    def _add(self, doc_id: int, vector: np.ndarray) -> None:
+        self._remove(doc_id)
+        row = len(self._delta_rows)
+        if row == len(self._delta):
+            grown = np.zeros((row * 2, self.dimensions), dtype=np.float32)
+            grown[:row] = self._delta
+            self._delta = grown
+            self._delta_ids = np.resize(self._delta_ids, row * 2)
+        self._delta[row] = vector
+        self._delta_ids[row] = doc_id
+        self._delta_rows[doc_id] = row
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+            if self._journal is not None:
+                self._journal.append((doc_id, None))
+
+    def _remove(self, doc_id: int) -> None:
+        row = self._base_rows.pop(doc_id, None)
+        if row is not None:
+            self._base_live[row] = False
+            return
+        row = self._delta_rows.pop(doc_id, None)
+        if row is None:
+            return
+        # 追加分の末尾の行を空いた行へ移して詰める
+        last = len(self._delta_rows)
+        if row != last:
+            self._delta[row] = self._delta[last]
+            self._delta_ids[row] = self._delta_ids[last]
+            self._delta_rows[int(self._delta_ids[row])] = row
+        self._delta[last] = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._set_base(*self._empty_base())
+            self._reset_delta()
+            if self._journal is not None:
+                self._journal.append((None, None))
+
+    # ============== 検索 ==============
+
+    async def search(self, query: np.ndarray, k: int, exact: bool = False) -> list[tuple[int, float]]:
+        # 全件走査は数十ミリ秒かかるため、イベントループを止めないようスレッドで行う
+        return await asyncio.to_thread(self.nearest, query, k, exact)
+
+    def nearest(self, query: np.ndarray, k: int, exact: bool = False) -> list[tuple[int, float]]:
+        """search の同期版"""
+        if k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            id_parts = []
+            score_parts = []
+
+            n_delta = len(self._delta_rows)
+            if n_delta:
+                id_parts.append(self._delta_ids[:n_delta])
+                score_parts.append(self._delta[:n_delta] @ query)
+
+            if self._base_rows:
+                if exact or self._centroids is None:
+                    ids, live = self._base_ids, self._base_live
+                    scores = self._base @ query
+                else:
+                    n_probe = min(self.n_probe or _probe_count(len(self._centroids)), len(self._centroids))
+                    lists = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+                    ranges = [
+                        (start, end)
+                        for start, end in zip(self._offsets[lists], self._offsets[lists + 1])
+                        if end > start
+                    ]
+                    rows = np.concatenate([np.arange(start, end) for start, end in ranges] or [np.zeros(0, dtype=np.int64)])
+                    ids, live = self._base_ids[rows], self._base_live[rows]
+                    scores = np.concatenate(
+                        [self._base[start:end] @ query for start, end in ranges] or [np.zeros(0, dtype=np.float32)]
+                    )
+                if len(self._base_rows) < len(self._base_ids):
+                    scores = np.where(live, scores, -np.inf)
+                id_parts.append(ids)
+                score_parts.append(scores)
+
+        if not id_parts:
+            return []
+        return _top_k(np.concatenate(id_parts), np.concatenate(score_parts), k)
+
+    # ============== 保存・復元 ==============
+
+    def save(self, directory: Path) -> None:
+        """保存済みの生存行と追加分を1つのセグメントにまとめて書き出し、メモリマップで開き直す
+
+        件数が学習時の2倍以上になった場合（未学習なら min_train_size 以上）は
+        リストの代表ベクトルを学習し直します。書き出し中も追加・削除・検索は
+        受け付け、書き出し後に新しいセグメントへ再適用します。
+        """
+        with self._save_lock:
+            with self._lock:
+                live_rows = np.flatnonzero(self._base_live)
+                n_delta = len(self._delta_rows)
+                rows = _Rows(self._base, live_rows, self._delta[:n_delta].copy())
+                ids = np.concatenate([self._base_ids[live_rows], self._delta_ids[:n_delta]])
+                offsets, centroids, trained_size = self._offsets, self._centroids, self._trained_size
+                self._journal = []
+
+            try:
+                n_rows = len(rows)
+                labels = None
+                if n_rows >= max(self.min_train_size, 2 * trained_size, 1):
+                    centroids = train_centroids(rows, min(_list_count(n_rows), n_rows))
+                    trained_size = n_rows
+                    labels = _assign(rows, centroids)
+                elif centroids is not None:
+                    # 既存の行はリストの割り当てをそのまま使い、追加分だけ割り当てる
+                    base_labels = np.repeat(np.arange(len(centroids), dtype=np.int32), np.diff(offsets))
+                    delta_labels = (
+                        np.argmax(rows.delta @ centroids.T, axis=1).astype(np.int32)
+                        if n_delta else np.zeros(0, dtype=np.int32)
+                    )
+                    labels = np.concatenate([base_labels[live_rows], delta_labels])
+
+                if labels is not None:
+                    order = np.argsort(labels, kind="stable")
+                    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(centroids)))])
+                else:
+                    order = np.arange(n_rows)
+                    offsets = np.array([0, n_rows])
+
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp_vectors = directory / (_IVF_VECTORS_FILE + ".tmp")
+                out = np.lib.format.open_memmap(
+                    tmp_vectors, mode="w+", dtype=np.float32, shape=(n_rows, self.dimensions)
+                )
+                for start in range(0, n_rows, _CHUNK_ROWS):
+                    out[start:start + _CHUNK_ROWS] = rows.take(order[start:start + _CHUNK_ROWS])
+                out.flush()
+                del out
+
+                ids = ids[order]
+                tmp_lists = directory / (_IVF_LISTS_FILE + ".tmp")
+                with open(tmp_lists, "wb") as f:
+                    np.savez(
+                        f,
+                        ids=ids,
+                        offsets=offsets,
+                        centroids=centroids if centroids is not None else np.zeros((0, self.dimensions), dtype=np.float32),
+                        trained_size=np.array(trained_size),
+                    )
+                os.replace(tmp_vectors, directory / _IVF_VECTORS_FILE)
+                os.replace(tmp_lists, directory / _IVF_LISTS_FILE)
+
+                vectors = np.load(directory / _IVF_VECTORS_FILE, mmap_mode="r")
+                row_map = dict(zip(ids.tolist(), range(n_rows)))
+            except BaseException:
+                with self._lock:
+                    self._journal = None
+                raise
+
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._set_base(vectors, ids, offsets if centroids is not None else None, centroids, trained_size, row_map)
+                self._reset_delta()
+                for doc_id, vector in journal:
+                    if doc_id is None:
+                        self._set_base(*self._empty_base())
+                        self._reset_delta()
+                    elif vector is None:
+                        self._remove(doc_id)
+                    else:
+                        self._add(doc_id, vector)
+
+    def load(self, directory: Path) -> bool:
+        try:
+            with np.load(directory / _IVF_LISTS_FILE) as lists:
+                ids = lists["ids"]
+                offsets = lists["offsets"]
+                centroids = lists["centroids"]
+                trained_size = int(lists["trained_size"])
+            vectors = np.load(directory / _IVF_VECTORS_FILE, mmap_mode="r")
+        except Exception:
+            # ファイルなし・破損時は呼び出し側で作り直す
+            return False
+        if (
+            vectors.dtype != np.float32
+            or vectors.shape != (len(ids), self.dimensions)
+            or centroids.ndim != 2
+            or centroids.shape[1] != self.dimensions
+            or offsets[-1] != len(ids)
+        ):
+            return False
+
+        with self._lock:
+            if len(centroids):
+                self._set_base(vectors, ids, offsets, centroids, trained_size)
+            else:
+                self._set_base(vectors, ids, None, None, 0)
+            self._reset_delta()
+        return True
+
+
+# ============== pgvector ==============
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{value:.6g}" for value in vector.tolist()) + "]"
+
+
+class PgVectorIndex(VectorIndex):
+    """PostgreSQL の pgvector（HNSW 索引）にベクトルを格納する
+
+    追加・削除はプロセス内に溜め、検索の前と flush() の呼び出し時に
+    まとめて反映します（失敗した分は次回に再送）。
+
+    Args:
+        table: 格納先のテーブル名（create_table で作成）
+        dimensions: ベクトルの次元数
+        session_factory: AsyncSession のファクトリ（省略時は app.database のもの）
+    """
+
+    kind = "pgvector"
+
+    # hnsw.ef_search の上限（pgvector の制約）
+    MAX_EF_SEARCH = 1000
+
+    def __init__(self, table: str, dimensions: int, session_factory=None):
+        super().__init__(dimensions)
+        self.table = table
+        self._session_factory = session_factory
+        self._pending: dict[int, np.ndarray | None] = {}
+        self._truncate = False
+        self._lock = threading.Lock()
+        self._upsert = text(
+            f"INSERT INTO {table} (doc_id, embedding) VALUES (:doc_id, CAST(:embedding AS vector)) "
+            "ON CONFLICT (doc_id) DO UPDATE SET embedding = EXCLUDED.embedding"
+        )
+        self._delete = text(f"DELETE FROM {table} WHERE doc_id = :doc_id")
+        self._search = text(
+            f"SELECT doc_id, 1 - (embedding <=> CAST(:query AS vector)) AS score FROM {table} "
+            "ORDER BY embedding <=> CAST(:query AS vector) LIMIT :k"
+        )
+
+    def create_table(self, connection: Connection) -> None:
+        """pgvector 拡張・テーブル・HNSW 索引を作成する（既存なら何もしない）"""
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "doc_id INTEGER PRIMARY KEY, "
+            f"embedding vector({self.dimensions}) NOT NULL)"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{self.table}_embedding "
+            f"ON {self.table} USING hnsw (embedding vector_cosine_ops)"
+        ))
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import async_session_factory
+
+            self._session_factory = async_session_factory
+        return self._session_factory()
+
+    def add(self, doc_id: int, vector: np.ndarray) -> None:
+        # 零ベクトルはコサイン距離が定義されず、どの検索にも一致しない
+        with self._lock:
+            self._pending[doc_id] = vector.copy() if vector.any() else None
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._pending[doc_id] = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._truncate = True
+
+    async def flush(self) -> None:
+        with self._lock:
+            snapshot, self._pending = self._pending, {}
+            truncate, self._truncate = self._truncate, False
+        if not snapshot and not truncate:
+            return
+
+        async with self._sessions() as db:
+            try:
+                if truncate:
+                    await db.execute(text(f"DELETE FROM {self.table}"))
+                deletes = [{"doc_id": doc_id} for doc_id, vector in snapshot.items() if vector is None]
+                if deletes:
+                    await db.execute(self._delete, deletes)
+                upserts = [
+                    {"doc_id": doc_id, "embedding": _vector_literal(vector)}
+                    for doc_id, vector in snapshot.items()
+                    if vector is not None
+                ]
+                if upserts:
+                    await db.execute(self._upsert, upserts)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                with self._lock:
+                    # 失敗中に受け付けた変更の方が新しい
+                    for doc_id, vector in snapshot.items():
+                        self._pending.setdefault(doc_id, vector)
+                    self._truncate = self._truncate or truncate
+                raise
+
+    async def search(self, query: np.ndarray, k: int, exact: bool = False) -> list[tuple[int, float]]:
+        if k <= 0:
+            return []
+        await self.flush()
+        async with self._sessions() as db:
+            if exact:
+                await db.execute(text("SET LOCAL enable_indexscan = off"))
+            else:
+                # HNSW が返す件数は ef_search が上限になる
+                ef_search = min(max(k, 40), self.MAX_EF_SEARCH)
+                await db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+            result = await db.execute(self._search, {"query": _vector_literal(query), "k": k})
+            return [(doc_id, float(score)) for doc_id, score in result.all()]
+
+
+def create_vector_index(name: str, dimensions: int) -> VectorIndex:
+    """設定（SIMILARITY_BACKEND）に応じたベクトル格納を作成する
+
+    auto では PostgreSQL 構成なら pgvector、それ以外は IVF-flat を使います。
+    """
+    backend = settings.SIMILARITY_BACKEND
+    if backend == "auto":
+        backend = "pgvector" if settings.is_postgres else "ivf"
+    if backend == "pgvector":
+        return PgVectorIndex(f"{name}_vectors_{dimensions}", dimensions)
+    if backend == "ivf":
+        return IVFFlatIndex(
+            dimensions,
+            n_probe=settings.SIMILARITY_IVF_PROBES or None,
+            min_train_size=settings.SIMILARITY_IVF_MIN_TRAIN_SIZE,
+        )
+    raise ValueError(f"Unknown SIMILARITY_BACKEND: {backend}")
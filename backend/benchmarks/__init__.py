@@ -0,0 +1,5 @@
+"""
+Benchmarks for Mirai HelpDesk Management System.
+
+Run from the backend directory, e.g. ``python -m benchmarks.login_storm``.
+"""
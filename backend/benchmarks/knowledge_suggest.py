@@ -0,0 +1,93 @@
+"""
+ナレッジ記事の入力補完（前方一致サジェスト）のレイテンシ計測
+
+合成したタイトル・タグの記事を PrefixSuggester に構築し、1〜数文字の
+接頭辞（入力途中の検索欄に相当）での suggest() の所要時間と、記事1件の
+追加・更新にかかる時間を計測します。
+
+Usage:
+    python -m benchmarks.knowledge_suggest [--articles 10000,100000] [--queries 2000]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.models.knowledge import KnowledgeVisibility
+from app.services.knowledge_search import ArticleMeta
+from app.services.knowledge_suggest import PrefixSuggester
+
+
+_WORDS = [
+    "パスワード", "リセット", "アカウント", "ロック", "解除", "プリンタ", "印刷", "VPN",
+    "接続", "手順", "メール", "送信", "エラー", "Outlook", "Teams", "会議", "ライセンス",
+    "申請", "サインイン", "多要素認証", "設定", "変更", "共有", "フォルダ", "OneDrive",
+    "同期", "SharePoint", "権限", "ネットワーク", "再起動", "Windows", "更新",
+]
+_TAGS = ["アカウント", "ネットワーク", "M365", "ハードウェア", "セキュリティ", "手順書", "FAQ", "PW"]
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def _meta(rng: random.Random) -> ArticleMeta:
+    visibility = rng.choice(["public", "public", "public", "department", "it_only"])
+    return ArticleMeta(visibility=visibility, is_published=rng.random() < 0.9, category="FAQ", article_type="faq")
+
+
+def main(sizes: list[int], n_queries: int) -> None:
+    for size in sizes:
+        rng = random.Random(size)
+        suggester = PrefixSuggester()
+
+        started = time.perf_counter()
+        suggester.rebuild(
+            (
+                article_id,
+                _title(rng),
+                ",".join(rng.sample(_TAGS, 2)),
+                _meta(rng),
+                (rng.randint(0, 5000), rng.randint(0, 50), rng.randint(0, 20)),
+            )
+            for article_id in range(size)
+        )
+        built = time.perf_counter() - started
+
+        prefixes = []
+        for _ in range(n_queries):
+            word = rng.choice(_WORDS + _TAGS)
+            prefixes.append(word[:rng.randint(1, len(word))])
+
+        latencies = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            suggester.suggest(prefix, limit=10, visibilities=[KnowledgeVisibility.PUBLIC])
+            latencies.append(time.perf_counter() - started)
+
+        updates = []
+        for article_id in rng.sample(range(size), min(size, 1000)):
+            started = time.perf_counter()
+            suggester.add(article_id, _title(rng), ",".join(rng.sample(_TAGS, 2)), _meta(rng))
+            updates.append(time.perf_counter() - started)
+
+        latencies_ms = np.array(latencies) * 1000
+        updates_ms = np.array(updates) * 1000
+        print(
+            f"articles={size:,}  keys={suggester.stats()['keys']:,}  build {built:.2f}s\n"
+            f"  suggest  p50 {np.percentile(latencies_ms, 50):.3f} ms  "
+            f"p99 {np.percentile(latencies_ms, 99):.3f} ms  max {latencies_ms.max():.3f} ms\n"
+            f"  update   p50 {np.percentile(updates_ms, 50):.3f} ms  "
+            f"p99 {np.percentile(updates_ms, 99):.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ナレッジ記事の入力補完のレイテンシ計測")
+    parser.add_argument("--articles", default="10000,100000", help="記事数（カンマ区切り）")
+    parser.add_argument("--queries", type=int, default=2000, help="接頭辞の数")
+    args = parser.parse_args()
+
+    main([int(size) for size in args.articles.split(",")], args.queries)
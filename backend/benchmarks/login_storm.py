@@ -0,0 +1,140 @@
+"""
+ログイン集中時のレイテンシベンチマーク
+
+大量のログイン（bcrypt 照合）を同時に流しながら、無関係なエンドポイント
+（/health）のレイテンシを計測し、p50/p99 を出力します。
+--inline を付けると bcrypt をイベントループ上で直接実行した場合
+（ハッシュ用スレッドプール導入前の挙動）と比較できます。
+
+Usage:
+    python -m benchmarks.login_storm [--logins 100] [--probes 100] [--inline]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest.mock import patch
+
+_WORK_DIR = Path(tempfile.mkdtemp(prefix="login-storm-"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_WORK_DIR / 'bench.db'}"
+os.environ["LOG_DIR"] = str(_WORK_DIR / "logs")
+os.environ["AUDIT_LOG_ENABLED"] = "false"
+# 同一IP・同一アカウントからの連続ログインを計測するため試行回数制限は無効化
+os.environ["LOGIN_RATE_LIMIT_PER_IP"] = "0"
+os.environ["LOGIN_RATE_LIMIT_PER_EMAIL"] = "0"
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+from app.core.hashing import password_hasher  # noqa: E402
+from app.core.security import get_password_hash, verify_password  # noqa: E402
+from app.database import async_session_factory, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import User, UserRole  # noqa: E402
+
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password-123"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def seed_user() -> None:
+    await init_db()
+    async with async_session_factory() as db:
+        db.add(User(
+            email=EMAIL,
+            hashed_password=get_password_hash(PASSWORD),
+            display_name="Login Storm",
+            role=UserRole.REQUESTER,
+        ))
+        await db.commit()
+
+
+async def run(logins: int, probes: int, concurrency: int) -> dict[str, float]:
+    transport = ASGITransport(app=app, raise_app_exceptions=False)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        failures = 0
+
+        async def login() -> None:
+            nonlocal failures
+            async with semaphore:
+                response = await client.post(
+                    "/api/auth/login", json={"email": EMAIL, "password": PASSWORD}
+                )
+                if response.status_code != 200:
+                    failures += 1
+
+        latencies: list[float] = []
+
+        async def probe() -> None:
+            # 予定時刻から計測し、ループが詰まって送信自体が遅れた分も含める
+            # （coordinated omission の回避）
+            interval = 0.01
+            origin = time.perf_counter()
+            for i in range(probes):
+                scheduled = origin + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                response = await client.get("/health")
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(probe(), *(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+        "failed_logins": failures,
+    }
+
+
+async def main(logins: int, probes: int, concurrency: int, inline: bool) -> None:
+    await seed_user()
+
+    if inline:
+        async def verify_inline(plain: str, hashed: str) -> bool:
+            return verify_password(plain, hashed)
+
+        context = patch("app.api.routes.auth.verify_password_async", verify_inline)
+    else:
+        context = nullcontext()
+
+    with context:
+        result = await run(logins, probes, concurrency)
+
+    mode = "inline (event loop)" if inline else f"executor ({password_hasher.max_workers} workers)"
+    print(f"[OK] mode={mode} logins={logins} probes={probes}")
+    print(
+        f"     /health p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+        f"max={result['max_ms']:.1f}ms elapsed={result['elapsed_s']:.1f}s "
+        f"failed_logins={result['failed_logins']}"
+    )
+    if not inline:
+        print(f"     hasher={password_hasher.stats()}")
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ログイン集中時の /health レイテンシ計測")
+    parser.add_argument("--logins", type=int, default=100, help="ログイン要求数")
+    parser.add_argument("--probes", type=int, default=100, help="/health の計測回数")
+    parser.add_argument("--concurrency", type=int, default=20, help="ログインの同時実行数")
+    parser.add_argument("--inline", action="store_true", help="bcrypt をイベントループ上で実行する")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.logins, args.probes, args.concurrency, args.inline))
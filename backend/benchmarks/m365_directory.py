@@ -0,0 +1,93 @@
+"""
+M365 ディレクトリミラーのユーザー検索のレイテンシ計測
+
+合成したユーザー（表示名・UPN・メールアドレス）を DirectoryIndex に読み込み、
+1〜数文字の接頭辞（/m365/users/search の入力途中に相当）での search() の
+所要時間と、差分同期1件分の反映にかかる時間を計測します。
+
+Usage:
+    python -m benchmarks.m365_directory [--users 10000,100000] [--queries 2000]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.models.m365_directory import DirectoryObjectKind
+from app.services.m365_directory import DirectoryEntry, DirectoryIndex
+
+
+_FAMILY = ["Sato", "Suzuki", "Takahashi", "Tanaka", "Watanabe", "Ito", "Yamamoto", "Nakamura", "Kobayashi", "Kato"]
+_GIVEN = ["Haruto", "Yui", "Sota", "Hina", "Ren", "Mei", "Yuto", "Aoi", "Riku", "Sakura", "Taro", "Hanako"]
+_KANJI_FAMILY = ["佐藤", "鈴木", "高橋", "田中", "渡辺", "伊藤", "山本", "中村", "小林", "加藤"]
+_KANJI_GIVEN = ["陽翔", "結衣", "蒼太", "陽菜", "蓮", "芽衣", "悠斗", "葵", "陸", "さくら"]
+
+
+def _user(rng: random.Random, n: int) -> DirectoryEntry:
+    family, given = rng.choice(_FAMILY), rng.choice(_GIVEN)
+    upn = f"{given.lower()}.{family.lower()}{n}@example.com"
+    if rng.random() < 0.5:
+        display_name = f"{rng.choice(_KANJI_FAMILY)} {rng.choice(_KANJI_GIVEN)}"
+    else:
+        display_name = f"{family} {given}"
+    return DirectoryEntry(
+        id=f"user-{n}",
+        kind=DirectoryObjectKind.USER,
+        display_name=display_name,
+        user_principal_name=upn,
+        mail=upn,
+        job_title=None,
+        department=rng.choice(["IT", "総務", "人事", "営業"]),
+        account_enabled=True,
+    )
+
+
+def main(sizes: list[int], n_queries: int) -> None:
+    for size in sizes:
+        rng = random.Random(size)
+        index = DirectoryIndex()
+
+        users = [_user(rng, n) for n in range(size)]
+        started = time.perf_counter()
+        index.apply(users, [])
+        built = time.perf_counter() - started
+
+        words = _FAMILY + _GIVEN + _KANJI_FAMILY + _KANJI_GIVEN
+        prefixes = []
+        for _ in range(n_queries):
+            word = rng.choice(words)
+            prefixes.append(word[:rng.randint(1, len(word))])
+
+        latencies = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.search(prefix, top=10)
+            latencies.append(time.perf_counter() - started)
+
+        updates = []
+        for n in rng.sample(range(size), min(size, 1000)):
+            entry = _user(rng, n)
+            started = time.perf_counter()
+            index.upsert(entry)
+            updates.append(time.perf_counter() - started)
+
+        latencies_ms = np.array(latencies) * 1000
+        updates_ms = np.array(updates) * 1000
+        print(
+            f"users={size:,}  keys={index.stats()['keys']:,}  build {built:.2f}s\n"
+            f"  search   p50 {np.percentile(latencies_ms, 50):.3f} ms  "
+            f"p99 {np.percentile(latencies_ms, 99):.3f} ms  max {latencies_ms.max():.3f} ms\n"
+            f"  update   p50 {np.percentile(updates_ms, 50):.3f} ms  "
+            f"p99 {np.percentile(updates_ms, 99):.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="M365 ディレクトリミラーのユーザー検索のレイテンシ計測")
+    parser.add_argument("--users", default="10000,100000", help="ユーザー数（カンマ区切り）")
+    parser.add_argument("--queries", type=int, default=2000, help="接頭辞の数")
+    args = parser.parse_args()
+
+    main([int(size) for size in args.users.split(",")], args.queries)
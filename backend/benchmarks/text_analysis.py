@@ -0,0 +1,102 @@
+"""
+日本語テキスト解析のスループット計測
+
+合成したナレッジ記事風のテキスト（日本語中心・英語のみ）に対して、
+簡易トークナイザ（simple_tokenize）と TextAnalyzer の正規化のみ・
+正規化＋分割の処理速度を比較し、BM25 索引の構築時間も計測します。
+
+Usage:
+    python -m benchmarks.text_analysis [--docs 2000] [--length 1500] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.knowledge_search import KNOWLEDGE_FIELDS
+from app.services.text_analysis import default_analyzer
+from app.services.text_index import InvertedIndex, simple_tokenize
+
+
+_JA_WORDS = [
+    "パスワード", "ﾊﾟｽﾜｰﾄﾞ", "ぱすわーど", "リセット", "アカウント", "ロック", "解除",
+    "プリンタ", "印刷", "できない", "VPN", "接続", "手順", "メール", "ｅメール", "送信",
+    "エラー", "Outlook", "Teams", "会議", "ライセンス", "割り当て", "申請", "承認",
+    "サインイン", "多要素認証", "設定", "変更", "の", "を", "に", "が", "は", "して",
+    "ください", "場合", "社内", "ネットワーク", "共有", "フォルダ", "ＰＣ", "再起動",
+]
+_EN_WORDS = [
+    "password", "reset", "account", "locked", "printer", "cannot", "print", "vpn",
+    "connect", "steps", "email", "send", "error", "outlook", "teams", "meeting",
+    "license", "assign", "request", "approve", "sign-in", "mfa", "settings", "restart",
+]
+
+
+def _corpus(words: list[str], docs: int, length: int, sep: str, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(docs):
+        parts: list[str] = []
+        size = 0
+        while size < length:
+            word = rng.choice(words)
+            parts.append(word)
+            size += len(word) + len(sep)
+        corpus.append(sep.join(parts))
+    return corpus
+
+
+def _throughput(func, corpus: list[str], repeat: int) -> tuple[float, float]:
+    """(MB/s, 文書/秒) を最良値で返す"""
+    size_mb = sum(len(text.encode("utf-8")) for text in corpus) / 1_000_000
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return size_mb / best, len(corpus) / best
+
+
+def _build_seconds(tokenizer, corpus: list[str]) -> float:
+    index = InvertedIndex(KNOWLEDGE_FIELDS, tokenizer=tokenizer)
+    started = time.perf_counter()
+    for doc_id, text in enumerate(corpus):
+        index.add(doc_id, {"title": text[:40], "content": text})
+    return time.perf_counter() - started
+
+
+def main(docs: int, length: int, repeat: int) -> None:
+    corpora = {
+        "japanese": _corpus(_JA_WORDS, docs, length, "", seed=1),
+        "english": _corpus(_EN_WORDS, docs, length, " ", seed=2),
+    }
+    pipelines = {
+        "simple_tokenize": simple_tokenize,
+        "normalize": default_analyzer.normalize,
+        "analyze": default_analyzer,
+    }
+
+    print(f"{docs} docs x ~{length} chars")
+    print(f"{'corpus':<10} {'pipeline':<16} {'MB/s':>8} {'docs/s':>10}")
+    for corpus_name, corpus in corpora.items():
+        for name, func in pipelines.items():
+            mb_per_s, docs_per_s = _throughput(func, corpus, repeat)
+            print(f"{corpus_name:<10} {name:<16} {mb_per_s:>8.2f} {docs_per_s:>10.0f}")
+
+    print()
+    print(f"{'corpus':<10} {'index build (s)':>16} {'simple':>8} {'analyze':>8}")
+    for corpus_name, corpus in corpora.items():
+        simple = _build_seconds(simple_tokenize, corpus)
+        analyzed = _build_seconds(default_analyzer, corpus)
+        print(f"{corpus_name:<10} {'':>16} {simple:>8.2f} {analyzed:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="日本語テキスト解析のスループット計測")
+    parser.add_argument("--docs", type=int, default=2000, help="文書数")
+    parser.add_argument("--length", type=int, default=1500, help="1文書あたりの文字数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数（最良値を採用）")
+    args = parser.parse_args()
+
+    main(args.docs, args.length, args.repeat)
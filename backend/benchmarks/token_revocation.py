@@ -0,0 +1,60 @@
+"""
+トークン失効チェックのマイクロベンチマーク
+
+失効リストの件数を変えながら、verify_token の所要時間を
+失効チェックあり・なしで比較します（検証済みトークンキャッシュのヒット時と
+署名検証を伴うミス時の両方）。失効チェックは辞書参照のため件数に依存しません。
+
+Usage:
+    python -m benchmarks.token_revocation [--sizes 0 10000 1000000] [--number 20000]
+"""
+
+import argparse
+import time
+import timeit
+import uuid
+
+from app.core.revocation import revocation_list
+from app.core.security import create_access_token, new_token_id, token_cache, verify_token
+
+
+def _per_call_us(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1_000_000
+
+
+def main(sizes: list[int], number: int) -> None:
+    token = create_access_token(subject="1", family=new_token_id())
+    expires_at = time.time() + 3600
+
+    print(f"{'revoked':>10} {'hit+check':>12} {'hit only':>12} {'miss+check':>12} {'miss only':>12}  (us/call)")
+    for size in sizes:
+        revocation_list.clear()
+        for _ in range(size // 2):
+            revocation_list.revoke_token(uuid.uuid4().hex, expires_at)
+            revocation_list.revoke_family(uuid.uuid4().hex, expires_at)
+
+        verify_token(token)
+        hit_checked = _per_call_us(lambda: verify_token(token), number)
+        hit_unchecked = _per_call_us(lambda: verify_token(token, check_revocation=False), number)
+
+        def miss(check: bool) -> None:
+            token_cache.clear()
+            verify_token(token, check_revocation=check)
+
+        miss_checked = _per_call_us(lambda: miss(True), number // 10)
+        miss_unchecked = _per_call_us(lambda: miss(False), number // 10)
+
+        print(
+            f"{len(revocation_list):>10} {hit_checked:>12.2f} {hit_unchecked:>12.2f} "
+            f"{miss_checked:>12.2f} {miss_unchecked:>12.2f}"
+        )
+    revocation_list.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="verify_token の失効チェックのオーバーヘッド計測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10_000, 1_000_000], help="失効リストの件数")
+    parser.add_argument("--number", type=int, default=20_000, help="1計測あたりの呼び出し回数")
+    args = parser.parse_args()
+
+    main(args.sizes, args.number)
@@ -0,0 +1,128 @@
+"""
+IVF-flat 近似最近傍索引の再現率・レイテンシ計測
+
+トピック（問い合わせの種類に相当し、件数によらず一定数）の混合で生成した
+単位ベクトル（クラスタ構造を持つ、文書ベクトルに近い分布）を IVFFlatIndex に追加して保存し、メモリマップで読み込み直した
+索引に対して、全件走査（exact=True）を正解とした recall@k と1クエリあたりの
+レイテンシを走査リスト数（n_probe）ごとに比較します。
+
+1M 件 x 256 次元のベクトルは約 1GB です（保存先は一時ディレクトリ）。
+
+Usage:
+    python -m benchmarks.vector_index [--sizes 100000,1000000] [--dimensions 256] [--topics 1000] [--queries 200] [--k 10]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.vector_index import IVFFlatIndex
+
+
+# 生成を一度に行う件数
+_CHUNK = 100_000
+
+
+def _vectors(rng: np.random.Generator, topics: np.ndarray, n: int) -> np.ndarray:
+    """ランダムに選んだ2トピックの混合にノイズを加えた単位ベクトル"""
+    first = topics[rng.integers(len(topics), size=n)]
+    second = topics[rng.integers(len(topics), size=n)]
+    weight = rng.uniform(0.6, 1.0, size=(n, 1))
+    vectors = weight * first + (1 - weight) * second
+    vectors += rng.normal(scale=1.5 / np.sqrt(topics.shape[1]), size=vectors.shape)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def _percentile_ms(seconds: list[float], q: float) -> float:
+    return float(np.percentile(seconds, q)) * 1000
+
+
+def _run(index: IVFFlatIndex, queries: np.ndarray, k: int, exact: bool) -> tuple[list[list[int]], list[float]]:
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.nearest(query, k, exact=exact)
+        latencies.append(time.perf_counter() - started)
+        results.append([doc_id for doc_id, _ in hits])
+    return results, latencies
+
+
+def main(sizes: list[int], dimensions: int, n_topics: int, n_queries: int, k: int, probes: list[int]) -> None:
+    print(f"{dimensions} dims, {n_topics} topics, {n_queries} queries, recall@{k}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        topics = rng.normal(size=(n_topics, dimensions))
+        topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            index = IVFFlatIndex(dimensions, initial_capacity=min(size, _CHUNK))
+
+            started = time.perf_counter()
+            for start in range(0, size, _CHUNK):
+                for offset, vector in enumerate(_vectors(rng, topics, min(_CHUNK, size - start))):
+                    index.add(start + offset, vector)
+            added = time.perf_counter() - started
+
+            started = time.perf_counter()
+            index.save(directory)
+            saved = time.perf_counter() - started
+            del index
+
+            # 保存したセグメントをメモリマップで開き直して計測する
+            started = time.perf_counter()
+            index = IVFFlatIndex(dimensions)
+            assert index.load(directory)
+            loaded = time.perf_counter() - started
+
+            print()
+            print(
+                f"n={size:,}  lists={len(index._centroids)}  "
+                f"add {added:.1f}s  save(train+write) {saved:.1f}s  load(mmap) {loaded:.2f}s"
+            )
+
+            queries = _vectors(rng, topics, n_queries)
+            # 1回目はページキャッシュへの読み込みを含むため捨てる
+            _run(index, queries[:10], k, exact=True)
+            truth, latencies = _run(index, queries, k, exact=True)
+            print(f"{'method':<16} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8}")
+            print(
+                f"{'brute force':<16} {1.0:>8.3f} {_percentile_ms(latencies, 50):>8.2f} "
+                f"{_percentile_ms(latencies, 95):>8.2f} {len(latencies) / sum(latencies):>8.0f}"
+            )
+
+            for n_probe in probes:
+                index.n_probe = n_probe
+                _run(index, queries[:10], k, exact=False)
+                results, latencies = _run(index, queries, k, exact=False)
+                recall = np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+                print(
+                    f"{f'ivf n_probe={n_probe}':<16} {recall:>8.3f} {_percentile_ms(latencies, 50):>8.2f} "
+                    f"{_percentile_ms(latencies, 95):>8.2f} {len(latencies) / sum(latencies):>8.0f}"
+                )
+            del index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF-flat 近似最近傍索引の再現率・レイテンシ計測")
+    parser.add_argument("--sizes", default="100000,1000000", help="ベクトル数（カンマ区切り）")
+    parser.add_argument("--dimensions", type=int, default=256, help="ベクトルの次元数")
+    parser.add_argument("--topics", type=int, default=1000, help="生成に使うトピック数")
+    parser.add_argument("--queries", type=int, default=200, help="クエリ数")
+    parser.add_argument("--k", type=int, default=10, help="取得件数")
+    parser.add_argument("--probes", default="4,8,16,32", help="比較する n_probe（カンマ区切り）")
+    args = parser.parse_args()
+
+    main(
+        [int(size) for size in args.sizes.split(",")],
+        args.dimensions,
+        args.topics,
+        args.queries,
+        args.k,
+        [int(probe) for probe in args.probes.split(",")],
+    )
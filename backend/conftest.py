@@ -5,6 +5,8 @@ Pytest Configuration and Shared Fixtures
 """
 
 import asyncio
+import os
+import tempfile
 from collections.abc import AsyncGenerator
 from typing import Any
 
@@ -13,9 +15,25 @@ import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+# 監査ミドルウェアのログをリポジトリ外に出力する
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="helpdesk-test-logs-"))
+
 from app.database import Base, get_db
 from app.main import app
-from app.core.security import get_password_hash
+from app.core.rate_limit import login_throttle
+from app.core.revocation import revocation_list
+from app.core.security import get_password_hash, token_cache
+from app.m365.auth import access_token_cache
+from app.m365.cache import graph_cache
+from app.m365.throttle import graph_throttle
+from app.services.index_lock import release_saver_locks
+from app.services.knowledge_counters import feedback_counts, view_counts
+from app.services.knowledge_search import knowledge_index
+from app.services.knowledge_suggest import knowledge_suggester
+from app.services.m365_directory import directory_index
+from app.services.m365_jobs import m365_job_worker
+from app.services.ticket_suggestions import article_vectors, ticket_vectors
+from app.services.user_cache import user_cache
 from app.models.user import User, UserRole
 from app.models.sla_policy import SLAPolicy
 from app.models.ticket import TicketPriority
@@ -37,6 +55,41 @@ def event_loop():
     loop.close()
 
 
+# テストごとにクリアするプロセス内の状態
+_PROCESS_STATE_RESETS = (
+    token_cache.clear,
+    user_cache.clear,
+    revocation_list.clear,
+    login_throttle.clear,
+    knowledge_index.clear,
+    view_counts.clear,
+    feedback_counts.clear,
+    ticket_vectors.clear,
+    article_vectors.clear,
+    knowledge_suggester.clear,
+    access_token_cache.clear,
+    directory_index.clear,
+    graph_cache.clear,
+    graph_throttle.clear,
+    m365_job_worker.clear,
+    release_saver_locks,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    """
+    プロセス内のキャッシュ・索引・カウンター・ログイン試行回数をテストごとにクリアする。
+
+    インメモリDBはテストごとに作り直されユーザーIDが再利用されるため。
+    """
+    for reset in _PROCESS_STATE_RESETS:
+        reset()
+    yield
+    for reset in _PROCESS_STATE_RESETS:
+        reset()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def test_engine():
     """
@@ -308,6 +361,7 @@ def mock_graph_client(monkeypatch):
     GraphClient のモックを提供する。
     """
     from unittest.mock import AsyncMock, MagicMock
+    from app.m365.graph_client import BatchResponse
 
     mock_client = AsyncMock()
     mock_client.get_user = AsyncMock(return_value={
@@ -330,14 +384,42 @@ def mock_graph_client(monkeypatch):
     ])
     mock_client.get_user_licenses = AsyncMock(return_value=[])
     mock_client.assign_license = AsyncMock(return_value={"success": True})
+    mock_client.assign_licenses = AsyncMock(
+        side_effect=lambda user_ids, sku_id: {u: BatchResponse(u, 200) for u in user_ids}
+    )
     mock_client.remove_license = AsyncMock(return_value={"success": True})
     mock_client.reset_password = AsyncMock(return_value={"success": True})
     mock_client.list_authentication_methods = AsyncMock(return_value=[])
     mock_client.delete_authentication_method = AsyncMock(return_value={"success": True})
+    mock_client.delete_authentication_methods = AsyncMock(
+        side_effect=lambda user_id, method_ids: {m: BatchResponse(m, 204) for m in method_ids}
+    )
     mock_client.get_group = AsyncMock(return_value={"id": "group-1", "displayName": "Test Group"})
     mock_client.add_group_member = AsyncMock(return_value={"success": True})
+    mock_client.add_group_members = AsyncMock(
+        side_effect=lambda group_id, user_ids: {u: BatchResponse(u, 204) for u in user_ids}
+    )
     mock_client.remove_group_member = AsyncMock(return_value={"success": True})
     mock_client.list_group_members = AsyncMock(return_value=[])
+    mock_client.add_member_to_groups = AsyncMock(
+        side_effect=lambda user_id, group_ids: {g: BatchResponse(g, 204) for g in group_ids}
+    )
+    mock_client.list_user_groups = AsyncMock(return_value=[])
+    mock_client.remove_group_memberships = AsyncMock(
+        side_effect=lambda user_id, group_ids: {g: BatchResponse(g, 204) for g in group_ids}
+    )
+    mock_client.create_user = AsyncMock(return_value={"id": "new-user-id"})
+    mock_client.update_user = AsyncMock(return_value={"id": "test-user-id", "accountEnabled": False})
+    mock_client.revoke_sign_in_sessions = AsyncMock(return_value={"value": True})
+    mock_client.get_license_assignment_states = AsyncMock(return_value=[])
+    mock_client.update_licenses = AsyncMock(return_value={"success": True})
+    mock_client.list_shared_drive_items = AsyncMock(return_value=[])
+    mock_client.list_drive_item_permissions = AsyncMock(
+        side_effect=lambda user_id, item_ids: {i: BatchResponse(i, 200, {"value": []}) for i in item_ids}
+    )
+    mock_client.delete_drive_item_permissions = AsyncMock(
+        side_effect=lambda user_id, permissions: {p: BatchResponse(str(p), 204) for p in permissions}
+    )
     mock_client.__aenter__ = AsyncMock(return_value=mock_client)
     mock_client.__aexit__ = AsyncMock(return_value=None)
 
@@ -1,19 +1,19 @@
 #!/usr/bin/env python3
 """SQLiteデータベースにテストユーザーを作成"""
 
+import asyncio
 import sqlite3
-from passlib.context import CryptContext
 from datetime import datetime
 import uuid
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.security import get_password_hash_async
 
 # データベース接続
 conn = sqlite3.connect("data/helpdesk.db")
 cursor = conn.cursor()
 
-# パスワードハッシュ生成
-password_hash = pwd_context.hash("password123")
+# パスワードハッシュ生成（API と同じハッシュ用スレッドプールを使用）
+password_hash = asyncio.run(get_password_hash_async("password123"))
 
 # ユーザーID
 user_id = "9057e96f-7dd1-45c1-b4a0-e757bb18a7a3"
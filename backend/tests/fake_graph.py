@@ -0,0 +1,168 @@
+"""
+Fake Microsoft Graph Server
+
+テスト用の Microsoft Graph の代替サーバー。httpx.MockTransport のハンドラとして
+プロセス内で動作し、次のエンドポイントを実装する。
+
+- POST {authority}/oauth2/v2.0/token（client credentials）
+- GET /users/delta, /groups/delta（@odata.nextLink によるページング、
+  $deltatoken による差分、削除は "@removed"、変更は変更されたプロパティのみ）
+- GET /users/{id}, /users?$filter=startswith(...)
+
+ディレクトリの変更は add_user / update_user / delete_user などで行い、
+受け付けたリクエストは requests に記録する。
+"""
+
+import json
+import re
+from typing import Any
+
+import httpx
+
+from app.m365.auth import M365AuthConfig
+
+
+GRAPH_ENDPOINT = "https://graph.fake.test/v1.0"
+AUTHORITY = "https://login.fake.test/tenant"
+
+
+def fake_auth_config() -> M365AuthConfig:
+    """代替サーバーを指す M365 の認証設定"""
+    return M365AuthConfig(
+        tenant_id="tenant",
+        client_id="client",
+        client_secret="secret",
+        authority=AUTHORITY,
+        graph_endpoint=GRAPH_ENDPOINT,
+        scopes=["https://graph.fake.test/.default"],
+    )
+
+
+class FakeGraph:
+    """Microsoft Graph の代替サーバー"""
+
+    def __init__(self, page_size: int = 2):
+        self.page_size = page_size
+        self.objects: dict[str, dict[str, dict[str, Any]]] = {"users": {}, "groups": {}}
+        # (変更番号, リソース, ID, 変更されたプロパティ（削除は None）)
+        self.changes: list[tuple[int, str, str, dict[str, Any] | None]] = []
+        self.requests: list[httpx.Request] = []
+        self.tokens_issued = 0
+        # これより古い $deltatoken は 410 Gone を返す
+        self.min_delta_token = 0
+
+    # ============== ディレクトリの変更 ==============
+
+    def _change(self, resource: str, object_id: str, fields: dict[str, Any] | None) -> None:
+        self.changes.append((len(self.changes) + 1, resource, object_id, fields))
+
+    def add_user(self, object_id: str, display_name: str, upn: str, **fields: Any) -> None:
+        user = {"id": object_id, "displayName": display_name, "userPrincipalName": upn, "mail": upn, **fields}
+        self.objects["users"][object_id] = user
+        self._change("users", object_id, dict(user))
+
+    def update_user(self, object_id: str, **fields: Any) -> None:
+        self.objects["users"][object_id].update(fields)
+        self._change("users", object_id, {"id": object_id, **fields})
+
+    def delete_user(self, object_id: str) -> None:
+        del self.objects["users"][object_id]
+        self._change("users", object_id, None)
+
+    def add_group(self, object_id: str, display_name: str, **fields: Any) -> None:
+        group = {"id": object_id, "displayName": display_name, **fields}
+        self.objects["groups"][object_id] = group
+        self._change("groups", object_id, dict(group))
+
+    def expire_delta_tokens(self) -> None:
+        """発行済みの $deltatoken をすべて失効させる"""
+        self.min_delta_token = len(self.changes) + 1
+
+    # ============== HTTP ==============
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self)
+
+    def graph_requests(self, path: str) -> list[httpx.Request]:
+        return [r for r in self.requests if r.url.path.startswith(f"/v1.0{path}")]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+
+        if path.endswith("/oauth2/v2.0/token"):
+            self.tokens_issued += 1
+            return httpx.Response(
+                200, json={"access_token": f"token-{self.tokens_issued}", "expires_in": 3599}
+            )
+        if not request.headers.get("Authorization", "").startswith("Bearer token-"):
+            return httpx.Response(401, json={"error": {"code": "InvalidAuthenticationToken"}})
+
+        match = re.fullmatch(r"/v1\.0/(users|groups)/delta", path)
+        if match:
+            return self._delta(request, match.group(1))
+
+        match = re.fullmatch(r"/v1\.0/users/([^/]+)", path)
+        if match:
+            user = self.objects["users"].get(match.group(1)) or next(
+                (u for u in self.objects["users"].values() if u["userPrincipalName"] == match.group(1)),
+                None,
+            )
+            if user is None:
+                return httpx.Response(404, json={"error": {"code": "Request_ResourceNotFound"}})
+            return httpx.Response(200, json=user)
+
+        if path == "/v1.0/users":
+            prefix = re.search(r"startswith\(displayName,'([^']*)'\)", request.url.params.get("$filter", ""))
+            users = [
+                u for u in self.objects["users"].values()
+                if prefix is None or u["displayName"].lower().startswith(prefix.group(1).lower())
+            ]
+            return httpx.Response(200, json={"value": users})
+
+        return httpx.Response(404, json={"error": {"code": "Request_ResourceNotFound"}})
+
+    def _delta(self, request: httpx.Request, resource: str) -> httpx.Response:
+        params = request.url.params
+        if "$skiptoken" in params:
+            state = json.loads(params["$skiptoken"])
+            since, through, offset = state["since"], state["through"], state["offset"]
+        elif "$deltatoken" in params:
+            since = int(params["$deltatoken"])
+            if since < self.min_delta_token:
+                return httpx.Response(410, json={"error": {"code": "syncStateNotFound"}})
+            through, offset = len(self.changes), 0
+        else:
+            since, through, offset = 0, len(self.changes), 0
+
+        items = self._changes_between(resource, since, through)
+        page = items[offset:offset + self.page_size]
+        body: dict[str, Any] = {"value": page}
+
+        base = f"{GRAPH_ENDPOINT}/{resource}/delta"
+        if offset + self.page_size < len(items):
+            token = json.dumps({"since": since, "through": through, "offset": offset + self.page_size})
+            body["@odata.nextLink"] = str(httpx.URL(base, params={"$skiptoken": token}))
+        else:
+            body["@odata.deltaLink"] = str(httpx.URL(base, params={"$deltatoken": str(through + 1)}))
+        return httpx.Response(200, json=body)
+
+    def _changes_between(self, resource: str, since: int, through: int) -> list[dict[str, Any]]:
+        """since 以降 through までの変更を ID ごとにまとめる（初回は現在の全件）"""
+        if since == 0:
+            return [dict(obj) for obj in self.objects[resource].values()]
+
+        merged: dict[str, dict[str, Any] | None] = {}
+        for seq, changed_resource, object_id, fields in self.changes:
+            if changed_resource != resource or not since <= seq <= through:
+                continue
+            if fields is None:
+                merged[object_id] = None
+            elif merged.get(object_id) is None:
+                merged[object_id] = dict(fields)
+            else:
+                merged[object_id].update(fields)
+        return [
+            {"id": object_id, "@removed": {"reason": "deleted"}} if fields is None else fields
+            for object_id, fields in merged.items()
+        ]
@@ -8,12 +8,14 @@ from datetime import datetime, timezone
 from typing import Any
 
 from faker import Faker
+from httpx import AsyncClient, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.user import User, UserRole
 from app.models.ticket import Ticket, TicketType, TicketStatus, TicketCategory, TicketPriority
 from app.models.comment import Comment, CommentVisibility
 from app.models.sla_policy import SLAPolicy
+from app.models.m365_task import M365Task
 from app.core.security import get_password_hash
 
 
@@ -236,6 +238,44 @@ def create_auth_headers(user_id: int) -> dict[str, str]:
     return {"Authorization": f"Bearer {token}"}
 
 
+# ============================================================================
+# M365 ヘルパー
+# ============================================================================
+
+async def queue_m365_execution(
+    client: AsyncClient,
+    task: M365Task,
+    headers: dict[str, str],
+    command_or_action: str = "execute",
+    idempotency_key: str | None = None,
+) -> Response:
+    """
+    M365 タスクの実行をジョブとして登録する（POST /api/m365/tasks/{id}/execute）。
+
+    Args:
+        client: テストクライアント
+        task: 実行するタスク
+        headers: 認証ヘッダー
+        command_or_action: 実行内容（パスワードリセットでは指定するパスワード）
+        idempotency_key: Idempotency-Key ヘッダー（省略時は付けない）
+
+    Returns:
+        レスポンス
+    """
+    if idempotency_key:
+        headers = {**headers, "Idempotency-Key": idempotency_key}
+    return await client.post(
+        f"/api/m365/tasks/{task.id}/execute",
+        json={
+            "action": "M365 タスクの実行",
+            "method": "graph_api",
+            "command_or_action": command_or_action,
+            "result": "success",
+        },
+        headers=headers,
+    )
+
+
 # ============================================================================
 # アサーションヘルパー
 # ============================================================================
@@ -0,0 +1,371 @@
+"""
+Test Audit Logs
+
+監査ログのテスト:
+- 時間単位ロールアップの増分更新
+- ロールアップのバックフィル
+- 統計API
+- 月次パーティションとアーカイブ
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import MetaData, func, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+
+from app.models.audit_log import AuditAction, AuditLog, AuditLogRollup, hour_bucket
+from app.models.user import User
+from app.services.audit_partitions import (
+    _partitioned_parent_table,
+    add_months,
+    archive_expired_partitions,
+    audit_log_source,
+    month_start,
+    partition_name,
+    seal_sqlite_partitions,
+)
+from app.services.audit_rollup import get_rollup_statistics, rebuild_audit_rollup
+
+
+def _log(action: AuditAction, resource_type: str, created_at: datetime | None = None) -> AuditLog:
+    log = AuditLog.create_log(
+        action=action,
+        resource_type=resource_type,
+        description="テスト",
+        actor_id=1,
+    )
+    if created_at is not None:
+        log.created_at = created_at
+    return log
+
+
+async def _rollup_rows(db: AsyncSession) -> dict[tuple, int]:
+    result = await db.execute(select(AuditLogRollup))
+    return {
+        (hour_bucket(r.hour), r.action, r.resource_type): r.count
+        for r in result.scalars().all()
+    }
+
+
+@pytest.mark.audit
+class TestAuditLogRollup:
+    """監査ログロールアップのテスト"""
+
+    def test_hour_bucket(self):
+        """時刻が正時に切り捨てられることを確認"""
+        value = datetime(2026, 4, 1, 9, 42, 13, 500, tzinfo=timezone.utc)
+        assert hour_bucket(value) == datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+
+    @pytest.mark.asyncio
+    async def test_rollup_incremented_on_insert(self, db_session: AsyncSession):
+        """監査ログ挿入時にロールアップが加算されることを確認"""
+        at = datetime(2026, 4, 1, 9, 15, tzinfo=timezone.utc)
+        db_session.add_all([
+            _log(AuditAction.LOGIN, "auth", at),
+            _log(AuditAction.LOGIN, "auth", at + timedelta(minutes=30)),
+            _log(AuditAction.TICKET_CREATE, "ticket", at),
+        ])
+        await db_session.commit()
+
+        db_session.add(_log(AuditAction.LOGIN, "auth", at + timedelta(minutes=40)))
+        await db_session.commit()
+
+        rows = await _rollup_rows(db_session)
+        hour = datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+        assert rows[(hour, AuditAction.LOGIN, "auth")] == 3
+        assert rows[(hour, AuditAction.TICKET_CREATE, "ticket")] == 1
+
+    @pytest.mark.asyncio
+    async def test_rollup_uses_now_for_server_default(self, db_session: AsyncSession):
+        """created_at 未指定のログは現在時刻のバケットに集計されることを確認"""
+        db_session.add(_log(AuditAction.EXPORT_DATA, "audit_log"))
+        await db_session.commit()
+
+        rows = await _rollup_rows(db_session)
+        assert sum(rows.values()) == 1
+        (hour, action, _), = rows.keys()
+        assert action == AuditAction.EXPORT_DATA
+        assert abs(datetime.now(timezone.utc) - hour) < timedelta(hours=1, minutes=1)
+
+    @pytest.mark.asyncio
+    async def test_rebuild_rollup(self, db_session: AsyncSession):
+        """バックフィルで audit_logs から正しく再集計されることを確認"""
+        at = datetime(2026, 4, 1, 9, 15, tzinfo=timezone.utc)
+        db_session.add_all([
+            _log(AuditAction.LOGIN, "auth", at),
+            _log(AuditAction.LOGIN, "auth", at + timedelta(hours=2)),
+        ])
+        await db_session.commit()
+
+        # 不整合な集計値を作る
+        stale = (await db_session.execute(select(AuditLogRollup))).scalars().first()
+        stale.count = 99
+        await db_session.commit()
+
+        buckets = await rebuild_audit_rollup(db_session)
+        await db_session.commit()
+
+        assert buckets == 2
+        rows = await _rollup_rows(db_session)
+        assert rows[(datetime(2026, 4, 1, 9, tzinfo=timezone.utc), AuditAction.LOGIN, "auth")] == 1
+        assert rows[(datetime(2026, 4, 1, 11, tzinfo=timezone.utc), AuditAction.LOGIN, "auth")] == 1
+
+    @pytest.mark.asyncio
+    async def test_statistics_include_partial_first_hour(self, db_session: AsyncSession):
+        """期間先頭の端数時間が正確に数えられることを確認"""
+        db_session.add_all([
+            _log(AuditAction.LOGIN, "auth", datetime(2026, 4, 1, 9, 10, tzinfo=timezone.utc)),
+            _log(AuditAction.LOGIN, "auth", datetime(2026, 4, 1, 9, 50, tzinfo=timezone.utc)),
+            _log(AuditAction.TICKET_CREATE, "ticket", datetime(2026, 4, 1, 12, 0, tzinfo=timezone.utc)),
+            _log(AuditAction.TICKET_CREATE, "ticket", datetime(2026, 4, 2, 12, 0, tzinfo=timezone.utc)),
+        ])
+        await db_session.commit()
+
+        total, by_action, by_resource = await get_rollup_statistics(
+            db_session,
+            datetime(2026, 4, 1, 9, 30, tzinfo=timezone.utc),
+            datetime(2026, 4, 1, 23, 0, tzinfo=timezone.utc),
+        )
+
+        assert total == 2
+        assert by_action == {"login": 1, "ticket_create": 1}
+        assert by_resource == {"auth": 1, "ticket": 1}
+
+    @pytest.mark.asyncio
+    async def test_statistics_endpoint(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_manager: User,
+        create_auth_headers,
+    ):
+        """統計APIがロールアップから集計結果を返すことを確認"""
+        now = datetime.now(timezone.utc)
+        db_session.add_all([
+            _log(AuditAction.LOGIN, "auth", now - timedelta(days=1)),
+            _log(AuditAction.LOGIN, "auth", now - timedelta(days=2)),
+            _log(AuditAction.LOGIN, "auth", now - timedelta(days=60)),
+        ])
+        await db_session.commit()
+
+        headers = create_auth_headers(test_user_manager.id)
+        response = await client.get("/api/audit/statistics?days=30", headers=headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_logs"] == 2
+        assert data["logs_by_action"] == {"login": 2}
+        assert data["logs_by_resource"] == {"auth": 2}
+
+
+@pytest.mark.audit
+class TestAuditLogPartitions:
+    """監査ログ月次パーティションのテスト"""
+
+    NOW = datetime(2026, 4, 15, 12, 0, tzinfo=timezone.utc)
+
+    async def _seed(self, db: AsyncSession) -> None:
+        db.add_all([
+            _log(AuditAction.LOGIN, "auth", datetime(2026, 1, 10, 9, 0, tzinfo=timezone.utc)),
+            _log(AuditAction.LOGIN, "auth", datetime(2026, 2, 10, 9, 0, tzinfo=timezone.utc)),
+            _log(AuditAction.TICKET_CREATE, "ticket", datetime(2026, 2, 20, 9, 0, tzinfo=timezone.utc)),
+            _log(AuditAction.LOGIN, "auth", datetime(2026, 4, 1, 9, 0, tzinfo=timezone.utc)),
+        ])
+        await db.commit()
+
+    async def _table_names(self, db: AsyncSession) -> list[str]:
+        connection = await db.connection()
+        return await connection.run_sync(lambda c: inspect(c).get_table_names())
+
+    def test_month_helpers(self):
+        """月の計算とパーティション名を確認"""
+        month = month_start(datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc))
+        assert month == datetime(2026, 12, 1, tzinfo=timezone.utc)
+        assert add_months(month, 1) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+        assert add_months(month, -12) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+        assert partition_name(month) == "audit_logs_2026_12"
+
+    def test_postgres_parent_table_ddl(self):
+        """PostgreSQL ではレンジパーティション親表として作成されることを確認"""
+        ddl = str(CreateTable(_partitioned_parent_table()).compile(dialect=postgresql.dialect()))
+
+        assert "PARTITION BY RANGE (created_at)" in ddl
+        assert "PRIMARY KEY (id, created_at)" in ddl
+        assert "id SERIAL" in ddl
+
+    @pytest.mark.asyncio
+    async def test_seal_moves_closed_months(self, db_session: AsyncSession):
+        """締め済みの月が月次テーブルへ移動されることを確認"""
+        await self._seed(db_session)
+
+        connection = await db_session.connection()
+        sealed = await connection.run_sync(lambda c: seal_sqlite_partitions(c, self.NOW))
+        await db_session.commit()
+
+        assert sealed == ["audit_logs_2026_01", "audit_logs_2026_02"]
+        hot = (await db_session.execute(select(AuditLog))).scalars().all()
+        assert len(hot) == 1
+
+        # 全期間のビュー
+        view_count = (await db_session.execute(
+            select(func.count()).select_from(text("audit_logs_all"))
+        )).scalar()
+        assert view_count == 4
+
+    @pytest.mark.asyncio
+    async def test_source_routes_to_partitions_in_range(self, db_session: AsyncSession):
+        """期間に重なるパーティションのみが参照されることを確認"""
+        await self._seed(db_session)
+        connection = await db_session.connection()
+        await connection.run_sync(lambda c: seal_sqlite_partitions(c, self.NOW))
+        await db_session.commit()
+
+        start = datetime(2026, 2, 1, tzinfo=timezone.utc)
+        end = datetime(2026, 2, 28, tzinfo=timezone.utc)
+        source = await audit_log_source(db_session, start, end)
+        sql = str(select(source).compile())
+        assert "audit_logs_2026_02" in sql
+        assert "audit_logs_2026_01" not in sql
+
+        result = await db_session.execute(
+            select(source).where(source.created_at >= start, source.created_at <= end)
+        )
+        logs = result.scalars().all()
+        assert sorted(log.action for log in logs) == [AuditAction.LOGIN, AuditAction.TICKET_CREATE]
+
+        # 範囲なしでは全パーティション
+        everything = await audit_log_source(db_session)
+        assert len((await db_session.execute(select(everything))).scalars().all()) == 4
+
+    @pytest.mark.asyncio
+    async def test_list_endpoint_reads_sealed_partitions(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_manager: User,
+        create_auth_headers,
+    ):
+        """一覧APIが月次テーブルのログも返すことを確認"""
+        await self._seed(db_session)
+        connection = await db_session.connection()
+        await connection.run_sync(lambda c: seal_sqlite_partitions(c, self.NOW))
+        await db_session.commit()
+
+        headers = create_auth_headers(test_user_manager.id)
+        response = await client.get(
+            "/api/audit/logs",
+            params={"start_date": "2026-01-01T00:00:00Z", "end_date": "2026-02-28T00:00:00Z"},
+            headers=headers,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3
+        assert data["items"][0]["action"] == "ticket_create"
+
+    @pytest.mark.asyncio
+    async def test_archive_expired_partitions(self, db_session: AsyncSession, tmp_path):
+        """保持期間を過ぎた月がエクスポートされ削除されることを確認"""
+        await self._seed(db_session)
+
+        connection = await db_session.connection()
+        archived = await connection.run_sync(
+            lambda c: archive_expired_partitions(c, tmp_path, retention_days=60, now=self.NOW)
+        )
+        await db_session.commit()
+
+        # 2026-01 のみ保持期間（60日）を完全に過ぎている
+        assert [path.name for path in archived] == ["audit_logs_2026_01.jsonl.gz"]
+        with gzip.open(archived[0], "rt", encoding="utf-8") as handle:
+            rows = [json.loads(line) for line in handle]
+        assert len(rows) == 1
+        assert rows[0]["resource_type"] == "auth"
+
+        tables = await self._table_names(db_session)
+        assert "audit_logs_2026_01" not in tables
+        assert "audit_logs_2026_02" in tables
+
+        everything = await audit_log_source(db_session)
+        assert len((await db_session.execute(select(everything))).scalars().all()) == 3
+
+        # アーカイブした月の集計も残らない
+        months = {hour.month for hour, _, _ in await _rollup_rows(db_session)}
+        assert months == {2, 4}
+
+    @pytest.mark.asyncio
+    async def test_ids_are_not_reused_after_sealing(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_manager: User,
+        create_auth_headers,
+    ):
+        """全行を締めた後の新しいログが月次テーブルと同じIDにならず、詳細APIで取得できることを確認"""
+        await self._seed(db_session)
+        connection = await db_session.connection()
+        await connection.run_sync(
+            lambda c: seal_sqlite_partitions(c, datetime(2026, 5, 15, tzinfo=timezone.utc))
+        )
+        await db_session.commit()
+        assert (await db_session.execute(select(AuditLog))).scalars().all() == []
+
+        log = _log(AuditAction.LOGIN, "auth")
+        db_session.add(log)
+        await db_session.commit()
+
+        assert log.id > 4
+        response = await client.get(
+            f"/api/audit/logs/{log.id}", headers=create_auth_headers(test_user_manager.id)
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == log.id
+
+    @pytest.mark.asyncio
+    async def test_ids_are_not_reused_on_table_without_autoincrement(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_manager: User,
+        create_auth_headers,
+    ):
+        """AUTOINCREMENT なしで作成済みの audit_logs でも、締めた後の新しいログが同じIDにならないことを確認"""
+
+        def recreate_without_autoincrement(connection) -> None:
+            connection.execute(text("DROP VIEW IF EXISTS audit_logs_all"))
+            AuditLog.__table__.drop(connection)
+            table = AuditLog.__table__.to_metadata(MetaData())
+            table.dialect_kwargs["sqlite_autoincrement"] = False
+            table.create(connection)
+
+        connection = await db_session.connection()
+        await connection.run_sync(recreate_without_autoincrement)
+        await db_session.commit()
+        await self._seed(db_session)
+
+        connection = await db_session.connection()
+        sealed = await connection.run_sync(
+            lambda c: seal_sqlite_partitions(c, datetime(2026, 5, 15, tzinfo=timezone.utc))
+        )
+        await db_session.commit()
+        assert len(sealed) == 3
+        ddl = (await db_session.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'audit_logs'")
+        )).scalar()
+        assert "AUTOINCREMENT" in ddl
+
+        log = _log(AuditAction.LOGIN, "auth")
+        db_session.add(log)
+        await db_session.commit()
+
+        assert log.id > 4
+        response = await client.get(
+            f"/api/audit/logs/{log.id}", headers=create_auth_headers(test_user_manager.id)
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == log.id
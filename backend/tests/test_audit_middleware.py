@@ -14,7 +14,7 @@ from fastapi import Request, Response
 from starlette.datastructures import Headers
 
 from app.middleware.audit import AuditMiddleware
-from app.core.security import create_access_token
+from app.core.security import create_access_token, verify_token
 
 
 @pytest.mark.middleware
@@ -97,6 +97,17 @@ class TestGetUserInfo:
 
         assert user_id_result == user_id
 
+    @pytest.mark.asyncio
+    async def test_get_user_info_shares_auth_context(self, client, test_user_requester, create_auth_headers):
+        """ミドルウェアと認証依存関係で JWT 検証が1回だけ行われることを確認"""
+        headers = create_auth_headers(test_user_requester.id)
+
+        with patch("app.core.auth_context.verify_token", wraps=verify_token) as verify:
+            response = await client.get("/api/auth/me", headers=headers)
+
+        assert response.status_code == 200
+        assert verify.call_count == 1
+
     @pytest.mark.asyncio
     async def test_get_user_info_without_token(self):
         """トークンがない場合にNoneを返すことを確認"""
@@ -6,10 +6,18 @@ Test Authentication Module
 - トークン生成/検証
 - パスワードハッシュ化
 - リフレッシュトークン
+- 認証ユーザーキャッシュ
+- トークン失効（ログアウト・リフレッシュトークンのローテーション）
+- ログイン試行回数の制限
 """
 
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import (
@@ -18,8 +26,14 @@ from app.core.security import (
     create_access_token,
     create_refresh_token,
     verify_token,
+    token_cache,
 )
-from app.models.user import User
+from app.core.rate_limit import MemoryCounterStore, SQLiteCounterStore, login_throttle
+from app.core.revocation import RevocationList, revocation_list
+from app.models.revoked_token import RevocationKind, RevokedToken
+from app.models.user import User, UserRole
+from app.services.token_revocation import load_revocations, revoke_family, sync_revocations
+from app.services.user_cache import UserCache, user_cache
 
 
 class TestPasswordHashing:
@@ -204,6 +218,23 @@ class TestLoginAPI:
         # ステータスコード401
         assert response.status_code == 401
 
+    @pytest.mark.asyncio
+    async def test_login_when_hasher_busy(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """ハッシュ処理の待機が上限に達した場合に503が返ることを確認"""
+        with patch("app.core.hashing.password_hasher.max_pending", 1), \
+                patch("app.core.hashing.password_hasher.pending", 1):
+            response = await client.post(
+                "/api/auth/login",
+                json={"email": test_user_requester.email, "password": "password123"},
+            )
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
     @pytest.mark.asyncio
     async def test_login_inactive_user(
         self,
@@ -386,3 +417,421 @@ class TestRefreshToken:
 
         # ステータスコード401
         assert response.status_code == 401
+
+
+@pytest.mark.auth
+class TestUserCache:
+    """認証ユーザーキャッシュのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_repeated_requests_hit_cache(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """2回目以降のリクエストでユーザーがキャッシュから取得されることを確認"""
+        headers = create_auth_headers(test_user_requester.id)
+
+        for _ in range(3):
+            response = await client.get("/api/auth/me", headers=headers)
+            assert response.status_code == 200
+            assert response.json()["email"] == test_user_requester.email
+
+        stats = user_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_deactivation_invalidates_cache(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_requester: User,
+        test_user_manager: User,
+        create_auth_headers,
+    ):
+        """users.update_user による無効化でキャッシュが破棄されることを確認"""
+        user_headers = create_auth_headers(test_user_requester.id)
+        await client.get("/api/auth/me", headers=user_headers)
+        assert user_cache.get(test_user_requester.id) is not None
+
+        response = await client.patch(
+            f"/api/users/{test_user_requester.id}",
+            json={"is_active": False},
+            headers=create_auth_headers(test_user_manager.id),
+        )
+        assert response.status_code == 200
+        assert user_cache.get(test_user_requester.id) is None
+
+        response = await client.get("/api/auth/me", headers=user_headers)
+        assert response.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_role_change_invalidates_cache(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """ロール変更のコミットでキャッシュが破棄されることを確認"""
+        headers = create_auth_headers(test_user_requester.id)
+        await client.get("/api/auth/me", headers=headers)
+
+        test_user_requester.role = UserRole.AGENT
+        await db_session.commit()
+
+        assert user_cache.get(test_user_requester.id) is None
+        response = await client.get("/api/auth/me", headers=headers)
+        assert response.json()["role"] == "agent"
+
+    def test_entries_expire_after_ttl(self):
+        """最大の古さ（TTL）を過ぎたエントリが返されないことを確認"""
+        cache = UserCache(max_size=10, ttl_seconds=30)
+        user = User(id=1, email="a@example.com", hashed_password="x", display_name="A")
+        cache.put(user)
+
+        with patch("app.services.user_cache.time.monotonic", return_value=10**9):
+            assert cache.get(1) is None
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """上限を超えると最も古く使われたエントリが破棄されることを確認"""
+        cache = UserCache(max_size=1, ttl_seconds=30)
+        for user_id in (1, 2):
+            cache.put(User(id=user_id, email=f"{user_id}@example.com", hashed_password="x", display_name="U"))
+
+        assert cache.get(1) is None
+        assert cache.get(2)["email"] == "2@example.com"
+        assert cache.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(
+        self,
+        client: AsyncClient,
+        test_user_manager: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """メトリクスAPIでキャッシュ統計を取得でき、権限が制限されることを確認"""
+        response = await client.get(
+            "/api/system/metrics", headers=create_auth_headers(test_user_manager.id)
+        )
+        assert response.status_code == 200
+        assert {"hits", "misses", "hit_ratio"} <= response.json()["user_cache"].keys()
+
+        response = await client.get(
+            "/api/system/metrics", headers=create_auth_headers(test_user_requester.id)
+        )
+        assert response.status_code == 403
+
+
+@pytest.mark.auth
+class TestTokenRevocation:
+    """トークン失効のテスト"""
+
+    async def _login(self, client: AsyncClient, user: User) -> dict:
+        response = await client.post(
+            "/api/auth/login",
+            json={"email": user.email, "password": "password123"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    @pytest.mark.asyncio
+    async def test_logout_revokes_session(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """ログアウト後はアクセストークンもリフレッシュトークンも使えないことを確認"""
+        tokens = await self._login(client, test_user_requester)
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert (await client.get("/api/auth/me", headers=headers)).status_code == 200
+
+        response = await client.post("/api/auth/logout", headers=headers)
+        assert response.status_code == 200
+
+        assert (await client.get("/api/auth/me", headers=headers)).status_code == 401
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_logout_keeps_other_sessions(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """別のログインセッションのトークンは失効しないことを確認"""
+        first = await self._login(client, test_user_requester)
+        second = await self._login(client, test_user_requester)
+
+        await client.post(
+            "/api/auth/logout",
+            headers={"Authorization": f"Bearer {first['access_token']}"},
+        )
+
+        response = await client.get(
+            "/api/auth/me",
+            headers={"Authorization": f"Bearer {second['access_token']}"},
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_refresh_rotation_and_reuse_detection(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """使用済みリフレッシュトークンの再利用でセッション全体が失効することを確認"""
+        tokens = await self._login(client, test_user_requester)
+
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 200
+        rotated = response.json()
+
+        # 使用済みトークンの再利用（盗用の疑い）
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 401
+
+        # 同じファミリーの新しいトークンも失効している
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]}
+        )
+        assert response.status_code == 401
+        response = await client.get(
+            "/api/auth/me",
+            headers={"Authorization": f"Bearer {rotated['access_token']}"},
+        )
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_access_token_rejected_as_refresh_token(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """アクセストークンではリフレッシュできないことを確認"""
+        tokens = await self._login(client, test_user_requester)
+
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": tokens["access_token"]}
+        )
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_revocations_reloaded_on_startup(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_requester: User,
+    ):
+        """起動時の読み込みで失効が復元され、期限切れ行は削除されることを確認"""
+        tokens = await self._login(client, test_user_requester)
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        await client.post("/api/auth/logout", headers=headers)
+
+        expired = RevokedToken(
+            kind=RevocationKind.TOKEN,
+            value="expired-jti",
+            expires_at=datetime.now(timezone.utc) - timedelta(minutes=1),
+        )
+        db_session.add(expired)
+        await db_session.commit()
+
+        # 再起動相当: プロセス内の状態を破棄して読み込み直す
+        revocation_list.clear()
+        token_cache.clear()
+        loaded = await load_revocations(db_session)
+
+        assert loaded == 2
+        rows = (await db_session.execute(select(RevokedToken.value))).scalars().all()
+        assert "expired-jti" not in rows
+        assert (await client.get("/api/auth/me", headers=headers)).status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_sync_picks_up_new_revocations(self, db_session: AsyncSession):
+        """他ワーカーで追加された失効が差分同期で反映されることを確認"""
+        await load_revocations(db_session)
+        db_session.add(RevokedToken(
+            kind=RevocationKind.FAMILY,
+            value="other-worker-family",
+            expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        ))
+        await db_session.commit()
+
+        assert await sync_revocations(db_session) == 1
+        assert revocation_list.is_revoked({"fam": "other-worker-family"})
+        assert await sync_revocations(db_session) == 0
+
+    @pytest.mark.asyncio
+    async def test_sync_picks_up_rows_committed_out_of_id_order(self, db_session: AsyncSession):
+        """ID の小さい行が後からコミットされても差分同期で反映されることを確認"""
+        await load_revocations(db_session)
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+        db_session.add(RevokedToken(id=20, kind=RevocationKind.TOKEN, value="later-id", expires_at=expires_at))
+        await db_session.commit()
+        assert await sync_revocations(db_session) == 1
+
+        # 先に採番されたが遅れてコミットされた行（updated_at は取り込み位置より前）
+        db_session.add(RevokedToken(
+            id=10,
+            kind=RevocationKind.TOKEN,
+            value="earlier-id",
+            expires_at=expires_at,
+            updated_at=datetime.now(timezone.utc) - timedelta(seconds=5),
+        ))
+        await db_session.commit()
+
+        assert await sync_revocations(db_session) == 1
+        assert revocation_list.is_revoked({"jti": "earlier-id"})
+        assert await sync_revocations(db_session) == 0
+
+    @pytest.mark.asyncio
+    async def test_sync_picks_up_extended_expiry(self, db_session: AsyncSession):
+        """他ワーカーでの再失効による有効期限の延長が差分同期で反映されることを確認"""
+        now = datetime.now(timezone.utc)
+        db_session.add(RevokedToken(
+            kind=RevocationKind.FAMILY, value="extended-family", expires_at=now + timedelta(minutes=1)
+        ))
+        await db_session.commit()
+        await load_revocations(db_session)
+
+        await revoke_family(db_session, "extended-family", None, "reuse")
+        await db_session.commit()
+        # 更新したのは別のワーカー（このプロセスの失効リストは読み込み時点のまま）
+        revocation_list.clear()
+        revocation_list.revoke_family("extended-family", (now + timedelta(minutes=1)).timestamp())
+
+        assert await sync_revocations(db_session) == 1
+        assert revocation_list._families["extended-family"] > (now + timedelta(days=1)).timestamp()
+        assert await sync_revocations(db_session) == 0
+
+    def test_revocation_list_prunes_expired(self):
+        """有効期限を過ぎたエントリが削除されることを確認"""
+        revocations = RevocationList()
+        now = time.time()
+        revocations.revoke_token("short", now + 10)
+        revocations.revoke_token("long", now + 1000)
+        revocations.revoke_family("fam", now + 10)
+
+        assert revocations.prune(now + 100) == 2
+        assert len(revocations) == 1
+        assert revocations.is_revoked({"jti": "long"})
+        assert not revocations.is_revoked({"jti": "short", "fam": "fam"})
+
+
+@pytest.mark.auth
+class TestLoginThrottle:
+    """ログイン試行回数制限のテスト"""
+
+    async def _login(self, client: AsyncClient, email: str, password: str = "wrong-password"):
+        return await client.post(
+            "/api/auth/login",
+            json={"email": email, "password": password},
+        )
+
+    @pytest.mark.asyncio
+    async def test_email_limit_returns_429_before_verification(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """メールアドレスごとの上限を超えるとパスワード照合前に429が返ることを確認"""
+        for _ in range(login_throttle.email_limit):
+            response = await self._login(client, test_user_requester.email)
+            assert response.status_code == 401
+
+        with patch("app.api.routes.auth.verify_password_async") as verify:
+            response = await self._login(client, test_user_requester.email, "password123")
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        verify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_successful_login_resets_email_counter(
+        self,
+        client: AsyncClient,
+        test_user_requester: User,
+    ):
+        """ログイン成功でメールアドレスの試行回数がリセットされることを確認"""
+        for _ in range(login_throttle.email_limit - 1):
+            await self._login(client, test_user_requester.email)
+        response = await self._login(client, test_user_requester.email, "password123")
+        assert response.status_code == 200
+
+        for _ in range(login_throttle.email_limit):
+            response = await self._login(client, test_user_requester.email)
+            assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_ip_limit_across_emails(self, client: AsyncClient):
+        """同一IPからは宛先メールアドレスが異なっても上限が適用されることを確認"""
+        with patch.object(login_throttle, "ip_limit", 3):
+            statuses = [
+                (await self._login(client, f"user{i}@example.com")).status_code
+                for i in range(4)
+            ]
+
+        assert statuses == [401, 401, 401, 429]
+
+    @pytest.mark.asyncio
+    async def test_spoofed_forwarded_for_does_not_reset_ip_limit(self, client: AsyncClient):
+        """信頼するプロキシ以外からの X-Forwarded-For では上限を回避できないことを確認"""
+        async def login(i: int):
+            return await client.post(
+                "/api/auth/login",
+                json={"email": f"user{i}@example.com", "password": "wrong-password"},
+                headers={"X-Forwarded-For": f"203.0.113.{i}", "X-Real-IP": f"198.51.100.{i}"},
+            )
+
+        with patch.object(login_throttle, "ip_limit", 3):
+            spoofed = [(await login(i)).status_code for i in range(4)]
+        assert spoofed == [401, 401, 401, 429]
+
+        # 信頼するプロキシ経由なら転送元のIPごとに数える
+        login_throttle.clear()
+        with patch.object(login_throttle, "ip_limit", 3), \
+                patch("app.core.rate_limit.settings.TRUSTED_PROXIES", ["127.0.0.0/8"]):
+            proxied = [(await login(i)).status_code for i in range(4)]
+        assert proxied == [401, 401, 401, 401]
+
+    def test_sliding_window_decay(self):
+        """前のウィンドウの試行が経過時間に応じて減衰することを確認"""
+        store = MemoryCounterStore()
+        window = 60.0
+
+        for _ in range(4):
+            assert store.hit("k", 4, window, 0.0) == 0.0
+        wait = store.hit("k", 4, window, 30.0)
+        assert 30.0 < wait <= 45.0
+
+        # 次のウィンドウの半分経過: 4 * 0.5 = 2 回分として数える
+        assert store.hit("k", 4, window, 90.0) == 0.0
+        assert store.hit("k", 4, window, 90.0) == 0.0
+        assert store.hit("k", 4, window, 90.0) > 0
+
+        # 2ウィンドウ以上経過したキーは失効する
+        store.hit("other", 4, window, 300.0)
+        assert len(store) == 1
+
+    def test_sqlite_store_is_shared(self, tmp_path):
+        """SQLiteストアの試行回数がワーカー間で共有されることを確認"""
+        path = tmp_path / "login_rate.db"
+        worker_a = SQLiteCounterStore(path)
+        worker_b = SQLiteCounterStore(path)
+
+        assert worker_a.hit("ip:10.0.0.1", 2, 60.0, 0.0) == 0.0
+        assert worker_b.hit("ip:10.0.0.1", 2, 60.0, 1.0) == 0.0
+        assert worker_a.hit("ip:10.0.0.1", 2, 60.0, 2.0) > 0
+
+        worker_b.reset("ip:10.0.0.1")
+        assert worker_a.hit("ip:10.0.0.1", 2, 60.0, 3.0) == 0.0
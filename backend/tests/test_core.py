@@ -4,8 +4,15 @@ Test Core Security Module
 セキュリティ機能のテスト:
 - パスワードハッシュ
 - JWTトークン生成/検証
+- 検証済みトークンキャッシュ
+- パスワードハッシュ用スレッドプール
 """
 
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
 import pytest
 from datetime import datetime, timedelta, timezone
 
@@ -15,7 +22,12 @@ from app.core.security import (
     create_access_token,
     create_refresh_token,
     verify_token,
+    token_cache,
+    VerifiedTokenCache,
+    get_password_hash_async,
+    verify_password_async,
 )
+from app.core.hashing import PasswordHasher, PasswordHasherBusyError
 
 
 @pytest.mark.security
@@ -143,3 +155,136 @@ class TestJWTTokens:
 
         assert payload1["sub"] == "123"
         assert payload2["sub"] == "456"
+
+
+@pytest.mark.security
+class TestVerifiedTokenCache:
+    """検証済みトークンキャッシュのテスト"""
+
+    def test_cache_hit_skips_decode(self):
+        """2回目以降の検証で署名検証が省略されることを確認"""
+        token = create_access_token(subject="123")
+        first = verify_token(token)
+
+        with patch("app.core.security.jwt.decode") as decode:
+            second = verify_token(token)
+
+        decode.assert_not_called()
+        assert second == first
+
+    def test_invalid_token_not_cached(self):
+        """検証に失敗したトークンはキャッシュされないことを確認"""
+        verify_token("invalid.token.here")
+
+        assert len(token_cache) == 0
+
+    def test_expired_entry_not_served(self):
+        """exp を過ぎたキャッシュエントリが返されないことを確認"""
+        cache = VerifiedTokenCache(max_size=10)
+        cache.put("token", {"sub": "123", "exp": time.time() - 1})
+
+        assert cache.get("token") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """上限を超えると最も古く使われたエントリが破棄されることを確認"""
+        cache = VerifiedTokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.put("a", {"sub": "1", "exp": exp})
+        cache.put("b", {"sub": "2", "exp": exp})
+        cache.get("a")
+        cache.put("c", {"sub": "3", "exp": exp})
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_returned_payload_is_copy(self):
+        """キャッシュから返されたペイロードを変更しても影響しないことを確認"""
+        token = create_access_token(subject="123")
+        verify_token(token)["sub"] = "999"
+
+        assert verify_token(token)["sub"] == "123"
+
+
+@pytest.mark.security
+class TestPasswordHasher:
+    """パスワードハッシュ用スレッドプールのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_async_hash_and_verify(self):
+        """スレッドプール経由でハッシュ化・照合できることを確認"""
+        hashed = await get_password_hash_async("mypassword123")
+
+        assert await verify_password_async("mypassword123", hashed) is True
+        assert await verify_password_async("wrong", hashed) is False
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self):
+        """同時実行数が max_workers を超えないことを確認"""
+        hasher = PasswordHasher(max_workers=2, max_pending=0)
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def work() -> None:
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*(hasher.run(work) for _ in range(6)))
+        hasher.shutdown()
+
+        stats = hasher.stats()
+        assert peak == 2
+        assert stats["completed"] == 6
+        assert stats["peak_pending"] == 6
+        assert stats["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects(self):
+        """待機数が上限に達すると PasswordHasherBusyError になることを確認"""
+        hasher = PasswordHasher(max_workers=1, max_pending=1)
+        release = threading.Event()
+
+        first = asyncio.ensure_future(hasher.run(release.wait))
+        await asyncio.sleep(0)
+
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.run(lambda: None)
+
+        release.set()
+        await first
+        hasher.shutdown()
+        assert hasher.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_counts_until_thread_finishes(self):
+        """呼び出し側がキャンセルされても、スレッドの処理が終わるまで待機数に数えることを確認"""
+        hasher = PasswordHasher(max_workers=1, max_pending=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def work() -> None:
+            started.set()
+            release.wait()
+
+        call = asyncio.ensure_future(hasher.run(work))
+        await asyncio.to_thread(started.wait)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+        assert hasher.pending == 1
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.run(lambda: None)
+
+        release.set()
+        hasher.shutdown()
+        assert hasher.pending == 0
+        assert await hasher.run(lambda: 42) == 42
+        hasher.shutdown()
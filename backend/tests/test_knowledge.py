@@ -6,15 +6,53 @@ Test Knowledge Module
 - 検索とフィルタリング
 - 可視性制御
 - フィードバック機能
+- 閲覧数・評価数のバッファリング、1ユーザー1票の評価
+- 本文を含まない一覧表示、関連記事の事前計算
+- タイトル・タグの入力補完
+- 全文検索インデックス（BM25）
+- 日本語テキスト解析（正規化・bi-gram・同義語）
 """
 
+import fcntl
+import json
+import pickle
+from collections import Counter
+from unittest.mock import patch
+
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
+from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility, KnowledgeVote
 from app.models.user import User, UserRole
+from app.services.knowledge_counters import (
+    feedback_counts,
+    flush_knowledge_counters,
+    record_vote,
+    view_counts,
+)
+from app.services.knowledge_related import (
+    RelatedSource,
+    compute_related,
+    rebuild_related_articles,
+)
+from app.services.index_lock import lock_path, release_saver_locks
+from app.services.knowledge_search import (
+    ArticleMeta,
+    knowledge_index,
+    load_knowledge_index,
+    refresh_knowledge_index,
+    save_knowledge_index,
+    search_knowledge,
+    sync_knowledge_index,
+)
+from app.services.knowledge_suggest import (
+    PrefixSuggester,
+    load_knowledge_suggestions,
+)
+from app.services.text_analysis import TextAnalyzer, default_analyzer
+from app.services.text_index import InvertedIndex
 
 
 @pytest.mark.knowledge
@@ -521,7 +559,8 @@ class TestKnowledgeFeedback:
 
         assert data["helpful"] is True
 
-        # DBを再読み込みして確認
+        # バッファを反映し、DBを再読み込みして確認
+        await flush_knowledge_counters(db_session)
         await db_session.refresh(article)
         assert article.helpful_count == initial_helpful + 1
 
@@ -558,7 +597,8 @@ class TestKnowledgeFeedback:
 
         assert response.status_code == 200
 
-        # DBを再読み込みして確認
+        # バッファを反映し、DBを再読み込みして確認
+        await flush_knowledge_counters(db_session)
         await db_session.refresh(article)
         assert article.not_helpful_count == initial_not_helpful + 1
 
@@ -577,3 +617,593 @@ class TestKnowledgeFeedback:
         )
 
         assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_one_vote_per_user(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """同じユーザーの同じ評価は1票として数えられることを確認"""
+        article = _article(test_user_agent, "テスト記事")
+        db_session.add(article)
+        await db_session.commit()
+
+        headers = create_auth_headers(test_user_requester.id)
+        url = f"/api/knowledge/{article.id}/feedback?helpful=true"
+        first = await client.post(url, headers=headers)
+        second = await client.post(url, headers=headers)
+        assert first.json()["changed"] is True
+        assert second.json()["changed"] is False
+
+        await flush_knowledge_counters(db_session)
+        await db_session.refresh(article)
+        assert (article.helpful_count, article.not_helpful_count) == (1, 0)
+        votes = (await db_session.execute(select(KnowledgeVote))).scalars().all()
+        assert len(votes) == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_vote_moves_count(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """評価を変更すると集計が移動し、未反映分も記事の取得結果に含まれることを確認"""
+        article = _article(test_user_agent, "テスト記事")
+        db_session.add(article)
+        await db_session.commit()
+        await record_vote(db_session, article.id, test_user_agent.id, True)
+
+        headers = create_auth_headers(test_user_requester.id)
+        await client.post(f"/api/knowledge/{article.id}/feedback?helpful=true", headers=headers)
+        await flush_knowledge_counters(db_session)
+        await db_session.refresh(article)
+        assert article.helpful_count == 2
+
+        await client.post(f"/api/knowledge/{article.id}/feedback?helpful=false", headers=headers)
+
+        # 変更分（helpful -1, not_helpful +1）は未反映
+        assert feedback_counts.pending(article.id) == {"helpful_count": -1, "not_helpful_count": 1}
+        response = await client.get(f"/api/knowledge/{article.id}", headers=headers)
+        assert response.json()["helpful_count"] == 1
+        assert response.json()["not_helpful_count"] == 1
+
+        await flush_knowledge_counters(db_session)
+        await db_session.refresh(article)
+        assert (article.helpful_count, article.not_helpful_count) == (1, 1)
+
+
+def _article(author: User, title: str, content: str = "本文です。", **kwargs) -> KnowledgeArticle:
+    values = {
+        "category": "FAQ",
+        "article_type": "faq",
+        "visibility": KnowledgeVisibility.PUBLIC,
+        "is_published": True,
+    }
+    values.update(kwargs)
+    return KnowledgeArticle(title=title, content=content, author_id=author.id, **values)
+
+
+@pytest.mark.knowledge
+class TestKnowledgeViewCounts:
+    """閲覧数バッファのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_get_is_read_only_until_flush(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """記事取得では DB を更新せず、フラッシュ時にまとめて加算されることを確認"""
+        article = _article(test_user_agent, "VPN 接続手順")
+        db_session.add(article)
+        await db_session.commit()
+        await db_session.refresh(article)
+        updated_at = article.updated_at
+
+        headers = create_auth_headers(test_user_requester.id)
+        for expected in (1, 2, 3):
+            response = await client.get(f"/api/knowledge/{article.id}", headers=headers)
+            assert response.json()["view_count"] == expected
+
+        await db_session.refresh(article)
+        assert article.view_count == 0
+
+        assert await flush_knowledge_counters(db_session) == 1
+        await db_session.refresh(article)
+        assert article.view_count == 3
+        assert article.updated_at == updated_at
+        assert view_counts.pending(article.id)["view_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_coalesces_per_article(
+        self, db_session: AsyncSession, test_user_agent: User
+    ):
+        """記事ごとに1行の加算にまとめられ、既存の値に加算されることを確認"""
+        first = _article(test_user_agent, "VPN 接続手順", view_count=10)
+        second = _article(test_user_agent, "プリンター 設定")
+        db_session.add_all([first, second])
+        await db_session.commit()
+
+        for _ in range(5):
+            view_counts.add(first.id, "view_count")
+        view_counts.add(second.id, "view_count", 2)
+
+        assert await flush_knowledge_counters(db_session) == 2
+        result = await db_session.execute(
+            select(KnowledgeArticle.id, KnowledgeArticle.view_count).order_by(KnowledgeArticle.id)
+        )
+        assert dict(result.all()) == {first.id: 15, second.id: 2}
+        assert await flush_knowledge_counters(db_session) == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_counts(
+        self, db_session: AsyncSession, test_user_agent: User
+    ):
+        """反映に失敗した加算はバッファに戻り、次回に反映されることを確認"""
+        article = _article(test_user_agent, "VPN 接続手順")
+        db_session.add(article)
+        await db_session.commit()
+
+        view_counts.add(article.id, "view_count", 3)
+        with patch.object(db_session, "execute", side_effect=RuntimeError("db down")):
+            with pytest.raises(RuntimeError):
+                await flush_knowledge_counters(db_session)
+
+        view_counts.add(article.id, "view_count")
+        assert view_counts.pending(article.id)["view_count"] == 4
+        assert view_counts.stats()["failures"] == 1
+
+        await flush_knowledge_counters(db_session)
+        await db_session.refresh(article)
+        assert article.view_count == 4
+
+
+@pytest.mark.knowledge
+class TestKnowledgeSummaryView:
+    """本文を含まない一覧表示のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_summary_view_omits_content(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        create_auth_headers,
+    ):
+        """view=summary で一覧・検索結果から本文が除かれることを確認"""
+        db_session.add(_article(test_user_agent, "VPN 接続手順", content="長い本文" * 1000, summary="概要"))
+        await db_session.commit()
+
+        headers = create_auth_headers(test_user_agent.id)
+        full = await client.get("/api/knowledge", headers=headers)
+        summary = await client.get("/api/knowledge", params={"view": "summary"}, headers=headers)
+        search = await client.get(
+            "/api/knowledge",
+            params={"view": "summary", "mode": "search", "search": "VPN"},
+            headers=headers,
+        )
+
+        assert "content" in full.json()["items"][0]
+        item = summary.json()["items"][0]
+        assert "content" not in item
+        assert item["title"] == "VPN 接続手順"
+        assert item["summary"] == "概要"
+        hit = search.json()["items"][0]
+        assert "content" not in hit
+        assert hit["score"] > 0
+
+
+@pytest.mark.knowledge
+class TestKnowledgeSuggest:
+    """タイトル・タグの入力補完のテスト"""
+
+    def _meta(self, visibility: str = "public", is_published: bool = True) -> ArticleMeta:
+        return ArticleMeta(visibility=visibility, is_published=is_published, category="FAQ", article_type="faq")
+
+    def test_prefix_matches_titles_words_and_tags(self):
+        """タイトルの先頭・語の先頭・タグに表記ゆれを吸収して前方一致することを確認"""
+        suggester = PrefixSuggester()
+        suggester.add(1, "パスワードをリセットする手順", "アカウント,PW", self._meta())
+        suggester.add(2, "Outlook Reset Guide", None, self._meta())
+        suggester.add(3, "プリンタの設定", None, self._meta())
+
+        assert [s.article_id for s in suggester.suggest("ぱすわ")] == [1]
+        assert [s.article_id for s in suggester.suggest("ＲＥＳ")] == [2]
+        tag_hit = suggester.suggest("ｐｗ")
+        assert [(s.article_id, s.tag) for s in tag_hit] == [(1, "PW")]
+        assert suggester.suggest("セキュリティ") == []
+
+        suggester.add(3, "パスワード期限の設定", None, self._meta())
+        assert {s.article_id for s in suggester.suggest("パスワード")} == {1, 3}
+        suggester.remove(1)
+        assert [s.article_id for s in suggester.suggest("パスワード")] == [3]
+
+    def test_ranking_and_visibility(self):
+        """閲覧数・役立ち度の順に並び、閲覧できない記事は含まれないことを確認"""
+        suggester = PrefixSuggester()
+        suggester.add(1, "VPN 接続手順", None, self._meta(), counts=(10, 0, 0))
+        suggester.add(2, "VPN 切断時の対処", None, self._meta(), counts=(100, 9, 1))
+        suggester.add(3, "VPN サーバー構成", None, self._meta("it_only"), counts=(500, 0, 0))
+        suggester.add(4, "VPN 下書き", None, self._meta(is_published=False), counts=(900, 0, 0))
+
+        assert [s.article_id for s in suggester.suggest("vpn")] == [3, 2, 1]
+        public = suggester.suggest("vpn", visibilities=[KnowledgeVisibility.PUBLIC])
+        assert [s.article_id for s in public] == [2, 1]
+
+        # 反映された閲覧数で並びが変わる（多数一致時の人気順の走査でも同じ）
+        suggester.apply_counts({1: Counter(view_count=1000)})
+        public = suggester.suggest("vpn", visibilities=[KnowledgeVisibility.PUBLIC])
+        assert [s.article_id for s in public] == [1, 2]
+        with patch("app.services.knowledge_suggest.MAX_RANGE_SCAN", 0):
+            public = suggester.suggest("v", visibilities=[KnowledgeVisibility.PUBLIC])
+            assert [s.article_id for s in public] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_suggest_endpoint_follows_article_changes(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """記事の作成・更新・閲覧数の反映が DB を読み直さずに候補へ反映されることを確認"""
+        first = _article(test_user_agent, "VPN 接続手順", tags="リモート")
+        second = _article(test_user_agent, "VPN 切断時の対処")
+        hidden = _article(test_user_agent, "VPN サーバー構成", visibility=KnowledgeVisibility.IT_ONLY)
+        db_session.add_all([first, second, hidden])
+        await db_session.commit()
+        assert await load_knowledge_suggestions(db_session) == 3
+
+        headers = create_auth_headers(test_user_requester.id)
+        response = await client.get("/api/knowledge/suggest", params={"prefix": "vpn"}, headers=headers)
+        assert response.status_code == 200
+        assert {item["id"] for item in response.json()["items"]} == {first.id, second.id}
+
+        for _ in range(3):
+            view_counts.add(second.id, "view_count")
+        await flush_knowledge_counters(db_session)
+        first.title = "リモート接続の手順"
+        await db_session.commit()
+
+        response = await client.get("/api/knowledge/suggest", params={"prefix": "vpn"}, headers=headers)
+        assert [item["id"] for item in response.json()["items"]] == [second.id]
+        response = await client.get("/api/knowledge/suggest", params={"prefix": "りもーと"}, headers=headers)
+        assert [(item["id"], item["tag"]) for item in response.json()["items"]] == [(first.id, None)]
+
+
+@pytest.mark.knowledge
+class TestRelatedArticles:
+    """関連記事の事前計算のテスト"""
+
+    def test_compute_related_uses_tags_and_terms(self):
+        """タグ・語の重なりが大きい記事ほど上位になり、無関係な記事は含まれないことを確認"""
+        sources = [
+            RelatedSource(1, "VPN 接続手順 社外から接続する", "vpn,remote"),
+            RelatedSource(2, "VPN 接続エラー 社外から接続できない", "vpn,remote"),
+            RelatedSource(3, "リモートワーク申請", "remote"),
+            RelatedSource(4, "プリンター設定", "printer"),
+            RelatedSource(5, "会議室予約", "facility"),
+        ]
+        related = compute_related(sources, limit=5)
+
+        assert [article_id for article_id, _ in related[1]] == [2, 3]
+        assert 4 not in related
+
+    @pytest.mark.asyncio
+    async def test_related_endpoint_filters_by_viewer(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """事前計算した関連記事が閲覧者の権限で絞り込まれて返ることを確認"""
+        base = _article(test_user_agent, "VPN 接続手順", content="社外から VPN で接続する", tags="vpn")
+        public = _article(test_user_agent, "VPN 接続エラー", content="VPN で接続できない", tags="vpn")
+        internal = _article(
+            test_user_agent, "VPN 装置の保守", content="VPN 装置の接続設定", tags="vpn",
+            visibility=KnowledgeVisibility.IT_ONLY,
+        )
+        other = _article(test_user_agent, "会議室 予約", content="予約方法", tags="facility")
+        db_session.add_all([base, public, internal, other])
+        await db_session.commit()
+
+        articles, rows = await rebuild_related_articles(db_session)
+        await db_session.commit()
+        assert articles == 3
+        assert rows == 6
+
+        response = await client.get(
+            f"/api/knowledge/{base.id}/related", headers=create_auth_headers(test_user_requester.id)
+        )
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()["items"]] == [public.id]
+        assert "content" not in response.json()["items"][0]
+
+        response = await client.get(
+            f"/api/knowledge/{base.id}/related", headers=create_auth_headers(test_user_agent.id)
+        )
+        assert {item["id"] for item in response.json()["items"]} == {public.id, internal.id}
+
+
+@pytest.mark.knowledge
+class TestInvertedIndex:
+    """転置インデックス（BM25F）のテスト"""
+
+    FIELDS = {"title": 4.0, "tags": 3.0, "summary": 2.0, "content": 1.0}
+
+    def test_field_boosts(self):
+        """タイトル > タグ > 概要 > 本文 の順にスコアが高いことを確認"""
+        index = InvertedIndex(self.FIELDS)
+        for doc_id, field in enumerate(self.FIELDS):
+            fields = {name: "other words here" for name in self.FIELDS}
+            fields[field] = "printer other words"
+            index.add(doc_id, fields)
+
+        ranked = [doc_id for doc_id, _ in index.search("printer")]
+        assert ranked == [0, 1, 2, 3]
+
+    def test_incremental_update_and_remove(self):
+        """文書の置換・削除でポスティングが更新されることを確認"""
+        index = InvertedIndex(self.FIELDS)
+        index.add(1, {"title": "vpn setup"})
+        index.add(2, {"title": "mail setup"})
+
+        index.add(1, {"title": "printer setup"})
+        assert index.search("vpn") == []
+        assert [d for d, _ in index.search("printer")] == [1]
+
+        index.remove(2)
+        assert "mail" not in index.postings
+        assert len(index) == 1
+        assert index.total_lengths[0] == 2
+
+    def test_predicate_filters_hits(self):
+        """メタデータによる絞り込みが適用されることを確認"""
+        index = InvertedIndex(self.FIELDS)
+        index.add(1, {"title": "vpn"}, meta="public")
+        index.add(2, {"title": "vpn"}, meta="it_only")
+
+        hits = index.search("vpn", predicate=lambda meta: meta == "public")
+        assert [d for d, _ in hits] == [1]
+
+    def test_save_and_load(self, tmp_path):
+        """保存した索引を復元でき、設定が異なる場合は破棄されることを確認"""
+        path = tmp_path / "index.idx"
+        index = InvertedIndex(self.FIELDS)
+        index.add(1, {"title": "vpn setup"}, meta="public", version="v1")
+        index.save(path)
+
+        restored = InvertedIndex(self.FIELDS)
+        assert restored.load(path) is True
+        assert restored.search("vpn") == index.search("vpn")
+        assert restored.doc_versions[1] == "v1"
+
+        other = InvertedIndex({"title": 1.0})
+        assert other.load(path) is False
+
+    def test_saved_file_is_json(self, tmp_path):
+        """索引が JSON で保存され、メタデータは変換関数で復元されることを確認"""
+        path = tmp_path / "index.idx"
+        meta = ArticleMeta("public", True, "vpn", "how_to")
+        codec = {"encode_meta": ArticleMeta.to_json, "decode_meta": ArticleMeta.from_json}
+        index = InvertedIndex(self.FIELDS, **codec)
+        index.add(1, {"title": "vpn setup", "body": "connect"}, meta=meta)
+        index.save(path)
+
+        assert json.loads(path.read_text(encoding="utf-8"))["docs"][0][2] == meta.to_json()
+        restored = InvertedIndex(self.FIELDS, **codec)
+        assert restored.load(path) is True
+        assert restored.doc_meta[1] == meta
+        assert restored.doc_terms[1] and set(restored.doc_terms[1]) == set(index.doc_terms[1])
+        assert restored.total_lengths == index.total_lengths
+
+    def test_pickle_file_is_not_loaded(self, tmp_path):
+        """pickle 形式のファイルは読み込まれない（逆シリアル化でコードを実行しない）ことを確認"""
+        path = tmp_path / "index.idx"
+        path.write_bytes(pickle.dumps({"signature": InvertedIndex(self.FIELDS).signature}))
+        assert InvertedIndex(self.FIELDS).load(path) is False
+
+
+@pytest.mark.knowledge
+class TestTextAnalyzer:
+    """日本語テキスト解析のテスト"""
+
+    def test_width_and_kana_variants_match(self):
+        """半角カナ・全角英数・ひらがなが同じ語に正規化されることを確認"""
+        expected = default_analyzer("パスワード")
+        assert default_analyzer("ﾊﾟｽﾜｰﾄﾞ") == expected
+        assert default_analyzer("ぱすわーど") == expected
+        assert default_analyzer("ＶＰＮ") == default_analyzer("vpn") == ["vpn"]
+
+    def test_cjk_bigrams_and_ascii_words(self):
+        """かな漢字は bi-gram、英数字は単語として分割されることを確認"""
+        assert default_analyzer("VPN接続手順") == ["vpn", "接続", "続手", "手順"]
+        assert default_analyzer("Windows 11 の件") == ["windows", "11", "ノ件"]
+        assert default_analyzer("件") == ["件"]
+
+    def test_synonyms_map_to_canonical_form(self):
+        """同義語が代表語に置換され、単語の一部には一致しないことを確認"""
+        assert default_analyzer("PW") == default_analyzer("パスワード")
+        assert default_analyzer("プリンタ") == default_analyzer("プリンター")
+        assert default_analyzer("E-Mail") == default_analyzer("メール")
+        assert default_analyzer("gmail") == ["gmail"]
+
+    def test_analyzer_id_reflects_configuration(self):
+        """同義語表が変わると識別子が変わることを確認（保存済み索引の破棄用）"""
+        assert TextAnalyzer().analyzer_id == default_analyzer.analyzer_id
+        assert TextAnalyzer(synonyms=()).analyzer_id != default_analyzer.analyzer_id
+
+
+@pytest.mark.knowledge
+class TestKnowledgeSearch:
+    """ナレッジ検索のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_index_follows_commits(self, db_session: AsyncSession, test_user_agent: User):
+        """作成・更新・公開がコミット後に索引へ反映されることを確認"""
+        article = _article(test_user_agent, "VPN 接続手順", is_published=False)
+        db_session.add(article)
+        await db_session.commit()
+
+        assert search_knowledge("vpn") == []
+        assert [a for a, _ in search_knowledge("vpn", published_only=False)] == [article.id]
+
+        article.publish()
+        await db_session.commit()
+        assert [a for a, _ in search_knowledge("vpn")] == [article.id]
+
+        article.title = "プリンター 設定"
+        await db_session.commit()
+        assert search_knowledge("vpn") == []
+        assert [a for a, _ in search_knowledge("プリンター")] == [article.id]
+
+        await db_session.delete(article)
+        await db_session.commit()
+        assert search_knowledge("プリンター") == []
+
+    @pytest.mark.asyncio
+    async def test_search_matches_notation_variants(
+        self, db_session: AsyncSession, test_user_agent: User
+    ):
+        """表記ゆれ・同義語の違いがあっても記事が見つかることを確認"""
+        article = _article(test_user_agent, "パスワードを忘れた場合", content="プリンタの設定は不要です")
+        db_session.add(article)
+        await db_session.commit()
+
+        for query in ("ﾊﾟｽﾜｰﾄﾞ", "ぱすわーど", "PW", "プリンター"):
+            assert [a for a, _ in search_knowledge(query)] == [article.id], query
+
+    @pytest.mark.asyncio
+    async def test_rollback_not_indexed(self, db_session: AsyncSession, test_user_agent: User):
+        """ロールバックした変更は索引に反映されないことを確認"""
+        db_session.add(_article(test_user_agent, "VPN 接続手順"))
+        await db_session.flush()
+        await db_session.rollback()
+
+        assert len(knowledge_index) == 0
+
+    @pytest.mark.asyncio
+    async def test_counter_update_does_not_reindex(
+        self, db_session: AsyncSession, test_user_agent: User
+    ):
+        """閲覧数など索引対象外の列の更新では再索引しないことを確認"""
+        article = _article(test_user_agent, "VPN 接続手順")
+        db_session.add(article)
+        await db_session.commit()
+
+        with patch.object(knowledge_index, "add") as add, \
+                patch.object(knowledge_index, "update_meta") as update_meta:
+            article.view_count += 1
+            await db_session.commit()
+
+        add.assert_not_called()
+        update_meta.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_startup_load_syncs_with_database(
+        self, db_session: AsyncSession, test_user_agent: User, tmp_path
+    ):
+        """起動時の読み込みで変更のあった記事のみ再索引されることを確認"""
+        path = tmp_path / "knowledge.idx"
+        db_session.add_all([
+            _article(test_user_agent, "VPN 接続手順"),
+            _article(test_user_agent, "プリンター 設定"),
+        ])
+        await db_session.commit()
+
+        # 更新日時が確定していない記事は再索引される
+        assert await load_knowledge_index(db_session, path) == (2, 0)
+        save_knowledge_index(path)
+
+        # 再起動相当: 保存した索引を読み込めば再索引は不要
+        knowledge_index.clear()
+        assert await load_knowledge_index(db_session, path) == (0, 0)
+        assert len(search_knowledge("vpn")) == 1
+
+        # 索引にない記事・DB から消えた記事の差分
+        knowledge_index.remove(next(iter(knowledge_index.doc_ids())))
+        knowledge_index.add(999, {"title": "deleted"})
+        assert await sync_knowledge_index(db_session) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_only_lock_owner_saves_index(
+        self, db_session: AsyncSession, test_user_agent: User, tmp_path
+    ):
+        """保存担当でないプロセスは保存せず、保存済みの索引を読み込み直して差分同期することを確認"""
+        path = tmp_path / "knowledge.idx"
+        db_session.add(_article(test_user_agent, "VPN 接続手順"))
+        await db_session.commit()
+        await refresh_knowledge_index(db_session, path)
+        saved = path.read_bytes()
+        release_saver_locks()
+
+        # 別のワーカーが保存担当のロックを保持している
+        with open(lock_path(path), "a+b") as held:
+            fcntl.flock(held.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            knowledge_index.add(999, {"title": "stale"})
+            assert save_knowledge_index(path) is False
+
+            # 別のワーカーで作成された記事も差分同期で取り込まれる
+            db_session.add(_article(test_user_agent, "プリンター 設定"))
+            await db_session.commit()
+            knowledge_index.clear()
+            assert await refresh_knowledge_index(db_session, path) == (1, 0)
+            assert 999 not in knowledge_index
+            assert len(search_knowledge("プリンター")) == 1
+            assert path.read_bytes() == saved
+
+    @pytest.mark.asyncio
+    async def test_search_mode_endpoint(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_agent: User,
+        test_user_requester: User,
+        create_auth_headers,
+    ):
+        """search モードでスコア付きの結果が関連度順に返ることを確認"""
+        db_session.add_all([
+            _article(test_user_agent, "メール 設定", content="VPN 経由でメールを送る場合"),
+            _article(test_user_agent, "VPN 接続手順", tags="vpn,remote"),
+            _article(
+                test_user_agent, "VPN 社内限定", visibility=KnowledgeVisibility.IT_ONLY
+            ),
+        ])
+        await db_session.commit()
+
+        headers = create_auth_headers(test_user_requester.id)
+        response = await client.get(
+            "/api/knowledge", params={"mode": "search", "search": "VPN"}, headers=headers
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert [item["title"] for item in data["items"]] == ["VPN 接続手順", "メール 設定"]
+        assert data["items"][0]["score"] > data["items"][1]["score"]
+
+    @pytest.mark.asyncio
+    async def test_search_mode_requires_term(
+        self,
+        client: AsyncClient,
+        test_user_agent: User,
+        create_auth_headers,
+    ):
+        """search モードで検索語がない場合に400が返ることを確認"""
+        headers = create_auth_headers(test_user_agent.id)
+        response = await client.get("/api/knowledge?mode=search", headers=headers)
+
+        assert response.status_code == 400
@@ -0,0 +1,180 @@
+"""
+Test M365 Directory Mirror
+
+Graph の差分クエリによるディレクトリのローカルミラーのテスト:
+- 初回の全件同期と差分同期（変更されたプロパティのみ・削除）
+- delta_link 失効時の全件同期
+- ローカル索引からのユーザー検索
+"""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import httpx
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.m365.graph_client import GraphClient
+from app.models.m365_directory import DirectoryObjectKind, M365DeltaLink, M365DirectoryObject
+from app.services.m365_directory import directory_index, load_directory_index, sync_directory
+from tests.fake_graph import GRAPH_ENDPOINT, FakeGraph, fake_auth_config
+
+
+@pytest.fixture
+def fake_graph() -> FakeGraph:
+    graph = FakeGraph(page_size=2)
+    graph.add_user("u1", "Yamada Taro", "taro.yamada@example.com", department="IT")
+    graph.add_user("u2", "山田 花子", "hanako.yamada@example.com", department="総務")
+    graph.add_user("u3", "Sato Jiro", "jiro.sato@example.com", department="IT")
+    graph.add_user("u5", "Yamamoto Ken", "ken.yamamoto@example.com")
+    graph.add_group("g1", "Yamanashi Office")
+    return graph
+
+
+async def _sync(db: AsyncSession, graph: FakeGraph, **kwargs) -> dict[str, tuple[int, int]]:
+    # トークン取得も代替サーバーへ送るため共有クライアントとして使う
+    async with httpx.AsyncClient(transport=graph.transport()) as http_client:
+        with patch("app.m365.http._shared_client", http_client):
+            async with GraphClient(fake_auth_config()) as client:
+                return await sync_directory(db, client, **kwargs)
+
+
+def _names(entries) -> list[str]:
+    return [entry.display_name for entry in entries]
+
+
+@pytest.mark.m365
+class TestDirectorySync:
+    """差分同期のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_full_sync_mirrors_users_and_groups(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """初回は全件をページをたどって取り込み、delta_link を保存することを確認"""
+        results = await _sync(db_session, fake_graph)
+
+        assert results == {"users": (4, 0), "groups": (1, 0)}
+        # 4件 / 1ページ2件 = 2ページ
+        assert len(fake_graph.graph_requests("/users/delta")) == 2
+        assert "$select" in fake_graph.graph_requests("/users/delta")[0].url.params
+
+        links = (await db_session.execute(select(M365DeltaLink))).scalars().all()
+        assert {link.resource for link in links} == {"users", "groups"}
+        assert directory_index.ready
+        assert directory_index.stats()["users"] == 4
+        assert directory_index.stats()["groups"] == 1
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_merges_changes(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """2回目以降は変更だけを取得し、含まれないプロパティは保持することを確認"""
+        await _sync(db_session, fake_graph)
+        fake_graph.update_user("u1", department="人事")
+        fake_graph.delete_user("u3")
+        fake_graph.add_user("u4", "Suzuki Ichiro", "ichiro.suzuki@example.com")
+        requests_before = len(fake_graph.graph_requests("/users/delta"))
+
+        results = await _sync(db_session, fake_graph)
+
+        assert results["users"] == (2, 1)
+        delta_request = fake_graph.graph_requests("/users/delta")[requests_before]
+        assert "$deltatoken" in delta_request.url.params
+
+        u1 = await db_session.get(M365DirectoryObject, "u1")
+        await db_session.refresh(u1)
+        assert u1.display_name == "Yamada Taro"
+        assert u1.department == "人事"
+        u3 = await db_session.get(M365DirectoryObject, "u3")
+        await db_session.refresh(u3)
+        assert u3.is_deleted
+
+        assert _names(directory_index.search("sato")) == []
+        assert _names(directory_index.search("suzu")) == ["Suzuki Ichiro"]
+        assert directory_index.search("taro")[0].department == "人事"
+
+    @pytest.mark.asyncio
+    async def test_only_lease_owner_syncs_with_graph(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """同期のリースを保持するワーカーだけが Graph と同期し、期限切れ後は他のワーカーが引き継ぐことを確認"""
+        assert await _sync(db_session, fake_graph, worker_id="worker-a") == {"users": (4, 0), "groups": (1, 0)}
+        requests_before = len(fake_graph.requests)
+
+        # 他のワーカーは Graph を呼ばず、DB から索引へ取り込むだけ
+        fake_graph.add_user("u4", "Suzuki Ichiro", "ichiro.suzuki@example.com")
+        assert await _sync(db_session, fake_graph, worker_id="worker-b") == {"users": (0, 0), "groups": (0, 0)}
+        assert not [r for r in fake_graph.requests[requests_before:] if "/delta" in r.url.path]
+        assert directory_index.stats()["users"] == 4
+
+        # 担当のワーカーが停止してリースが切れたら引き継ぐ
+        await db_session.execute(update(M365DeltaLink).values(lease_expires_at=datetime.now(timezone.utc)))
+        await db_session.commit()
+        assert (await _sync(db_session, fake_graph, worker_id="worker-b"))["users"] == (1, 0)
+        assert _names(directory_index.search("suzu")) == ["Suzuki Ichiro"]
+        owners = (await db_session.execute(select(M365DeltaLink.lease_owner))).scalars().all()
+        assert set(owners) == {"worker-b"}
+
+    @pytest.mark.asyncio
+    async def test_expired_delta_link_triggers_full_sync(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """delta_link が失効（410）したら全件を取り直し、見つからないものを削除扱いにすることを確認"""
+        await _sync(db_session, fake_graph)
+        fake_graph.delete_user("u3")
+        fake_graph.expire_delta_tokens()
+
+        results = await _sync(db_session, fake_graph)
+
+        assert results["users"] == (3, 1)
+        assert _names(directory_index.search("sato")) == []
+        assert _names(directory_index.search("yama")) == ["Yamada Taro", "Yamamoto Ken"]
+
+    @pytest.mark.asyncio
+    async def test_index_is_rebuilt_from_database(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """起動時は DB から索引を作り直し、削除済みの行は含めないことを確認"""
+        await _sync(db_session, fake_graph)
+        fake_graph.delete_user("u2")
+        await _sync(db_session, fake_graph)
+
+        directory_index.clear()
+        assert await load_directory_index(db_session) == 4
+        assert directory_index.ready
+        assert _names(directory_index.search("yama")) == ["Yamada Taro", "Yamamoto Ken"]
+        assert _names(directory_index.search("山田")) == []
+
+
+@pytest.mark.m365
+class TestDirectorySearch:
+    """ローカル索引からの検索のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_prefix_search_over_names_and_addresses(self, db_session: AsyncSession, fake_graph: FakeGraph):
+        """表示名・表示名の単語の先頭・UPN で前方一致し、グループは含まれないことを確認"""
+        await _sync(db_session, fake_graph)
+
+        assert _names(directory_index.search("YAMA")) == ["Yamada Taro", "Yamamoto Ken"]
+        assert _names(directory_index.search("taro")) == ["Yamada Taro"]
+        assert _names(directory_index.search("hanako.y")) == ["山田 花子"]
+        assert _names(directory_index.search("山田")) == ["山田 花子"]
+        assert _names(directory_index.search("花子")) == ["山田 花子"]
+        assert _names(directory_index.search("yamanashi", kind=DirectoryObjectKind.GROUP)) == ["Yamanashi Office"]
+        assert _names(directory_index.search("ｙａｍａ", top=1)) == ["Yamada Taro"]
+        assert directory_index.search("") == []
+
+    @pytest.mark.asyncio
+    async def test_search_route_uses_mirror(
+        self, client, db_session: AsyncSession, fake_graph: FakeGraph, test_user_agent, create_auth_headers
+    ):
+        """同期済みならユーザー検索 API は Graph を呼ばずにミラーから返すことを確認"""
+        await _sync(db_session, fake_graph)
+        requests_before = len(fake_graph.requests)
+
+        response = await client.get(
+            "/api/m365/users/search",
+            params={"query": "yama", "top": 5},
+            headers=create_auth_headers(test_user_agent.id),
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 2
+        assert [u["userPrincipalName"] for u in data["users"]] == [
+            "taro.yamada@example.com",
+            "ken.yamamoto@example.com",
+        ]
+        assert len(fake_graph.requests) == requests_before
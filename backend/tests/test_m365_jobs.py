@@ -0,0 +1,422 @@
+"""
+Test M365 Job Queue
+
+M365 タスク実行のジョブキューのテスト:
+- 実行要求は 202 とジョブIDを返し、冪等キーで二重登録されない
+- ワーカーによる実行と実行ログの記録
+- 一時的なエラーのリトライ・恒久的なエラーの失敗
+- リース切れのジョブの再実行
+- 一括操作（JSON バッチ・対象ごとの実行ログ・チェックポイントからの再開）
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.m365.exceptions import M365APIError, M365AuthorizationError
+from app.m365.graph_client import BatchResponse
+from app.models.approval import Approval, ApprovalStatus
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365JobStatus,
+    M365Task,
+    M365TaskStatus,
+    M365TaskTarget,
+    M365TaskType,
+)
+from app.models.ticket import TicketStatus
+from app.models.user import User
+from app.services import m365_jobs
+from app.services.m365_jobs import M365JobWorker, claim_jobs, enqueue_execution, run_job
+from tests.helpers import create_test_ticket, queue_m365_execution
+
+
+@pytest_asyncio.fixture
+async def approved_task(
+    db_session: AsyncSession,
+    test_user_requester: User,
+    test_user_approver: User,
+) -> M365Task:
+    """承認済みのライセンス付与タスク"""
+    ticket = await create_test_ticket(db_session, requester=test_user_requester)
+    db_session.add(Approval(
+        ticket_id=ticket.id,
+        approver_id=test_user_approver.id,
+        status=ApprovalStatus.APPROVED,
+        request_reason="ライセンス付与の承認依頼",
+    ))
+    task = M365Task(
+        ticket_id=ticket.id,
+        task_type=M365TaskType.LICENSE_ASSIGN,
+        target_upn="taro@example.com",
+        target_resource_id="sku-1",
+        target_description="E3 ライセンスの付与",
+    )
+    db_session.add(task)
+    await db_session.commit()
+    await db_session.refresh(task)
+    return task
+
+
+async def _logs(db: AsyncSession, task: M365Task) -> list[M365ExecutionLog]:
+    result = await db.execute(select(M365ExecutionLog).where(M365ExecutionLog.task_id == task.id))
+    return list(result.scalars().all())
+
+
+@pytest.mark.m365
+class TestExecutionQueue:
+    """実行要求の登録のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_execute_returns_202_with_job(
+        self, client, db_session: AsyncSession, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers,
+    ):
+        """実行要求は Graph を呼ばずに 202 とジョブIDを返し、タスクを実施中にすることを確認"""
+        headers = create_auth_headers(test_user_m365_operator.id)
+
+        response = await queue_m365_execution(client, approved_task, headers, idempotency_key="req-1")
+
+        assert response.status_code == 202
+        data = response.json()
+        assert data["job_status"] == "queued"
+        assert data["task_status"] == "in_progress"
+        assert await _logs(db_session, approved_task) == []
+
+        # 同じ冪等キー、実行待ちのジョブがあるタスクへの再要求は同じジョブを返す
+        again = await queue_m365_execution(client, approved_task, headers, idempotency_key="req-1")
+        other_key = await queue_m365_execution(client, approved_task, headers, idempotency_key="req-2")
+        assert again.json()["job_id"] == data["job_id"]
+        assert other_key.json()["job_id"] == data["job_id"]
+        jobs = (await db_session.execute(select(M365Job))).scalars().all()
+        assert len(jobs) == 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("idempotency_key", [None, "req-1"])
+    async def test_concurrent_enqueue_creates_one_job(
+        self, test_session_factory, approved_task: M365Task, test_user_m365_operator, idempotency_key,
+    ):
+        """確認と登録の間に他のリクエストが登録しても、ジョブは1つだけになることを確認"""
+        existing_job = m365_jobs._existing_job
+        calls = 0
+
+        async def check_before_other_commit(db, task, key):
+            # 1回目の確認は、もう一方の登録がコミットされる前に行われたものとする
+            nonlocal calls
+            calls += 1
+            return None if calls == 2 else await existing_job(db, task, key)
+
+        async def enqueue():
+            async with test_session_factory() as db:
+                task = (await db.execute(
+                    select(M365Task).options(selectinload(M365Task.ticket)).where(M365Task.id == approved_task.id)
+                )).scalar_one()
+                job, created = await enqueue_execution(
+                    db, task, test_user_m365_operator.id, "ライセンス付与", None, idempotency_key
+                )
+                await db.commit()
+                return job.id, created
+
+        with patch("app.services.m365_jobs._existing_job", check_before_other_commit):
+            first = await enqueue()
+            second = await enqueue()
+
+        assert first[1] is True
+        assert second == (first[0], False)
+        async with test_session_factory() as db:
+            jobs = (await db.execute(select(M365Job).where(M365Job.task_id == approved_task.id))).scalars().all()
+        assert len(jobs) == 1
+
+    @pytest.mark.asyncio
+    async def test_execute_still_checks_sod(
+        self, client, approved_task: M365Task, test_user_approver, create_auth_headers,
+    ):
+        """承認者は実行を登録できないことを確認"""
+        response = await queue_m365_execution(client, approved_task, create_auth_headers(test_user_approver.id))
+
+        assert response.status_code == 403
+
+
+@pytest.mark.m365
+class TestJobWorker:
+    """ワーカーによるジョブ実行のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_worker_executes_and_logs(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """ワーカーが Graph 操作を実行し、完了時に実行ログとタスク・チケットの状態を記録することを確認"""
+        headers = create_auth_headers(test_user_m365_operator.id)
+        job_id = (await queue_m365_execution(client, approved_task, headers)).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=2, poll_seconds=1, session_factory=test_session_factory)
+        await worker.run_until_idle()
+
+        mock_graph_client.assign_license.assert_awaited_once_with("taro@example.com", "sku-1")
+        assert worker.stats()["succeeded"] == 1
+
+        response = await client.get(f"/api/m365/jobs/{job_id}", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["job_status"] == "succeeded"
+        assert data["result"] == "success"
+        assert data["attempts"] == 1
+
+        logs = await _logs(db_session, approved_task)
+        assert [log.id for log in logs] == [data["log_id"]]
+        assert logs[0].result == "success"
+        assert logs[0].operator_id == test_user_m365_operator.id
+        await db_session.refresh(approved_task, ["status", "ticket"])
+        await db_session.refresh(approved_task.ticket)
+        assert approved_task.status == M365TaskStatus.COMPLETED
+        assert approved_task.ticket.status == TicketStatus.RESOLVED
+
+    @pytest.mark.asyncio
+    async def test_password_reset_returns_password_once(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, test_user_manager, create_auth_headers, mock_m365_operations,
+        mock_graph_client,
+    ):
+        """パスワードリセットのパスワードは結果・実行ログ・payload に残さず、実行したオペレーターに1回だけ返すことを確認"""
+        approved_task.task_type = M365TaskType.PASSWORD_RESET
+        await db_session.commit()
+        operator = create_auth_headers(test_user_m365_operator.id)
+        other = create_auth_headers(test_user_manager.id)
+        job_id = (await queue_m365_execution(client, approved_task, operator, command_or_action="Given#Pass123")).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        await worker.run_until_idle()
+        mock_graph_client.reset_password.assert_awaited_once_with("taro@example.com", "Given#Pass123", True)
+
+        responses = [
+            (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).text
+            for headers in (other, operator, operator, other)
+        ]
+        assert [text.count("Given#Pass123") for text in responses] == [0, 1, 0, 0]
+        assert json.loads(responses[1])["secrets"] == {"temporary_password": "Given#Pass123"}
+        assert json.loads(responses[1])["job_status"] == "succeeded"
+
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        logs = await _logs(db_session, approved_task)
+        stored = [job.payload, job.result, job.secrets, *(log.command_or_action for log in logs),
+                  *(log.result_details for log in logs)]
+        assert all("Given#Pass123" not in (text or "") for text in stored)
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """429・5xx は再実行され、実行ログは完了時の1件だけになることを確認"""
+        mock_graph_client.assign_license.side_effect = [
+            M365APIError("Rate limit exceeded", status_code=429, details={"retry_after": "0"}),
+            {"success": True},
+        ]
+        job_id = (await queue_m365_execution(client, approved_task, create_auth_headers(test_user_m365_operator.id))).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        with patch("app.services.m365_jobs.settings.M365_JOB_RETRY_BACKOFF_SECONDS", 0):
+            await worker.run_until_idle()
+
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        assert job.status == M365JobStatus.SUCCEEDED
+        assert job.attempts == 2
+        assert worker.stats()["retried"] == 1
+        assert [log.result for log in await _logs(db_session, approved_task)] == ["success"]
+
+    @pytest.mark.asyncio
+    async def test_permanent_errors_fail_immediately(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """権限不足などは再実行せず、失敗の実行ログを記録してタスクを失敗にすることを確認"""
+        mock_graph_client.assign_license.side_effect = M365AuthorizationError("Insufficient permissions")
+        job_id = (await queue_m365_execution(client, approved_task, create_auth_headers(test_user_m365_operator.id))).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        await worker.run_until_idle()
+
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        assert job.status == M365JobStatus.FAILED
+        assert job.attempts == 1
+        assert job.error_message == "Authorization error: Insufficient permissions"
+        logs = await _logs(db_session, approved_task)
+        assert [log.result for log in logs] == ["failure"]
+        await db_session.refresh(approved_task, ["status"])
+        assert approved_task.status == M365TaskStatus.FAILED
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_taken_over(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """停止したワーカーのリースが切れたら他のワーカーが実行し、元のワーカーは何も書き込まないことを確認"""
+        job_id = (await queue_m365_execution(client, approved_task, create_auth_headers(test_user_m365_operator.id))).json()["job_id"]
+
+        async with test_session_factory() as db:
+            assert await claim_jobs(db, "dead-worker", 5) == [job_id]
+            # リース中は他のワーカーは取得できない
+            assert await claim_jobs(db, "other-worker", 5) == []
+            await db.execute(
+                update(M365Job)
+                .where(M365Job.id == job_id)
+                .values(lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+            await db.commit()
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        await worker.run_until_idle()
+        assert worker.stats()["succeeded"] == 1
+
+        # 元のワーカーが後から完了しようとしても記録されない
+        assert await run_job(test_session_factory, job_id, "dead-worker") is None
+        assert len(await _logs(db_session, approved_task)) == 1
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        assert job.attempts == 2
+
+
+async def _bulk_task(db: AsyncSession, approved_task: M365Task, task_type: M365TaskType, upns: list[str]) -> M365Task:
+    """承認済みのチケットに一括操作タスクを作る"""
+    task = M365Task(
+        ticket_id=approved_task.ticket_id,
+        task_type=task_type,
+        target_resource_id="sku-1" if task_type == M365TaskType.BULK_LICENSE_ASSIGN else "group-1",
+        target_description="4月入社者の一括設定",
+        targets=[M365TaskTarget(target_upn=upn) for upn in upns],
+    )
+    db.add(task)
+    await db.commit()
+    await db.refresh(task)
+    return task
+
+
+def _upns(count: int) -> list[str]:
+    return [f"new{i:03d}@example.com" for i in range(count)]
+
+
+@pytest.mark.m365
+class TestBulkTasks:
+    """一括操作タスクのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_create_bulk_task_registers_targets(
+        self, client, db_session: AsyncSession, approved_task: M365Task, test_user_agent, create_auth_headers,
+    ):
+        """一括操作タスクは重複を除いた対象を登録し、対象がなければ 400 になることを確認"""
+        headers = create_auth_headers(test_user_agent.id)
+        payload = {
+            "ticket_id": approved_task.ticket_id,
+            "task_type": "bulk_group_add",
+            "target_resource_id": "group-1",
+            "target_description": "4月入社者のグループ追加",
+        }
+
+        response = await client.post(
+            "/api/m365/tasks",
+            json={**payload, "target_upns": ["a@example.com", "B@example.com", "A@example.com", " "]},
+            headers=headers,
+        )
+        missing = await client.post("/api/m365/tasks", json=payload, headers=headers)
+
+        assert response.status_code == 201
+        assert response.json()["target_count"] == 2
+        targets = (await db_session.execute(
+            select(M365TaskTarget.target_upn).where(M365TaskTarget.task_id == response.json()["id"])
+        )).scalars().all()
+        assert targets == ["a@example.com", "B@example.com"]
+        assert missing.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_bulk_license_assign_batches_and_logs_per_target(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """20人ずつの JSON バッチで付与し、対象ごとの実行ログと一部の失敗を記録することを確認"""
+        task = await _bulk_task(db_session, approved_task, M365TaskType.BULK_LICENSE_ASSIGN, _upns(45))
+        mock_graph_client.assign_licenses.side_effect = lambda user_ids, sku_id: {
+            u: BatchResponse(u, 404, {"error": {"message": "User not found"}}) if u == "new007@example.com"
+            else BatchResponse(u, 200)
+            for u in user_ids
+        }
+        headers = create_auth_headers(test_user_m365_operator.id)
+        job_id = (await queue_m365_execution(client, task, headers)).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        await worker.run_until_idle()
+
+        assert [len(call.args[0]) for call in mock_graph_client.assign_licenses.await_args_list] == [20, 20, 5]
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "failed"
+        assert data["error_message"] == "1 of 45 targets failed"
+        assert data["progress"] == {"total": 45, "pending": 0, "succeeded": 44, "failed": 1}
+        assert data["execution_result"]["failed_targets"] == {
+            "new007@example.com": "Graph API error: 404 (User not found)"
+        }
+
+        logs = await _logs(db_session, task)
+        assert len(logs) == 45
+        assert [json.loads(log.command_or_action)["target_upn"] for log in logs if log.result == "failure"] == [
+            "new007@example.com"
+        ]
+
+        # 再実行では失敗した対象だけをやり直す
+        mock_graph_client.assign_licenses.side_effect = lambda user_ids, sku_id: {
+            u: BatchResponse(u, 200) for u in user_ids
+        }
+        job_id = (await queue_m365_execution(client, task, headers)).json()["job_id"]
+        await worker.run_until_idle()
+
+        assert mock_graph_client.assign_licenses.await_args_list[-1].args[0] == ["new007@example.com"]
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "succeeded"
+        assert data["progress"]["succeeded"] == 45
+        await db_session.refresh(task, ["status"])
+        assert task.status == M365TaskStatus.COMPLETED
+
+    @pytest.mark.asyncio
+    async def test_bulk_group_add_resumes_from_checkpoint(
+        self, client, db_session: AsyncSession, test_session_factory, approved_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """途中のバッチ全体が一時的に失敗したら、記録済みのバッチを飛ばして再開することを確認"""
+        task = await _bulk_task(db_session, approved_task, M365TaskType.BULK_GROUP_ADD, _upns(30))
+        calls: list[list[str]] = []
+
+        def add_group_members(group_id, user_ids):
+            calls.append(list(user_ids))
+            if len(calls) == 2:
+                raise M365APIError("Server error: 503", status_code=503)
+            # 再開時にすでに追加済みのメンバーは成功として扱う
+            return {
+                u: BatchResponse(u, 400, {"error": {"message": "One or more added object references already exist"}})
+                if u == "new020@example.com" else BatchResponse(u, 204)
+                for u in user_ids
+            }
+
+        mock_graph_client.add_group_members.side_effect = add_group_members
+        job_id = (await queue_m365_execution(client, task, create_auth_headers(test_user_m365_operator.id))).json()["job_id"]
+
+        worker = M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+        with patch("app.services.m365_bulk.settings.M365_BULK_CONCURRENCY", 1), \
+                patch("app.services.m365_jobs.settings.M365_JOB_RETRY_BACKOFF_SECONDS", 0):
+            await worker.run_until_idle()
+
+        assert [len(c) for c in calls] == [20, 10, 10]
+        assert calls[2] == calls[1]
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        assert job.status == M365JobStatus.SUCCEEDED
+        assert job.attempts == 2
+        assert len(await _logs(db_session, task)) == 30
@@ -7,13 +7,26 @@ Microsoft 365操作のテスト:
 - MFAリセット
 - グループ管理
 - エラーハンドリング
+- アクセストークンの共有キャッシュ
+- JSON バッチ・ページング
+- 読み取りキャッシュ・スロットリング・サーキットブレーカー
 """
 
+import asyncio
+import json
+
+import httpx
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from app.m365.auth import AccessTokenCache, M365AuthConfig
+from app.m365 import http as graph_http
+from app.m365.cache import graph_cache
+from app.m365.throttle import GraphThrottle, graph_throttle
+from app.m365.graph_client import BatchRequest, BatchResponse, GraphClient
 from app.m365.operations import M365Operations
-from app.m365.exceptions import M365ValidationError, M365APIError
+from app.m365.exceptions import M365APIError, M365AuthorizationError, M365ValidationError
+from tests.fake_graph import fake_auth_config
 
 
 @pytest.mark.m365
@@ -239,6 +252,27 @@ class TestMFAOperations:
         # パスワードメソッドは削除されない
         assert "#microsoft.graph.passwordAuthenticationMethod" not in result["deleted_methods"]
 
+    @pytest.mark.asyncio
+    async def test_reset_mfa_partial_failure(self, mock_m365_operations, mock_graph_client):
+        """一部の認証方法の削除に失敗しても残りは削除されることを確認"""
+        mock_graph_client.list_authentication_methods.return_value = [
+            {"id": "method-1", "@odata.type": "#microsoft.graph.phoneAuthenticationMethod"},
+            {"id": "method-2", "@odata.type": "#microsoft.graph.emailAuthenticationMethod"},
+        ]
+        mock_graph_client.delete_authentication_methods.side_effect = None
+        mock_graph_client.delete_authentication_methods.return_value = {
+            "method-1": BatchResponse("method-1", 204),
+            "method-2": BatchResponse("method-2", 400, {"error": {"code": "badRequest"}}),
+        }
+
+        ops = mock_m365_operations()
+        result = await ops.reset_mfa("test@example.com")
+
+        assert result["deleted_methods"] == ["#microsoft.graph.phoneAuthenticationMethod"]
+        mock_graph_client.delete_authentication_methods.assert_awaited_once_with(
+            "test@example.com", ["method-1", "method-2"]
+        )
+
     @pytest.mark.asyncio
     async def test_reset_mfa_no_methods(self, mock_m365_operations, mock_graph_client):
         """認証方法がない場合のMFAリセットを確認"""
@@ -286,6 +320,23 @@ class TestGroupOperations:
         with pytest.raises(M365ValidationError):
             await ops.add_user_to_group("group-1", "")
 
+    @pytest.mark.asyncio
+    async def test_add_users_to_group(self, mock_m365_operations, mock_graph_client):
+        """複数ユーザーのグループ追加がまとめて実行され、個別の失敗が返されることを確認"""
+        mock_graph_client.add_group_members.side_effect = None
+        mock_graph_client.add_group_members.return_value = {
+            "user-1": BatchResponse("user-1", 204),
+            "user-2": BatchResponse("user-2", 404, {"error": {"code": "Request_ResourceNotFound"}}),
+        }
+
+        ops = mock_m365_operations()
+        result = await ops.add_users_to_group("group-1", ["user-1", "user-2"])
+
+        assert result["status"] == "partial"
+        assert result["added_user_ids"] == ["user-1"]
+        assert list(result["failed"]) == ["user-2"]
+        mock_graph_client.add_group_members.assert_awaited_once_with("group-1", ["user-1", "user-2"])
+
     @pytest.mark.asyncio
     async def test_remove_user_from_group_success(self, mock_m365_operations, mock_graph_client):
         """グループからのユーザー削除が正しく動作することを確認"""
@@ -356,8 +407,10 @@ class TestUtilityOperations:
         assert result["upn"] == "test@example.com"
         assert result["display_name"] == "Test User"
         assert "current_licenses" in result
-        mock_graph_client.get_user.assert_called_once_with("test@example.com")
-        mock_graph_client.get_user_licenses.assert_called_once_with("test@example.com")
+        # ライセンスもユーザー情報と同じリクエストで取得する
+        mock_graph_client.get_user.assert_called_once()
+        assert "assignedLicenses" in mock_graph_client.get_user.call_args.kwargs["select"]
+        mock_graph_client.get_user_licenses.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_get_operation_summary_non_license(self, mock_m365_operations, mock_graph_client):
@@ -397,3 +450,508 @@ class TestContextManager:
                     mock_graph_client.__aenter__.assert_called_once()
 
                 mock_graph_client.__aexit__.assert_called_once()
+
+
+@pytest.mark.m365
+class TestAccessTokenCache:
+    """アクセストークンの共有キャッシュのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_fetch(self):
+        """同時に要求しても取得は1回だけで、全員が同じトークンを受け取ることを確認"""
+        cache = AccessTokenCache(refresh_ahead_seconds=300)
+        config = fake_auth_config()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "token-1", 3600
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(side_effect=fetch)) as fetch_mock:
+            tokens = await asyncio.gather(*(cache.get(config) for _ in range(20)))
+            assert await cache.get(config) == "token-1"
+
+        assert tokens == ["token-1"] * 20
+        assert fetch_mock.await_count == 1
+        assert cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_token_is_fetched_again(self):
+        """有効期限（余裕を引いた時刻）を過ぎたトークンは再取得することを確認"""
+        cache = AccessTokenCache(refresh_ahead_seconds=300)
+        config = fake_auth_config()
+        fetch_mock = AsyncMock(side_effect=[("short", 30), ("long", 3600)])
+
+        with patch.object(M365AuthConfig, "fetch_access_token", fetch_mock):
+            assert await cache.get(config) == "short"
+            assert await cache.get(config) == "long"
+            assert await cache.get(config) == "long"
+
+        assert fetch_mock.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_refresh_ahead_returns_current_token(self):
+        """期限間近では手元のトークンを返しつつバックグラウンドで更新することを確認"""
+        cache = AccessTokenCache(refresh_ahead_seconds=3600)
+        config = fake_auth_config()
+        fetch_mock = AsyncMock(side_effect=[("old", 3600), ("new", 3600)])
+
+        with patch.object(M365AuthConfig, "fetch_access_token", fetch_mock):
+            assert await cache.get(config) == "old"
+            # 有効期間の半分を過ぎた扱いにする
+            cache._entries[config.cache_key()].refresh_at = 0
+            assert await cache.get(config) == "old"
+            await asyncio.sleep(0)
+            assert await cache.get(config) == "new"
+
+        assert fetch_mock.await_count == 2
+        assert cache.stats()["refreshes_ahead"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_error_is_raised_to_waiters_and_not_cached(self):
+        """取得に失敗した場合は待っている全員に例外を返し、次回は取得し直すことを確認"""
+        from app.m365.exceptions import M365AuthenticationError
+
+        cache = AccessTokenCache(refresh_ahead_seconds=300)
+        config = fake_auth_config()
+        fetch_mock = AsyncMock(side_effect=[M365AuthenticationError("denied"), ("token", 3600)])
+
+        with patch.object(M365AuthConfig, "fetch_access_token", fetch_mock):
+            results = await asyncio.gather(cache.get(config), cache.get(config), return_exceptions=True)
+            assert all(isinstance(r, M365AuthenticationError) for r in results)
+            assert await cache.get(config) == "token"
+
+        assert cache.stats()["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_ignores_replaced_token(self):
+        """拒否されたトークンが既に更新済みなら新しいトークンを破棄しないことを確認"""
+        cache = AccessTokenCache(refresh_ahead_seconds=300)
+        config = fake_auth_config()
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("current", 3600))):
+            await cache.get(config)
+            cache.invalidate(config, "stale")
+            assert config.cache_key() in cache._entries
+            cache.invalidate(config, "current")
+            assert config.cache_key() not in cache._entries
+
+    @pytest.mark.asyncio
+    async def test_graph_clients_reuse_cached_token(self):
+        """GraphClient を作り直してもトークンエンドポイントへは1回だけ問い合わせることを確認"""
+        config = fake_auth_config()
+        authorizations = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            authorizations.append(request.headers["Authorization"])
+            return httpx.Response(200, json={"id": "user-1"})
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("shared", 3600))) as fetch_mock:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+                for _ in range(3):
+                    async with GraphClient(config, http_client) as client:
+                        await client.list_authentication_methods("user-1")
+
+        assert fetch_mock.await_count == 1
+        assert authorizations == ["Bearer shared"] * 3
+
+
+@pytest.mark.m365
+class TestSharedHttpClient:
+    """Graph 用の共有 HTTP クライアントのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_graph_clients_use_shared_client(self):
+        """起動時に作成した共有クライアントを使い、GraphClient の終了では閉じないことを確認"""
+        shared = await graph_http.start_http_client()
+        try:
+            assert await graph_http.start_http_client() is shared
+            async with GraphClient(fake_auth_config()) as client:
+                assert client._client is shared
+            async with M365Operations(auth_config=fake_auth_config()) as ops:
+                assert ops._client._client is shared
+            assert not shared.is_closed
+        finally:
+            await graph_http.close_http_client()
+
+        assert shared.is_closed
+        assert graph_http.get_http_client() is None
+
+    @pytest.mark.asyncio
+    async def test_client_without_shared_pool_owns_its_client(self):
+        """共有クライアントがない場合は専用のクライアントを作成し、終了時に閉じることを確認"""
+        async with GraphClient(fake_auth_config()) as client:
+            own = client._client
+            assert graph_http.get_http_client() is None
+        assert own.is_closed
+
+
+class _FakeBatchGraph:
+    """/$batch を受け付ける Graph のテストダブル
+
+    status_for(リクエストID, 試行回数) が返すステータスで個別に応答し、
+    dependsOn 先が失敗していれば 424 を返す。
+    """
+
+    def __init__(self, status_for=lambda request_id, attempt: 204):
+        self.status_for = status_for
+        self.posts: list[list[dict]] = []
+        self.attempts: dict[str, int] = {}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        items = json.loads(request.content)["requests"]
+        self.posts.append(items)
+        statuses = {}
+        responses = []
+        for item in items:
+            if any(statuses.get(dep, 204) >= 400 for dep in item.get("dependsOn", [])):
+                status = 424
+            else:
+                attempt = self.attempts[item["id"]] = self.attempts.get(item["id"], 0) + 1
+                status = self.status_for(item["id"], attempt)
+            statuses[item["id"]] = status
+            headers = {"Retry-After": "0"} if status == 429 else {}
+            responses.append({"id": item["id"], "status": status, "headers": headers, "body": {}})
+        # Graph は応答の順序を保証しない
+        return httpx.Response(200, json={"responses": responses[::-1]})
+
+
+@pytest.mark.m365
+class TestGraphBatch:
+    """JSON バッチのテスト"""
+
+    async def _batch(self, graph: _FakeBatchGraph, requests):
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("token", 3600))):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(graph)) as http_client:
+                async with GraphClient(fake_auth_config(), http_client) as client:
+                    with patch("app.m365.graph_client.asyncio.sleep", AsyncMock()):
+                        return await client.batch(requests)
+
+    @pytest.mark.asyncio
+    async def test_requests_are_packed_by_twenty(self):
+        """20件ずつ POST され、結果が要求と同じ順で返ることを確認"""
+        graph = _FakeBatchGraph()
+        requests = [BatchRequest("DELETE", f"/users/u/authentication/methods/m{i}") for i in range(45)]
+        responses = await self._batch(graph, requests)
+
+        assert [len(post) for post in graph.posts] == [20, 20, 5]
+        assert [r.id for r in responses] == [str(i + 1) for i in range(45)]
+        assert all(r.ok for r in responses)
+
+    @pytest.mark.asyncio
+    async def test_throttled_items_are_retried(self):
+        """429 / 5xx の個別リクエストだけが再送されることを確認"""
+        def status_for(request_id, attempt):
+            if request_id == "2" and attempt == 1:
+                return 429
+            if request_id == "3" and attempt < 3:
+                return 503
+            return 204
+
+        graph = _FakeBatchGraph(status_for)
+        responses = await self._batch(graph, [BatchRequest("GET", f"/users/{i}") for i in range(3)])
+
+        assert [r.status for r in responses] == [204, 204, 204]
+        assert [[item["id"] for item in post] for post in graph.posts] == [["1", "2", "3"], ["2", "3"], ["3"]]
+
+    @pytest.mark.asyncio
+    async def test_dependencies_stay_together_and_are_retried(self):
+        """依存関係のあるリクエストは同じバッチに入り、依存先の再送時に一緒に再送されることを確認"""
+        requests = [BatchRequest("GET", f"/users/{i}") for i in range(19)]
+        requests.append(BatchRequest("POST", "/groups/g/members/$ref", body={}, id="add"))
+        requests.append(BatchRequest("GET", "/groups/g", id="check", depends_on=["add"]))
+
+        graph = _FakeBatchGraph(lambda request_id, attempt: 429 if request_id == "add" and attempt == 1 else 204)
+        responses = await self._batch(graph, requests)
+
+        assert [len(post) for post in graph.posts] == [19, 2, 2]
+        assert graph.posts[1][1]["dependsOn"] == ["add"]
+        assert {item["id"] for item in graph.posts[2]} == {"add", "check"}
+        assert all(r.ok for r in responses)
+
+    @pytest.mark.asyncio
+    async def test_permanent_failures_are_returned(self):
+        """再試行しない失敗は例外にせずレスポンスとして返ることを確認"""
+        graph = _FakeBatchGraph(lambda request_id, attempt: 403 if request_id == "1" else 204)
+        responses = await self._batch(
+            graph,
+            [BatchRequest("DELETE", "/a"), BatchRequest("DELETE", "/b", depends_on=["1"])],
+        )
+
+        assert [r.status for r in responses] == [403, 424]
+        assert isinstance(responses[0].error(), M365AuthorizationError)
+        assert len(graph.posts) == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_dependencies_are_rejected(self):
+        """存在しない依存先・大きすぎる依存関係はバリデーションエラーになることを確認"""
+        with pytest.raises(M365ValidationError):
+            await self._batch(_FakeBatchGraph(), [BatchRequest("GET", "/a", depends_on=["missing"])])
+
+        chained = [BatchRequest("GET", "/a", id="0")]
+        chained += [BatchRequest("GET", "/a", id=str(i), depends_on=[str(i - 1)]) for i in range(1, 21)]
+        with pytest.raises(M365ValidationError):
+            await self._batch(_FakeBatchGraph(), chained)
+
+
+def _paged_graph(pages: list[list[dict]], requested: list[httpx.URL]):
+    """@odata.nextLink で pages を1ページずつ返す Graph のテストダブル"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url)
+        if "/groups/missing" in request.url.path:
+            return httpx.Response(404, json={"error": {"code": "Request_ResourceNotFound"}})
+        index = int(request.url.params.get("$skiptoken", 0))
+        body = {"value": pages[index]}
+        if index + 1 < len(pages):
+            body["@odata.nextLink"] = f"{request.url.copy_with(query=None)}?$skiptoken={index + 1}"
+        return httpx.Response(200, json=body)
+
+    return handler
+
+
+@pytest.mark.m365
+class TestGraphPaging:
+    """@odata.nextLink をたどるページングのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_pages_are_fetched_lazily(self):
+        """次のページは要求されたときに初めて取得され、$top と $select が渡されることを確認"""
+        requested: list[httpx.URL] = []
+        pages = [[{"id": "1"}, {"id": "2"}], [{"id": "3"}, {"id": "4"}], [{"id": "5"}]]
+        handler = _paged_graph(pages, requested)
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("token", 3600))):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+                async with GraphClient(fake_auth_config(), http_client) as client:
+                    stream = client.iter_group_member_pages("g1", select=["id", "displayName"], page_size=2)
+                    assert await anext(stream) == pages[0]
+                    assert len(requested) == 1
+                    assert requested[0].params["$top"] == "2"
+                    assert requested[0].params["$select"] == "id,displayName"
+
+                    assert [page async for page in stream] == pages[1:]
+                    assert len(requested) == 3
+
+                    members = await client.list_group_members("g1")
+
+        assert [m["id"] for m in members] == ["1", "2", "3", "4", "5"]
+        assert requested[-1].params["$skiptoken"] == "2"
+
+    @pytest.mark.asyncio
+    async def test_group_members_are_streamed_as_ndjson(
+        self, client, test_user_manager, create_auth_headers
+    ):
+        """グループメンバーが全ページ分 NDJSON で返され、存在しないグループは404になることを確認"""
+        requested: list[httpx.URL] = []
+        pages = [[{"id": "1", "displayName": "山田"}], [{"id": "2", "displayName": "佐藤"}]]
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(_paged_graph(pages, requested)))
+        headers = create_auth_headers(test_user_manager.id)
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("token", 3600))), \
+                patch("app.m365.graph_client.get_http_client", return_value=http_client):
+            response = await client.get("/api/m365/groups/g1/members?page_size=1", headers=headers)
+            missing = await client.get("/api/m365/groups/missing/members", headers=headers)
+        await http_client.aclose()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line) for line in response.text.splitlines()] == pages[0] + pages[1]
+        assert missing.status_code == 404
+
+
+class _CountingGraph:
+    """ユーザー・SKU の読み取りとライセンス付与を受け付け、リクエストを記録する Graph のテストダブル"""
+
+    def __init__(self):
+        self.requests: list[httpx.Request] = []
+        self.users = {"u1": {"id": "u1", "userPrincipalName": "taro@example.com", "assignedLicenses": []}}
+
+    def count(self, method: str, path: str) -> int:
+        return sum(1 for r in self.requests if r.method == method and r.url.path == f"/v1.0{path}")
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path.removeprefix("/v1.0")
+        if path == "/subscribedSkus":
+            return httpx.Response(200, json={"value": [{"skuId": "sku-1", "consumedUnits": 1}]})
+        user_id = path.split("/")[2]
+        user = self.users.get(user_id) or next(
+            (u for u in self.users.values() if u["userPrincipalName"] == user_id), None
+        )
+        if request.method == "POST" and path == f"/users/{user_id}/assignLicense":
+            user["assignedLicenses"].append({"skuId": "sku-1"})
+            return httpx.Response(200, json=user)
+        if user is None:
+            return httpx.Response(404, json={"error": {"code": "Request_ResourceNotFound"}})
+        return httpx.Response(200, json=user)
+
+
+@pytest.mark.m365
+class TestGraphResponseCache:
+    """Graph 読み取りのレスポンスキャッシュのテスト"""
+
+    async def _run(self, graph: _CountingGraph, action):
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("token", 3600))):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(graph)) as http_client:
+                async with GraphClient(fake_auth_config(), http_client) as client:
+                    return await action(client)
+
+    @pytest.mark.asyncio
+    async def test_repeated_reads_hit_graph_once(self):
+        """同じユーザー・SKU 一覧の読み取りは1回だけ Graph に送られ、コピーが返ることを確認"""
+        graph = _CountingGraph()
+
+        async def action(client: GraphClient):
+            first = await client.get_user("u1")
+            first["displayName"] = "変更"
+            second = await client.get_user("u1")
+            await client.list_available_licenses()
+            await client.list_available_licenses()
+            await client.get_user_licenses("u1")
+            return second
+
+        user = await self._run(graph, action)
+
+        assert "displayName" not in user
+        assert graph.count("GET", "/users/u1") == 2  # $select の有無で別エントリ
+        assert graph.count("GET", "/subscribedSkus") == 1
+        stats = graph_cache.stats()["endpoints"]
+        assert stats["users"]["hits"] == 1
+        assert stats["skus"]["hits"] == 1
+        assert stats["skus"]["hit_ratio"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_missing_user_is_negatively_cached(self):
+        """存在しない UPN の 404 はキャッシュされ、再問い合わせせずに同じエラーになることを確認"""
+        graph = _CountingGraph()
+
+        async def action(client: GraphClient):
+            for _ in range(2):
+                with pytest.raises(M365APIError) as exc_info:
+                    await client.get_user("nobody@example.com")
+                assert exc_info.value.status_code == 404
+
+        await self._run(graph, action)
+
+        assert graph.count("GET", "/users/nobody@example.com") == 1
+        assert graph_cache.stats()["endpoints"]["users"]["negative_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_writes_invalidate_user_and_sku_entries(self):
+        """ライセンス付与の後は、UPN で読んだユーザーと SKU 一覧も取り直すことを確認"""
+        graph = _CountingGraph()
+
+        async def action(client: GraphClient):
+            assert await client.get_user_licenses("taro@example.com") == []
+            await client.list_available_licenses()
+            await client.assign_license("u1", "sku-1")
+            await client.list_available_licenses()
+            return await client.get_user_licenses("taro@example.com")
+
+        licenses = await self._run(graph, action)
+
+        assert licenses == [{"skuId": "sku-1"}]
+        assert graph.count("GET", "/users/taro@example.com") == 2
+        assert graph.count("GET", "/subscribedSkus") == 2
+        assert graph_cache.stats()["endpoints"]["users"]["invalidations"] == 1
+
+
+@pytest.mark.m365
+class TestGraphThrottle:
+    """Graph 呼び出しの共有リミッターのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_requests_over_limit_wait_in_order(self):
+        """上限を超えたリクエストは待ち、空いた枠が到着順に渡されることを確認"""
+        throttle = GraphThrottle(max_concurrency=4, initial_concurrency=2, failure_threshold=3, recovery_seconds=30)
+        admitted: list[int] = []
+
+        async def caller(n: int):
+            await throttle.acquire()
+            admitted.append(n)
+
+        tasks = [asyncio.create_task(caller(n)) for n in range(5)]
+        await asyncio.sleep(0)
+        assert admitted == [0, 1]
+        assert throttle.stats()["queued"] == 3
+
+        throttle.release(200)
+        throttle.release(200)
+        await asyncio.sleep(0)
+        assert admitted == [0, 1, 2, 3]
+        assert throttle.stats()["in_flight"] == 2
+
+        # 成功が続くと同時実行数が増える
+        for _ in range(4):
+            throttle.release(200)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert admitted == [0, 1, 2, 3, 4]
+        assert throttle.limit == 4  # 6回の成功で 2 → 4.09
+
+    @pytest.mark.asyncio
+    async def test_429_pauses_all_callers(self):
+        """429 を受けると Retry-After の間は誰も送信できず、同時実行数が半分になることを確認"""
+        throttle = GraphThrottle(max_concurrency=8, initial_concurrency=8, failure_threshold=3, recovery_seconds=30)
+        await throttle.acquire()
+        throttle.release(429, retry_after=0.1)
+        throttle.throttled(0.05)
+
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(throttle.acquire(), throttle.acquire())
+
+        assert asyncio.get_running_loop().time() - started >= 0.09
+        assert throttle.limit == 4
+        assert throttle.stats()["throttle_events"] == 2
+
+    @pytest.mark.asyncio
+    async def test_circuit_opens_and_recovers(self):
+        """連続失敗でサーキットが開いて即座に失敗し、回復待ちの後の1件の成功で閉じることを確認"""
+        throttle = GraphThrottle(max_concurrency=1, initial_concurrency=1, failure_threshold=2, recovery_seconds=0.05)
+        await throttle.acquire()
+        queued = asyncio.create_task(throttle.acquire())
+        await asyncio.sleep(0)
+        throttle.release(503)
+        await queued
+        throttle.release(None)
+
+        with pytest.raises(M365APIError) as exc_info:
+            await throttle.acquire()
+        assert exc_info.value.status_code == 503
+        assert throttle.stats()["circuit"]["state"] == "open"
+
+        await asyncio.sleep(0.06)
+        await throttle.acquire()
+        with pytest.raises(M365APIError):
+            await throttle.acquire()
+        throttle.release(200)
+
+        assert throttle.stats()["circuit"] == {
+            "state": "closed", "consecutive_failures": 0, "opened": 1, "rejected": 2,
+        }
+
+    @pytest.mark.asyncio
+    async def test_graph_client_shares_throttle(self):
+        """GraphClient の 429 は全体の停止として記録され、障害が続くと Graph に送らず失敗することを確認"""
+        statuses = iter([429] + [503] * 10)
+        sent: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.append(request)
+            return httpx.Response(next(statuses), headers={"Retry-After": "0"}, json={})
+
+        with patch.object(M365AuthConfig, "fetch_access_token", AsyncMock(return_value=("token", 3600))), \
+                patch("app.m365.graph_client.asyncio.sleep", AsyncMock()):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+                async with GraphClient(fake_auth_config(), http_client) as client:
+                    with pytest.raises(M365APIError):
+                        await client.list_authentication_methods("u1")
+                    assert graph_throttle.stats()["throttle_events"] == 1
+                    assert len(sent) == 4
+
+                    with pytest.raises(M365APIError) as exc_info:
+                        await client.list_authentication_methods("u1")
+
+        assert "circuit open" in exc_info.value.message
+        assert len(sent) == 6
+        assert graph_throttle.stats()["circuit"]["state"] == "open"
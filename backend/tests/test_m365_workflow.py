@@ -0,0 +1,379 @@
+"""
+Test M365 Workflows
+
+退職者処理・新規ユーザー作成のワークフローのテスト:
+- タスク作成時のステップ登録と入力チェック
+- 依存関係に従った実行と、互いに依存しないステップの同時実行
+- ステップごとの実行ログ・チェックポイントからの再開
+- 失敗したステップに依存するステップを実行しないこと
+"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.m365.exceptions import M365APIError
+from app.m365.graph_client import BatchResponse
+from app.models.approval import Approval, ApprovalStatus
+from app.models.m365_task import (
+    M365ExecutionLog,
+    M365Job,
+    M365JobStatus,
+    M365StepStatus,
+    M365Task,
+    M365TaskStatus,
+    M365TaskType,
+    M365WorkflowStep,
+)
+from app.models.user import User
+from app.services.m365_jobs import M365JobWorker
+from app.services.m365_workflow import build_workflow_steps
+from tests.helpers import create_test_ticket, queue_m365_execution
+
+
+@pytest_asyncio.fixture
+async def offboard_task(
+    db_session: AsyncSession,
+    test_user_requester: User,
+    test_user_approver: User,
+) -> M365Task:
+    """承認済みの退職者処理タスク"""
+    ticket = await create_test_ticket(db_session, requester=test_user_requester)
+    db_session.add(Approval(
+        ticket_id=ticket.id,
+        approver_id=test_user_approver.id,
+        status=ApprovalStatus.APPROVED,
+        request_reason="退職者処理の承認依頼",
+    ))
+    task = M365Task(
+        ticket_id=ticket.id,
+        task_type=M365TaskType.USER_OFFBOARD,
+        target_upn="leaver@example.com",
+        target_description="3月末退職者のアカウント処理",
+        workflow_steps=build_workflow_steps(M365TaskType.USER_OFFBOARD),
+    )
+    db_session.add(task)
+    await db_session.commit()
+    await db_session.refresh(task)
+    return task
+
+
+async def _step_logs(db: AsyncSession, task: M365Task) -> list[tuple[str, str]]:
+    result = await db.execute(
+        select(M365ExecutionLog).where(M365ExecutionLog.task_id == task.id).order_by(M365ExecutionLog.id)
+    )
+    return [(json.loads(log.command_or_action)["step"], log.result) for log in result.scalars().all()]
+
+
+def _worker(test_session_factory) -> M365JobWorker:
+    return M365JobWorker(concurrency=1, poll_seconds=1, session_factory=test_session_factory)
+
+
+@pytest.mark.m365
+class TestWorkflowTaskCreate:
+    """ワークフロータスク作成のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_create_registers_steps(
+        self, client, db_session: AsyncSession, offboard_task: M365Task, test_user_agent, create_auth_headers,
+    ):
+        """ステップとパラメータを登録し、対象ユーザー・入社者情報がなければ 400 になることを確認"""
+        headers = create_auth_headers(test_user_agent.id)
+        payload = {
+            "ticket_id": offboard_task.ticket_id,
+            "task_type": "user_onboard",
+            "target_upn": "newcomer@example.com",
+            "target_description": "4月入社者のアカウント作成",
+        }
+
+        response = await client.post("/api/m365/tasks", json={
+            **payload,
+            "onboarding": {"display_name": "新入 太郎", "usage_location": "JP", "license_sku_ids": ["sku-1"]},
+        }, headers=headers)
+        missing_options = await client.post("/api/m365/tasks", json=payload, headers=headers)
+        missing_upn = await client.post("/api/m365/tasks", json={
+            **payload, "task_type": "user_offboard", "target_upn": None,
+        }, headers=headers)
+
+        assert response.status_code == 201
+        steps = (await db_session.execute(
+            select(M365WorkflowStep).where(M365WorkflowStep.task_id == response.json()["id"])
+            .order_by(M365WorkflowStep.id)
+        )).scalars().all()
+        assert [step.step_key for step in steps] == ["create_user", "assign_licenses", "add_groups"]
+        assert json.loads(steps[0].params) == {"display_name": "新入 太郎", "usage_location": "JP"}
+        assert json.loads(steps[1].params) == {"license_sku_ids": ["sku-1"]}
+        assert missing_options.status_code == 400
+        assert missing_upn.status_code == 400
+
+
+@pytest.mark.m365
+class TestOffboardingWorkflow:
+    """退職者処理ワークフローの実行のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_steps_run_as_dag(
+        self, client, db_session: AsyncSession, test_session_factory, offboard_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """依存関係の順に実行し、互いに依存しないステップを同時に実行することを確認"""
+        events: list[str] = []
+        in_flight = 0
+        peak = 0
+
+        def tracked(name: str, value):
+            async def call(*args, **kwargs):
+                nonlocal in_flight, peak
+                events.append(f"start:{name}")
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                events.append(f"end:{name}")
+                return value
+            return call
+
+        mock_graph_client.update_user.side_effect = tracked("block_sign_in", {"accountEnabled": False})
+        mock_graph_client.revoke_sign_in_sessions.side_effect = tracked("revoke_sessions", {"value": True})
+        mock_graph_client.list_authentication_methods.side_effect = tracked("reset_mfa", [])
+        mock_graph_client.list_user_groups.side_effect = tracked("remove_groups", [
+            {"id": "group-1", "mailEnabled": False, "securityEnabled": True},
+            {"id": "group-dynamic", "groupTypes": ["DynamicMembership"]},
+            {"id": "group-unified", "groupTypes": ["Unified"], "mailEnabled": True, "securityEnabled": False},
+            # Exchange で管理するグループ（配布リスト・メールが有効なセキュリティグループ）
+            {"id": "group-dl", "groupTypes": [], "mailEnabled": True, "securityEnabled": False},
+            {"id": "group-mesg", "groupTypes": [], "mailEnabled": True, "securityEnabled": True},
+        ])
+        mock_graph_client.list_shared_drive_items.side_effect = tracked("revoke_onedrive_shares", [
+            {"id": "item-1", "shared": {"scope": "anonymous"}},
+        ])
+        mock_graph_client.get_license_assignment_states.side_effect = tracked("remove_licenses", [
+            {"skuId": "sku-1"},
+            {"skuId": "sku-2", "assignedByGroup": "group-1"},
+        ])
+        mock_graph_client.list_drive_item_permissions.side_effect = lambda user_id, item_ids: {
+            "item-1": BatchResponse("item-1", 200, {"value": [
+                {"id": "perm-owner", "roles": ["owner"]},
+                {"id": "perm-inherited", "roles": ["read"], "inheritedFrom": {"id": "root"}},
+                {"id": "perm-link", "roles": ["read"], "link": {"scope": "anonymous"}},
+            ]}),
+        }
+        headers = create_auth_headers(test_user_m365_operator.id)
+        job_id = (await queue_m365_execution(client, offboard_task, headers)).json()["job_id"]
+
+        await _worker(test_session_factory).run_until_idle()
+
+        # サインインのブロックが先、ライセンスの剥奪はグループ削除と共有解除の後
+        first_others = min(events.index(f"start:{name}") for name in (
+            "revoke_sessions", "reset_mfa", "remove_groups", "revoke_onedrive_shares"
+        ))
+        assert events.index("end:block_sign_in") < first_others
+        assert events.index("start:remove_licenses") > events.index("end:remove_groups")
+        assert events.index("start:remove_licenses") > events.index("end:revoke_onedrive_shares")
+        assert peak == 4
+
+        mock_graph_client.remove_group_memberships.assert_awaited_once_with(
+            "leaver@example.com", ["group-1", "group-unified"]
+        )
+        mock_graph_client.delete_drive_item_permissions.assert_awaited_once_with(
+            "leaver@example.com", [("item-1", "perm-link")]
+        )
+        mock_graph_client.update_licenses.assert_awaited_once_with("leaver@example.com", remove_sku_ids=["sku-1"])
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "succeeded"
+        assert data["progress"]["succeeded"] == 6
+        assert data["execution_result"]["step_results"]["remove_groups"]["skipped_group_ids"] == [
+            "group-dynamic", "group-dl", "group-mesg",
+        ]
+        assert data["log_id"] is None
+        logs = await _step_logs(db_session, offboard_task)
+        assert sorted(logs) == sorted((step, "success") for step in (
+            "block_sign_in", "revoke_sessions", "reset_mfa", "remove_groups",
+            "revoke_onedrive_shares", "remove_licenses",
+        ))
+        await db_session.refresh(offboard_task, ["status"])
+        assert offboard_task.status == M365TaskStatus.COMPLETED
+
+    @pytest.mark.asyncio
+    async def test_transient_failure_resumes_from_checkpoint(
+        self, client, db_session: AsyncSession, test_session_factory, offboard_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """一時的に失敗したステップと依存するステップだけを、リトライで実行することを確認"""
+        mock_graph_client.list_user_groups.side_effect = [
+            M365APIError("Server error: 503", status_code=503),
+            [],
+        ]
+        job_id = (await queue_m365_execution(client, offboard_task, create_auth_headers(test_user_m365_operator.id))).json()["job_id"]
+
+        with patch("app.services.m365_jobs.settings.M365_JOB_RETRY_BACKOFF_SECONDS", 0):
+            await _worker(test_session_factory).run_until_idle()
+
+        job = await db_session.get(M365Job, job_id)
+        await db_session.refresh(job)
+        assert job.status == M365JobStatus.SUCCEEDED
+        assert job.attempts == 2
+        # 成功済みのステップは再実行しない
+        assert mock_graph_client.update_user.await_count == 1
+        assert mock_graph_client.revoke_sign_in_sessions.await_count == 1
+        logs = await _step_logs(db_session, offboard_task)
+        assert ("remove_groups", "failure") in logs
+        assert logs[-2:] == [("remove_groups", "success"), ("remove_licenses", "success")]
+        step = (await db_session.execute(
+            select(M365WorkflowStep).where(
+                M365WorkflowStep.task_id == offboard_task.id, M365WorkflowStep.step_key == "remove_groups"
+            )
+        )).scalar_one()
+        assert step.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_step_blocks_dependents(
+        self, client, db_session: AsyncSession, test_session_factory, offboard_task: M365Task,
+        test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """失敗したステップに依存するステップは実行せず、再実行で続きから実行することを確認"""
+        mock_graph_client.list_user_groups.return_value = [{"id": "group-1"}]
+        mock_graph_client.get_license_assignment_states.return_value = [{"skuId": "sku-1"}]
+        mock_graph_client.remove_group_memberships.side_effect = lambda user_id, group_ids: {
+            g: BatchResponse(g, 403, {"error": {"message": "Insufficient privileges"}}) for g in group_ids
+        }
+        headers = create_auth_headers(test_user_m365_operator.id)
+        job_id = (await queue_m365_execution(client, offboard_task, headers)).json()["job_id"]
+        worker = _worker(test_session_factory)
+
+        await worker.run_until_idle()
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "failed"
+        assert data["error_message"] == "1 of 6 steps failed"
+        assert data["execution_result"]["blocked_steps"] == ["remove_licenses"]
+        statuses = {step["step"]: step["status"] for step in data["progress"]["steps"]}
+        assert statuses["remove_groups"] == "failed"
+        assert statuses["remove_licenses"] == "pending"
+        mock_graph_client.update_licenses.assert_not_awaited()
+
+        mock_graph_client.remove_group_memberships.side_effect = lambda user_id, group_ids: {
+            g: BatchResponse(g, 204) for g in group_ids
+        }
+        job_id = (await queue_m365_execution(client, offboard_task, headers)).json()["job_id"]
+        await worker.run_until_idle()
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "succeeded"
+        assert mock_graph_client.update_user.await_count == 1
+        mock_graph_client.update_licenses.assert_awaited_once()
+        steps = (await db_session.execute(
+            select(M365WorkflowStep.status).where(M365WorkflowStep.task_id == offboard_task.id)
+        )).scalars().all()
+        assert set(steps) == {M365StepStatus.SUCCEEDED}
+
+
+@pytest.mark.m365
+class TestOnboardingWorkflow:
+    """新規ユーザー作成ワークフローの実行のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_creates_user_then_assigns_licenses_and_groups(
+        self, client, db_session: AsyncSession, test_session_factory, offboard_task: M365Task,
+        test_user_agent, test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """ユーザーを作成してからライセンス付与・グループ追加を行うことを確認"""
+        created = await client.post("/api/m365/tasks", json={
+            "ticket_id": offboard_task.ticket_id,
+            "task_type": "user_onboard",
+            "target_upn": "newcomer@example.com",
+            "target_description": "4月入社者のアカウント作成",
+            "onboarding": {
+                "display_name": "新入 太郎",
+                "usage_location": "JP",
+                "license_sku_ids": ["sku-1"],
+                "group_ids": ["group-1", "group-2"],
+            },
+        }, headers=create_auth_headers(test_user_agent.id))
+        task = await db_session.get(M365Task, created.json()["id"])
+        headers = create_auth_headers(test_user_m365_operator.id)
+        job_id = (await queue_m365_execution(client, task, headers)).json()["job_id"]
+
+        await _worker(test_session_factory).run_until_idle()
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "succeeded"
+        user = mock_graph_client.create_user.await_args.args[0]
+        assert user["userPrincipalName"] == "newcomer@example.com"
+        assert user["displayName"] == "新入 太郎"
+        assert user["usageLocation"] == "JP"
+        # 初期パスワードは結果・ステップ・実行ログに残さず、実行したオペレーターに1回だけ返す
+        password = data["secrets"]["create_user"]["temporary_password"]
+        assert user["passwordProfile"]["password"] == password
+        assert "temporary_password" not in data["execution_result"]["step_results"]["create_user"]
+        stored = (await db_session.execute(
+            select(M365WorkflowStep.result).where(M365WorkflowStep.task_id == task.id)
+        )).scalars().all()
+        logs = (await db_session.execute(
+            select(M365ExecutionLog.result_details).where(M365ExecutionLog.task_id == task.id)
+        )).scalars().all()
+        job = (await db_session.execute(select(M365Job).where(M365Job.id == job_id))).scalar_one()
+        assert all(password not in (text or "") for text in [*stored, *logs, job.result, job.secrets])
+        assert (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()["secrets"] is None
+        mock_graph_client.update_licenses.assert_awaited_once_with("newcomer@example.com", add_sku_ids=["sku-1"])
+        mock_graph_client.add_member_to_groups.assert_awaited_once_with(
+            "newcomer@example.com", ["group-1", "group-2"]
+        )
+        assert [step for step, _ in await _step_logs(db_session, task)][0] == "create_user"
+
+    @pytest.mark.asyncio
+    async def test_retried_create_user_accepts_existing_user(
+        self, client, db_session: AsyncSession, test_session_factory, offboard_task: M365Task,
+        test_user_agent, test_user_m365_operator, create_auth_headers, mock_m365_operations, mock_graph_client,
+    ):
+        """前回の作成が Graph に反映済みの場合（already exists）は作成済みとして扱うことを確認"""
+        created = await client.post("/api/m365/tasks", json={
+            "ticket_id": offboard_task.ticket_id,
+            "task_type": "user_onboard",
+            "target_upn": "newcomer@example.com",
+            "target_description": "4月入社者のアカウント作成",
+            "onboarding": {"display_name": "新入 太郎"},
+        }, headers=create_auth_headers(test_user_agent.id))
+        task = await db_session.get(M365Task, created.json()["id"])
+        headers = create_auth_headers(test_user_m365_operator.id)
+        mock_graph_client.create_user.side_effect = M365APIError(
+            "Graph API error: 400",
+            status_code=400,
+            details={"error": {"message": "Another object with the same value for property "
+                                          "userPrincipalName already exists."}},
+        )
+        mock_graph_client.get_user.return_value = {
+            "id": "existing-id", "userPrincipalName": "newcomer@example.com", "displayName": "新入 太郎",
+        }
+        job_id = (await queue_m365_execution(client, task, headers)).json()["job_id"]
+
+        await _worker(test_session_factory).run_until_idle()
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "succeeded"
+        assert data["execution_result"]["step_results"]["create_user"]["already_existed"] is True
+        # 返す初期パスワードが有効になるよう設定し直す
+        password = data["secrets"]["create_user"]["temporary_password"]
+        mock_graph_client.reset_password.assert_awaited_once_with("existing-id", password, True)
+
+        # 表示名が異なる既存ユーザーは別人として失敗にする
+        mock_graph_client.get_user.return_value = {"id": "other-id", "displayName": "別人"}
+        await db_session.execute(
+            update(M365WorkflowStep)
+            .where(M365WorkflowStep.task_id == task.id)
+            .values(status=M365StepStatus.PENDING)
+        )
+        await db_session.commit()
+        job_id = (await queue_m365_execution(client, task, headers)).json()["job_id"]
+        await _worker(test_session_factory).run_until_idle()
+
+        data = (await client.get(f"/api/m365/jobs/{job_id}", headers=headers)).json()
+        assert data["job_status"] == "failed"
+        assert "already exists" in data["error_message"]
+        mock_graph_client.reset_password.assert_awaited_once()
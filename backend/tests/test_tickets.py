@@ -7,8 +7,14 @@ Test Ticket Module
 - 優先度計算
 - 履歴自動記録
 - コメントと添付ファイル
+- 類似チケット・関連記事の提案
 """
 
+import fcntl
+import json
+import threading
+
+import numpy as np
 import pytest
 from datetime import datetime, timezone
 from httpx import AsyncClient
@@ -26,6 +32,17 @@ from app.models.user import User
 from app.models.comment import Comment, CommentVisibility
 from app.models.ticket_history import TicketHistory, HistoryAction
 from app.models.approval import Approval, ApprovalStatus
+from app.models.knowledge import KnowledgeArticle, KnowledgeVisibility
+from app.services.index_lock import lock_path, release_saver_locks
+from app.services.knowledge_search import ArticleMeta
+from app.services.similarity import HashedVectorizer, SimilarityIndex
+from app.services.ticket_suggestions import (
+    article_vectors,
+    refresh_similarity_indexes,
+    save_similarity_indexes,
+    ticket_vectors,
+)
+from app.services.vector_index import IVFFlatIndex, _probe_count
 from tests.helpers import (
     create_test_ticket,
     create_test_comment,
@@ -565,3 +582,295 @@ class TestTicketFilters:
 
         # P1優先度のチケットのみ返される
         assert all(item["priority"] == "p1" for item in data["items"])
+
+
+@pytest.mark.tickets
+class TestSimilarityIndex:
+    """ベクトル索引のテスト"""
+
+    def _index(self) -> SimilarityIndex:
+        index = SimilarityIndex(HashedVectorizer(256), IVFFlatIndex(256, initial_capacity=2))
+        index.add(1, "VPNに接続できない 在宅勤務", meta="resolved")
+        index.add(2, "プリンタで印刷できない", meta="resolved")
+        index.add(3, "VPN接続が切れる", meta="new")
+        return index
+
+    @pytest.mark.asyncio
+    async def test_search_ranks_similar_documents_first(self):
+        """類似した文書が上位に返ることを確認（行列の拡張も含む）"""
+        index = self._index()
+
+        hits = await index.search("VPNに接続できません", k=3)
+
+        assert len(index) == 3
+        assert hits[0][0] == 1
+        assert 2 not in [doc_id for doc_id, _ in hits[:2]]
+
+    @pytest.mark.asyncio
+    async def test_predicate_and_remove(self):
+        """絞り込み条件と削除が検索結果に反映されることを確認"""
+        index = self._index()
+        resolved = lambda doc_id, status: status == "resolved"
+
+        hits = await index.search("VPN接続", predicate=resolved)
+        assert [doc_id for doc_id, _ in hits] == [1]
+
+        index.remove(1)
+        assert 1 not in index
+        assert await index.search("VPN接続", predicate=resolved) == []
+        # 末尾から移動した行も引き続き検索できる
+        assert (await index.search("VPN接続"))[0][0] == 3
+
+    @pytest.mark.asyncio
+    async def test_save_and_load(self, tmp_path):
+        """保存した索引を読み込むと同じ結果になることを確認"""
+        index = self._index()
+        index.save(tmp_path)
+        assert not index.dirty
+
+        restored = SimilarityIndex(HashedVectorizer(256))
+        assert restored.load(tmp_path)
+        assert await restored.search("VPN") == await index.search("VPN")
+        assert restored.meta(3) == "new"
+
+        # 次元数が異なる索引には読み込まない
+        assert not SimilarityIndex(HashedVectorizer(128)).load(tmp_path)
+
+    def test_saved_state_is_json_and_npz(self, tmp_path):
+        """メタデータは JSON、文書頻度は pickle を使わない .npz で保存されることを確認"""
+        meta = ArticleMeta("public", True, "vpn", "faq")
+        codec = {"encode_meta": ArticleMeta.to_json, "decode_meta": ArticleMeta.from_json}
+        index = SimilarityIndex(HashedVectorizer(256), **codec)
+        index.add(1, "VPN 接続", meta=meta, version="v1")
+        index.save(tmp_path)
+
+        state = json.loads((tmp_path / "state.json").read_text(encoding="utf-8"))
+        assert state["ids"] == [1] and state["metas"] == [meta.to_json()]
+        with np.load(tmp_path / "state.npz", allow_pickle=False) as arrays:
+            assert arrays["df"].sum() == np.unpackbits(arrays["nonzero"]).sum() > 0
+
+        restored = SimilarityIndex(HashedVectorizer(256), **codec)
+        assert restored.load(tmp_path)
+        assert restored.meta(1) == meta and restored.version(1) == "v1"
+        assert (restored._df == index._df).all()
+
+        # JSON と配列の組が一致しない場合は読み込まない
+        index.add(2, "プリンター")
+        index.save(tmp_path / "other")
+        (tmp_path / "other" / "state.npz").replace(tmp_path / "state.npz")
+        assert not SimilarityIndex(HashedVectorizer(256), **codec).load(tmp_path)
+
+
+@pytest.mark.tickets
+class TestIVFFlatIndex:
+    """IVF-flat 近似最近傍索引のテスト"""
+
+    def _vectors(self, n: int, dimensions: int = 32, clusters: int = 8) -> np.ndarray:
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(clusters, dimensions))
+        vectors = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dimensions))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+    def test_trained_search_matches_brute_force(self, tmp_path):
+        """クラスタ分割後も、十分なリストを走査すれば全件走査と同じ結果になることを確認"""
+        vectors = self._vectors(600)
+        index = IVFFlatIndex(32, n_probe=16, min_train_size=100)
+        for doc_id, vector in enumerate(vectors):
+            index.add(doc_id, vector)
+
+        index.save(tmp_path)
+
+        assert index.trained
+        # 保存したベクトルはメモリマップで参照する
+        assert isinstance(index._base, np.memmap)
+        for query in vectors[:20]:
+            approximate = [doc_id for doc_id, _ in index.nearest(query, 5)]
+            assert approximate == [doc_id for doc_id, _ in index.nearest(query, 5, exact=True)]
+
+    def test_changes_after_save_and_reload(self, tmp_path):
+        """保存後の追加・削除が検索に反映され、再読み込みで復元されることを確認"""
+        vectors = self._vectors(300)
+        index = IVFFlatIndex(32, n_probe=16, min_train_size=100)
+        for doc_id, vector in enumerate(vectors[:200]):
+            index.add(doc_id, vector)
+        index.save(tmp_path)
+
+        index.remove(0)
+        index.add(1, vectors[250])
+        index.add(500, vectors[0])
+        assert len(index) == 200
+        assert index.nearest(vectors[0], 1)[0][0] == 500
+        assert index.nearest(vectors[250], 1)[0][0] == 1
+
+        index.save(tmp_path)
+        restored = IVFFlatIndex(32, n_probe=16, min_train_size=100)
+        assert restored.load(tmp_path)
+        assert restored.doc_ids() == index.doc_ids()
+        assert restored.nearest(vectors[0], 1)[0][0] == 500
+        assert not IVFFlatIndex(16).load(tmp_path)
+
+    def test_default_probes_scale_with_list_count(self, tmp_path):
+        """走査するリスト数の既定値がリスト数の平方根に応じて増えることを確認"""
+        assert _probe_count(16) == 8
+        assert _probe_count(316) == 36
+        assert _probe_count(4096) == 128
+
+        vectors = self._vectors(600)
+        index = IVFFlatIndex(32, min_train_size=100)
+        for doc_id, vector in enumerate(vectors):
+            index.add(doc_id, vector)
+        index.save(tmp_path)
+
+        assert index.trained and index.n_probe is None
+        for query in vectors[:20]:
+            assert index.nearest(query, 1)[0][0] == index.nearest(query, 1, exact=True)[0][0]
+
+    @pytest.mark.asyncio
+    async def test_search_runs_outside_event_loop(self):
+        """検索の走査がイベントループのスレッドの外で行われることを確認"""
+        index = IVFFlatIndex(32)
+        for doc_id, vector in enumerate(self._vectors(50)):
+            index.add(doc_id, vector)
+        threads = []
+        nearest = index.nearest
+
+        def recording_nearest(*args):
+            threads.append(threading.get_ident())
+            return nearest(*args)
+
+        index.nearest = recording_nearest
+        query = self._vectors(1)[0]
+        assert await index.search(query, 3) == nearest(query, 3)
+        assert await index.search(query, 3, exact=True) == nearest(query, 3)
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
+
+
+@pytest.mark.tickets
+class TestTicketSuggestions:
+    """チケット作成時の提案のテスト"""
+
+    async def _seed(self, db_session: AsyncSession, requester: User, author: User) -> None:
+        await create_test_ticket(
+            db_session,
+            requester=requester,
+            status=TicketStatus.RESOLVED,
+            subject="VPNに接続できない",
+            description="在宅勤務中にVPNへ接続できません。",
+            resolution_summary="VPNクライアントを再インストールして解決",
+        )
+        await create_test_ticket(
+            db_session,
+            requester=requester,
+            status=TicketStatus.NEW,
+            subject="VPNに接続できない（対応中）",
+            description="在宅勤務中にVPNへ接続できません。",
+        )
+        db_session.add_all([
+            KnowledgeArticle(
+                title="VPN接続できない場合の対処", content="VPNクライアントの再インストール手順",
+                category="FAQ", article_type="faq", author_id=author.id,
+                visibility=KnowledgeVisibility.PUBLIC, is_published=True,
+            ),
+            KnowledgeArticle(
+                title="VPNサーバーの構成", content="VPN接続の内部構成",
+                category="FAQ", article_type="faq", author_id=author.id,
+                visibility=KnowledgeVisibility.IT_ONLY, is_published=True,
+            ),
+        ])
+        await db_session.commit()
+
+    @pytest.mark.asyncio
+    async def test_create_ticket_returns_suggestions(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_requester: User,
+        test_user_agent: User,
+        create_auth_headers,
+    ):
+        """作成したチケットに類似した解決済みチケットと記事が返ることを確認"""
+        await self._seed(db_session, test_user_requester, test_user_agent)
+        assert len(ticket_vectors) == 2
+        assert len(article_vectors) == 2
+
+        response = await client.post(
+            "/api/tickets",
+            json={
+                "subject": "VPNに接続できません",
+                "description": "自宅からVPNに接続できなくなりました。",
+                "type": "incident",
+                "category": "network",
+                "impact": 3,
+                "urgency": 3,
+            },
+            headers=create_auth_headers(test_user_agent.id),
+        )
+
+        assert response.status_code == 201
+        data = response.json()
+        suggestions = data["suggestions"]
+
+        # 解決済みのチケットのみ（作成したチケット自身は含まない）
+        assert [t["subject"] for t in suggestions["similar_tickets"]] == ["VPNに接続できない"]
+        assert suggestions["similar_tickets"][0]["resolution_summary"] == "VPNクライアントを再インストールして解決"
+        assert data["id"] in ticket_vectors
+        assert {a["title"] for a in suggestions["articles"]} == {
+            "VPN接続できない場合の対処", "VPNサーバーの構成",
+        }
+
+    @pytest.mark.asyncio
+    async def test_requester_gets_public_articles_only(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        test_user_requester: User,
+        test_user_agent: User,
+        create_auth_headers,
+    ):
+        """依頼者には類似チケットを返さず、公開記事のみ返すことを確認"""
+        await self._seed(db_session, test_user_requester, test_user_agent)
+        ticket = await create_test_ticket(
+            db_session,
+            requester=test_user_requester,
+            subject="VPNがつながらない",
+            description="VPNに接続できません。",
+        )
+
+        response = await client.get(
+            f"/api/tickets/{ticket.id}/suggestions",
+            headers=create_auth_headers(test_user_requester.id),
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["similar_tickets"] == []
+        assert [a["title"] for a in data["articles"]] == ["VPN接続できない場合の対処"]
+
+    @pytest.mark.asyncio
+    async def test_only_lock_owner_saves_indexes(
+        self,
+        db_session: AsyncSession,
+        test_user_requester: User,
+        test_user_agent: User,
+        tmp_path,
+    ):
+        """保存担当でないプロセスは保存せず、保存済みの索引を読み込み直して差分同期することを確認"""
+        await self._seed(db_session, test_user_requester, test_user_agent)
+        await refresh_similarity_indexes(db_session, tmp_path)
+        saved = (tmp_path / "tickets" / "state.json").read_bytes()
+        release_saver_locks()
+
+        # 別のワーカーが保存担当のロックを保持している
+        with open(lock_path(tmp_path), "a+b") as held:
+            fcntl.flock(held.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            ticket_vectors.add(999, "stale")
+            assert save_similarity_indexes(tmp_path) == 0
+
+            # 別のワーカーで作成されたチケットも差分同期で取り込まれる
+            ticket = await create_test_ticket(db_session, requester=test_user_requester, subject="プリンター")
+            ticket_vectors.clear()
+            synced = await refresh_similarity_indexes(db_session, tmp_path)
+            assert synced["tickets"] == (1, 0)
+            assert ticket.id in ticket_vectors and 999 not in ticket_vectors
+            assert (tmp_path / "tickets" / "state.json").read_bytes() == saved